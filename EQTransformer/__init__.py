@@ -5,9 +5,12 @@ import sys
 import warnings
 
 from EQTransformer.core.trainer import trainer 
-from EQTransformer.core.tester import tester
+from EQTransformer.core.tester import tester, compare_models
 from EQTransformer.core.predictor import predictor
 from EQTransformer.core.mseed_predictor import mseed_predictor
+from EQTransformer.core.quantizer import quantizer
+from EQTransformer.core.inference_server import inference_server, InferenceClient
+from EQTransformer.core.autotune import autotune
 from EQTransformer.core.EqT_utils import *
 from EQTransformer.utils.associator import run_associator
 from EQTransformer.utils.downloader import downloadMseeds, makeStationList, downloadSacs
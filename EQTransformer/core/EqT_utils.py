@@ -13,19 +13,269 @@ import matplotlib
 matplotlib.use('agg')
 from tqdm import tqdm
 import os
+import sys
+import time
+import atexit
+import threading
+import collections
+from functools import lru_cache
 os.environ['KERAS_BACKEND']='tensorflow'
+import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import backend as K
 from tensorflow.keras.layers import add, Activation, LSTM, Conv1D, InputSpec
 from tensorflow.keras.layers import MaxPooling1D, UpSampling1D, Cropping1D, SpatialDropout1D, Bidirectional, BatchNormalization 
-from tensorflow.keras.models import Model
+from tensorflow.keras.models import Model, load_model
 from tensorflow.keras.optimizers import Adam
 from obspy.signal.trigger import trigger_onset
 import matplotlib
+from ..utils.hdf5_maker import get_window
+from ..utils.packed_hdf5 import iter_traces, trace_ids
 from tensorflow.python.util import deprecation
 deprecation._PRINT_DEPRECATION_WARNINGS = False
 
 
+
+class _BatchBuffers():
+    
+    """ 
+    
+    The arrays of the batches of a generator, float32 unless given, reused for the next batches once nothing outside 
+    of the pool refers to them. Keras queues the batches ahead of the model and some callers keep all of them, so the 
+    arrays of a batch that is still in use are never overwritten, new ones are allocated instead and reused later too.
+    
+    """
+    
+    def __init__(self):
+        self.shapes = None
+        self.pool = []
+        self.lock = threading.Lock()
+        
+    def __getstate__(self):
+        # the arrays and the lock stay in this process
+        return {}
+    
+    def __setstate__(self, state):
+        self.__init__()
+        
+    def get(self, *shapes, dtypes=None):
+        ' returns zeroed arrays of the shapes, float32 or of dtypes '
+        
+        dtypes = tuple(dtypes or [np.float32]*len(shapes))
+        with self.lock:
+            if (shapes, dtypes) != self.shapes:
+                self.shapes, self.pool = (shapes, dtypes), []
+            for arrays in self.pool:
+                if all(sys.getrefcount(arrays[k]) == self.free for k in range(len(arrays))):
+                    for k in range(len(arrays)):
+                        arrays[k].fill(0)
+                    return tuple(arrays)
+            arrays = [np.zeros(shape, dtype=dtype) for shape, dtype in zip(shapes, dtypes)]
+            # the reference count of an array that only the pool refers to
+            self.free = sys.getrefcount(arrays[0])
+            self.pool.append(arrays)
+            return tuple(arrays)
+
+
+
+# read-only hdf5 files of the data generators: (path, process id) -> (file, modification time), least recently used first
+_HDF5_FILES = collections.OrderedDict()
+_HDF5_LOCK = threading.Lock()
+_HDF5_MAX_OPEN = 8
+
+
+
+def cached_hdf5(file_name):
+    
+    """ 
+    
+    Returns a read-only h5py file that stays open for the following batches, instead of opening and closing the 
+    file for each batch. Each process opens its own on first use, so the worker processes forked by Keras never 
+    use a handle of their parent. A file is opened again if it was modified, and a process keeps at most 
+    _HDF5_MAX_OPEN files open.
+    
+    Parameters
+    ----------
+    file_name : str
+        Path to the hdf5 file.
+        
+    Returns
+    -------  
+    fl : obj
+        Open h5py file. It is closed by close_hdf5_files, not by the caller.
+        
+    """  
+    
+    key = (os.path.abspath(file_name), os.getpid())
+    mtime = os.path.getmtime(file_name)
+    with _HDF5_LOCK:
+        fl, opened = _HDF5_FILES.pop(key, (None, None))
+        if fl is not None and (opened != mtime or not fl.id.valid):
+            fl.close()
+            fl = None
+        if fl is None:
+            fl = h5py.File(file_name, 'r')
+        _HDF5_FILES[key] = (fl, mtime)
+        for other in [k for k in _HDF5_FILES if k[1] == key[1]][:-_HDF5_MAX_OPEN]:
+            _HDF5_FILES.pop(other)[0].close()
+    return fl
+
+
+
+def close_hdf5_files():
+    
+    """ 
+    
+    Closes the hdf5 files opened by cached_hdf5 in this process. It is also called when the process exits.
+        
+    """  
+    
+    with _HDF5_LOCK:
+        for key in [k for k in _HDF5_FILES if k[1] == os.getpid()]:
+            _HDF5_FILES.pop(key)[0].close()
+
+
+atexit.register(close_hdf5_files)
+
+
+
+def _triangle(a=0, b=20, c=40):  
+    'Used for triangolar labeling'
+    
+    z = np.linspace(a, c, num = 2*(b-a)+1)
+    y = np.zeros(z.shape)
+    y[z <= a] = 0
+    y[z >= c] = 0
+    first_half = np.logical_and(a < z, z <= b)
+    y[first_half] = (z[first_half]-a) / (b-a)
+    second_half = np.logical_and(b < z, z < c)
+    y[second_half] = (c-z[second_half]) / (c-b)
+    return y
+
+
+
+@lru_cache(maxsize=8)
+def _label_kernels(dim):
+    ' read-only triangle of _triangle(), and exp(-d**2/200) for d from -(dim+40) to 39, computed once per dim '
+    
+    triangle = _triangle()
+    gaussian = np.exp(-(np.arange(-(dim+40), 40))**2/(2*(10)**2))
+    for kernel in [triangle, gaussian]:
+        kernel.flags.writeable = False
+    return triangle, gaussian
+
+
+
+def _check_label_dtype(label_dtype, label_type):
+    ' the numpy dtype of the labels; an integer one only holds the 0 and 1 of box labels '
+    
+    label_dtype = np.dtype(label_dtype)
+    if label_dtype.kind not in 'fu' or (label_dtype.kind == 'u' and label_type != 'box'):
+        raise ValueError('label_dtype must be a float type, or an unsigned integer type with box labels, not '+str(label_dtype)+'.')
+    return label_dtype
+
+
+
+def _pick_label(label_type, pick, dim, phase='P'):
+    
+    """ 
+    
+    The slice of the P or S label of a pick, as (start, stop, values) with Python slice bounds, or None. The 
+    values are views of the kernels of _label_kernels, except for a triangle near the edges of the window. Near 
+    the edges a gaussian label is clipped with the conditions of the P and S picks of an event or of an added 
+    event (phase 'add'), which differ.
+    
+    """
+    
+    if not pick:
+        return None
+    if label_type == 'gaussian':
+        if phase == 'S':
+            inside, clipped = pick-20 >= 0 and pick-20 < dim, pick-20 < dim
+        elif phase == 'P':
+            inside, clipped = pick-20 >= 0 and pick+20 < dim, pick-20 < dim
+        else:
+            inside, clipped = pick-20 >= 0 and pick+20 < dim, pick+20 < dim
+        if inside:
+            start = pick-20
+        elif clipped:
+            start = 0
+        else:
+            return None
+        # gaussian[k] is exp(-d**2/200) at d = k-(dim+40)
+        return start, pick+20, _label_kernels(dim)[1][start-pick+dim+40:dim+60][:dim-(pick-20)]
+    
+    elif label_type == 'triangle':
+        if pick-20 >= 0 and pick+21 < dim:
+            return pick-20, pick+21, _label_kernels(dim)[0]
+        elif pick+21 < dim:
+            return 0, pick+pick+1, _triangle(a=0, b=pick, c=2*pick)
+        elif pick-20 >= 0:
+            dif = dim - pick
+            return pick-dif-1, dim, _triangle(a=pick-dif, b=pick, c=2*dif)
+        return None
+    
+    elif label_type == 'box':
+        return pick-20, pick+20, None
+
+
+
+def _detection_label(spt, sst, dim, coda_ratio):
+    ' the slice (start, stop) of the detection label of an event, from its P pick to coda_ratio of its S-P time past the S pick '
+    
+    sd = sst - spt
+    if sst+int(coda_ratio*sd) <= dim: 
+        return spt, int(sst+(coda_ratio*sd))
+    return spt, dim
+
+
+
+def _event_labels(label_type, spt, sst, dim, coda_ratio, added=False):
+    
+    """ 
+    
+    The slices (start, stop, values) of the detection, P, and S labels of an event in the training generators, or 
+    None for the labels it does not have. added is True for an event added by the augmentation.
+    
+    """
+    
+    if label_type not in ['gaussian', 'triangle', 'box']:
+        return None, None, None
+    if spt and sst and sst - spt:
+        detection = _detection_label(spt, sst, dim, coda_ratio)+(None,)
+    elif added or label_type == 'box':
+        detection = (spt, dim, None)
+    else:
+        detection = None
+    return (detection, 
+            _pick_label(label_type, spt, dim, 'add' if added else 'P'), 
+            _pick_label(label_type, sst, dim, 'add' if added else 'S'))
+
+
+
+def _write_labels(y, slices):
+    
+    """ 
+    
+    Writes the label slices of a batch in order, so the labels of an added event are written over those of the 
+    event. 
+    
+    Parameters
+    ----------
+    y: numpy array
+        Labels, (batch, samples, 1).
+        
+    slices: list
+        (row, start, stop, values) with Python slice bounds along the samples, and values a 1D array or None for 
+        ones.
+        
+    """
+    
+    for row, start, stop, value in slices:
+        y[row, start:stop, 0] = 1 if value is None else value
+    
+    
+
 class DataGenerator(keras.utils.Sequence):
     
     """ 
@@ -35,7 +285,7 @@ class DataGenerator(keras.utils.Sequence):
     Parameters
     ----------
     list_IDsx: str
-        List of trace names.
+        List of trace names, or their integer ids in the metadata index of file_name (see trace_ids).
             
     file_name: str
         Name of hdf5 file containing waveforms data.
@@ -88,6 +338,9 @@ class DataGenerator(keras.utils.Sequence):
     pre_emphasis: bool, default=False
         If True, waveforms will be pre emphasized. 
 
+    label_dtype: str, default='float32'
+        Type of the labels, e.g. 'float16' to halve their memory, or 'uint8' with box labels.
+
     Returns
     --------        
     Batches of two dictionaries: {'input': X}: pre-processed waveform as input {'detector': y1, 'picker_P': y2, 'picker_S': y3}: outputs including three separate numpy arrays as labels for detection, P, and S respectively.
@@ -112,13 +365,14 @@ class DataGenerator(keras.utils.Sequence):
                  add_noise_r = None, 
                  drop_channe_r = None, 
                  scale_amplitude_r = None, 
-                 pre_emphasis = True):
+                 pre_emphasis = True,
+                 label_dtype = 'float32'):
        
         'Initialization'
         self.dim = dim
         self.batch_size = batch_size
         self.phase_window = phase_window
-        self.list_IDs = list_IDs
+        self.list_IDs = trace_ids(file_name, list_IDs)
         self.file_name = file_name        
         self.n_channels = n_channels
         self.shuffle = shuffle
@@ -134,6 +388,8 @@ class DataGenerator(keras.utils.Sequence):
         self.drop_channe_r = drop_channe_r
         self.scale_amplitude_r = scale_amplitude_r
         self.pre_emphasis = pre_emphasis
+        self.label_dtype = _check_label_dtype(label_dtype, label_type)
+        self._buffers = _BatchBuffers()
 
 
     def __len__(self):
@@ -244,19 +500,6 @@ class DataGenerator(keras.utils.Sequence):
           data *= data.shape[-1] / np.count_nonzero(tmp)
         return data
 
-    def _label(self, a=0, b=20, c=40):  
-        'Used for triangolar labeling'
-        
-        z = np.linspace(a, c, num = 2*(b-a)+1)
-        y = np.zeros(z.shape)
-        y[z <= a] = 0
-        y[z >= c] = 0
-        first_half = np.logical_and(a < z, z <= b)
-        y[first_half] = (z[first_half]-a) / (b-a)
-        second_half = np.logical_and(b < z, z < c)
-        y[second_half] = (c-z[second_half]) / (c-b)
-        return y
-
     def _add_event(self, data, addp, adds, coda_end, snr, rate): 
         'Add a scaled version of the event into the empty part of the trace'
        
@@ -324,36 +567,31 @@ class DataGenerator(keras.utils.Sequence):
                     
     def __data_generation(self, list_IDs_temp):
         'read the waveforms'         
-        X = np.zeros((self.batch_size, self.dim, self.n_channels))
-        y1 = np.zeros((self.batch_size, self.dim, 1))
-        y2 = np.zeros((self.batch_size, self.dim, 1))
-        y3 = np.zeros((self.batch_size, self.dim, 1))
-        fl = h5py.File(self.file_name, 'r')
+        X, y1, y2, y3 = self._buffers.get((self.batch_size, self.dim, self.n_channels), *[(self.batch_size, self.dim, 1)]*3, 
+                                            dtypes=[np.float32]+[self.label_dtype]*3)
+        fl = cached_hdf5(self.file_name)
 
+        # label slices of the events, and of the added events written over them
+        labels, added = [[], [], []], [[], [], []]
         # Generate data
-        for i, ID in enumerate(list_IDs_temp):
+        for i, (data, meta) in enumerate(iter_traces(fl, list_IDs_temp)):
             additions = None
-            dataset = fl.get('data/'+str(ID))
 
-            if ID.split('_')[-1] == 'EV':
-                data = np.array(dataset)                    
-                spt = int(dataset.attrs['p_arrival_sample']);
-                sst = int(dataset.attrs['s_arrival_sample']);
-                coda_end = int(dataset.attrs['coda_end_sample']);
-                snr = dataset.attrs['snr_db'];
-                    
-            elif ID.split('_')[-1] == 'NO':
-                data = np.array(dataset)
+            if meta['event']:
+                spt = int(meta['p_arrival_sample']);
+                sst = int(meta['s_arrival_sample']);
+                coda_end = int(meta['coda_end_sample']);
+                snr = meta['snr_db'];
            
             ## augmentation 
             if self.augmentation == True:                 
                 if i <= self.batch_size//2:   
-                    if self.shift_event_r and dataset.attrs['trace_category'] == 'earthquake_local':
+                    if self.shift_event_r and meta['earthquake']:
                         data, spt, sst, coda_end = self._shift_event(data, spt, sst, coda_end, snr, self.shift_event_r/2);                                       
                     if self.norm_mode:                    
                         data = self._normalize(data, self.norm_mode)  
                 else:                  
-                    if dataset.attrs['trace_category'] == 'earthquake_local':                   
+                    if meta['earthquake']:                   
                         if self.shift_event_r:
                             data, spt, sst, coda_end = self._shift_event(data, spt, sst, coda_end, snr, self.shift_event_r); 
                             
@@ -376,7 +614,7 @@ class DataGenerator(keras.utils.Sequence):
                         if self.norm_mode:    
                             data = self._normalize(data, self.norm_mode)                            
                                     
-                    elif dataset.attrs['trace_category'] == 'noise':
+                    elif meta['noise']:
                         if self.drop_channe_r:    
                             data = self._drop_channel_noise(data, self.drop_channe_r);
                             
@@ -387,7 +625,7 @@ class DataGenerator(keras.utils.Sequence):
                             data = self._normalize(data, self.norm_mode) 
 
             elif self.augmentation == False:  
-                if self.shift_event_r and dataset.attrs['trace_category'] == 'earthquake_local':
+                if self.shift_event_r and meta['earthquake']:
                     data, spt, sst, coda_end = self._shift_event(data, spt, sst, coda_end, snr, self.shift_event_r/2);                     
                 if self.norm_mode:                    
                     data = self._normalize(data, self.norm_mode)                          
@@ -395,140 +633,19 @@ class DataGenerator(keras.utils.Sequence):
             X[i, :, :] = data                                       
 
             ## labeling 
-            if dataset.attrs['trace_category'] == 'earthquake_local': 
-                if self.label_type  == 'gaussian': 
-                    sd = None    
-                    if spt and sst: 
-                        sd = sst - spt  
-                                                            
-                    if sd and sst:
-                        if sst+int(self.coda_ratio*sd) <= self.dim: 
-                            y1[i, spt:int(sst+(self.coda_ratio*sd)), 0] = 1        
-                        else:
-                            y1[i, spt:self.dim, 0] = 1                       
-                             
-                    if spt and (spt-20 >= 0) and (spt+20 < self.dim):
-                        y2[i, spt-20:spt+20, 0] = np.exp(-(np.arange(spt-20,spt+20)-spt)**2/(2*(10)**2))[:self.dim-(spt-20)]                
-                    elif spt and (spt-20 < self.dim):
-                        y2[i, 0:spt+20, 0] = np.exp(-(np.arange(0,spt+20)-spt)**2/(2*(10)**2))[:self.dim-(spt-20)]
-    
-                    if sst and (sst-20 >= 0) and (sst-20 < self.dim):
-                        y3[i, sst-20:sst+20, 0] = np.exp(-(np.arange(sst-20,sst+20)-sst)**2/(2*(10)**2))[:self.dim-(sst-20)]
-                    elif sst and (sst-20 < self.dim):
-                        y3[i, 0:sst+20, 0] = np.exp(-(np.arange(0,sst+20)-sst)**2/(2*(10)**2))[:self.dim-(sst-20)]
-
-                    if additions: 
-                        add_sd = None
-                        add_spt = additions[0];
-                        add_sst = additions[1];
-                        if add_spt and add_sst: 
-                            add_sd = add_sst - add_spt  
-                                    
-                        if add_sd and add_sst+int(self.coda_ratio*add_sd) <= self.dim: 
-                            y1[i, add_spt:int(add_sst+(self.coda_ratio*add_sd)), 0] = 1        
-                        else:
-                            y1[i, add_spt:self.dim, 0] = 1
-                            
-                        if add_spt and (add_spt-20 >= 0) and (add_spt+20 < self.dim):
-                            y2[i, add_spt-20:add_spt+20, 0] = np.exp(-(np.arange(add_spt-20,add_spt+20)-add_spt)**2/(2*(10)**2))[:self.dim-(add_spt-20)]
-                        elif add_spt and (add_spt+20 < self.dim):
-                            y2[i, 0:add_spt+20, 0] = np.exp(-(np.arange(0,add_spt+20)-add_spt)**2/(2*(10)**2))[:self.dim-(add_spt-20)]
-        
-                        if add_sst and (add_sst-20 >= 0) and (add_sst+20 < self.dim):
-                            y3[i, add_sst-20:add_sst+20, 0] = np.exp(-(np.arange(add_sst-20,add_sst+20)-add_sst)**2/(2*(10)**2))[:self.dim-(add_sst-20)]
-                        elif add_sst and (add_sst+20 < self.dim):
-                            y3[i, 0:add_sst+20, 0] = np.exp(-(np.arange(0,add_sst+20)-add_sst)**2/(2*(10)**2))[:self.dim-(add_sst-20)]
-                                                    
-
-                elif self.label_type  == 'triangle':                      
-                    sd = None    
-                    if spt and sst: 
-                        sd = sst - spt  
-                                                            
-                    if sd and sst:
-                        if sst+int(self.coda_ratio*sd) <= self.dim: 
-                            y1[i, spt:int(sst+(self.coda_ratio*sd)), 0] = 1        
-                        else:
-                            y1[i, spt:self.dim, 0] = 1                     
-                        
-                    if spt and (spt-20 >= 0) and (spt+21 < self.dim):
-                        y2[i, spt-20:spt+21, 0] = self._label()
-                    elif spt and (spt+21 < self.dim):
-                        y2[i, 0:spt+spt+1, 0] = self._label(a=0, b=spt, c=2*spt)
-                    elif spt and (spt-20 >= 0):
-                        pdif = self.dim - spt
-                        y2[i, spt-pdif-1:self.dim, 0] = self._label(a=spt-pdif, b=spt, c=2*pdif)
-         
-                    if sst and (sst-20 >= 0) and (sst+21 < self.dim):
-                        y3[i, sst-20:sst+21, 0] = self._label()
-                    elif sst and (sst+21 < self.dim):
-                        y3[i, 0:sst+sst+1, 0] = self._label(a=0, b=sst, c=2*sst)
-                    elif sst and (sst-20 >= 0):
-                        sdif = self.dim - sst
-                        y3[i, sst-sdif-1:self.dim, 0] = self._label(a=sst-sdif, b=sst, c=2*sdif)             
-    
-                    if additions: 
-                        add_spt = additions[0];
-                        add_sst = additions[1];
-                        add_sd = None
-                        if add_spt and add_sst: 
-                            add_sd = add_sst - add_spt                     
-                        
-                        if add_sd and add_sst+int(self.coda_ratio*add_sd) <= self.dim: 
-                            y1[i, add_spt:int(add_sst+(self.coda_ratio*add_sd)), 0] = 1        
-                        else:
-                            y1[i, add_spt:self.dim, 0] = 1                     
-    
-                        if add_spt and (add_spt-20 >= 0) and (add_spt+21 < self.dim):
-                            y2[i, add_spt-20:add_spt+21, 0] = self._label()
-                        elif add_spt and (add_spt+21 < self.dim):
-                            y2[i, 0:add_spt+add_spt+1, 0] = self._label(a=0, b=add_spt, c=2*add_spt)
-                        elif add_spt and (add_spt-20 >= 0):
-                            pdif = self.dim - add_spt
-                            y2[i, add_spt-pdif-1:self.dim, 0] = self._label(a=add_spt-pdif, b=add_spt, c=2*pdif)
-    
-                        if add_sst and (add_sst-20 >= 0) and (add_sst+21 < self.dim):
-                            y3[i, add_sst-20:add_sst+21, 0] = self._label()
-                        elif add_sst and (add_sst+21 < self.dim):
-                            y3[i, 0:add_sst+add_sst+1, 0] = self._label(a=0, b=add_sst, c=2*add_sst)
-                        elif add_sst and (add_sst-20 >= 0):
-                            sdif = self.dim - add_sst
-                            y3[i, add_sst-sdif-1:self.dim, 0] = self._label(a=add_sst-sdif, b=add_sst, c=2*sdif) 
-    
-    
-                elif self.label_type  == 'box':
-                    sd = None                             
-                    if sst and spt:
-                        sd = sst - spt      
-
-                    if sd and sst+int(self.coda_ratio*sd) <= self.dim: 
-                        y1[i, spt:int(sst+(self.coda_ratio*sd)), 0] = 1        
-                    else:
-                        y1[i, spt:self.dim, 0] = 1         
-                    if spt: 
-                        y2[i, spt-20:spt+20, 0] = 1
-                    if sst:
-                        y3[i, sst-20:sst+20, 0] = 1                       
-                   
-                    if additions:
-                        add_sd = None
-                        add_spt = additions[0];
-                        add_sst = additions[1];
-                        if add_spt and add_sst:
-                            add_sd = add_sst - add_spt  
-                            
-                        if add_sd and add_sst+int(self.coda_ratio*add_sd) <= self.dim: 
-                            y1[i, add_spt:int(add_sst+(self.coda_ratio*add_sd)), 0] = 1        
-                        else:
-                            y1[i, add_spt:self.dim, 0] = 1                     
-                        if add_spt:
-                            y2[i, add_spt-20:add_spt+20, 0] = 1
-                        if add_sst:
-                            y3[i, add_sst-20:add_sst+20, 0] = 1                 
-
-        fl.close() 
-                           
-        return X, y1.astype('float32'), y2.astype('float32'), y3.astype('float32')
+            if meta['earthquake']: 
+                for slices, label in zip(labels, _event_labels(self.label_type, spt, sst, self.dim, self.coda_ratio)):
+                    if label:
+                        slices.append((i,)+label)
+                if additions:
+                    for slices, label in zip(added, _event_labels(self.label_type, additions[0], additions[1], self.dim, 
+                                                                  self.coda_ratio, added=True)):
+                        if label:
+                            slices.append((i,)+label)
+
+        for y, event_slices, added_slices in zip([y1, y2, y3], labels, added):
+            _write_labels(y, event_slices + added_slices)
+        return X, y1, y2, y3
 
 
 
@@ -595,6 +712,9 @@ class PreLoadGenerator(keras.utils.Sequence):
     pre_emphasis: bool, default=False
         If True, waveforms will be pre emphasized. 
 
+    label_dtype: str, default='float32'
+        Type of the labels, e.g. 'float16' to halve their memory, or 'uint8' with box labels.
+
     Returns
     --------        
     Batches of two dictionaries: {'input': X}: pre-processed waveform as input {'detector': y1, 'picker_P': y2, 'picker_S': y3}: outputs including three separate numpy arrays as labels for detection, P, and S respectively.
@@ -620,7 +740,8 @@ class PreLoadGenerator(keras.utils.Sequence):
                  add_noise_r = None, 
                  drop_channe_r = None, 
                  scale_amplitude_r = None, 
-                 pre_emphasis = True):
+                 pre_emphasis = True,
+                 label_dtype = 'float32'):
        
         'Initialization'
         self.inp_data =inp_data
@@ -642,7 +763,9 @@ class PreLoadGenerator(keras.utils.Sequence):
         self.add_noise_r = add_noise_r
         self.drop_channe_r = drop_channe_r
         self.scale_amplitude_r = scale_amplitude_r
-        self.pre_emphasis = pre_emphasis       
+        self.pre_emphasis = pre_emphasis
+        self.label_dtype = _check_label_dtype(label_dtype, label_type)
+        self._buffers = _BatchBuffers()
         
     def __len__(self):
         'Denotes the number of batches per epoch'
@@ -755,19 +878,6 @@ class PreLoadGenerator(keras.utils.Sequence):
           data *= data.shape[-1] / np.count_nonzero(tmp)
         return data
 
-    def _label(self, a=0, b=20, c=40):  
-        'Used for triangolar labeling'
-        
-        z = np.linspace(a, c, num = 2*(b-a)+1)
-        y = np.zeros(z.shape)
-        y[z <= a] = 0
-        y[z >= c] = 0
-        first_half = np.logical_and(a < z, z <= b)
-        y[first_half] = (z[first_half]-a) / (b-a)
-        second_half = np.logical_and(b < z, z < c)
-        y[second_half] = (c-z[second_half]) / (c-b)
-        return y
-
     def _add_event(self, data, addp, adds, coda_end, snr, rate): 
         'Add a scaled version of the event into the empty part of the trace'
         
@@ -837,10 +947,10 @@ class PreLoadGenerator(keras.utils.Sequence):
                     
     def __data_generation(self, list_IDs_temp):
         'readint the waveforms' 
-        X = np.zeros((self.batch_size, self.dim, self.n_channels))
-        y1 = np.zeros((self.batch_size, self.dim, 1))
-        y2 = np.zeros((self.batch_size, self.dim, 1))
-        y3 = np.zeros((self.batch_size, self.dim, 1))            
+        X, y1, y2, y3 = self._buffers.get((self.batch_size, self.dim, self.n_channels), *[(self.batch_size, self.dim, 1)]*3, 
+                                            dtypes=[np.float32]+[self.label_dtype]*3)
+        # label slices of the events, and of the added events written over them
+        labels, added = [[], [], []], [[], [], []]
         # Generate data
         for i, ID in enumerate(list_IDs_temp):            
             additions = None
@@ -899,141 +1009,20 @@ class PreLoadGenerator(keras.utils.Sequence):
                     data = self._normalize(data, self.norm_mode)    
                       
             X[i, :, :] = data                                                           
-            ## labeling             
-            if dataset.attrs['trace_category'] == 'earthquake_local':
- 
-                if self.label_type  == 'gaussian': 
-                    sd = None                             
-                    if spt and sst: 
-                        sd = sst - spt  
-                                                            
-                    if sd and sst:
-                        if sst+int(self.coda_ratio*sd) <= self.dim: 
-                            y1[i, spt:int(sst+(self.coda_ratio*sd)), 0] = 1        
-                        else:
-                            y1[i, spt:self.dim, 0] = 1                     
-                                 
-                    if spt and (spt-20 >= 0) and (spt+20 < self.dim):
-                        y2[i, spt-20:spt+20, 0] = np.exp(-(np.arange(spt-20,spt+20)-spt)**2/(2*(10)**2))[:self.dim-(spt-20)]                
-                    elif spt and (spt-20 < self.dim):
-                        y2[i, 0:spt+20, 0] = np.exp(-(np.arange(0,spt+20)-spt)**2/(2*(10)**2))[:self.dim-(spt-20)]
-    
-                    if sst and (sst-20 >= 0) and (sst-20 < self.dim):
-                        y3[i, sst-20:sst+20, 0] = np.exp(-(np.arange(sst-20,sst+20)-sst)**2/(2*(10)**2))[:self.dim-(sst-20)]
-                    elif sst and (sst-20 < self.dim):
-                        y3[i, 0:sst+20, 0] = np.exp(-(np.arange(0,sst+20)-sst)**2/(2*(10)**2))[:self.dim-(sst-20)]
-
-                    if additions: 
-                        add_spt = additions[0];
-                        add_sst = additions[1];
-                        add_sd = None
-                        
-                        if add_spt and add_sst: 
-                            add_sd = add_sst - add_spt  
-                                    
-                        if add_sd and add_sst+int(self.coda_ratio*add_sd) <= self.dim: 
-                            y1[i, add_spt:int(add_sst+(self.coda_ratio*add_sd)), 0] = 1        
-                        else:
-                            y1[i, add_spt:self.dim, 0] = 1
-                            
-                        if add_spt and (add_spt-20 >= 0) and (add_spt+20 < self.dim):
-                            y2[i, add_spt-20:add_spt+20, 0] = np.exp(-(np.arange(add_spt-20,add_spt+20)-add_spt)**2/(2*(10)**2))[:self.dim-(add_spt-20)]
-                        elif add_spt and (add_spt+20 < self.dim):
-                            y2[i, 0:add_spt+20, 0] = np.exp(-(np.arange(0,add_spt+20)-add_spt)**2/(2*(10)**2))[:self.dim-(add_spt-20)]
-        
-                        if add_sst and (add_sst-20 >= 0) and (add_sst+20 < self.dim):
-                            y3[i, add_sst-20:add_sst+20, 0] = np.exp(-(np.arange(add_sst-20,add_sst+20)-add_sst)**2/(2*(10)**2))[:self.dim-(add_sst-20)]
-                        elif add_sst and (add_sst+20 < self.dim):
-                            y3[i, 0:add_sst+20, 0] = np.exp(-(np.arange(0,add_sst+20)-add_sst)**2/(2*(10)**2))[:self.dim-(add_sst-20)]
-                                                    
-                elif self.label_type  == 'triangle':  
-                    sd = None     
-                    if spt and sst: 
-                        sd = sst - spt  
-                                                            
-                    if sd and sst:
-                        if sst+int(self.coda_ratio*sd) <= self.dim: 
-                            y1[i, spt:int(sst+(self.coda_ratio*sd)), 0] = 1        
-                        else:
-                            y1[i, spt:self.dim, 0] = 1                     
-                        
-                    if spt and (spt-20 >= 0) and (spt+21 < self.dim):
-                        y2[i, spt-20:spt+21, 0] = self._label()
-                    elif spt and (spt+21 < self.dim):
-                        y2[i, 0:spt+spt+1, 0] = self._label(a=0, b=spt, c=2*spt)
-                    elif spt and (spt-20 >= 0):
-                        pdif = self.dim - spt
-                        y2[i, spt-pdif-1:self.dim, 0] = self._label(a=spt-pdif, b=spt, c=2*pdif)
-         
-                    if sst and (sst-20 >= 0) and (sst+21 < self.dim):
-                        y3[i, sst-20:sst+21, 0] = self._label()
-                    elif sst and (sst+21 < self.dim):
-                        y3[i, 0:sst+sst+1, 0] = self._label(a=0, b=sst, c=2*sst)
-                    elif sst and (sst-20 >= 0):
-                        sdif = self.dim - sst
-                        y3[i, sst-sdif-1:self.dim, 0] = self._label(a=sst-sdif, b=sst, c=2*sdif)    
-         
-                    if additions: 
-                        add_spt = additions[0];
-                        add_sst = additions[1];
-                        add_sd = None
-                        
-                        if add_spt and add_sst: 
-                            add_sd = add_sst - add_spt                     
-                        
-                        if add_sd and add_sst+int(self.coda_ratio*add_sd) <= self.dim: 
-                            y1[i, add_spt:int(add_sst+(self.coda_ratio*add_sd)), 0] = 1        
-                        else:
-                            y1[i, add_spt:self.dim, 0] = 1                     
-    
-                        if add_spt and (add_spt-20 >= 0) and (add_spt+21 < self.dim):
-                            y2[i, add_spt-20:add_spt+21, 0] = self.label()
-                        elif add_spt and (add_spt+21 < self.dim):
-                            y2[i, 0:add_spt+add_spt+1, 0] = self.label(a=0, b=add_spt, c=2*add_spt)
-                        elif add_spt and (add_spt-20 >= 0):
-                            pdif = self.dim - add_spt
-                            y2[i, add_spt-pdif-1:self.dim, 0] = self.label(a=add_spt-pdif, b=add_spt, c=2*pdif)
-    
-                        if add_sst and (add_sst-20 >= 0) and (add_sst+21 < self.dim):
-                            y3[i, add_sst-20:add_sst+21, 0] = self.label()
-                        elif add_sst and (add_sst+21 < self.dim):
-                            y3[i, 0:add_sst+add_sst+1, 0] = self.label(a=0, b=add_sst, c=2*add_sst)
-                        elif add_sst and (add_sst-20 >= 0):
-                            sdif = self.dim - add_sst
-                            y3[i, add_sst-sdif-1:self.dim, 0] = self.label(a=add_sst-sdif, b=add_sst, c=2*sdif) 
-    
-                elif self.label_type  == 'box':
-                    sd = None
-                    if sst and spt:
-                        sd = sst - spt      
-
-                    if sd and sst+int(self.coda_ratio*sd) <= self.dim: 
-                        y1[i, spt:int(sst+(self.coda_ratio*sd)), 0] = 1        
-                    else:
-                        y1[i, spt:self.dim, 0] = 1
-                        
-                    if spt: 
-                        y2[i, spt-20:spt+20, 0] = 1
-                    if sst:
-                        y3[i, sst-20:sst+20, 0] = 1                       
-                   
-                    if additions: 
-                        add_sd = None
-                        add_spt = additions[0];
-                        add_sst = additions[1];
-                        if add_spt and add_sst:
-                            add_sd = add_sst - add_spt  
-                            
-                        if add_sd and add_sst+int(self.coda_ratio*add_sd) <= self.dim: 
-                            y1[i, add_spt:int(add_sst+(self.coda_ratio*add_sd)), 0] = 1        
-                        else:
-                            y1[i, add_spt:self.dim, 0] = 1                     
-                        if add_spt:
-                            y2[i, add_spt-20:add_spt+20, 0] = 1
-                        if add_sst:
-                            y3[i, add_sst-20:add_sst+20, 0] = 1                 
-                                                              
-        return X.astype('float32'), y1.astype('float32'), y2.astype('float32'), y3.astype('float32')
+            ## labeling 
+            if dataset.attrs['trace_category'] == 'earthquake_local': 
+                for slices, label in zip(labels, _event_labels(self.label_type, spt, sst, self.dim, self.coda_ratio)):
+                    if label:
+                        slices.append((i,)+label)
+                if additions:
+                    for slices, label in zip(added, _event_labels(self.label_type, additions[0], additions[1], self.dim, 
+                                                                  self.coda_ratio, added=True)):
+                        if label:
+                            slices.append((i,)+label)
+
+        for y, event_slices, added_slices in zip([y1, y2, y3], labels, added):
+            _write_labels(y, event_slices + added_slices)
+        return X, y1, y2, y3
 
 
 
@@ -1050,7 +1039,8 @@ def data_reader( list_IDs,
                  add_noise_r=None, 
                  drop_channe_r=None, 
                  scale_amplitude_r=None, 
-                 pre_emphasis=True):   
+                 pre_emphasis=True,
+                 label_dtype='float32'):   
     
     """ 
     
@@ -1059,7 +1049,7 @@ def data_reader( list_IDs,
     Parameters
     ----------
     list_IDsx: str
-        List of trace names.
+        List of trace names, or their integer ids in the metadata index of file_name (see trace_ids).
             
     file_name: str
         Path to the input hdf5 datasets.
@@ -1100,6 +1090,9 @@ def data_reader( list_IDs,
     pre_emphasis: bool, default=False
         If True, waveforms will be pre emphasized. 
 
+    label_dtype: str, default='float32'
+        Type of the labels, e.g. 'float16' to halve their memory.
+
     Returns
     --------        
     Batches of two dictionaries: {'input': X}: pre-processed waveform as input {'detector': y1, 'picker_P': y2, 'picker_S': y3}: outputs including three separate numpy arrays as labels for detection, P, and S respectively.
@@ -1194,19 +1187,6 @@ def data_reader( list_IDs,
           data *= data.shape[-1] / np.count_nonzero(tmp)
         return data
 
-    def _label(a=0, b=20, c=40): 
-        'Used for triangolar labeling'
-        
-        z = np.linspace(a, c, num = 2*(b-a)+1)
-        y = np.zeros(z.shape)
-        y[z <= a] = 0
-        y[z >= c] = 0
-        first_half = np.logical_and(a < z, z <= b)
-        y[first_half] = (z[first_half]-a) / (b-a)
-        second_half = np.logical_and(b < z, z < c)
-        y[second_half] = (c-z[second_half]) / (c-b)
-        return y
-    
     def _add_event(data, addp, adds, coda_end, snr, rate): 
         'Add a scaled version of the event into the empty part of the trace'
         
@@ -1270,44 +1250,43 @@ def data_reader( list_IDs,
             data[:, ch] = np.append(bpf[0], bpf[1:] - pre_emphasis * bpf[:-1])
         return data
                     
+    label_dtype = _check_label_dtype(label_dtype, 'triangle')
+    list_IDs = trace_ids(file_name, list_IDs)
     fl = h5py.File(file_name, 'r')
 
     if augmentation:
-        X = np.zeros((2*len(list_IDs), dim, n_channels))
-        y1 = np.zeros((2*len(list_IDs), dim, 1))
-        y2 = np.zeros((2*len(list_IDs), dim, 1))
-        y3 = np.zeros((2*len(list_IDs), dim, 1))
+        X = np.zeros((2*len(list_IDs), dim, n_channels), dtype=np.float32)
+        y1 = np.zeros((2*len(list_IDs), dim, 1), dtype=label_dtype)
+        y2 = np.zeros((2*len(list_IDs), dim, 1), dtype=label_dtype)
+        y3 = np.zeros((2*len(list_IDs), dim, 1), dtype=label_dtype)
     else:
-        X = np.zeros((len(list_IDs), dim, n_channels))
-        y1 = np.zeros((len(list_IDs), dim, 1))
-        y2 = np.zeros((len(list_IDs), dim, 1))
-        y3 = np.zeros((len(list_IDs), dim, 1))     
+        X = np.zeros((len(list_IDs), dim, n_channels), dtype=np.float32)
+        y1 = np.zeros((len(list_IDs), dim, 1), dtype=label_dtype)
+        y2 = np.zeros((len(list_IDs), dim, 1), dtype=label_dtype)
+        y3 = np.zeros((len(list_IDs), dim, 1), dtype=label_dtype)     
 
     # Generate data
+    # label slices of the events, and of the added events written over them
+    labels, added = [[], [], []], [[], [], []]
     pbar = tqdm(total=len(list_IDs)) 
-    for i, ID in enumerate(list_IDs):
+    for i, (data, meta) in enumerate(iter_traces(fl, list_IDs)):
         pbar.update()
 
         additions = None
-        dataset = fl.get('data/'+str(ID))
-        
-        if ID.split('_')[-1] == 'EV':            
-            data = np.array(dataset)                    
-            spt = int(dataset.attrs['p_arrival_sample']);
-            sst = int(dataset.attrs['s_arrival_sample']);
-            coda_end = int(dataset.attrs['coda_end_sample']);
-            snr = dataset.attrs['snr_db'];
-                    
-        elif ID.split('_')[-1] == 'NO':
-            data = np.array(dataset)
+        
+        if meta['event']:            
+            spt = int(meta['p_arrival_sample']);
+            sst = int(meta['s_arrival_sample']);
+            coda_end = int(meta['coda_end_sample']);
+            snr = meta['snr_db'];
            
         if augmentation:                 
-            if dataset.attrs['trace_category'] == 'earthquake_local':                   
+            if meta['earthquake']:                   
                 data, spt, sst, coda_end = _shift_event(data, spt, sst, coda_end, snr, shift_event_r/2); 
             if norm_mode: 
                 data1 = _normalize(data, norm_mode)   
                           
-            if dataset.attrs['trace_category'] == 'earthquake_local':
+            if meta['earthquake']:
                 if shift_event_r and spt:
                     data, spt, sst, coda_end = _shift_event(data, spt, sst, coda_end, snr, shift_event_r);  
                           
@@ -1331,7 +1310,7 @@ def data_reader( list_IDs,
                     data2 = _normalize(data, norm_mode); 
                      
                             
-            if dataset.attrs['trace_category'] == 'noise':
+            if meta['noise']:
                 if drop_channe_r:    
                     data = _drop_channel_noise(data, drop_channe_r);
                 if add_gap_r:    
@@ -1342,67 +1321,27 @@ def data_reader( list_IDs,
             X[i, :, :] = data1 
             X[len(list_IDs)+i, :, :] = data2                                      
 
-            if dataset.attrs['trace_category'] == 'earthquake_local': 
-
-                if spt and (spt-20 >= 0) and (spt+21 < dim):
-                    y2[i, spt-20:spt+21, 0] = _label()
-                    y2[len(list_IDs)+i, spt-20:spt+21, 0] = _label()                   
-                elif spt and (spt+21 < dim):
-                    y2[i, 0:spt+spt+1, 0] = _label(a=0, b=spt, c=2*spt)
-                    y2[len(list_IDs)+i, 0:spt+spt+1, 0] = _label(a=0, b=spt, c=2*spt)                   
-                elif spt and (spt-20 >= 0):
-                    pdif = dim - spt
-                    y2[i, spt-pdif-1:dim, 0] = _label(a=spt-pdif, b=spt, c=2*pdif)
-                    y2[len(list_IDs)+i, spt-pdif-1:dim, 0] = _label(a=spt-pdif, b=spt, c=2*pdif)
-         
-                if sst and (sst-20 >= 0) and (sst+21 < dim):
-                    y3[i, sst-20:sst+21, 0] = _label()
-                    y3[len(list_IDs)+i, sst-20:sst+21, 0] = _label()                   
-                elif sst and (sst+21 < dim):
-                    y3[i, 0:sst+sst+1, 0] = _label(a=0, b=sst, c=2*sst)
-                    y3[len(list_IDs)+i, 0:sst+sst+1, 0] = _label(a=0, b=sst, c=2*sst)
-                elif sst and (sst-20 >= 0):
-                    sdif = dim - sst
-                    y3[i, sst-sdif-1:dim, 0] = _label(a=sst-sdif, b=sst, c=2*sdif)    
-                    y3[len(list_IDs)+i, sst-sdif-1:dim, 0] = _label(a=sst-sdif, b=sst, c=2*sdif)    
-                     
-                sd = sst - spt      
-                if sst+int(coda_ratio*sd) <= dim: 
-                    y1[i, spt:int(sst+(coda_ratio*sd)), 0] = 1  
-                    y1[len(list_IDs)+i, spt:int(sst+(coda_ratio*sd)), 0] = 1                              
-                else:
-                    y1[i, spt:dim, 0] = 1
-                    y1[len(list_IDs)+i, spt:dim, 0] = 1  
+            if meta['earthquake']: 
+                event = [_detection_label(spt, sst, dim, coda_ratio)+(None,), _pick_label('triangle', spt, dim), _pick_label('triangle', sst, dim)]
+                for slices, label in zip(labels, event):
+                    if label:
+                        slices.append((i,)+label)
+                        slices.append((len(list_IDs)+i,)+label)
                     
                 if additions: 
                     add_spt = additions[0];
                     print(add_spt)
                     add_sst = additions[1];
-                    add_sd = add_sst - add_spt 
-                    
-                    if add_spt and (add_spt-20 >= 0) and (add_spt+21 < dim):
-                        y2[len(list_IDs)+i, add_spt-20:add_spt+21, 0] = _label()  
-                    elif add_spt and (add_spt+21 < dim):
-                        y2[len(list_IDs)+i, 0:add_spt+add_spt+1, 0] = _label(a=0, b=add_spt, c=2*add_spt)
-                    elif add_spt and (add_spt-20 >= 0):
-                        pdif = dim - add_spt
-                        y2[len(list_IDs)+i, add_spt-pdif-1:dim, 0] = _label(a=add_spt-pdif, b=add_spt, c=2*pdif) 
-                        
-                    if add_sst and (add_sst-20 >= 0) and (add_sst+21 < dim):
-                        y3[len(list_IDs)+i, add_sst-20:add_sst+21, 0] = _label()
-                    elif add_sst and (add_sst+21 < dim):
-                        y3[len(list_IDs)+i, 0:add_sst+add_sst+1, 0] = _label(a=0, b=add_sst, c=2*add_sst)
-                    elif add_sst and (add_sst-20 >= 0):
-                        sdif = dim - add_sst
-                        y3[len(list_IDs)+i, add_sst-sdif-1:dim, 0] = _label(a=add_sst-sdif, b=add_sst, c=2*sdif) 
-    
-                    if add_sst+int(coda_ratio*add_sd) <= dim: 
-                        y1[len(list_IDs)+i, add_spt:int(add_sst+(coda_ratio*add_sd)), 0] = 1        
-                    else:
-                        y1[len(list_IDs)+i, add_spt:dim, 0] = 1
-
+                    event = [_detection_label(add_spt, add_sst, dim, coda_ratio)+(None,), 
+                             _pick_label('triangle', add_spt, dim), _pick_label('triangle', add_sst, dim)]
+                    for slices, label in zip(added, event):
+                        if label:
+                            slices.append((len(list_IDs)+i,)+label)
+
+    for y, event_slices, added_slices in zip([y1, y2, y3], labels, added):
+        _write_labels(y, event_slices + added_slices)
     fl.close()                           
-    return X.astype('float32'), y1.astype('float32'), y2.astype('float32'), y3.astype('float32')
+    return X, y1, y2, y3
 
 
 
@@ -1456,6 +1395,7 @@ class PreLoadGeneratorTest(keras.utils.Sequence):
         self.n_channels = n_channels
         self.on_epoch_end()
         self.norm_mode = norm_mode
+        self._buffers = _BatchBuffers()
         
     def __len__(self):
         'Denotes the number of batches per epoch'
@@ -1492,7 +1432,7 @@ class PreLoadGeneratorTest(keras.utils.Sequence):
                        
     def __data_generation(self, list_IDs_temp):
         'readint the waveforms' 
-        X = np.zeros((self.batch_size, self.dim, self.n_channels))           
+        X, = self._buffers.get((self.batch_size, self.dim, self.n_channels))
         # Generate data
         for i, ID in enumerate(list_IDs_temp):            
             dataset = self.inp_data[ID]
@@ -1513,7 +1453,7 @@ class DataGeneratorTest(keras.utils.Sequence):
     Parameters
     ----------
     list_IDsx: str
-        List of trace names.
+        List of trace names, or their integer ids in the metadata index of file_name (see trace_ids).
             
     file_name: str
         Path to the input hdf5 file.
@@ -1547,11 +1487,12 @@ class DataGeneratorTest(keras.utils.Sequence):
         'Initialization'
         self.dim = dim
         self.batch_size = batch_size
-        self.list_IDs = list_IDs
+        self.list_IDs = trace_ids(file_name, list_IDs)
         self.file_name = file_name        
         self.n_channels = n_channels
         self.on_epoch_end()
         self.norm_mode = norm_mode
+        self._buffers = _BatchBuffers()
 
     def __len__(self):
         'Denotes the number of batches per epoch'
@@ -1590,25 +1531,15 @@ class DataGeneratorTest(keras.utils.Sequence):
     def __data_generation(self, list_IDs_temp):
         'readint the waveforms' 
         
-        X = np.zeros((self.batch_size, self.dim, self.n_channels))
-        fl = h5py.File(self.file_name, 'r')
+        X, = self._buffers.get((self.batch_size, self.dim, self.n_channels))
+        fl = cached_hdf5(self.file_name)
 
         # Generate data
-        for i, ID in enumerate(list_IDs_temp):
-            if ID.split('_')[-1] == 'EV':
-                dataset = fl.get('data/'+str(ID))
-                data = np.array(dataset)              
-                    
-            elif ID.split('_')[-1] == 'NO':
-                dataset = fl.get('data/'+str(ID))
-                data = np.array(dataset)
-          
+        for i, (data, _) in enumerate(iter_traces(fl, list_IDs_temp)):
             if self.norm_mode:                    
                 data = self.normalize(data, self.norm_mode)  
                             
             X[i, :, :] = data                                       
-
-        fl.close() 
                            
         return X
 
@@ -1639,6 +1570,10 @@ class DataGeneratorPrediction(keras.utils.Sequence):
     norm_mode: str, default=max
         The mode of normalization, 'max' or 'std'.
 
+    windows: dic, default=None
+        The window_index of the csv file, if the hdf5 file contains continuous traces (storage='continuous' in 
+        preprocessor) instead of the slices.
+
         
     Returns
     --------        
@@ -1653,7 +1588,8 @@ class DataGeneratorPrediction(keras.utils.Sequence):
                  dim, 
                  batch_size=32, 
                  n_channels=3, 
-                 norm_mode = 'max'):
+                 norm_mode = 'max',
+                 windows=None):
        
         'Initialization'
         self.dim = dim
@@ -1663,6 +1599,8 @@ class DataGeneratorPrediction(keras.utils.Sequence):
         self.n_channels = n_channels
         self.on_epoch_end()
         self.norm_mode = norm_mode
+        self.windows = windows
+        self._buffers = _BatchBuffers()
 
     def __len__(self):
         'Denotes the number of batches per epoch'
@@ -1699,20 +1637,18 @@ class DataGeneratorPrediction(keras.utils.Sequence):
  
     def __data_generation(self, list_IDs_temp):
         'read the waveforms'         
-        X = np.zeros((self.batch_size, self.dim, self.n_channels))
-        fl = h5py.File(self.file_name, 'r')
+        X, = self._buffers.get((self.batch_size, self.dim, self.n_channels))
+        fl = cached_hdf5(self.file_name)
 
         # Generate data
         for i, ID in enumerate(list_IDs_temp):
-            dataset = fl.get('data/'+str(ID))
+            dataset = get_window(fl, ID, self.windows)
             data = np.array(dataset)                
          
             if self.norm_mode:                    
                 data = self.normalize(data, self.norm_mode)  
                             
             X[i, :, :] = data                                       
-
-        fl.close() 
                            
         return X
 
@@ -2158,7 +2094,594 @@ def normalize(data, mode='std'):
     
     
 
+def set_inference_precision(precision=None):
+    
+    """ 
+    
+    Sets the numerical precision used by TensorFlow for the following model loads and predictions.
+    
+    Parameters
+    ----------
+    precision : {str, None}, default=None
+        None or 'float32' for the default full precision. 'bfloat16' enables the oneDNN auto-mixed precision 
+        graph rewrite, which runs convolutions, LSTMs, and matrix products in bfloat16 on CPUs that support it 
+        (e.g. AVX512_BF16 or AMX). 
+        
+    Notes
+    -----
+    This is a process-wide setting and it is only applied to models loaded after the call. 
+    int8 and float16 models are made by the quantizer and are recognized from their '.tflite' extension.
+        
+    """  
+    
+    if precision == 'bfloat16':
+        tf.config.optimizer.set_experimental_options({'auto_mixed_precision_mkl': True})
+    elif precision in [None, 'float32']:
+        tf.config.optimizer.set_experimental_options({'auto_mixed_precision_mkl': False})
+    else:
+        raise ValueError("precision should be None, 'float32', or 'bfloat16'. Got: "+str(precision))
+
+
+
+def set_inference_threads(intra_op_threads=None, inter_op_threads=None):
+    
+    """ 
+    
+    Sets the number of threads TensorFlow uses inside (intra-op) and across (inter-op) operations.
+    
+    Parameters
+    ----------
+    intra_op_threads : {int, None}, default=None
+        Number of threads of a single operation. None keeps the current setting.
+        
+    inter_op_threads : {int, None}, default=None
+        Number of operations run in parallel. None keeps the current setting.
+        
+    Notes
+    -----
+    TensorFlow only accepts this before it is initialized, i.e. before the first model is loaded in the process. 
+    Later calls print a message and leave the threads unchanged.
+        
+    """  
+    
+    try:
+        if intra_op_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(int(intra_op_threads))
+        if inter_op_threads:
+            tf.config.threading.set_inter_op_parallelism_threads(int(inter_op_threads))
+    except RuntimeError:
+        print('TensorFlow is already initialized, the thread settings are not changed.', flush=True)
+
+
+
+def load_inference_model(input_model, loss_types, loss_weights, precision=None):
+    
+    """ 
+    
+    Loads a trained model for prediction.
+    
+    Parameters
+    ----------
+    input_model : str
+        Path to a trained Keras model (.h5), to a reduced-precision model (.tflite) made by the quantizer, or the address 
+        of a running inference server ('http://127.0.0.1:8765' or 'unix:///path/to/socket').
+        
+    loss_types : list
+        Loss types for detection, P picking, and S picking respectively.
+        
+    loss_weights : list
+        Loss weights for detection, P picking, and S picking respectively.
+        
+    precision : {str, None}, default=None
+        None, 'float32', or 'bfloat16'. See set_inference_precision. Ignored for .tflite models.
+        
+    Returns
+    -------  
+    model : obj
+        Compiled Keras model, or a TFLiteModel or InferenceClient with the same predict interface. 
+        
+    """  
+    
+    if str(input_model).startswith(('http://', 'unix://')):
+        from .inference_server import InferenceClient
+        return InferenceClient(input_model)
+    if str(input_model).lower().endswith('.tflite'):
+        return TFLiteModel(input_model)
+    
+    set_inference_precision(precision)
+    model = load_model(input_model, 
+                       custom_objects={'SeqSelfAttention': SeqSelfAttention, 
+                                       'FeedForward': FeedForward,
+                                       'LayerNormalization': LayerNormalization, 
+                                       'NormalizationLayer': NormalizationLayer,
+                                       'f1': f1                                                                            
+                                        })
+    model.compile(loss = loss_types,
+                  loss_weights = loss_weights,           
+                  optimizer = Adam(lr = 0.001),
+                  metrics = [f1])
+    return model
+
+
+
+class TFLiteModel():
+    
+    """ 
+    
+    Runs a TensorFlow Lite model made by the quantizer through the same predict interface as the Keras model. 
+    
+    Parameters
+    ----------
+    model_path : str
+        Path to the .tflite model.
+        
+    number_of_threads : {int, None}, default=None
+        Number of threads used by the interpreter. None uses the TensorFlow Lite default.
+        
+    Returns
+    -------  
+    Lists of three numpy arrays: detection, P, and S probabilities, each with the shape of (batch, 6000, 1).
+        
+    """  
+    
+    def __init__(self, model_path, number_of_threads=None):
+        self.model_path = model_path
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=number_of_threads)
+        self.runner = self.interpreter.get_signature_runner()
+        
+    def predict(self, X, batch_size=None, **kwargs):
+        'Predicts the probabilities for an array of waveforms'
+        
+        outputs = self.runner(input=np.asarray(X, dtype=np.float32))
+        return [outputs['detector'], outputs['picker_P'], outputs['picker_S']]
+    
+    def predict_generator(self, generator, **kwargs):
+        'Predicts the probabilities for all of the batches of a keras generator'
+        
+        predD, predP, predS = [], [], []
+        for bn in range(len(generator)):
+            batch = generator[bn]
+            if isinstance(batch, tuple):
+                batch = batch[0]
+            yh1, yh2, yh3 = self.predict(batch['input'])
+            predD.append(yh1)
+            predP.append(yh2)
+            predS.append(yh3)
+        return [np.concatenate(predD), np.concatenate(predP), np.concatenate(predS)]
+    
+    
+
+class XLAModel():
+    
+    """ 
+    
+    Runs a Keras model through a single XLA-compiled function (jit_compile), which fuses the many small convolution, 
+    normalization, upsampling, and element-wise operations of the decoders. 
+    
+    Parameters
+    ----------
+    model : obj
+        A loaded Keras model.
+        
+    batch_size : int
+        Every call is padded to this many windows so the function is compiled once, during the warm-up in the 
+        constructor, and reused for all of the following batches.
+        
+    Notes
+    -----
+    Whether the fused graph is faster depends on the hardware and on the TensorFlow version; the LSTM loops can 
+    also run slower under XLA on CPUs. benchmarks/xla.py compares the two paths on the current machine.
+        
+    Returns
+    -------  
+    Lists of three numpy arrays: detection, P, and S probabilities, each with the shape of (batch, 6000, 1).
+        
+    """  
+    
+    def __init__(self, model, batch_size):
+        if not isinstance(model, Model):
+            raise ValueError('jit_compile needs a Keras (.h5) model. Got: '+str(type(model)))
+        self.model = model
+        self.batch_size = int(batch_size)
+        self.input_shape = model.input_shape
+        spec = tf.TensorSpec((self.batch_size,)+tuple(model.input_shape[1:]), tf.float32)
+        self._call = tf.function(model, jit_compile=True, input_signature=[spec])
+        start = time.time()
+        self._call(tf.zeros(spec.shape))
+        self.compile_time = time.time() - start
+        
+    def predict(self, X, batch_size=None, **kwargs):
+        'Predicts the probabilities for an array of waveforms'
+        
+        X = np.asarray(X, dtype=np.float32)
+        outputs = [[], [], []]
+        for i in range(0, len(X), self.batch_size):
+            batch = X[i:i+self.batch_size]
+            n = len(batch)
+            if n < self.batch_size:
+                batch = np.concatenate([batch, np.zeros((self.batch_size-n,)+batch.shape[1:], dtype=np.float32)])
+            for k, out in enumerate(self._call(batch)):
+                outputs[k].append(out.numpy()[:n])
+        return [np.concatenate(out) for out in outputs]
+    
+    def predict_generator(self, generator, **kwargs):
+        'Predicts the probabilities for all of the batches of a keras generator'
+        
+        predD, predP, predS = [], [], []
+        for bn in range(len(generator)):
+            batch = generator[bn]
+            if isinstance(batch, tuple):
+                batch = batch[0]
+            yh1, yh2, yh3 = self.predict(batch['input'])
+            predD.append(yh1)
+            predP.append(yh2)
+            predS.append(yh3)
+        return [np.concatenate(predD), np.concatenate(predP), np.concatenate(predS)]
+    
+    
+    
+class ModelEnsemble():
+    
+    """ 
+    
+    Runs several models on the same batches. Each batch is read and normalized once and predicted by all of the models. 
+    
+    Parameters
+    ----------
+    models : list
+        Loaded models, TFLiteModels, ReplicaPools, or InferenceClients.
+        
+    ensemble : {'mean', 'max', None}, default='mean'
+        How the probabilities of the models are combined. With None the outputs of the models are returned side by side 
+        along the last axis, i.e. column m of each output belongs to the m-th model.
+        
+    """    
+    
+    def __init__(self, models, ensemble='mean'):
+        if ensemble not in ['mean', 'max', None]:
+            raise ValueError("ensemble should be 'mean', 'max', or None. Got: "+str(ensemble))
+        self.models = models
+        self.ensemble = ensemble
+        self.input_shape = getattr(models[0], 'input_shape', None)
+        
+    def predict(self, X, batch_size=None, **kwargs):
+        'Predicts the probabilities for an array of waveforms with all of the models'
+        
+        outputs = [model.predict(X, batch_size=batch_size, verbose=0) for model in self.models]
+        return self._combine(outputs)
+    
+    def predict_generator(self, generator, **kwargs):
+        'Reads the batches of a keras generator once and predicts them with all of the models'
+        
+        batches = [generator[bn] for bn in range(len(generator))]
+        batches = [b[0] if isinstance(b, tuple) else b for b in batches]
+        X = np.concatenate([b['input'] for b in batches])
+        outputs = [model.predict(X, batch_size=len(batches[0]['input']), verbose=0) for model in self.models]
+        return self._combine(outputs)
+    
+    def _combine(self, outputs):
+        combined = []
+        for k in range(3):
+            out = [np.asarray(o[k]) for o in outputs]
+            if self.ensemble == 'mean':
+                combined.append(np.mean(out, axis=0))
+            elif self.ensemble == 'max':
+                combined.append(np.max(out, axis=0))
+            else:
+                combined.append(np.concatenate(out, axis=-1))
+        return combined
+    
+    def close(self):
+        for model in self.models:
+            if hasattr(model, 'close'):
+                model.close()
+
+
+
+def long_input_model(model, n_windows):
+    
+    """ 
+    
+    Builds the weights of a trained model into a graph that accepts n_windows x 6000-sample inputs.
+    
+    Parameters
+    ----------
+    model: obj
+        A loaded Keras model trained on 6000-sample windows. 
+        
+    n_windows: int
+        Number of 60 s windows in one input segment.
+        
+    Returns
+    -------  
+    long_model: obj
+        The same network with the input and decoder cropping resized for n_windows*6000 samples. 
+            
+    """ 
+    
+    if not hasattr(model, 'get_config'):
+        raise ValueError('long-input inference needs a Keras model, not a '+type(model).__name__+'.')
+    
+    input_length = int(n_windows)*6000
+    cropping = _decoder_cropping(input_length)
+    config = model.get_config()
+    for layer in config['layers']:
+        layer.pop('build_config', None)
+        if layer['class_name'] == 'InputLayer':
+            shape = list(layer['config']['batch_input_shape'])
+            layer['config']['batch_input_shape'] = tuple([shape[0], input_length] + shape[2:])
+        elif layer['class_name'] == 'Cropping1D':
+            layer['config']['cropping'] = cropping
+            
+    long_model = Model.from_config(config, custom_objects={'SeqSelfAttention': SeqSelfAttention, 
+                                                          'FeedForward': FeedForward,
+                                                          'LayerNormalization': LayerNormalization,
+                                                          'NormalizationLayer': NormalizationLayer})
+    long_model.set_weights(model.get_weights())
+    return long_model
+
+
+
+def normalized_model(model, norm_mode='std', pre_emphasis=None):
+    
+    """ 
+    
+    Prepends a NormalizationLayer to a trained model, so it can be fed raw waveforms.
+    
+    Parameters
+    ----------
+    model: obj
+        A loaded Keras model. 
+        
+    norm_mode: str, default='std'
+        Mode of normalization of the NormalizationLayer. 'max', 'std', or None.
+        
+    pre_emphasis: float, default=None
+        Pre-emphasis coefficient of the NormalizationLayer.
+        
+    Returns
+    -------  
+    normalized_model: obj
+        The same network, with the same layer and output names and weights, whose input is first normalized in 
+        the graph. A model that already has a NormalizationLayer is returned as it is. 
+            
+    """ 
+    
+    if not hasattr(model, 'get_config'):
+        raise ValueError('in-graph normalization needs a Keras model, not a '+type(model).__name__+'.')
+    
+    config = model.get_config()
+    if any([layer['class_name'] == 'NormalizationLayer' for layer in config['layers']]):
+        return model
+    input_name = config['input_layers'][0][0]
+    for layer in config['layers']:
+        layer.pop('build_config', None)
+        for node in layer['inbound_nodes']:
+            for inbound in node:
+                if inbound[0] == input_name:
+                    inbound[0] = 'normalization'
+    position = [layer['name'] for layer in config['layers']].index(input_name) + 1
+    config['layers'].insert(position, {'class_name': 'NormalizationLayer',
+                                       'config': {'name': 'normalization', 'trainable': False, 
+                                                  'norm_mode': norm_mode, 'pre_emphasis': pre_emphasis},
+                                       'name': 'normalization',
+                                       'inbound_nodes': [[[input_name, 0, 0, {}]]]})
+            
+    norm_model = Model.from_config(config, custom_objects={'SeqSelfAttention': SeqSelfAttention, 
+                                                          'FeedForward': FeedForward,
+                                                          'LayerNormalization': LayerNormalization,
+                                                          'NormalizationLayer': NormalizationLayer})
+    norm_model.set_weights(model.get_weights())
+    return norm_model
+
+
+
+def prune_filters(model, prune_ratio):
+    
+    """ 
+    
+    Removes the filters with the smallest L1 norms from the convolutional layers of a trained model (structured pruning). 
+    Only layers whose outputs go, through pooling, upsampling, or cropping, into other convolutional layers are pruned, 
+    so the residual, LSTM, and attention blocks keep their widths.
+    
+    Parameters
+    ----------
+    model: obj
+        A trained Keras model. 
+        
+    prune_ratio: float
+        Fraction of the filters removed from each prunable layer.
+        
+    Returns
+    -------  
+    pruned_model: obj
+        The uncompiled smaller model holding the remaining weights. 
+            
+    """ 
+    
+    if not 0 < prune_ratio < 1:
+        raise ValueError('prune_ratio should be between 0 and 1.')
+    
+    passthrough = ('MaxPooling1D', 'UpSampling1D', 'Cropping1D')
+    config = model.get_config()
+    layers = {layer['name']: layer for layer in config['layers']}
+    consumers = {name: [] for name in layers}
+    sources = {}
+    for layer in config['layers']:
+        for node in layer['inbound_nodes']:
+            for inbound in node:
+                consumers[inbound[0]].append(layer['name'])
+                sources[layer['name']] = inbound[0]
+                
+    def _follow(name, links):
+        ' skips the layers that do not change the channels. '
+        ends = []
+        for nxt in links(name):
+            if layers[nxt]['class_name'] in passthrough:
+                ends += _follow(nxt, links)
+            else:
+                ends.append(nxt)
+        return ends
+    
+    outputs = [out[0] for out in config['output_layers']]
+    kept = {}
+    for layer in model.layers:
+        if layer.__class__.__name__ != 'Conv1D' or layer.name in outputs:
+            continue
+        ends = _follow(layer.name, lambda n: consumers[n])
+        if ends and all(layers[e]['class_name'] == 'Conv1D' for e in ends):
+            n_keep = max(1, int(round(layer.filters * (1 - prune_ratio))))
+            norms = np.abs(layer.get_weights()[0]).sum(axis=(0, 1))
+            kept[layer.name] = np.sort(np.argsort(norms)[-n_keep:])
+            layers[layer.name]['config']['filters'] = n_keep
+
+    for layer in config['layers']:
+        layer.pop('build_config', None)
+    pruned_model = Model.from_config(config, custom_objects={'SeqSelfAttention': SeqSelfAttention, 
+                                                            'FeedForward': FeedForward,
+                                                            'LayerNormalization': LayerNormalization,
+                                                            'NormalizationLayer': NormalizationLayer})
+    for layer in model.layers:
+        weights = layer.get_weights()
+        if layer.__class__.__name__ == 'Conv1D' and weights:
+            src = _follow(layer.name, lambda n: [sources[n]] if n in sources else [])
+            if src and src[0] in kept:
+                weights[0] = weights[0][:, kept[src[0]], :]
+            if layer.name in kept:
+                weights[0] = weights[0][:, :, kept[layer.name]]
+                weights[1] = weights[1][kept[layer.name]]
+        pruned_model.get_layer(layer.name).set_weights(weights)
+    return pruned_model
+
+
+
+def long_input_predict(model, data, norm_mode='std', margin=500, batch_size=1):
+    
+    """ 
+    
+    Predicts probabilities for a continuous 3-component trace with a long-input model. The trace is cut into 
+    segments of the model input length overlapping by 2*margin samples, each segment is normalized on its own, 
+    and the outputs are stitched at the middle of each overlap so every sample comes from a single segment.
+    
+    Parameters
+    ----------
+    model: obj
+        A model built by long_input_model, or a ReplicaPool or ModelEnsemble running such models. 
+        
+    data: 2D numpy array
+        Continuous (npts, 3) preprocessed trace sampled at 100 Hz.
+        
+    norm_mode: str, default='std'
+        Mode of normalization applied per segment. 'max' or 'std'.
+        
+    margin: int, default=500
+        Number of samples discarded at each inner segment border.
+
+    batch_size: int, default=1
+        Number of segments in each predicted batch.
+        
+    Returns
+    -------  
+    yh1: numpy array
+        Detection probabilities, (npts,) or (npts, number of models) for a ModelEnsemble without combination.
+
+    yh2: numpy array
+        P arrival probabilities.
+
+    yh3: numpy array
+        S arrival probabilities.
+            
+    """ 
+    
+    npts = data.shape[0]
+    seg_len = int(model.input_shape[1])
+    step = seg_len - 2*margin
+    if step <= 0:
+        raise ValueError('margin='+str(margin)+' leaves no samples in a '+str(seg_len)+'-sample segment.')
+        
+    if npts <= seg_len:
+        starts = [0]
+    else:
+        starts = list(range(0, npts - seg_len, step)) + [npts - seg_len]
+    borders = [0] + [(starts[k] + seg_len + starts[k+1]) // 2 for k in range(len(starts)-1)] + [npts]  
+     
+    X = np.zeros((len(starts), seg_len, data.shape[1]), dtype=np.float32)
+    for k, st in enumerate(starts):
+        seg = data[st:st+seg_len].astype(np.float32)
+        X[k, :seg.shape[0]] = normalize(seg, norm_mode)
+    predD, predP, predS = model.predict(X, batch_size=batch_size, verbose=0)
+    
+    yh1 = np.zeros((npts, predD.shape[-1]), dtype=np.float32)
+    yh2 = np.zeros((npts, predP.shape[-1]), dtype=np.float32)
+    yh3 = np.zeros((npts, predS.shape[-1]), dtype=np.float32)
+    for k, st in enumerate(starts):
+        yh1[borders[k]:borders[k+1]] = predD[k, borders[k]-st:borders[k+1]-st]
+        yh2[borders[k]:borders[k+1]] = predP[k, borders[k]-st:borders[k+1]-st]
+        yh3[borders[k]:borders[k+1]] = predS[k, borders[k]-st:borders[k+1]-st]
+    if yh1.shape[1] == 1:
+        return yh1[:, 0], yh2[:, 0], yh3[:, 0]
+    return yh1, yh2, yh3
+    
+    
+    
   
+class NormalizationLayer(keras.layers.Layer):
+    
+    """ 
+    
+    Normalizes a batch of waveforms inside the model, as the data generators do for each window with norm_mode: 
+    each channel is demeaned over time and divided by its maximum ('max') or standard deviation ('std'), where 
+    zeros are replaced with 1. 
+    
+    Parameters
+    ----------
+    norm_mode: str, default='std'
+        Mode of normalization. 'max', 'std', or None to only demean. 
+        
+    pre_emphasis: float, default=None
+        If set, the pre-emphasis filter y[t] = x[t] - pre_emphasis*x[t-1] is applied to each channel before the 
+        normalization. 
+                    
+    Returns
+    -------  
+    data: 3D tensor
+        with shape: (batch_size, samples, channels) 
+            
+    """   
+              
+    def __init__(self, norm_mode='std', pre_emphasis=None, **kwargs):
+        super(NormalizationLayer, self).__init__(**kwargs)
+        if norm_mode not in ['max', 'std', None]:
+            raise ValueError("norm_mode should be 'max', 'std', or None. Got: "+str(norm_mode))
+        self.norm_mode = norm_mode
+        self.pre_emphasis = pre_emphasis
+
+    def get_config(self):
+        config = {
+            'norm_mode': self.norm_mode,
+            'pre_emphasis': self.pre_emphasis,
+        }
+        base_config = super(NormalizationLayer, self).get_config()
+        return dict(list(base_config.items()) + list(config.items()))
+
+    def compute_output_shape(self, input_shape):
+        return input_shape
+
+    def call(self, inputs):
+        data = inputs
+        if self.pre_emphasis:
+            data = tf.concat([data[:, :1], data[:, 1:] - self.pre_emphasis * data[:, :-1]], axis=1)
+        data = data - tf.reduce_mean(data, axis=1, keepdims=True)
+        if self.norm_mode == 'max':
+            scale = tf.reduce_max(data, axis=1, keepdims=True)
+        elif self.norm_mode == 'std':
+            scale = tf.math.reduce_std(data, axis=1, keepdims=True)
+        else:
+            return data
+        return data / tf.where(tf.equal(scale, 0), tf.ones_like(scale), scale)
+
+    
+    
 class LayerNormalization(keras.layers.Layer):
     
     """ 
@@ -2655,13 +3178,23 @@ def _encoder(filter_number, filter_size, depth, drop_rate, ker_regul, bias_regul
     return(e) 
 
 
-def _decoder(filter_number, filter_size, depth, drop_rate, ker_regul, bias_regul, activation, padding, inpC):
+def _decoder_cropping(input_length, depth=7):
+    ' Returns the cropping applied after the 4th upsampling of the decoder so its output matches an input of input_length samples. '
+    lengths = [input_length]
+    for _ in range(depth):
+        lengths.append(int(np.ceil(lengths[-1] / 2)))
+    crop = lengths[-1] * 2**4 - lengths[depth - 4]
+    return (crop // 2, crop - crop // 2)
+
+
+
+def _decoder(filter_number, filter_size, depth, drop_rate, ker_regul, bias_regul, activation, padding, inpC, cropping=(1, 1)):
     ' Returns the dencoder that is a combination of residual blocks and upsampling. '           
     d = inpC
     for dp in range(depth):        
         d = UpSampling1D(2)(d) 
         if dp == 3:
-            d = Cropping1D(cropping=(1, 1))(d)           
+            d = Cropping1D(cropping=cropping)(d)           
         d = Conv1D(filter_number[dp], 
                    filter_size[dp], 
                    padding = padding, 
@@ -2736,6 +3269,10 @@ class cred2():
 
     bias_regularizer: str
         l1 norm regularizer.
+
+    norm_mode: str, default=None
+        If set ('max' or 'std'), the input is normalized inside the model by a NormalizationLayer, and the data 
+        generators can feed it raw waveforms.
            
     Returns
     ----------
@@ -2757,6 +3294,7 @@ class cred2():
                  loss_types=['binary_crossentropy', 'binary_crossentropy', 'binary_crossentropy'],                                 
                  kernel_regularizer=keras.regularizers.l1(1e-4),
                  bias_regularizer=keras.regularizers.l1(1e-4),
+                 norm_mode=None,
                  ):
         
         self.kernel_size = kernel_size
@@ -2772,11 +3310,15 @@ class cred2():
         self.loss_types = loss_types       
         self.kernel_regularizer = kernel_regularizer     
         self.bias_regularizer = bias_regularizer 
+        self.norm_mode = norm_mode
 
         
     def __call__(self, inp):
 
         x = inp
+        if self.norm_mode:
+            x = NormalizationLayer(self.norm_mode, name='normalization')(x)
+        cropping = _decoder_cropping(int(inp.shape[1]), self.endcoder_depth)
         x = _encoder(self.nb_filters, 
                     self.kernel_size, 
                     self.endcoder_depth, 
@@ -2807,7 +3349,7 @@ class cred2():
                              self.bias_regularizer,
                              self.activationf, 
                              self.padding,                             
-                             encoded)
+                             encoded, cropping)
         d = Conv1D(1, 11, padding = self.padding, activation='sigmoid', name='detector')(decoder_D)
 
 
@@ -2824,7 +3366,7 @@ class cred2():
                             self.bias_regularizer,
                             self.activationf, 
                             self.padding,                            
-                            norm_layerP)
+                            norm_layerP, cropping)
         P = Conv1D(1, 11, padding = self.padding, activation='sigmoid', name='picker_P')(decoder_P)
         
         SLSTM = LSTM(self.nb_filters[1], return_sequences=True, dropout=self.drop_rate, recurrent_dropout=self.drop_rate)(encoded) 
@@ -2841,7 +3383,7 @@ class cred2():
                             self.bias_regularizer,
                             self.activationf, 
                             self.padding,                            
-                            norm_layerS) 
+                            norm_layerS, cropping)
         
         S = Conv1D(1, 11, padding = self.padding, activation='sigmoid', name='picker_S')(decoder_S)
         
@@ -3,7 +3,10 @@ name='core'
 
 from .EqT_utils import *
 from .trainer import trainer
-from .tester import tester
+from .tester import tester, compare_models
 from .predictor import predictor
 from .mseed_predictor import mseed_predictor
+from .quantizer import quantizer
+from .inference_server import inference_server, InferenceClient
+from .autotune import autotune
 
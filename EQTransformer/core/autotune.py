@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 09:12:44 2026
+
+last update: 10/20/2026
+
+"""
+
+from __future__ import print_function
+from __future__ import division
+import os
+import json
+import time
+import queue
+import shutil
+import argparse
+import platform
+import tempfile
+import datetime
+import traceback
+import multiprocessing as mp
+import numpy as np
+import h5py
+
+DEFAULT_PROFILE = os.path.join(os.path.expanduser('~'), '.eqtransformer', 'autotune.json')
+
+
+def autotune(input_model=None,
+             output_profile=None,
+             batch_sizes=[50, 100, 200, 500],
+             intra_op_threads=None,
+             inter_op_threads=[1, 2],
+             number_of_cpus=[1, 2, 4],
+             number_of_windows=1500,
+             loss_weights=[0.03, 0.40, 0.58],
+             loss_types=['binary_crossentropy', 'binary_crossentropy', 'binary_crossentropy'],
+             precision=None,
+             use_multiprocessing=True):
+
+    """
+
+    Benchmarks a trained model over a grid of batch sizes, TensorFlow thread counts and data loader workers
+    using synthetic windows, and writes the fastest setting into a JSON tuning profile.
+
+    Parameters
+    ----------
+    input_model: str
+        Path to a trained model (.h5 or .tflite).
+
+    output_profile: str, default=None
+        Path of the JSON profile. If None it is $EQT_TUNING_PROFILE or ~/.eqtransformer/autotune.json, which
+        predictor, mseed_predictor and tester read by default.
+
+    batch_sizes: list, default=[50, 100, 200, 500]
+        Batch sizes to try.
+
+    intra_op_threads: list, default=None
+        Numbers of threads inside each operation to try. If None, powers of two up to the number of CPUs and the number of CPUs.
+
+    inter_op_threads: list, default=[1, 2]
+        Numbers of operations run in parallel to try.
+
+    number_of_cpus: list, default=[1, 2, 4]
+        Numbers of workers loading and normalizing the batches to try.
+
+    use_multiprocessing: bool, default=True
+        If True the workers are processes, otherwise threads. Use the value predictor is run with; the tuned number_of_cpus is only applied to predictions with the same loader.
+
+    number_of_windows: int, default=1500
+        Number of synthetic windows predicted in each trial. The first batch of each trial is not timed.
+
+    loss_weights: list, default=[0.03, 0.40, 0.58]
+        Loss weights for detection P picking and S picking respectively.
+
+    loss_types: list, default=['binary_crossentropy', 'binary_crossentropy', 'binary_crossentropy']
+        Loss types for detection P picking and S picking respectively.
+
+    precision: str, default=None
+        None, 'float32', or 'bfloat16'. See set_inference_precision.
+
+    Returns
+    --------
+    profile: dict
+        The profile written to output_profile: the model, precision and loader it was tuned for, the machine, the best setting under 'best', and all trials.
+
+    Notes
+    --------
+    The TensorFlow threads can only be set once per process, so each (intra_op_threads, inter_op_threads)
+    pair is measured in a new process.
+
+    """
+
+    if not output_profile:
+        output_profile = os.environ.get('EQT_TUNING_PROFILE', DEFAULT_PROFILE)
+    cpu_count = mp.cpu_count()
+    if not intra_op_threads:
+        intra_op_threads = sorted(set([2**i for i in range(int(np.log2(cpu_count))+1)] + [cpu_count]))
+    batch_sizes = [bs for bs in batch_sizes if 2*bs <= number_of_windows]
+    if not batch_sizes:
+        raise ValueError('number_of_windows should be at least twice the smallest batch size.')
+
+    tmp_dir = tempfile.mkdtemp(prefix='eqt_autotune_')
+    file_name = os.path.join(tmp_dir, 'synthetic.hdf5')
+    list_IDs = _synthetic_hdf5(file_name, number_of_windows)
+
+    trials = []
+    ctx = mp.get_context('spawn')
+    try:
+        for intra in intra_op_threads:
+            for inter in inter_op_threads:
+                print(' *** intra_op_threads: '+str(intra)+', inter_op_threads: '+str(inter), flush=True)
+                result_queue = ctx.Queue()
+                p = ctx.Process(target=_trial_worker,
+                                args=(input_model, loss_types, loss_weights, precision, intra, inter,
+                                      batch_sizes, number_of_cpus, use_multiprocessing, file_name, list_IDs, result_queue))
+                p.start()
+                while True:
+                    try:
+                        status, value = result_queue.get(timeout=5)
+                        break
+                    except queue.Empty:
+                        if not p.is_alive():
+                            raise RuntimeError('autotune trial exited with code '+str(p.exitcode)+'.')
+                p.join()
+                if status == 'error':
+                    raise RuntimeError('autotune trial failed:\n'+value)
+                for trial in value:
+                    print('     batch_size: {:<6} number_of_cpus: {:<4} {:.1f} windows/s'.format(
+                          trial['batch_size'], trial['number_of_cpus'], trial['windows_per_second']), flush=True)
+                trials.extend(value)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    best = max(trials, key=lambda t: t['windows_per_second'])
+    default = [t for t in trials if t['batch_size'] == 500 and t['intra_op_threads'] == cpu_count]
+    profile = {'created': str(datetime.datetime.now()),
+               'input_model': os.path.abspath(input_model),
+               'precision': precision or 'float32',
+               'use_multiprocessing': use_multiprocessing,
+               'machine': {'node': platform.node(),
+                           'processor': platform.processor(),
+                           'cpu_count': cpu_count},
+               'best': best,
+               'speedup_over_default': round(best['windows_per_second'] / max([t['windows_per_second'] for t in default]), 2) if default else None,
+               'trials': trials}
+
+    if os.path.dirname(output_profile):
+        os.makedirs(os.path.dirname(output_profile), exist_ok=True)
+    with open(output_profile, 'w') as f:
+        json.dump(profile, f, indent=2)
+    print(' *** Best: '+str(best), flush=True)
+    print(' *** Wrote the profile into --> " '+str(output_profile)+' "', flush=True)
+    return profile
+
+
+
+def _synthetic_hdf5(file_name, number_of_windows):
+    ' Writes random 3-component windows in the layout of the preprocessed hdf5 files and returns their names. '
+
+    list_IDs = ['synthetic_'+str(i)+'_EV' for i in range(number_of_windows)]
+    rng = np.random.default_rng(0)
+    with h5py.File(file_name, 'w') as f:
+        grp = f.create_group('data')
+        for ID in list_IDs:
+            grp.create_dataset(ID, data=rng.standard_normal((6000, 3), dtype=np.float32))
+    return list_IDs
+
+
+
+def _trial_worker(input_model, loss_types, loss_weights, precision, intra, inter,
+                  batch_sizes, number_of_cpus, use_multiprocessing, file_name, list_IDs, result_queue):
+    ' Measures the prediction speed of all batch sizes and loader workers for one thread setting. '
+
+    try:
+        from .EqT_utils import set_inference_threads, load_inference_model, TFLiteModel, DataGeneratorPrediction
+        from tensorflow.keras.utils import OrderedEnqueuer
+        set_inference_threads(intra, inter)
+        if str(input_model).lower().endswith('.tflite'):
+            model = TFLiteModel(input_model, number_of_threads=intra)
+        else:
+            model = load_inference_model(input_model, loss_types, loss_weights, precision)
+
+        trials = []
+        for bs in batch_sizes:
+            for workers in number_of_cpus:
+                generator = DataGeneratorPrediction(list_IDs, file_name, dim=6000, batch_size=bs, n_channels=3, norm_mode='std')
+                enqueuer = OrderedEnqueuer(generator, use_multiprocessing=use_multiprocessing, shuffle=False)
+                enqueuer.start(workers=workers, max_queue_size=2*workers)
+                batches = enqueuer.get()
+                model.predict(next(batches)['input'], batch_size=bs, verbose=0)
+                start = time.time()
+                for _ in range(len(generator) - 1):
+                    model.predict(next(batches)['input'], batch_size=bs, verbose=0)
+                elapsed = time.time() - start
+                enqueuer.stop()
+                trials.append({'batch_size': bs,
+                               'intra_op_threads': intra,
+                               'inter_op_threads': inter,
+                               'number_of_cpus': workers,
+                               'use_multiprocessing': use_multiprocessing,
+                               'windows_per_second': round((len(generator) - 1)*bs / elapsed, 2)})
+        result_queue.put(('ok', trials))
+    except Exception:
+        result_queue.put(('error', traceback.format_exc()))
+
+
+
+def load_tuning_profile(tuning_profile='default', input_model=None, precision=None):
+
+    """
+
+    Reads the best setting of a profile written by autotune.
+
+    Parameters
+    ----------
+    tuning_profile: str, default='default'
+        Path of the profile. 'default' reads $EQT_TUNING_PROFILE or ~/.eqtransformer/autotune.json if it exists. None disables the profile.
+
+    input_model: str or list, default=None
+        The model(s) the setting is for. If given, a profile tuned for another model is skipped with a warning.
+
+    precision: str, default=None
+        The precision the setting is for. If input_model is given, a profile tuned for another precision is skipped with a warning.
+
+    Returns
+    --------
+    best: dict
+        batch_size, intra_op_threads, inter_op_threads, number_of_cpus, and use_multiprocessing, or None if there is no matching profile.
+
+    """
+
+    if not tuning_profile:
+        return None
+    if tuning_profile == 'default':
+        tuning_profile = os.environ.get('EQT_TUNING_PROFILE', DEFAULT_PROFILE)
+        if not os.path.isfile(tuning_profile):
+            return None
+    with open(tuning_profile) as f:
+        profile = json.load(f)
+    if input_model is None:
+        return profile['best']
+
+    input_models = input_model if isinstance(input_model, (list, tuple)) else [input_model]
+    if [os.path.abspath(m) for m in input_models] != [os.path.abspath(profile['input_model'])]:
+        print(' *** Skipped the tuning profile " '+str(tuning_profile)+' ": it was tuned for '+str(profile['input_model'])+', not '+str(input_model)+'.', flush=True)
+        return None
+    if (profile['precision'] or 'float32') != (precision or 'float32'):
+        print(' *** Skipped the tuning profile " '+str(tuning_profile)+' ": it was tuned for the '+str(profile['precision'])+' precision, not '+str(precision)+'.', flush=True)
+        return None
+    return profile['best']
+
+
+
+def apply_tuning_profile(args, tuning_profile, defaults):
+
+    """
+
+    Fills the arguments that are not set (None) from a tuning profile matching args['input_model'] and args['precision'], or with their defaults.
+
+    Parameters
+    ----------
+    args: dic
+        A dictionary containing all of the input parameters.
+
+    tuning_profile: str
+        See load_tuning_profile.
+
+    defaults: dic
+        The arguments the profile may set and their values when there is no profile.
+
+    Returns
+    --------
+    best: dict
+        The profile setting, or None if there is no matching profile.
+
+    Notes
+    --------
+    number_of_cpus is only taken from the profile if it was tuned with the same args['use_multiprocessing'].
+
+    """
+
+    best = load_tuning_profile(tuning_profile, args['input_model'], args['precision'])
+    for key, default in defaults.items():
+        if args[key] is not None:
+            continue
+        if best and key in best and (key != 'number_of_cpus' or best.get('use_multiprocessing', False) == args['use_multiprocessing']):
+            args[key] = best[key]
+        else:
+            args[key] = default
+    return best
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Finds the fastest batch size, TensorFlow threads and loader workers for a trained EqT model.')
+    parser.add_argument('--input_model', required=True)
+    parser.add_argument('--output_profile', default=None)
+    parser.add_argument('--batch_sizes', default='50,100,200,500')
+    parser.add_argument('--intra_op_threads', default=None)
+    parser.add_argument('--inter_op_threads', default='1,2')
+    parser.add_argument('--number_of_cpus', default='1,2,4')
+    parser.add_argument('--number_of_windows', type=int, default=1500)
+    parser.add_argument('--precision', default=None)
+    parser.add_argument('--use_threads', action='store_true', help='tune number_of_cpus for thread workers (use_multiprocessing=False)')
+    opt = parser.parse_args()
+
+    def _ints(s):
+        return [int(v) for v in s.split(',')] if s else None
+
+    autotune(input_model=opt.input_model,
+             output_profile=opt.output_profile,
+             batch_sizes=_ints(opt.batch_sizes),
+             intra_op_threads=_ints(opt.intra_op_threads),
+             inter_op_threads=_ints(opt.inter_op_threads),
+             number_of_cpus=_ints(opt.number_of_cpus),
+             number_of_windows=opt.number_of_windows,
+             precision=opt.precision,
+             use_multiprocessing=not opt.use_threads)
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 16:40:27 2026
+
+last update: 10/19/2026
+
+"""
+
+from __future__ import print_function
+from __future__ import division
+import os
+import io
+import json
+import time
+import queue
+import socket
+import argparse
+import threading
+import http.client
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from .EqT_utils import load_inference_model, normalize
+
+LOCAL_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+
+def inference_server(input_model=None,
+                     host='127.0.0.1',
+                     port=8765,
+                     socket_path=None,
+                     max_batch_size=500,
+                     max_wait=0.01,
+                     loss_weights=[0.03, 0.40, 0.58],
+                     loss_types=['binary_crossentropy', 'binary_crossentropy', 'binary_crossentropy'],
+                     normalization_mode='std',
+                     precision=None):
+
+    """
+
+    Runs a local inference server that keeps a trained model loaded and batches the incoming requests.
+
+    Parameters
+    ----------
+    input_model: str
+        Path to a trained model (.h5 or .tflite).
+
+    host: str, default='127.0.0.1'
+        Address the HTTP server binds to. Only local addresses are accepted.
+
+    port: int, default=8765
+        Port of the HTTP server.
+
+    socket_path: str, default=None
+        If set, the server listens on this Unix socket instead of host and port.
+
+    max_batch_size: int, default=500
+        Maximum number of windows predicted together.
+
+    max_wait: float, default=0.01
+        Maximum time in seconds a request waits for other requests to fill a batch.
+
+    loss_weights: list, default=[0.03, 0.40, 0.58]
+        Loss weights for detection P picking and S picking respectively.
+
+    loss_types: list, default=['binary_crossentropy', 'binary_crossentropy', 'binary_crossentropy']
+        Loss types for detection P picking and S picking respectively.
+
+    normalization_mode: str, default=std
+        Mode of normalization applied to the windows cut from continuous arrays. 'max' or 'std'.
+
+    precision: str, default=None
+        None, 'float32', or 'bfloat16'. See set_inference_precision.
+
+    Returns
+    --------
+    Serves until interrupted. The endpoints are:
+
+    GET /health: JSON with the model and batching settings.
+
+    POST /predict: a .npy (n, 6000, 3) array of normalized windows. Returns a .npz with the detector, picker_P and picker_S arrays of shape (n, 6000, 1).
+
+    POST /predict_continuous?overlap=0.3: a .npy (npts, 3) preprocessed continuous array. It is cut into windows that are normalized and
+    predicted, and a .npz with the detector, picker_P and picker_S probabilities of shape (npts,) is returned, taking the maximum over overlapping windows.
+
+    """
+
+    if socket_path is None and host not in LOCAL_HOSTS:
+        raise ValueError('The inference server only binds to local addresses, not '+str(host)+'.')
+
+    model = load_inference_model(input_model, loss_types, loss_weights, precision)
+    model.predict(np.zeros((1, 6000, 3), dtype=np.float32), batch_size=1, verbose=0)
+    batcher = _Batcher(model, max_batch_size, max_wait)
+    batcher.start()
+
+    class _Handler(_RequestHandler):
+        pass
+    _Handler.batcher = batcher
+    _Handler.normalization_mode = normalization_mode
+    _Handler.info = {'input_model': str(input_model),
+                     'input_shape': [None, 6000, 3],
+                     'max_batch_size': max_batch_size,
+                     'max_wait': max_wait,
+                     'normalization_mode': normalization_mode,
+                     'precision': precision}
+
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = _UnixHTTPServer(socket_path, _Handler)
+        print(' *** Inference server listening on unix://'+str(socket_path), flush=True)
+    else:
+        server = ThreadingHTTPServer((host, port), _Handler)
+        print(' *** Inference server listening on http://'+str(host)+':'+str(port), flush=True)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.stop()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+
+class _Batcher(threading.Thread):
+    ' Collects the submitted windows into batches of at most max_batch_size windows, waiting at most max_wait seconds for a batch to fill. '
+
+    def __init__(self, model, max_batch_size, max_wait):
+        threading.Thread.__init__(self, daemon=True)
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.running = True
+
+    def submit(self, X):
+        ' Predicts X with the other pending requests and returns the detector, picker_P and picker_S outputs. '
+
+        items = [{'X': X[i:i+self.max_batch_size], 'done': threading.Event()} for i in range(0, len(X), self.max_batch_size)]
+        for item in items:
+            self.requests.put(item)
+        for item in items:
+            item['done'].wait()
+            if 'error' in item:
+                raise RuntimeError(item['error'])
+        return [np.concatenate([item['pred'][k] for item in items]) for k in range(3)]
+
+    def stop(self):
+        self.running = False
+        self.requests.put(None)
+
+    def run(self):
+        pending = None
+        while self.running:
+            item = pending if pending is not None else self.requests.get()
+            pending = None
+            if item is None:
+                continue
+            batch, size = [item], len(item['X'])
+            deadline = time.time() + self.max_wait
+            while size < self.max_batch_size:
+                try:
+                    nxt = self.requests.get(timeout=max(0, deadline - time.time()))
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    continue
+                if size + len(nxt['X']) > self.max_batch_size:
+                    pending = nxt
+                    break
+                batch.append(nxt)
+                size += len(nxt['X'])
+            self._predict(batch)
+
+    def _predict(self, batch):
+        try:
+            X = np.concatenate([item['X'] for item in batch])
+            pred = self.model.predict(X, batch_size=len(X), verbose=0)
+            start = 0
+            for item in batch:
+                end = start + len(item['X'])
+                item['pred'] = [np.asarray(p[start:end]) for p in pred]
+                start = end
+        except Exception as e:
+            for item in batch:
+                item['error'] = repr(e)
+        for item in batch:
+            item['done'].set()
+
+
+
+def _windows(data, overlap, norm_mode):
+    ' Cuts a continuous (npts, 3) array into normalized 6000-sample windows and returns them with their start samples. '
+
+    npts = data.shape[0]
+    shift = max(1, int(6000*(1 - overlap)))
+    if npts <= 6000:
+        starts = [0]
+    else:
+        starts = list(range(0, npts - 6000, shift)) + [npts - 6000]
+    X = np.zeros((len(starts), 6000, data.shape[1]), dtype=np.float32)
+    for i, st in enumerate(starts):
+        w = data[st:st+6000].astype(np.float32)
+        X[i, :len(w)] = normalize(w, norm_mode)
+    return X, starts
+
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    batcher = None
+    normalization_mode = 'std'
+    info = {}
+
+    def address_string(self):
+        return str(self.client_address[0]) if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, code, body, content_type):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, code, message):
+        self._send(code, json.dumps({'error': message}).encode(), 'application/json')
+
+    def do_GET(self):
+        if self.path.split('?')[0] == '/health':
+            self._send(200, json.dumps(self.info).encode(), 'application/json')
+        else:
+            self._error(404, 'unknown endpoint '+self.path)
+
+    def do_POST(self):
+        endpoint, _, query = self.path.partition('?')
+        params = dict(p.split('=', 1) for p in query.split('&') if '=' in p)
+        try:
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            data = np.load(io.BytesIO(body), allow_pickle=False)
+        except Exception as e:
+            self._error(400, 'the body must be a .npy array: '+repr(e))
+            return
+
+        try:
+            if endpoint == '/predict':
+                if data.ndim != 3:
+                    raise ValueError('expected an (n, 6000, 3) array, got '+str(data.shape))
+                predD, predP, predS = self.batcher.submit(data.astype(np.float32))
+            elif endpoint == '/predict_continuous':
+                if data.ndim != 2:
+                    raise ValueError('expected an (npts, 3) array, got '+str(data.shape))
+                X, starts = _windows(data, float(params.get('overlap', 0.3)), self.normalization_mode)
+                winD, winP, winS = self.batcher.submit(X)
+                predD = np.zeros(data.shape[0], dtype=np.float32)
+                predP = np.zeros(data.shape[0], dtype=np.float32)
+                predS = np.zeros(data.shape[0], dtype=np.float32)
+                for i, st in enumerate(starts):
+                    n = min(6000, data.shape[0] - st)
+                    predD[st:st+n] = np.maximum(predD[st:st+n], winD[i, :n, 0])
+                    predP[st:st+n] = np.maximum(predP[st:st+n], winP[i, :n, 0])
+                    predS[st:st+n] = np.maximum(predS[st:st+n], winS[i, :n, 0])
+            else:
+                self._error(404, 'unknown endpoint '+endpoint)
+                return
+        except ValueError as e:
+            self._error(400, str(e))
+            return
+        except Exception as e:
+            self._error(500, repr(e))
+            return
+
+        out = io.BytesIO()
+        np.savez(out, detector=predD, picker_P=predP, picker_S=predS)
+        self._send(200, out.getvalue(), 'application/octet-stream')
+
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, socket_path, timeout=None):
+        http.client.HTTPConnection.__init__(self, 'localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+
+class InferenceClient():
+
+    """
+
+    Client of a running inference server. It has the predict and predict_generator methods of a Keras model,
+    so load_inference_model returns it when input_model is a server address and the predictors can use the server as a backend.
+
+    Parameters
+    ----------
+    address: str
+        'http://127.0.0.1:8765' or 'unix:///path/to/socket'.
+
+    timeout: float, default=600
+        Timeout of each request in seconds.
+
+    """
+
+    def __init__(self, address, timeout=600):
+        self.address = address
+        self.timeout = timeout
+        if address.startswith('unix://'):
+            self.socket_path = address[len('unix://'):]
+            self.host, self.port = None, None
+        elif address.startswith('http://'):
+            self.socket_path = None
+            self.host, _, port = address[len('http://'):].rstrip('/').partition(':')
+            self.port = int(port) if port else 80
+            if self.host not in LOCAL_HOSTS:
+                raise ValueError('The inference server must run on localhost, not '+str(self.host)+'.')
+        else:
+            raise ValueError('Unknown inference server address '+str(address)+'.')
+        self.info = json.loads(self._request('GET', '/health'))
+        self.input_shape = tuple(self.info['input_shape'])
+
+    def _request(self, method, path, body=None):
+        if self.socket_path:
+            conn = _UnixHTTPConnection(self.socket_path, timeout=self.timeout)
+        else:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            conn.request(method, path, body=body)
+            resp = conn.getresponse()
+            data = resp.read()
+        finally:
+            conn.close()
+        if resp.status != 200:
+            raise RuntimeError('inference server returned '+str(resp.status)+': '+data.decode(errors='replace'))
+        return data
+
+    def _post(self, path, data):
+        buf = io.BytesIO()
+        np.save(buf, np.ascontiguousarray(data, dtype=np.float32))
+        out = np.load(io.BytesIO(self._request('POST', path, buf.getvalue())))
+        return [out['detector'], out['picker_P'], out['picker_S']]
+
+    def predict(self, X, batch_size=None, **kwargs):
+        ' Predicts normalized (n, 6000, 3) windows. '
+        return self._post('/predict', X)
+
+    def predict_generator(self, generator, **kwargs):
+        ' Predicts all batches of a generator returning {"input": X}. '
+        outputs = [self._post('/predict', generator[bn]['input']) for bn in range(len(generator))]
+        return [np.concatenate([o[k] for o in outputs]) for k in range(3)]
+
+    def predict_continuous(self, data, overlap=0.3):
+        ' Predicts a preprocessed continuous (npts, 3) array and returns the detector, picker_P and picker_S probabilities of each sample. '
+        return self._post('/predict_continuous?overlap='+str(overlap), data)
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local EqTransformer inference server.')
+    parser.add_argument('--input_model', required=True)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket_path', default=None)
+    parser.add_argument('--max_batch_size', type=int, default=500)
+    parser.add_argument('--max_wait', type=float, default=0.01)
+    parser.add_argument('--normalization_mode', default='std')
+    parser.add_argument('--precision', default=None)
+    opt = parser.parse_args()
+    inference_server(input_model=opt.input_model,
+                     host=opt.host,
+                     port=opt.port,
+                     socket_path=opt.socket_path,
+                     max_batch_size=opt.max_batch_size,
+                     max_wait=opt.max_wait,
+                     normalization_mode=opt.normalization_mode,
+                     precision=opt.precision)
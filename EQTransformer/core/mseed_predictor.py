@@ -38,13 +38,19 @@ from scipy import signal
 from matplotlib.lines import Line2D
 from obspy import read
 from os.path import join
-import json
 import pickle
 import faulthandler; faulthandler.enable()
 import obspy
 import logging
 from obspy.signal.trigger import trigger_onset
-from .EqT_utils import f1, SeqSelfAttention, FeedForward, LayerNormalization
+from .EqT_utils import f1, SeqSelfAttention, FeedForward, LayerNormalization, load_inference_model, long_input_model, long_input_predict, set_inference_threads, ModelEnsemble, XLAModel
+from .EqT_utils import _BatchBuffers
+from .replica_pool import ReplicaPool
+from .autotune import apply_tuning_profile
+from ..utils.preprocessing import preprocess_stream, resample_stream, BlockStream, window_qc, dead_windows
+from ..utils.trace_cache import TraceCache
+from ..utils.mseed_catalog import MseedCatalog
+from ..utils.hdf5_maker import load_stations
 warnings.filterwarnings("ignore")
 from tensorflow.python.util import deprecation
 deprecation._PRINT_DEPRECATION_WARNINGS = False
@@ -70,11 +76,25 @@ def mseed_predictor(input_dir='downloads_mseeds',
               loss_weights=[0.03, 0.40, 0.58],
               loss_types=['binary_crossentropy', 'binary_crossentropy', 'binary_crossentropy'],
               normalization_mode='std',
-              batch_size=500,              
+              batch_size=None,              
               overlap = 0.3,
               gpuid=None,
               gpu_limit=None,
-              overwrite=False): 
+              overwrite=False,
+              precision=None,
+              long_input=None,
+              number_of_replicas=None,
+              threads_per_replica=None,
+              share_weights=False,
+              tuning_profile='default',
+              ensemble='mean',
+              jit_compile=False,
+              block_length=None,
+              cache_dir=None,
+              cache_size=None,
+              qc_policy=None,
+              qc_max_gap=0.9,
+              catalog_path=None): 
     
     """ 
     
@@ -85,8 +105,9 @@ def mseed_predictor(input_dir='downloads_mseeds',
     input_dir: str
         Directory name containing hdf5 and csv files-preprocessed data.
             
-    input_model: str
-        Path to a trained model.
+    input_model: {str, list}
+        Path to a trained model, or the address of a running inference server ('http://127.0.0.1:8765' or 'unix:///path/to/socket'). 
+        A list of them runs all of the models on the same preprocessed windows, see ensemble.
             
     stations_json: str
         Path to a JSON file containing station information. 
@@ -118,8 +139,8 @@ def mseed_predictor(input_dir='downloads_mseeds',
     normalization_mode: str, default=std
         Mode of normalization for data preprocessing max maximum amplitude among three components std standard deviation.
              
-    batch_size: int, default=500
-        Batch size. This wont affect the speed much but can affect the performance. A value beteen 200 to 1000 is recommanded.
+    batch_size: int, default=None
+        Batch size. If None it is taken from the tuning profile, else 500. Depending on the hardware it can change the speed several times, see eqt-autotune. It can also affect the performance. A value beteen 200 to 1000 is recommanded.
              
     overlap: float, default=0.3
         If set the detection and picking are performed in overlapping windows.
@@ -132,6 +153,48 @@ def mseed_predictor(input_dir='downloads_mseeds',
 
     overwrite: Bolean, default=False
         Overwrite your results automatically.
+
+    precision: str, default=None
+        None or 'float32' for full precision, 'bfloat16' for running the model in bfloat16 on CPUs that support it. int8 and float16 models made by the quantizer (.tflite) can be passed directly as input_model.
+
+    long_input: int, default=None
+        If set, the weights are built into a graph accepting long_input x 6000-sample inputs and the continuous data is predicted in segments of that length, stitched at the segment borders, instead of in overlapping 60 s windows. Detection and picking are still done per window over the stitched probabilities. 
+
+    number_of_replicas: {int, 'auto'}, default=None
+        If set, the model is run in this many processes, each pinned to its own cores, that share the batches. 'auto' picks the number from the machine topology. 
+
+    threads_per_replica: int, default=None
+        Number of cores and intra-op threads of each replica. If None it is chosen from the machine topology. Without replicas it sets the intra-op threads of the single model. 
+
+    share_weights: bool, default=False
+        If True, the model is loaded once as a float32 TensorFlow Lite model and the replicas are forked from it after the warm-up, so they share one read-only copy of the weights and of the TensorFlow runtime. Each replica then runs on a single core. See ReplicaPool. 
+
+    tuning_profile: str, default='default'
+        JSON profile written by eqt-autotune. Its batch size fills batch_size if it is None, and its TensorFlow threads are used. It is skipped with a warning if it was tuned for another model or precision. 'default' reads ~/.eqtransformer/autotune.json (or $EQT_TUNING_PROFILE) if it exists, None disables it. 
+
+    ensemble: str, default='mean'
+        If input_model is a list: 'mean' or 'max' combines the probabilities of the models before the picking, None picks the outputs of each model separately and adds a model column to the results. 
+
+    jit_compile: bool, default=False
+        If True, the Keras model is run through one XLA-compiled function with a fixed batch shape (see XLAModel). The compilation is done once, before the first batch, and can take a few minutes; it is reused for the rest of the run. Not used with number_of_replicas. 
+
+    block_length: float, default=None
+        If set, each chunk of mseed files is read, preprocessed, and predicted in blocks of this many seconds (e.g. 3600) instead of as a whole, so the memory used per station depends on the block length and not on the length of the files. The windows are the same as without blocks up to float32 rounding (see BlockStream). Not used with long_input. 
+
+    cache_dir: str, default=None
+        If set, the preprocessed 100 Hz traces of each chunk of mseed files are stored in this directory, keyed by the contents of the files and the preprocessing parameters, and read from it (memory-mapped) when the same files are predicted again, e.g. with another model or thresholds. The directory can be shared with preprocessor. See TraceCache. Not used with long_input. 
+
+    cache_size: float, default=None
+        Disk budget of cache_dir in GB. The least recently used chunks are deleted when it is exceeded. None for no limit. 
+
+    qc_policy: str, default=None
+        What to do with the windows that are mostly gaps or dead channels, i.e. in which every channel has at least qc_max_gap samples that are zero after the preprocessing (see window_qc and dead_windows). 'skip' does not predict them, 'last' predicts them after the other windows of the chunk of data, None predicts all of the windows in their order. Their number is written into the report. Not used with long_input. 
+
+    qc_max_gap: float, default=0.9
+        Fraction of gap or dead samples above which a channel counts as dead for qc_policy. 
+
+    catalog_path: str, default=None
+        Path of the SQLite catalog of the mseed files (see MseedCatalog), which is refreshed with the new and changed files and used instead of scanning input_dir. It can be shared with preprocessor. None keeps it in input_dir/.mseed_catalog.sqlite. 
            
     Returns
     --------        
@@ -144,6 +207,12 @@ def mseed_predictor(input_dir='downloads_mseeds',
     --------        
     This does not allow uncertainty estimation or writing the probabilities out.
     
+    With long_input every sample is passed through the network about once, instead of 1/(1-overlap) times. The two global attention layers 
+    however grow with the square of the segment length, so on CPUs this is not faster than overlap=0.3 windows (0.95x for long_input=1 and 
+    0.3-0.4x for long_input=2 to 10 in our tests). Each segment is normalized as a whole and the attention layers see the whole segment, so 
+    the probabilities differ slightly from the windowed ones (mean absolute difference below 0.01 in our tests) and weak events next to large 
+    ones in the same segment get lower probabilities. benchmarks/long_input.py measures both on your data and hardware.
+    
     
     """  
         
@@ -164,8 +233,25 @@ def mseed_predictor(input_dir='downloads_mseeds',
     "overlap": overlap,
     "batch_size": batch_size,    
     "gpuid": gpuid,
-    "gpu_limit": gpu_limit 
-    }        
+    "gpu_limit": gpu_limit,
+    "precision": precision,
+    "jit_compile": jit_compile,
+    "long_input": long_input,
+    "number_of_replicas": number_of_replicas,
+    "threads_per_replica": threads_per_replica,
+    "share_weights": share_weights,
+    "tuning_profile": tuning_profile,
+    "ensemble": ensemble,
+    "block_length": block_length,
+    "cache_dir": cache_dir,
+    "cache_size": cache_size,
+    "qc_policy": qc_policy,
+    "qc_max_gap": qc_max_gap,
+    "catalog_path": catalog_path
+    }
+    
+    tuned = apply_tuning_profile(args, args['tuning_profile'], {'batch_size': 500})        
+    assert args['qc_policy'] in [None, 'skip', 'last'], "qc_policy should be None, 'skip', or 'last'"
         
     if args['gpuid']:     
         os.environ['CUDA_VISIBLE_DEVICES'] = '{}'.format(args['gpuid'])
@@ -200,16 +286,25 @@ def mseed_predictor(input_dir='downloads_mseeds',
     eqt_logger.info(f"Running EqTransformer  {EQT_VERSION}")
             
     eqt_logger.info(f"*** Loading the model ...")
-    model = load_model(args['input_model'], 
-                       custom_objects={'SeqSelfAttention': SeqSelfAttention, 
-                                       'FeedForward': FeedForward,
-                                       'LayerNormalization': LayerNormalization, 
-                                       'f1': f1                                                                            
-                                        })              
-    model.compile(loss = args['loss_types'],
-                  loss_weights = args['loss_weights'],           
-                  optimizer = Adam(lr = 0.001),
-                  metrics = [f1])
+    input_models = args['input_model'] if isinstance(args['input_model'], (list, tuple)) else [args['input_model']]
+    if args['number_of_replicas']:
+        models = [ReplicaPool(input_model, args['loss_types'], args['loss_weights'], args['precision'], 
+                              args['number_of_replicas'], args['threads_per_replica'], args['long_input'], 
+                              args['share_weights']) for input_model in input_models]
+    else:
+        if args['threads_per_replica']:
+            set_inference_threads(args['threads_per_replica'])
+        elif tuned:
+            set_inference_threads(tuned['intra_op_threads'], tuned['inter_op_threads'])
+        models = [load_inference_model(input_model, args['loss_types'], args['loss_weights'], args['precision']) for input_model in input_models]
+        if args['long_input']:
+            models = [long_input_model(model, args['long_input']) for model in models]
+        if args['jit_compile']:
+            eqt_logger.info(f"*** Compiling the model with XLA ...")
+            xla_batch = max(1, args['batch_size'] // args['long_input']) if args['long_input'] else args['batch_size']
+            models = [XLAModel(model, xla_batch) for model in models]
+    model = models[0] if len(models) == 1 else ModelEnsemble(models, args['ensemble'])
+    model_names = [str(input_model) for input_model in input_models] if len(models) > 1 and args['ensemble'] is None else [None]
     eqt_logger.info(f"*** Loading is complete!")
 
     out_dir = os.path.join(os.getcwd(), str(args['output_dir']))
@@ -225,16 +320,15 @@ def mseed_predictor(input_dir='downloads_mseeds',
             os.makedirs(out_dir) 
         else:
             print("Okay.")
+            if args['number_of_replicas']:
+                model.close()
             return
      
-    if platform.system() == 'Windows':
-        station_list = [ev.split(".")[0] for ev in listdir(args['input_dir']) if ev.split("\\")[-1] != ".DS_Store"];
-    else:     
-        station_list = [ev.split(".")[0] for ev in listdir(args['input_dir']) if ev.split("/")[-1] != ".DS_Store"];
-        
-    station_list = sorted(set(station_list))
+    catalog = MseedCatalog(args['input_dir'], args['catalog_path'])
+    station_list = catalog.stations()
     
     data_track = dict()
+    cache = TraceCache(args['cache_dir'], args['cache_size']) if args['cache_dir'] else None
 
     eqt_logger.info(f"There are files for {len(station_list)} stations in {args['input_dir']} directory.")
     for ct, st in enumerate(station_list):
@@ -269,45 +363,58 @@ def mseed_predictor(input_dir='downloads_mseeds',
                                  's_probability',
                                  's_uncertainty',
                                  's_snr'
-                                     ])  
+                                     ] + (['model'] if model_names[0] else []))  
         csvPr_gen.flush()
         eqt_logger.info(f"Started working on {st}, {ct+1} out of {len(station_list)} ...")       
 
         start_Predicting = time.time()       
-        if platform.system() == 'Windows':
-            file_list = [join(st, ev) for ev in listdir(args["input_dir"]+"\\"+st) if ev.split("\\")[-1].split(".")[-1].lower() == "mseed"]; 
-        else:
-            file_list = [join(st, ev) for ev in listdir(args["input_dir"]+"/"+st) if ev.split("/")[-1].split(".")[-1].lower() == "mseed"]; 
-        
-        mon = [ev.split('__')[1]+'__'+ev.split('__')[2] for ev in file_list ];
-        uni_list = list(set(mon))
-        uni_list.sort()  
-          
         time_slots, comp_types = [], []
+        n_dead = 0
         
-        for _, month in enumerate(uni_list):
+        for month, matching in catalog.chunks(st):
             eqt_logger.info(f"{month}")
-            matching = [s for s in file_list if month in s]
-            meta, time_slots, comp_types, data_set = _mseed2nparry(args, matching, time_slots, comp_types, st)
-
-            params_pred = {'batch_size': args['batch_size'],
-                           'norm_mode': args['normalization_mode']}  
-                
-            pred_generator = PreLoadGeneratorTest(meta["trace_start_time"], data_set, **params_pred)
-
-            predD, predP, predS = model.predict_generator(pred_generator)
-
-            detection_memory = []
-            for ix in range(len(predD)):
-                matches, pick_errors, yh3 =  _picker(args, predD[ix][:, 0], predP[ix][:, 0], predS[ix][:, 0])        
-                if (len(matches) >= 1) and ((matches[list(matches)[0]][3] or matches[list(matches)[0]][6])):
-                    snr = [_get_snr(data_set[meta["trace_start_time"][ix]], matches[list(matches)[0]][3], window = 100), _get_snr(data_set[meta["trace_start_time"][ix]], matches[list(matches)[0]][6], window = 100)]
-                    pre_write = len(detection_memory)
-                    detection_memory=_output_writter_prediction(meta, predict_writer, csvPr_gen, matches, snr, detection_memory, ix)
-                    post_write = len(detection_memory)
-                    if plt_n < args['number_of_plots'] and post_write > pre_write:
-                        _plotter_prediction(data_set[meta["trace_start_time"][ix]], args, save_figs, predD[ix][:, 0], predP[ix][:, 0], predS[ix][:, 0], meta["trace_start_time"][ix], matches)
-                        plt_n += 1            
+            if (args['block_length'] or cache) and not args['long_input']:
+                blocks = _mseed2nparry_blocks(args, matching, time_slots, comp_types, st, cache)
+            else:
+                meta, time_slots, comp_types, data_set = _mseed2nparry(args, matching, time_slots, comp_types, st)
+                blocks = [(meta, data_set)]
+
+            detection_memories = [[] for _ in model_names]
+            for meta, data_set in blocks:
+                if args['long_input']:
+                    predD, predP, predS = _long_input_windows(args, model, meta)
+                else:
+                    list_IDs = meta["trace_start_time"]
+                    if args['qc_policy']:
+                        meta, dead = _qc_windows(args, meta, data_set)
+                        n_dead += dead
+                        if not len(meta["trace_start_time"]):
+                            continue
+                        # the last batch is filled up with the last window and its predictions are left out
+                        list_IDs = meta["trace_start_time"] + meta["trace_start_time"][-1:] * (-len(meta["trace_start_time"]) % args['batch_size'])
+                    params_pred = {'batch_size': args['batch_size'],
+                                   'norm_mode': args['normalization_mode']}  
+                        
+                    pred_generator = PreLoadGeneratorTest(list_IDs, data_set, **params_pred)
+        
+                    predD, predP, predS = model.predict_generator(pred_generator)
+                    if args['qc_policy']:
+                        predD, predP, predS = [pred[:len(meta["trace_start_time"])] for pred in [predD, predP, predS]]
+
+                for m, model_name in enumerate(model_names):
+                    detection_memory = detection_memories[m]
+                    for ix in range(len(predD)):
+                        matches, pick_errors, yh3 =  _picker(args, predD[ix][:, m], predP[ix][:, m], predS[ix][:, m])        
+                        if (len(matches) >= 1) and ((matches[list(matches)[0]][3] or matches[list(matches)[0]][6])):
+                            snr = [_get_snr(data_set[meta["trace_start_time"][ix]], matches[list(matches)[0]][3], window = 100), _get_snr(data_set[meta["trace_start_time"][ix]], matches[list(matches)[0]][6], window = 100)]
+                            pre_write = len(detection_memory)
+                            detection_memory=_output_writter_prediction(meta, predict_writer, csvPr_gen, matches, snr, detection_memory, ix, model_name)
+                            post_write = len(detection_memory)
+                            if plt_n < args['number_of_plots'] and post_write > pre_write:
+                                evi = meta["trace_start_time"][ix] if model_name is None else meta["trace_start_time"][ix]+'_model'+str(m)
+                                _plotter_prediction(data_set[meta["trace_start_time"][ix]], args, save_figs, predD[ix][:, m], predP[ix][:, m], predS[ix][:, m], evi, matches)
+                                plt_n += 1            
+                    detection_memories[m] = detection_memory
                                                        
         end_Predicting = time.time() 
         data_track[st]=[time_slots, comp_types] 
@@ -349,9 +456,30 @@ def mseed_predictor(input_dir='downloads_mseeds',
             the_file.write('number_of_plots: '+str(args['number_of_plots'])+'\n')                        
             the_file.write('gpuid: '+str(args['gpuid'])+'\n')
             the_file.write('gpu_limit: '+str(args['gpu_limit'])+'\n')    
+            the_file.write('precision: '+str(args['precision'])+'\n')
+            the_file.write('jit_compile: '+str(args['jit_compile'])+'\n')
+            the_file.write('long_input: '+str(args['long_input'])+'\n')
+            the_file.write('number_of_replicas: '+str(args['number_of_replicas'])+'\n')
+            the_file.write('threads_per_replica: '+str(args['threads_per_replica'])+'\n')
+            the_file.write('share_weights: '+str(args['share_weights'])+'\n')
+            if args['number_of_replicas']:
+                the_file.write('replica memory (MB): '+str([pool.memory_usage() for pool in models])+'\n')
+            the_file.write('tuning_profile: '+str(tuned)+'\n')
+            the_file.write('ensemble: '+str(args['ensemble'])+'\n')
+            the_file.write('block_length: '+str(args['block_length'])+'\n')
+            the_file.write('cache_dir: '+str(args['cache_dir'])+'\n')
+            if cache:
+                the_file.write('cache hits/misses: '+str(cache.hits)+'/'+str(cache.misses)+'\n')
+            the_file.write('qc_policy: '+str(args['qc_policy'])+'\n')
+            if args['qc_policy']:
+                the_file.write('windows with mostly gaps or dead channels '+('skipped' if args['qc_policy'] == 'skip' else 'predicted last')+': '+str(n_dead)+'\n')
   
+    catalog.close()
     with open('time_tracks.pkl', 'wb') as f:
         pickle.dump(data_track, f, pickle.HIGHEST_PROTOCOL)
+        
+    if args['number_of_replicas']:
+        model.close()
 
        
         
@@ -359,8 +487,7 @@ def mseed_predictor(input_dir='downloads_mseeds',
 def _mseed2nparry(args, matching, time_slots, comp_types, st_name):
     ' read miniseed files and from a list of string names and returns 3 dictionaries of numpy arrays, meta data, and time slice info'
     
-    json_file = open(args['stations_json'])
-    stations_ = json.load(json_file)
+    stations_ = load_stations(args['stations_json'])
     
     st = obspy.core.Stream()
     tsw = False
@@ -373,18 +500,12 @@ def _mseed2nparry(args, matching, time_slots, comp_types, st_name):
         try:
             temp_st.merge(fill_value=0)                     
         except Exception:
-            temp_st =_resampling(temp_st)
+            temp_st =resample_stream(temp_st)
             temp_st.merge(fill_value=0) 
-        temp_st.detrend('demean')
         st += temp_st
                
-    st.filter(type='bandpass', freqmin = 1.0, freqmax = 45, corners=2, zerophase=True)
-    st.taper(max_percentage=0.001, type='cosine', max_length=2) 
-    if len([tr for tr in st if tr.stats.sampling_rate != 100.0]) != 0:
-        try:
-            st.interpolate(100, method="linear")
-        except Exception:
-            st=_resampling(st)            
+    preprocess_stream(st)
+    st=resample_stream(st)
                     
     st.trim(min([tr.stats.starttime for tr in st]), max([tr.stats.endtime for tr in st]), pad=True, fill_value=0)
 
@@ -405,7 +526,7 @@ def _mseed2nparry(args, matching, time_slots, comp_types, st_name):
                 
     sl = 0; st_times = []      
     while next_slice <= end_time:
-        npz_data = np.zeros([6000, 3]) 
+        npz_data = np.zeros([6000, 3], dtype=np.float32) 
         st_times.append(str(start_time).replace('T', ' ').replace('Z', ''))
         w = st.slice(start_time, next_slice) 
         if 'Z' in chanL:
@@ -428,6 +549,24 @@ def _mseed2nparry(args, matching, time_slots, comp_types, st_name):
         sl += 1
                          
     meta["trace_start_time"] = st_times
+    meta["window_shift"] = tim_shift*100
+    
+    if args['long_input']:
+        npts = min([len(tr.data) for tr in st])
+        npz_data = np.zeros([npts, 3], dtype=np.float32) 
+        if 'Z' in chanL:
+            npz_data[:,2] = st[chanL.index('Z')].data[:npts]
+        if ('E' in chanL) or ('1' in chanL):    
+            try: 
+                npz_data[:,0] = st[chanL.index('E')].data[:npts]
+            except Exception:
+                npz_data[:,0] = st[chanL.index('1')].data[:npts]
+        if ('N' in chanL) or ('2' in chanL):        
+            try: 
+                npz_data[:,1] = st[chanL.index('N')].data[:npts]
+            except Exception:
+                npz_data[:,1] = st[chanL.index('2')].data[:npts]
+        meta["continuous_data"] = npz_data
     
     try:
         meta["receiver_code"]=st[0].stats.station
@@ -448,6 +587,87 @@ def _mseed2nparry(args, matching, time_slots, comp_types, st_name):
 
 
 
+def _mseed2nparry_blocks(args, matching, time_slots, comp_types, st_name, cache=None):
+    ' like _mseed2nparry, but preprocesses the files block by block (or reads them from the cache) and yields the meta data and the windows of each block'
+    
+    stations_ = load_stations(args['stations_json'])
+    
+    # whole batches per block, as PreLoadGeneratorTest leaves out the last incomplete batch
+    tim_shift = int(60-(args['overlap']*60))
+    block_length = None
+    if args['block_length']:
+        block_length = max(1, int(round(args['block_length'] / tim_shift / args['batch_size'])))*args['batch_size']*tim_shift
+    files = [os.path.join(str(args['input_dir']), m) for m in matching]
+    if cache:
+        stream = cache.stream(files, overlap=args['overlap'], block_length=block_length, span='union')
+    else:
+        stream = BlockStream(files, overlap=args['overlap'], block_length=block_length, span='union')
+    time_slots.extend(stream.time_slots)
+    comp_types.append(len(stream.traces))
+    
+    meta = {"start_time":stream.starttime,
+            "end_time": stream.endtime,
+            "trace_name":matching[-1],
+            "window_shift":stream.shift*100
+             } 
+    try:
+        meta["receiver_code"]=stream.traces[0].station
+        meta["instrument_type"]=stream.traces[0].channel[:2]
+        meta["network_code"]=stations_[stream.traces[0].station]['network']
+        meta["receiver_latitude"]=stations_[stream.traces[0].station]['coords'][0]
+        meta["receiver_longitude"]=stations_[stream.traces[0].station]['coords'][1]
+        meta["receiver_elevation_m"]=stations_[stream.traces[0].station]['coords'][2]  
+    except Exception:
+        meta["receiver_code"]=st_name
+        meta["instrument_type"]=stations_[st_name]['channels'][0][:2]
+        meta["network_code"]=stations_[st_name]['network']
+        meta["receiver_latitude"]=stations_[st_name]['coords'][0]
+        meta["receiver_longitude"]=stations_[st_name]['coords'][1]
+        meta["receiver_elevation_m"]=stations_[st_name]['coords'][2] 
+
+    for start_times, windows in stream.blocks():
+        if len(start_times) < args['batch_size']:
+            continue
+        st_times = [str(start_time).replace('T', ' ').replace('Z', '') for start_time in start_times]
+        yield dict(meta, trace_start_time=st_times), dict(zip(st_times, windows))
+
+
+
+def _qc_windows(args, meta, data_set):
+    ' the windows of meta that are predicted with qc_policy, in the order they are predicted, and the number of windows that are mostly gaps or dead channels '
+    
+    # the windows PreLoadGeneratorTest predicts without qc_policy, i.e. without the last incomplete batch
+    st_times = meta["trace_start_time"][:len(meta["trace_start_time"]) // args['batch_size'] * args['batch_size']]
+    if not len(st_times):
+        return dict(meta, trace_start_time=[]), 0
+    scale = np.max([np.max(np.abs(data_set[st_time]), axis=0) for st_time in st_times], axis=0)
+    dead = np.concatenate([dead_windows(window_qc(np.stack([data_set[st_time] for st_time in st_times[k:k+args['batch_size']]]), scale), args['qc_max_gap'])
+                           for k in range(0, len(st_times), args['batch_size'])])
+    st_times_qc = [st_time for st_time, d in zip(st_times, dead) if not d]
+    if args['qc_policy'] == 'last':
+        st_times_qc += [st_time for st_time, d in zip(st_times, dead) if d]
+    return dict(meta, trace_start_time=st_times_qc), int(np.sum(dead))
+
+
+
+def _long_input_windows(args, model, meta):
+    ' predicts the continuous data in long segments and cuts the stitched probabilities into the same windows as the windowed prediction'
+    
+    n_windows = int(model.input_shape[1]) // 6000
+    yh1, yh2, yh3 = long_input_predict(model, 
+                                       meta["continuous_data"], 
+                                       norm_mode=args['normalization_mode'], 
+                                       batch_size=max(1, args['batch_size'] // n_windows))
+    starts = [ix*meta["window_shift"] for ix in range(len(meta["trace_start_time"]))]
+    if len(starts) == 0:
+        return np.zeros((0, 6000, 1)), np.zeros((0, 6000, 1)), np.zeros((0, 6000, 1))
+    predD = np.stack([yh1[s:s+6000] for s in starts]).reshape(len(starts), 6000, -1)
+    predP = np.stack([yh2[s:s+6000] for s in starts]).reshape(len(starts), 6000, -1)
+    predS = np.stack([yh3[s:s+6000] for s in starts]).reshape(len(starts), 6000, -1)
+    return predD, predP, predS
+    
+    
+    
 class PreLoadGeneratorTest(keras.utils.Sequence):
     
     """ 
@@ -493,6 +713,7 @@ class PreLoadGeneratorTest(keras.utils.Sequence):
         self.inp_data = inp_data        
         self.on_epoch_end()
         self.norm_mode = norm_mode
+        self._buffers = _BatchBuffers()
         
     def __len__(self):
         'Denotes the number of batches per epoch'
@@ -530,7 +751,7 @@ class PreLoadGeneratorTest(keras.utils.Sequence):
                        
     def __data_generation(self, list_IDs_temp):
         'readint the waveforms' 
-        X = np.zeros((self.batch_size, 6000, 3))           
+        X, = self._buffers.get((self.batch_size, 6000, 3))
         # Generate data
         for i, ID in enumerate(list_IDs_temp):            
             data = self.inp_data[ID]
@@ -540,7 +761,7 @@ class PreLoadGeneratorTest(keras.utils.Sequence):
         return X      
     
 
-def _output_writter_prediction(meta, predict_writer, csvPr, matches, snr, detection_memory, idx):
+def _output_writter_prediction(meta, predict_writer, csvPr, matches, snr, detection_memory, idx, model_name=None):
     
     """ 
     
@@ -565,6 +786,12 @@ def _output_writter_prediction(meta, predict_writer, csvPr, matches, snr, detect
     
     detection_memory : list
         Keep the track of detected events.          
+
+    idx : int
+        Index of the window.
+
+    model_name : str, default=None
+        Written into the model column when the models of an ensemble are picked separately.
         
     Returns
     -------   
@@ -628,26 +855,29 @@ def _output_writter_prediction(meta, predict_writer, csvPr, matches, snr, detect
             if s_prob:
                 s_prob = round(s_prob, 2)
                 
-            predict_writer.writerow([meta["trace_name"], 
-                                         network_name,
-                                         station_name, 
-                                         instrument_type,
-                                         station_lat, 
-                                         station_lon,
-                                         station_elv,
-                                         _date_convertor(ev_strt), 
-                                         _date_convertor(ev_end), 
-                                         det_prob, 
-                                         None,                                
-                                         _date_convertor(p_time), 
-                                         p_prob,
-                                         None,
-                                         snr[0],
-                                         _date_convertor(s_time), 
-                                         s_prob,
-                                         None, 
-                                         snr[1]
-                                         ]) 
+            row = [meta["trace_name"], 
+                   network_name,
+                   station_name, 
+                   instrument_type,
+                   station_lat, 
+                   station_lon,
+                   station_elv,
+                   _date_convertor(ev_strt), 
+                   _date_convertor(ev_end), 
+                   det_prob, 
+                   None,                                
+                   _date_convertor(p_time), 
+                   p_prob,
+                   None,
+                   snr[0],
+                   _date_convertor(s_time), 
+                   s_prob,
+                   None, 
+                   snr[1]
+                   ]
+            if model_name is not None:
+                row.append(model_name)
+            predict_writer.writerow(row) 
             
             csvPr.flush()                
             detection_memory.append(ev_strt)                           
@@ -955,25 +1185,6 @@ def _picker(args, yh1, yh2, yh3):
 
 
 
-def _resampling(st):
-    'perform resampling on Obspy stream objects'
-    
-    need_resampling = [tr for tr in st if tr.stats.sampling_rate != 100.0]
-    if len(need_resampling) > 0:
-       # print('resampling ...', flush=True)    
-        for indx, tr in enumerate(need_resampling):
-            if tr.stats.delta < 0.01:
-                tr.filter('lowpass',freq=45,zerophase=True)
-            tr.resample(100)
-            tr.stats.sampling_rate = 100
-            tr.stats.delta = 0.01
-            tr.data.dtype = 'int32'
-            st.remove(tr)                    
-            st.append(tr) 
-    return st 
-
-
-
 def _normalize(data, mode = 'max'):  
     """ 
     
@@ -28,7 +28,12 @@ import time
 from os import listdir
 import platform
 import shutil
-from .EqT_utils import DataGeneratorPrediction, picker, generate_arrays_from_file
+from ..utils.hdf5_maker import window_index, get_window, station_attrs
+from ..utils.preprocessing import dead_windows, QC_COLUMNS
+from .EqT_utils import DataGeneratorPrediction, picker, generate_arrays_from_file, load_inference_model, set_inference_threads, ModelEnsemble, XLAModel, normalized_model
+from .EqT_utils import cached_hdf5, close_hdf5_files
+from .replica_pool import ReplicaPool
+from .autotune import apply_tuning_profile
 from .EqT_utils import f1, SeqSelfAttention, FeedForward, LayerNormalization
 from tqdm import tqdm
 from datetime import datetime, timedelta
@@ -65,14 +70,24 @@ def predictor(input_dir=None,
               loss_types=['binary_crossentropy', 'binary_crossentropy', 'binary_crossentropy'],
               input_dimention=(6000, 3),
               normalization_mode='std',
-              batch_size=500,
+              batch_size=None,
               gpuid=None,
               gpu_limit=None,
-              number_of_cpus=5,
+              number_of_cpus=None,
               use_multiprocessing=True,
               keepPS=True,
               allowonlyS=True,
-              spLimit=60): 
+              spLimit=60,
+              precision=None,
+              number_of_replicas=None,
+              threads_per_replica=None,
+              share_weights=False,
+              tuning_profile='default',
+              ensemble='mean',
+              jit_compile=False,
+              qc_policy=None,
+              qc_max_gap=0.9,
+              graph_normalization=False): 
     
     
     """
@@ -85,8 +100,9 @@ def predictor(input_dir=None,
     input_dir: str, default=None
         Directory name containing hdf5 and csv files-preprocessed data.
         
-    input_model: str, default=None
-        Path to a trained model.
+    input_model: {str, list}, default=None
+        Path to a trained model, or the address of a running inference server ('http://127.0.0.1:8765' or 'unix:///path/to/socket'). 
+        A list of them runs all of the models on the same batches, which are read and normalized once, see ensemble.
 
     output_dir: str, default=None
         Output directory that will be generated. 
@@ -127,8 +143,8 @@ def predictor(input_dir=None,
     normalization_mode: str, default='std' 
         Mode of normalization for data preprocessing, 'max', maximum amplitude among three components, 'std', standard deviation.
            
-    batch_size: int, default=500 
-        Batch size. This wont affect the speed much but can affect the performance. A value beteen 200 to 1000 is recommanded.
+    batch_size: int, default=None
+        Batch size. If None it is taken from the tuning profile, else 500. Depending on the hardware it can change the speed several times, see eqt-autotune. It can also affect the performance. A value beteen 200 to 1000 is recommanded.
 
     gpuid: int, default=None
         Id of GPU used for the prediction. If using CPU set to None.
@@ -136,8 +152,8 @@ def predictor(input_dir=None,
     gpu_limit: int, default=None
         Set the maximum percentage of memory usage for the GPU.
           
-    number_of_cpus: int, default=5
-        Number of CPUs used for the parallel preprocessing and feeding of data for prediction.
+    number_of_cpus: int, default=None
+        Number of CPUs used for the parallel preprocessing and feeding of data for prediction. If None it is taken from the tuning profile when it was tuned with the same use_multiprocessing, else 5.
 
     use_multiprocessing: bool, default=True
         If True, multiple CPUs will be used for the preprocessing of data even when GPU is used for the prediction.        
@@ -150,6 +166,37 @@ def predictor(input_dir=None,
         
     spLimit: int, default=60
         S - P time in seconds. It will limit the results to those detections with events that have a specific S-P time limit. 
+
+    precision: str, default=None
+        None or 'float32' for full precision, 'bfloat16' for running the model in bfloat16 on CPUs that support it. int8 and float16 models made by the quantizer (.tflite) can be passed directly as input_model. 
+
+    number_of_replicas: {int, 'auto'}, default=None
+        If set, the model is run in this many processes, each pinned to its own cores, that share the batches. 'auto' picks the number from the machine topology. 
+
+    threads_per_replica: int, default=None
+        Number of cores and intra-op threads of each replica. If None it is chosen from the machine topology. Without replicas it sets the intra-op threads of the single model. 
+
+    share_weights: bool, default=False
+        If True, the model is loaded once as a float32 TensorFlow Lite model and the replicas are forked from it after the warm-up, so they share one read-only copy of the weights and of the TensorFlow runtime. Each replica then runs on a single core. See ReplicaPool. 
+
+    tuning_profile: str, default='default'
+        JSON profile written by eqt-autotune. Its batch size and number of cpus fill the arguments left at None, and its TensorFlow threads are used. It is skipped with a warning if it was tuned for another model or precision. 'default' reads ~/.eqtransformer/autotune.json (or $EQT_TUNING_PROFILE) if it exists, None disables it. 
+
+    ensemble: str, default='mean'
+        If input_model is a list: 'mean' or 'max' combines the probabilities of the models before the picking, None picks the outputs of each model separately, 
+        adds a model column to the results, and writes the probabilities of the m-th model into the columns 3m to 3m+2 of the probability outputs. 
+
+    jit_compile: bool, default=False
+        If True, the Keras model is run through one XLA-compiled function with a fixed batch shape (see XLAModel). The compilation is done once, before the first batch, and can take a few minutes; it is reused for the rest of the run. Not used with number_of_replicas. 
+
+    qc_policy: str, default=None
+        What to do with the slices that are mostly gaps or dead channels, according to the QC columns written by preprocessor into station.csv (see dead_windows). 'skip' does not predict them, 'last' predicts them after the other slices of the station, None predicts all of the slices in their order. Their number is written into the report. 
+
+    qc_max_gap: float, default=0.9
+        Fraction of gap or dead samples above which a channel counts as dead for qc_policy. 
+
+    graph_normalization: bool, default=False
+        If True, a NormalizationLayer with normalization_mode is prepended to the Keras models (see normalized_model) and the data generator passes the raw waveforms to them, so each batch is normalized at once inside the model. Models trained with graph_normalization are not normalized twice. Not available for .tflite models or an inference server. 
         
     Returns
     -------- 
@@ -195,8 +242,21 @@ def predictor(input_dir=None,
     "use_multiprocessing": use_multiprocessing,
     "keepPS": keepPS,
     "allowonlyS": allowonlyS,
-    "spLimit": spLimit   
+    "spLimit": spLimit,
+    "precision": precision,
+    "jit_compile": jit_compile,
+    "number_of_replicas": number_of_replicas,
+    "threads_per_replica": threads_per_replica,
+    "share_weights": share_weights,
+    "tuning_profile": tuning_profile,
+    "ensemble": ensemble,
+    "qc_policy": qc_policy,
+    "qc_max_gap": qc_max_gap,
+    "graph_normalization": graph_normalization
     }
+    
+    tuned = apply_tuning_profile(args, args['tuning_profile'], {'batch_size': 500, 'number_of_cpus': 5})
+    assert args['qc_policy'] in [None, 'skip', 'last'], "qc_policy should be None, 'skip', or 'last'"
         
     availble_cpus = multiprocessing.cpu_count()
     if args['number_of_cpus'] > availble_cpus:
@@ -232,16 +292,25 @@ def predictor(input_dir=None,
     print('Running EqTransformer ', str(EQT_VERSION))
             
     print(' *** Loading the model ...', flush=True)        
-    model = load_model(args['input_model'], 
-                       custom_objects={'SeqSelfAttention': SeqSelfAttention, 
-                                       'FeedForward': FeedForward,
-                                       'LayerNormalization': LayerNormalization, 
-                                       'f1': f1                                                                            
-                                        })
-    model.compile(loss = args['loss_types'],
-                  loss_weights =  args['loss_weights'],           
-                  optimizer = Adam(lr = 0.001),
-                  metrics = [f1])
+    input_models = args['input_model'] if isinstance(args['input_model'], (list, tuple)) else [args['input_model']]
+    if args['number_of_replicas']:
+        models = [ReplicaPool(input_model, args['loss_types'], args['loss_weights'], args['precision'], 
+                              args['number_of_replicas'], args['threads_per_replica'], 
+                              share_weights=args['share_weights'], 
+                              norm_mode=args['normalization_mode'] if args['graph_normalization'] else None) for input_model in input_models]
+    else:
+        if args['threads_per_replica']:
+            set_inference_threads(args['threads_per_replica'])
+        elif tuned:
+            set_inference_threads(tuned['intra_op_threads'], tuned['inter_op_threads'])
+        models = [load_inference_model(input_model, args['loss_types'], args['loss_weights'], args['precision']) for input_model in input_models]
+        if args['graph_normalization']:
+            models = [normalized_model(model, args['normalization_mode']) for model in models]
+        if args['jit_compile']:
+            print(' *** Compiling the model with XLA ...', flush=True)
+            models = [XLAModel(model, args['batch_size']) for model in models]
+    model = models[0] if len(models) == 1 else ModelEnsemble(models, args['ensemble'])
+    per_model = len(models) > 1 and args['ensemble'] is None
     print('*** Loading is complete!', flush=True)  
 
     if isinstance(args['output_dir'], str):
@@ -309,17 +378,19 @@ def predictor(input_dir=None,
                                      's_probability',
                                      's_uncertainty',
                                      's_snr'
-                                         ])  
+                                         ] + (['model'] if per_model else []))  
             csvPr_gen.flush()
             print(f'========= Started working on {st}, {ct+1} out of {len(station_list)} ...', flush=True)
     
             start_Predicting = time.time()       
-            detection_memory = []
+            detection_memory = {}
             plt_n = 0
         
             df = pd.read_csv(args['input_csv']) 
-            prediction_list = df.trace_name.tolist() 
-            fl = h5py.File(args['input_hdf5'], 'r')    
+            prediction_list, n_dead = _qc_order(df, args)
+            windows = window_index(df)
+            fl = cached_hdf5(args['input_hdf5'])    
+            station, start_times = station_attrs(fl), dict(zip(df.trace_name, df.start_time))
             list_generator=generate_arrays_from_file(prediction_list, args['batch_size']) 
         
             pbar_test = tqdm(total= int(np.ceil(len(prediction_list)/args['batch_size'])), ncols=100, file=sys.stdout)        
@@ -328,15 +399,16 @@ def predictor(input_dir=None,
                     pbar_test.update()
                     
                 new_list = next(list_generator)  
-                prob_dic=_gen_predictor(new_list, args, model)
+                prob_dic=_gen_predictor(new_list, args, model, windows)
         
                 pred_set={}
                 for ID in new_list:
-                    dataset = fl.get('data/'+str(ID))
+                    dataset = get_window(fl, ID, windows)
                     pred_set.update( {str(ID) : dataset})  
                     
-                plt_n, detection_memory= _gen_writer(new_list, args, prob_dic, pred_set, HDF_PROB, predict_writer, save_figs, csvPr_gen, plt_n, detection_memory, keepPS, allowonlyS, spLimit)    
+                plt_n, detection_memory= _gen_writer(new_list, args, prob_dic, pred_set, HDF_PROB, predict_writer, save_figs, csvPr_gen, plt_n, detection_memory, keepPS, allowonlyS, spLimit, station, start_times)    
     
+            close_hdf5_files()
             end_Predicting = time.time() 
             delta = (end_Predicting - start_Predicting) 
             hour = int(delta / 3600)
@@ -368,6 +440,7 @@ def predictor(input_dir=None,
                 the_file.write('batch_size: '+str(args['batch_size'])+'\n')       
                 the_file.write('================== Other Parameters ========================='+'\n')            
                 the_file.write('normalization_mode: '+str(args['normalization_mode'])+'\n')
+                the_file.write('graph_normalization: '+str(args['graph_normalization'])+'\n')
                 the_file.write('estimate uncertainty: '+str(args['estimate_uncertainty'])+'\n')
                 the_file.write('number of Monte Carlo sampling: '+str(args['number_of_sampling'])+'\n')             
                 the_file.write('detection_threshold: '+str(args['detection_threshold'])+'\n')            
@@ -380,6 +453,18 @@ def predictor(input_dir=None,
                 the_file.write('keepPS: '+str(args['keepPS'])+'\n')
                 the_file.write('allowonlyS: '+str(args['allowonlyS'])+'\n')  
                 the_file.write('spLimit: '+str(args['spLimit'])+' seconds\n')      
+                the_file.write('precision: '+str(args['precision'])+'\n')
+                the_file.write('jit_compile: '+str(args['jit_compile'])+'\n')
+                the_file.write('number_of_replicas: '+str(args['number_of_replicas'])+'\n')
+                the_file.write('threads_per_replica: '+str(args['threads_per_replica'])+'\n')
+                the_file.write('share_weights: '+str(args['share_weights'])+'\n')
+                if args['number_of_replicas']:
+                    the_file.write('replica memory (MB): '+str([pool.memory_usage() for pool in models])+'\n')
+                the_file.write('tuning_profile: '+str(tuned)+'\n')
+                the_file.write('ensemble: '+str(args['ensemble'])+'\n')
+                the_file.write('qc_policy: '+str(args['qc_policy'])+'\n')
+                if args['qc_policy']:
+                    the_file.write('slices with mostly gaps or dead channels '+('skipped' if args['qc_policy'] == 'skip' else 'predicted last')+': '+str(n_dead)+'\n')
     else:
         NN_in = len(args['output_dir'])
         for iidir in range(NN_in):
@@ -450,17 +535,19 @@ def predictor(input_dir=None,
                                          's_probability',
                                          's_uncertainty',
                                          's_snr'
-                                             ])  
+                                             ] + (['model'] if per_model else []))  
                 csvPr_gen.flush()
                 print(f'========= Started working on {st}, {ct+1} out of {len(station_list)} ...', flush=True)
         
                 start_Predicting = time.time()       
-                detection_memory = []
+                detection_memory = {}
                 plt_n = 0
             
                 df = pd.read_csv(args['input_csv']) 
-                prediction_list = df.trace_name.tolist() 
-                fl = h5py.File(args['input_hdf5'], 'r')    
+                prediction_list, n_dead = _qc_order(df, args)
+                windows = window_index(df)
+                fl = cached_hdf5(args['input_hdf5'])    
+                station, start_times = station_attrs(fl), dict(zip(df.trace_name, df.start_time))
                 list_generator=generate_arrays_from_file(prediction_list, args['batch_size']) 
             
                 pbar_test = tqdm(total= int(np.ceil(len(prediction_list)/args['batch_size'])), ncols=100, file=sys.stdout)        
@@ -469,16 +556,17 @@ def predictor(input_dir=None,
                         pbar_test.update()
                         
                     new_list = next(list_generator)  
-                    prob_dic=_gen_predictor(new_list, args, model)
+                    prob_dic=_gen_predictor(new_list, args, model, windows)
             
                     pred_set={}
                     for ID in new_list:
-                        dataset = fl.get('data/'+str(ID))
+                        dataset = get_window(fl, ID, windows)
                         pred_set.update( {str(ID) : dataset})  
                         
-                    plt_n, detection_memory= _gen_writer(new_list, args, prob_dic, pred_set, HDF_PROB, predict_writer, save_figs, csvPr_gen, plt_n, detection_memory, keepPS, allowonlyS, spLimit)    
+                    plt_n, detection_memory= _gen_writer(new_list, args, prob_dic, pred_set, HDF_PROB, predict_writer, save_figs, csvPr_gen, plt_n, detection_memory, keepPS, allowonlyS, spLimit, station, start_times)    
         
                 HDF_PROB.close()
+                close_hdf5_files()
         
                 end_Predicting = time.time() 
                 delta = (end_Predicting - start_Predicting) 
@@ -511,6 +599,7 @@ def predictor(input_dir=None,
                     the_file.write('batch_size: '+str(args['batch_size'])+'\n')       
                     the_file.write('================== Other Parameters ========================='+'\n')            
                     the_file.write('normalization_mode: '+str(args['normalization_mode'])+'\n')
+                    the_file.write('graph_normalization: '+str(args['graph_normalization'])+'\n')
                     the_file.write('estimate uncertainty: '+str(args['estimate_uncertainty'])+'\n')
                     the_file.write('number of Monte Carlo sampling: '+str(args['number_of_sampling'])+'\n')             
                     the_file.write('detection_threshold: '+str(args['detection_threshold'])+'\n')            
@@ -523,9 +612,48 @@ def predictor(input_dir=None,
                     the_file.write('keepPS: '+str(args['keepPS'])+'\n')
                     the_file.write('allowonlyS: '+str(args['allowonlyS'])+'\n')
                     the_file.write('spLimit: '+str(args['spLimit'])+' seconds\n') 
+                    the_file.write('precision: '+str(args['precision'])+'\n')
+                    the_file.write('jit_compile: '+str(args['jit_compile'])+'\n')
+                    the_file.write('number_of_replicas: '+str(args['number_of_replicas'])+'\n')
+                    the_file.write('threads_per_replica: '+str(args['threads_per_replica'])+'\n')
+                    the_file.write('share_weights: '+str(args['share_weights'])+'\n')
+                    if args['number_of_replicas']:
+                        the_file.write('replica memory (MB): '+str([pool.memory_usage() for pool in models])+'\n')
+                    the_file.write('tuning_profile: '+str(tuned)+'\n')
+                    the_file.write('ensemble: '+str(args['ensemble'])+'\n')
+                    the_file.write('qc_policy: '+str(args['qc_policy'])+'\n')
+                    if args['qc_policy']:
+                        the_file.write('slices with mostly gaps or dead channels '+('skipped' if args['qc_policy'] == 'skip' else 'predicted last')+': '+str(n_dead)+'\n')
+                    
+    if args['number_of_replicas']:
+        model.close()
     
             
-def _gen_predictor(new_list, args, model): 
+def _qc_order(df, args):
+    
+    """ 
+    
+    Returns the trace names of a station.csv file in the order they are predicted with qc_policy, and the number 
+    of slices that are mostly gaps or dead channels. A file without QC columns (written by an older preprocessor) 
+    is predicted as a whole.
+    
+    """
+    
+    prediction_list = df.trace_name.tolist()
+    if not args['qc_policy']:
+        return prediction_list, 0
+    if not set(QC_COLUMNS) <= set(df.columns):
+        print(' *** '+str(args['input_csv'])+' has no QC columns, run the preprocessor again to use qc_policy.', flush=True)
+        return prediction_list, 0
+    dead = dead_windows(df, args['qc_max_gap'])
+    prediction_list = df.trace_name[~dead].tolist()
+    if args['qc_policy'] == 'last':
+        prediction_list += df.trace_name[dead].tolist()
+    return prediction_list, int(np.sum(dead))
+
+
+
+def _gen_predictor(new_list, args, model, windows=None): 
     
     
     """ 
@@ -542,6 +670,9 @@ def _gen_predictor(new_list, args, model):
     model: 
         The compiled model used for the prediction.
 
+    windows: dic, default=None
+        The window_index of the csv file, for continuous traces.
+
     Returns
     -------
     prob_dic: dic
@@ -554,7 +685,8 @@ def _gen_predictor(new_list, args, model):
                          'dim': args['input_dimention'][0],
                          'batch_size': len(new_list),
                          'n_channels': args['input_dimention'][-1],
-                         'norm_mode': args['normalization_mode']}     
+                         'norm_mode': None if args['graph_normalization'] else args['normalization_mode'],
+                         'windows': windows}     
             
     prediction_generator = DataGeneratorPrediction(new_list, **params_prediction)
     if args['estimate_uncertainty']:
@@ -572,28 +704,29 @@ def _gen_predictor(new_list, args, model):
             pred_PP.append(predP)               
             pred_SS.append(predS)
                             
-        pred_DD = np.array(pred_DD).reshape(args['number_of_sampling'], len(new_list), params_prediction['dim'])
+        pred_DD = np.array(pred_DD).reshape(args['number_of_sampling'], len(new_list), params_prediction['dim'], -1)
         pred_DD_mean = pred_DD.mean(axis=0)
         pred_DD_std = pred_DD.std(axis=0)  
                 
-        pred_PP = np.array(pred_PP).reshape(args['number_of_sampling'], len(new_list), params_prediction['dim'])
+        pred_PP = np.array(pred_PP).reshape(args['number_of_sampling'], len(new_list), params_prediction['dim'], -1)
         pred_PP_mean = pred_PP.mean(axis=0)
         pred_PP_std = pred_PP.std(axis=0)      
                     
-        pred_SS = np.array(pred_SS).reshape(args['number_of_sampling'], len(new_list), params_prediction['dim'])
+        pred_SS = np.array(pred_SS).reshape(args['number_of_sampling'], len(new_list), params_prediction['dim'], -1)
         pred_SS_mean = pred_SS.mean(axis=0)
         pred_SS_std = pred_SS.std(axis=0)                       
     else:          
         pred_DD_mean, pred_PP_mean, pred_SS_mean = model.predict_generator(generator = prediction_generator,
                                                                            use_multiprocessing = args['use_multiprocessing'],
                                                                            workers = args['number_of_cpus'])
-        pred_DD_mean = pred_DD_mean.reshape(pred_DD_mean.shape[0], pred_DD_mean.shape[1]) 
-        pred_PP_mean = pred_PP_mean.reshape(pred_PP_mean.shape[0], pred_PP_mean.shape[1]) 
-        pred_SS_mean = pred_SS_mean.reshape(pred_SS_mean.shape[0], pred_SS_mean.shape[1]) 
+        pred_DD_mean = pred_DD_mean.reshape(pred_DD_mean.shape[0], pred_DD_mean.shape[1], -1) 
+        pred_PP_mean = pred_PP_mean.reshape(pred_PP_mean.shape[0], pred_PP_mean.shape[1], -1) 
+        pred_SS_mean = pred_SS_mean.reshape(pred_SS_mean.shape[0], pred_SS_mean.shape[1], -1) 
                     
-        pred_DD_std = np.zeros((pred_DD_mean.shape))
-        pred_PP_std = np.zeros((pred_PP_mean.shape))
-        pred_SS_std = np.zeros((pred_SS_mean.shape))   
+        # read-only zeros that take no memory, the uncertainties are only used with estimate_uncertainty
+        pred_DD_std = np.broadcast_to(np.float32(0), pred_DD_mean.shape)
+        pred_PP_std = np.broadcast_to(np.float32(0), pred_PP_mean.shape)
+        pred_SS_std = np.broadcast_to(np.float32(0), pred_SS_mean.shape)
                 
     prob_dic['DD_mean']=pred_DD_mean   
     prob_dic['PP_mean']=pred_PP_mean   
@@ -606,7 +739,7 @@ def _gen_predictor(new_list, args, model):
      
       
     
-def _gen_writer(new_list, args, prob_dic, pred_set, HDF_PROB, predict_writer, save_figs, csvPr_gen, plt_n, detection_memory, keepPS, allowonlyS, spLimit):
+def _gen_writer(new_list, args, prob_dic, pred_set, HDF_PROB, predict_writer, save_figs, csvPr_gen, plt_n, detection_memory, keepPS, allowonlyS, spLimit, station, start_times):
     
     """ 
     
@@ -642,8 +775,8 @@ def _gen_writer(new_list, args, prob_dic, pred_set, HDF_PROB, predict_writer, sa
     plt_n: positive integer
         Keep the track of plotted figures.     
 
-    detection_memory: list
-        Keep the track of detected events.  
+    detection_memory: dic
+        Keep the track of detected events of each model.  
 
     keepPS: bool, default=False
         If True, detected events require both P and S picks to be written. If False, individual P or S (see allowonlyS) picks may be written.
@@ -653,87 +786,101 @@ def _gen_writer(new_list, args, prob_dic, pred_set, HDF_PROB, predict_writer, sa
         
     spLimit: int, default : 60
         S - P time in seconds. It will limit the results to those detections with events that have a specific S-P time limit.
+
+    station: dic
+        The station attributes of the hdf5 file, see station_attrs.
+
+    start_times: dic
+        The start times of the traces from the CSV file.
         
     Returns
     -------
     plt_n: positive integer
         Keep the track of plotted figures. 
         
-    detection_memory: list
-        Keep the track of detected events.  
+    detection_memory: dic
+        Keep the track of detected events of each model.  
         
         
     """    
     
+    n_models = prob_dic['DD_mean'].shape[2]
     for ts in range(prob_dic['DD_mean'].shape[0]): 
         evi =  new_list[ts] 
         dataset = pred_set[evi]  
         dat = np.array(dataset)
+        meta = dict(station, trace_name=evi, trace_start_time=start_times[evi])
 
 
         if args['output_probabilities']: 
             
-            probs = np.zeros((prob_dic['DD_mean'].shape[1], 3))
-            probs[:, 0] = prob_dic['DD_mean'][ts]
-            probs[:, 1] = prob_dic['PP_mean'][ts]
-            probs[:, 2] = prob_dic['SS_mean'][ts]
+            probs = np.stack([prob_dic['DD_mean'][ts], prob_dic['PP_mean'][ts], prob_dic['SS_mean'][ts]], axis=-1)
+            probs = probs.reshape(probs.shape[0], -1)
              
-            uncs = np.zeros((prob_dic['DD_mean'].shape[1], 3))
-            uncs[:, 0] = prob_dic['DD_std'][ts]
-            uncs[:, 1] = prob_dic['PP_std'][ts]
-            uncs[:, 2] = prob_dic['SS_std'][ts]
+            uncs = np.stack([prob_dic['DD_std'][ts], prob_dic['PP_std'][ts], prob_dic['SS_std'][ts]], axis=-1)
+            uncs = uncs.reshape(uncs.shape[0], -1)
             
             HDF_PROB.create_dataset('probabilities/'+str(evi), probs.shape, data=probs, dtype= np.float32) 
             HDF_PROB.create_dataset('uncertainties/'+str(evi), uncs.shape, data=uncs, dtype= np.float32) 
             HDF_PROB.flush()
-                               
-        matches, pick_errors, yh3 =  picker(args, prob_dic['DD_mean'][ts], prob_dic['PP_mean'][ts], prob_dic['SS_mean'][ts],
-                                            prob_dic['DD_std'][ts], prob_dic['PP_std'][ts], prob_dic['SS_std'][ts])
-
-        if not allowonlyS: #if NOT limiting to "only S" picks
-            if len(matches)>=1 and matches[list(matches)[0]][6] and not matches[list(matches)[0]][3]: #if S picks exist but no P...
-                continue
-        
-        if keepPS:
-            if (len(matches) >= 1) and (matches[list(matches)[0]][3] and matches[list(matches)[0]][6]):
-                if (matches[list(matches)[0]][6] - matches[list(matches)[0]][3]) < spLimit*100:
+            
+        for m in range(n_models):
+            if n_models > 1:
+                model_name = str(args['input_model'][m])
+                fig_name = str(evi)+'_model'+str(m)
+            else:
+                model_name = None
+                fig_name = evi
+            memory = detection_memory.setdefault(m, [])
+            yh1, yh2, yh3 = prob_dic['DD_mean'][ts][:, m], prob_dic['PP_mean'][ts][:, m], prob_dic['SS_mean'][ts][:, m]
+            yh1_std, yh2_std, yh3_std = prob_dic['DD_std'][ts][:, m], prob_dic['PP_std'][ts][:, m], prob_dic['SS_std'][ts][:, m]
+                                   
+            matches, pick_errors, yh3 =  picker(args, yh1, yh2, yh3, yh1_std, yh2_std, yh3_std)
+    
+            if not allowonlyS: #if NOT limiting to "only S" picks
+                if len(matches)>=1 and matches[list(matches)[0]][6] and not matches[list(matches)[0]][3]: #if S picks exist but no P...
+                    continue
+            
+            if keepPS:
+                if (len(matches) >= 1) and (matches[list(matches)[0]][3] and matches[list(matches)[0]][6]):
+                    if (matches[list(matches)[0]][6] - matches[list(matches)[0]][3]) < spLimit*100:
+                        snr = [_get_snr(dat, matches[list(matches)[0]][3], window = 100), _get_snr(dat, matches[list(matches)[0]][6], window = 100)] 
+                        pre_write = len(memory)
+                        memory=_output_writter_prediction(meta, predict_writer, csvPr_gen, matches, snr, memory, model_name)
+                        post_write = len(memory)
+                        if plt_n < args['number_of_plots'] and post_write > pre_write:
+                            _plotter_prediction(dat, fig_name, args, save_figs, 
+                                                  yh1, 
+                                                  yh2,
+                                                  yh3,
+                                                  yh1_std,
+                                                  yh2_std, 
+                                                  yh3_std,
+                                                  matches)
+                            plt_n += 1 ; 
+            else:
+                if (len(matches) >= 1) and ((matches[list(matches)[0]][3] or matches[list(matches)[0]][6])):
                     snr = [_get_snr(dat, matches[list(matches)[0]][3], window = 100), _get_snr(dat, matches[list(matches)[0]][6], window = 100)] 
-                    pre_write = len(detection_memory)
-                    detection_memory=_output_writter_prediction(dataset, predict_writer, csvPr_gen, matches, snr, detection_memory)
-                    post_write = len(detection_memory)
+                    pre_write = len(memory)
+                    memory=_output_writter_prediction(meta, predict_writer, csvPr_gen, matches, snr, memory, model_name)
+                    post_write = len(memory)
                     if plt_n < args['number_of_plots'] and post_write > pre_write:
-                        _plotter_prediction(dat, evi, args, save_figs, 
-                                              prob_dic['DD_mean'][ts], 
-                                              prob_dic['PP_mean'][ts],
-                                              prob_dic['SS_mean'][ts],
-                                              prob_dic['DD_std'][ts],
-                                              prob_dic['PP_std'][ts], 
-                                              prob_dic['SS_std'][ts],
+                        _plotter_prediction(dat, fig_name, args, save_figs, 
+                                              yh1, 
+                                              yh2,
+                                              yh3,
+                                              yh1_std,
+                                              yh2_std, 
+                                              yh3_std,
                                               matches)
                         plt_n += 1 ; 
-        else:
-            if (len(matches) >= 1) and ((matches[list(matches)[0]][3] or matches[list(matches)[0]][6])):
-                snr = [_get_snr(dat, matches[list(matches)[0]][3], window = 100), _get_snr(dat, matches[list(matches)[0]][6], window = 100)] 
-                pre_write = len(detection_memory)
-                detection_memory=_output_writter_prediction(dataset, predict_writer, csvPr_gen, matches, snr, detection_memory)
-                post_write = len(detection_memory)
-                if plt_n < args['number_of_plots'] and post_write > pre_write:
-                    _plotter_prediction(dat, evi, args, save_figs, 
-                                          prob_dic['DD_mean'][ts], 
-                                          prob_dic['PP_mean'][ts],
-                                          prob_dic['SS_mean'][ts],
-                                          prob_dic['DD_std'][ts],
-                                          prob_dic['PP_std'][ts], 
-                                          prob_dic['SS_std'][ts],
-                                          matches)
-                    plt_n += 1 ; 
            
                     
     return plt_n, detection_memory
 
 
 
-def _output_writter_prediction(dataset, predict_writer, csvPr, matches, snr, detection_memory):
+def _output_writter_prediction(meta, predict_writer, csvPr, matches, snr, detection_memory, model_name=None):
     
     """ 
     
@@ -741,8 +888,8 @@ def _output_writter_prediction(dataset, predict_writer, csvPr, matches, snr, det
 
     Parameters
     ----------
-    dataset: hdf5 obj
-        Dataset object of the trace.
+    meta: dic
+        The station attributes with the name and start time of the trace.
 
     predict_writer: obj
         For writing out the detection/picking results in the CSV file.
@@ -758,6 +905,9 @@ def _output_writter_prediction(dataset, predict_writer, csvPr, matches, snr, det
  
     detection_memory : list
         Keep the track of detected events.          
+
+    model_name : str, default=None
+        Written into the model column when the models of an ensemble are picked separately.
         
     Returns
     -------   
@@ -767,14 +917,14 @@ def _output_writter_prediction(dataset, predict_writer, csvPr, matches, snr, det
         
     """      
 
-    trace_name = dataset.attrs["trace_name"]
-    station_name = dataset.attrs["receiver_code"]
-    station_lat = dataset.attrs["receiver_latitude"]
-    station_lon = dataset.attrs["receiver_longitude"]
-    station_elv = dataset.attrs["receiver_elevation_m"]
-    start_time = dataset.attrs["trace_start_time"]
+    trace_name = meta["trace_name"]
+    station_name = meta["receiver_code"]
+    station_lat = meta["receiver_latitude"]
+    station_lon = meta["receiver_longitude"]
+    station_elv = meta["receiver_elevation_m"]
+    start_time = meta["trace_start_time"]
     station_name = "{:<4}".format(station_name)
-    network_name = dataset.attrs["network_code"]
+    network_name = meta["network_code"]
     network_name = "{:<2}".format(network_name)
     instrument_type = trace_name.split('_')[2]
     instrument_type = "{:<2}".format(instrument_type)  
@@ -833,26 +983,29 @@ def _output_writter_prediction(dataset, predict_writer, csvPr, matches, snr, det
             if s_prob:
                 s_prob = round(s_prob, 2)
                 
-            predict_writer.writerow([trace_name, 
-                                         network_name,
-                                         station_name, 
-                                         instrument_type,
-                                         station_lat, 
-                                         station_lon,
-                                         station_elv,
-                                         _date_convertor(ev_strt), 
-                                         _date_convertor(ev_end), 
-                                         det_prob, 
-                                         det_unc,                                
-                                         _date_convertor(p_time), 
-                                         p_prob,
-                                         p_unc,
-                                         snr[0],
-                                         _date_convertor(s_time), 
-                                         s_prob,
-                                         s_unc, 
-                                         snr[1]
-                                         ]) 
+            row = [trace_name, 
+                   network_name,
+                   station_name, 
+                   instrument_type,
+                   station_lat, 
+                   station_lon,
+                   station_elv,
+                   _date_convertor(ev_strt), 
+                   _date_convertor(ev_end), 
+                   det_prob, 
+                   det_unc,                                
+                   _date_convertor(p_time), 
+                   p_prob,
+                   p_unc,
+                   snr[0],
+                   _date_convertor(s_time), 
+                   s_prob,
+                   s_unc, 
+                   snr[1]
+                   ]
+            if model_name is not None:
+                row.append(model_name)
+            predict_writer.writerow(row) 
             
             csvPr.flush()
             detection_memory.append(ev_strt)
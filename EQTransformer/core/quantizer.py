@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 10:12:31 2026
+
+last update: 10/19/2026
+
+"""
+
+from __future__ import print_function
+from __future__ import division
+import os
+os.environ['KERAS_BACKEND']='tensorflow'
+import tensorflow as tf
+import numpy as np
+import pandas as pd
+import h5py
+import time
+import shutil
+import threading
+import datetime
+from tqdm import tqdm
+from .EqT_utils import DataGeneratorTest, picker, generate_arrays_from_file
+from .EqT_utils import load_inference_model, set_inference_precision, normalize
+from tensorflow.python.util import deprecation
+deprecation._PRINT_DEPRECATION_WARNINGS = False
+
+
+def quantizer(input_hdf5=None,
+              input_csv=None,
+              input_testset=None,
+              input_model=None,
+              output_name=None,
+              precision='int8_dynamic',
+              number_of_calibration=200,
+              number_of_tests=1000,
+              detection_threshold=0.3,
+              P_threshold=0.1,
+              S_threshold=0.1,
+              loss_weights=[0.05, 0.40, 0.55],
+              loss_types=['binary_crossentropy', 'binary_crossentropy', 'binary_crossentropy'],
+              input_dimention=(6000, 3),
+              normalization_mode='std',
+              batch_size=100):
+
+    """
+
+    Makes a reduced-precision version of a trained model for CPU inference and compares it against the float32 model.
+
+    Parameters
+    ----------
+    input_hdf5: str, default=None
+        Path to an hdf5 file containing only one class of "data" with NumPy arrays containing 3 component waveforms each 1 min long.
+        The calibration and test windows are read from this file.
+
+    input_csv: str, default=None
+        Path to a CSV file with one column (trace_name) listing the name of all datasets in the hdf5 file. Used for drawing the calibration set.
+
+    input_testset: npy, default=None
+        Path to a NumPy file (automaticaly generated by the trainer) containing a list of trace names held out for the accuracy report.
+        Traces in this list are never used for calibration. If None, no accuracy report is made.
+
+    input_model: str, default=None
+        Path to a trained model.
+
+    output_name: str, default=None
+        Output directory that will be generated.
+
+    precision: str, default='int8_dynamic'
+        'int8_dynamic': int8 weights with dynamic-range activations.
+        'int8_static': int8 weights and activations calibrated on windows from input_hdf5, falling back to float for unsupported ops.
+        'float16': float16 weights.
+        'bfloat16': the float32 model run with bfloat16 arithmetic on CPUs that support it. No new model file is written for this one; use precision='bfloat16' in the predictor, mseed_predictor, or tester.
+
+    number_of_calibration: int, default=200
+        Number of windows used for calibrating the int8_static model.
+
+    number_of_tests: int, default=1000
+        Maximum number of held-out windows used for the accuracy report.
+
+    detection_threshold : float, default=0.3
+        A value in which the detection probabilities above it will be considered as an event.
+
+    P_threshold: float, default=0.1
+        A value which the P probabilities above it will be considered as P arrival.
+
+    S_threshold: float, default=0.1
+        A value which the S probabilities above it will be considered as S arrival.
+
+    loss_weights: list, default=[0.05, 0.40, 0.55]
+        Loss weights for detection, P picking, and S picking respectively.
+
+    loss_types: list, default=['binary_crossentropy', 'binary_crossentropy', 'binary_crossentropy']
+        Loss types for detection, P picking, and S picking respectively.
+
+    input_dimention: tuple, default=(6000, 3)
+        Dimension of input traces.
+
+    normalization_mode: str, default='std'
+        Mode of normalization for data preprocessing, 'max', maximum amplitude among three components, 'std', standard deviation.
+
+    batch_size: int, default=100
+        Batch size used for the accuracy and throughput comparison.
+
+    Returns
+    --------
+    ./output_name/output_name.tflite: The reduced-precision model. It can be passed as input_model to the predictor, mseed_predictor, and tester.
+
+    ./output_name/X_report.txt: Detection F1-scores, P and S pick residuals, throughput, and memory of the float32 and the reduced-precision model.
+
+
+    Notes
+    --------
+    The model uses Monte Carlo dropout, so two float32 runs are not identical either. Compare the F1-scores and residual
+    statistics rather than single probabilities.
+
+    """
+
+    args = {
+    "input_hdf5": input_hdf5,
+    "input_csv": input_csv,
+    "input_testset": input_testset,
+    "input_model": input_model,
+    "output_name": output_name,
+    "precision": precision,
+    "number_of_calibration": number_of_calibration,
+    "number_of_tests": number_of_tests,
+    "detection_threshold": detection_threshold,
+    "P_threshold": P_threshold,
+    "S_threshold": S_threshold,
+    "estimate_uncertainty": False,
+    "loss_weights": loss_weights,
+    "loss_types": loss_types,
+    "input_dimention": input_dimention,
+    "normalization_mode": normalization_mode,
+    "batch_size": batch_size
+    }
+
+    if args['precision'] not in ['int8_dynamic', 'int8_static', 'float16', 'bfloat16']:
+        print("Please set the precision to 'int8_dynamic', 'int8_static', 'float16', or 'bfloat16'!", flush=True)
+        return
+
+    save_dir = os.path.join(os.getcwd(), str(args['output_name'])+'_outputs')
+    if os.path.isdir(save_dir):
+        shutil.rmtree(save_dir)
+    os.makedirs(save_dir)
+
+    if args['input_testset']:
+        test = list(np.load(args['input_testset']))[:args['number_of_tests']]
+    else:
+        test = []
+
+    print('Loading the model ...', flush=True)
+    model = load_inference_model(args['input_model'], args['loss_types'], args['loss_weights'])
+
+    out_model = None
+    if args['precision'] != 'bfloat16':
+        calibration = None
+        if args['precision'] == 'int8_static':
+            df = pd.read_csv(args['input_csv'])
+            test_set = set(test)
+            ev_list = [ev for ev in df.trace_name.tolist() if ev not in test_set]
+            np.random.shuffle(ev_list)
+            calibration = ev_list[:args['number_of_calibration']]
+
+        print(f"Converting the model to {args['precision']} ...", flush=True)
+        out_model = os.path.join(save_dir, str(args['output_name'])+'.tflite')
+        with open(out_model, 'wb') as f:
+            f.write(_convert(args, model, calibration))
+
+    if len(test) > 0:
+        print('Comparing against the float32 model ...', flush=True)
+        reference = _evaluate(args, model, test)
+
+        if args['precision'] == 'bfloat16':
+            reduced_model = load_inference_model(args['input_model'], args['loss_types'], args['loss_weights'], 'bfloat16')
+        else:
+            reduced_model = load_inference_model(out_model, args['loss_types'], args['loss_weights'])
+        reduced = _evaluate(args, reduced_model, test, reference)
+        set_inference_precision(None)
+
+        reference['model_size_mb'] = os.path.getsize(args['input_model'])/1e6
+        if out_model:
+            reduced['model_size_mb'] = os.path.getsize(out_model)/1e6
+        else:
+            reduced['model_size_mb'] = reference['model_size_mb']
+
+    with open(os.path.join(save_dir,'X_report.txt'), 'a') as the_file:
+        the_file.write('================== Overal Info =============================='+'\n')
+        the_file.write('date of report: '+str(datetime.datetime.now())+'\n')
+        the_file.write('input_hdf5: '+str(args['input_hdf5'])+'\n')
+        the_file.write('input_csv: '+str(args['input_csv'])+'\n')
+        the_file.write('input_testset: '+str(args['input_testset'])+'\n')
+        the_file.write('input_model: '+str(args['input_model'])+'\n')
+        the_file.write('output_model: '+str(out_model)+'\n')
+        the_file.write('================== Quantization Parameters ======================='+'\n')
+        the_file.write('precision: '+str(args['precision'])+'\n')
+        the_file.write('number_of_calibration: '+str(args['number_of_calibration'])+'\n')
+        the_file.write('number of tests: '+str(len(test))+'\n')
+        the_file.write('batch_size: '+str(args['batch_size'])+'\n')
+        the_file.write('normalization_mode: '+str(args['normalization_mode'])+'\n')
+        the_file.write('detection_threshold: '+str(args['detection_threshold'])+'\n')
+        the_file.write('P_threshold: '+str(args['P_threshold'])+'\n')
+        the_file.write('S_threshold: '+str(args['S_threshold'])+'\n')
+        if len(test) > 0:
+            for name, res in [('float32', reference), (args['precision'], reduced)]:
+                the_file.write('================== '+name+' ========================='+'\n')
+                the_file.write('model size: '+str(round(res['model_size_mb'], 2))+' MB\n')
+                the_file.write('memory increase (peak RSS during the run above the RSS at its start): '+str(res['memory_increase_mb'])+' MB\n')
+                the_file.write('throughput: '+str(round(res['throughput'], 2))+' windows per second\n')
+                the_file.write('detection precision: '+str(round(res['precision'], 4))+'\n')
+                the_file.write('detection recall: '+str(round(res['recall'], 4))+'\n')
+                the_file.write('detection F1: '+str(round(res['f1'], 4))+'\n')
+                the_file.write('P residuals (s): mean '+str(res['P_mean'])+', std '+str(res['P_std'])+', MAE '+str(res['P_mae'])+', n '+str(res['P_n'])+'\n')
+                the_file.write('S residuals (s): mean '+str(res['S_mean'])+', std '+str(res['S_std'])+', MAE '+str(res['S_mae'])+', n '+str(res['S_n'])+'\n')
+                if 'prob_diff' in res:
+                    the_file.write('mean absolute difference from float32 probabilities (D, P, S): '+str(res['prob_diff'])+'\n')
+                    the_file.write('detection agreement with float32: '+str(round(res['agreement'], 4))+'\n')
+                    the_file.write('speedup over float32: '+str(round(res['throughput']/reference['throughput'], 2))+'\n')
+
+    print('Wrote the results into: " ' + str(save_dir)+' "', flush=True)
+
+
+
+def _convert(args, model, calibration=None):
+
+    """
+
+    Converts the Keras model into a reduced-precision TensorFlow Lite model. With the 'float32' precision the weights are kept as they are.
+
+    Parameters
+    ----------
+    args: dic
+        A dictionary containing all of the input parameters.
+
+    model:
+        The float32 Keras model.
+
+    calibration: {list of str, None}, default=None
+        Trace names used as the representative dataset for the int8_static conversion.
+
+    Returns
+    -------
+    tflite_model: bytes
+        The converted model.
+
+    """
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if args['precision'] != 'float32':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    # the LSTM layers need a few TensorFlow ops that have no TensorFlow Lite kernel
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS, tf.lite.OpsSet.SELECT_TF_OPS]
+
+    if args['precision'] == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+
+    elif args['precision'] == 'int8_static':
+        def representative_dataset():
+            fl = h5py.File(args['input_hdf5'], 'r')
+            for ID in tqdm(calibration):
+                data = np.array(fl.get('data/'+str(ID)), dtype=np.float32)
+                data = normalize(data, args['normalization_mode'])
+                yield [data[np.newaxis, ...]]
+            fl.close()
+        converter.representative_dataset = representative_dataset
+
+    return converter.convert()
+
+
+
+def _evaluate(args, model, test, reference=None):
+
+    """
+
+    Runs a model over the held-out set and measures its detection and picking performance and speed.
+
+    Parameters
+    ----------
+    args: dic
+        A dictionary containing all of the input parameters.
+
+    model:
+        A Keras or TFLiteModel model.
+
+    test: list of str
+        Trace names of the held-out set.
+
+    reference: {dic, None}, default=None
+        Results of the float32 model. If given, the probabilities are compared against it.
+
+    Returns
+    -------
+    results: dic
+        Detection scores, pick residuals in seconds, throughput in windows per second, and the increase of the 
+        resident memory during the run.
+
+    """
+    
+    monitor = _MemoryMonitor()
+    monitor.start()
+
+    fl = h5py.File(args['input_hdf5'], 'r')
+    params_test = {'file_name': str(args['input_hdf5']),
+                   'dim': args['input_dimention'][0],
+                   'n_channels': args['input_dimention'][-1],
+                   'norm_mode': args['normalization_mode']}
+
+    TP = FP = FN = 0
+    P_res, S_res, detected, probs = [], [], [], []
+    prob_diff = np.zeros(3)
+    pred_time = 0
+    list_generator = generate_arrays_from_file(test, args['batch_size'])
+    for bn in tqdm(range(int(np.ceil(len(test) / args['batch_size'])))):
+        new_list = next(list_generator)
+        test_generator = DataGeneratorTest(new_list, batch_size=len(new_list), **params_test)
+        X = test_generator[0]['input'].astype('float32')
+        if bn == 0:
+            # warm-up, so tracing and graph optimization are not counted as prediction time
+            model.predict(X)
+
+        start = time.time()
+        predD, predP, predS = model.predict(X)
+        pred_time += time.time() - start
+        predD, predP, predS = predD[..., 0], predP[..., 0], predS[..., 0]
+
+        if reference:
+            refD, refP, refS = reference['probs'][bn]
+            prob_diff += [np.abs(predD-refD).sum(), np.abs(predP-refP).sum(), np.abs(predS-refS).sum()]
+        else:
+            probs.append((predD, predP, predS))
+
+        for ts, ID in enumerate(new_list):
+            dataset = fl.get('data/'+str(ID))
+            earthquake = dataset.attrs['trace_category'] == 'earthquake_local'
+            matches, _, _ = picker(args, predD[ts], predP[ts], predS[ts], None, None, None)
+            detected.append(len(matches) > 0)
+
+            if earthquake and len(matches) > 0:
+                TP += 1
+                first = matches[list(matches)[0]]
+                if first[3]:
+                    P_res.append((int(dataset.attrs['p_arrival_sample']) - first[3])/100)
+                if first[6]:
+                    S_res.append((int(dataset.attrs['s_arrival_sample']) - first[6])/100)
+            elif earthquake:
+                FN += 1
+            elif len(matches) > 0:
+                FP += 1
+    fl.close()
+
+    results = {}
+    results['throughput'] = len(test) / pred_time
+    results['precision'] = TP / (TP + FP) if TP + FP else 0
+    results['recall'] = TP / (TP + FN) if TP + FN else 0
+    results['f1'] = 2*results['precision']*results['recall']/(results['precision']+results['recall']) if TP else 0
+    for phase, res in [('P', P_res), ('S', S_res)]:
+        res = np.array(res)
+        results[phase+'_n'] = len(res)
+        results[phase+'_mean'] = round(float(res.mean()), 3) if len(res) else None
+        results[phase+'_std'] = round(float(res.std()), 3) if len(res) else None
+        results[phase+'_mae'] = round(float(np.abs(res).mean()), 3) if len(res) else None
+
+    results['memory_increase_mb'] = monitor.stop()
+
+    results['detected'] = detected
+    if reference:
+        results['prob_diff'] = list(np.round(prob_diff / (len(test)*args['input_dimention'][0]), 5))
+        results['agreement'] = np.mean(np.array(detected) == np.array(reference['detected']))
+    else:
+        results['probs'] = probs
+    return results
+
+
+
+def _current_rss():
+    ' resident memory of this process in bytes, None where /proc is not available '
+
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+
+class _MemoryMonitor():
+
+    """
+
+    Samples the resident memory of the process in a thread during a run. ru_maxrss is the peak of the whole process 
+    so far, so a model evaluated after another could never show a lower peak; the increase above the memory at the 
+    start of the run is comparable between the runs.
+
+    Parameters
+    ----------
+    interval: float, default=0.01
+        Seconds between two samples.
+
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def start(self):
+        self.base = self.peak = _current_rss()
+        if self.base is not None:
+            self.thread = threading.Thread(target=self._sample, daemon=True)
+            self.thread.start()
+
+    def _sample(self):
+        while not self.stopped.wait(self.interval):
+            self._update()
+
+    def _update(self):
+        # a failed read of /proc is skipped rather than ending the sampling
+        rss = _current_rss()
+        if rss is not None:
+            self.peak = max(self.peak, rss)
+
+    def stop(self):
+        ' the peak increase in MB, None if it cannot be measured '
+
+        if self.base is None:
+            return None
+        self.stopped.set()
+        self.thread.join()
+        self._update()
+        return round((self.peak - self.base)/1e6, 1)
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 14:05:12 2026
+
+last update: 10/19/2026
+
+"""
+
+from __future__ import print_function
+from __future__ import division
+import os
+import queue
+import tempfile
+import traceback
+import numpy as np
+import multiprocessing as mp
+
+
+
+def _physical_cores():
+    ' Returns the usable logical CPUs grouped by physical core and ordered by socket and core id. '
+
+    if hasattr(os, 'sched_getaffinity'):
+        allowed = sorted(os.sched_getaffinity(0))
+    else:
+        allowed = list(range(os.cpu_count() or 1))
+
+    cores = {}
+    for cpu in allowed:
+        topo = '/sys/devices/system/cpu/cpu'+str(cpu)+'/topology/'
+        try:
+            with open(topo+'physical_package_id') as f:
+                package = int(f.read())
+            with open(topo+'core_id') as f:
+                core = int(f.read())
+        except (IOError, ValueError):
+            package, core = 0, cpu
+        cores.setdefault((package, core), []).append(cpu)
+    return [cores[k] for k in sorted(cores)]
+
+
+
+def replica_layout(number_of_replicas='auto', threads_per_replica=None):
+
+    """
+
+    Splits the CPUs of the machine into core sets for model replicas. Each replica is pinned to one logical CPU
+    per physical core, so hyper-threading siblings are not shared between replicas.
+
+    Parameters
+    ----------
+    number_of_replicas: {int, 'auto'}, default='auto'
+        Number of replicas. With 'auto' it is the number of physical cores divided by threads_per_replica.
+
+    threads_per_replica: int, default=None
+        Number of physical cores (and intra-op threads) of each replica. With None it is 4 in the 'auto' mode
+        (fewer on small machines) and all cores divided by number_of_replicas otherwise.
+
+    Returns
+    -------
+    layout: list of lists
+        The CPU ids of each replica.
+
+    """
+
+    cores = _physical_cores()
+    if number_of_replicas == 'auto':
+        if not threads_per_replica:
+            threads_per_replica = min(4, max(1, len(cores) // 2))
+        number_of_replicas = max(1, len(cores) // threads_per_replica)
+    else:
+        number_of_replicas = int(number_of_replicas)
+        if not threads_per_replica:
+            threads_per_replica = max(1, len(cores) // number_of_replicas)
+
+    layout = []
+    for r in range(number_of_replicas):
+        group = [cores[(r*threads_per_replica + i) % len(cores)][0] for i in range(threads_per_replica)]
+        layout.append(sorted(set(group)))
+    return layout
+
+
+
+def _replica_worker(rank, cpus, model_args, task_queue, result_queue):
+    ' Pins the process, sets the TensorFlow threads, loads the model and predicts the batches of the shared queue. '
+
+    try:
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, cpus)
+        if 'model' in model_args:
+            # forked after the warm-up: the interpreter and the TensorFlow runtime are inherited copy-on-write
+            model = model_args['model']
+            result_queue.put(('ready', rank, model_args['input_shape']))
+            return _serve(model, task_queue, result_queue, rank)
+        os.environ['OMP_NUM_THREADS'] = str(len(cpus))
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(len(cpus))
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+        from .EqT_utils import load_inference_model, long_input_model, normalized_model, TFLiteModel
+
+        if str(model_args['input_model']).endswith('.tflite'):
+            model = TFLiteModel(model_args['input_model'], number_of_threads=len(cpus))
+            input_shape = None
+        else:
+            model = load_inference_model(model_args['input_model'],
+                                         model_args['loss_types'],
+                                         model_args['loss_weights'],
+                                         model_args['precision'])
+            if model_args['long_input']:
+                model = long_input_model(model, model_args['long_input'])
+            if model_args['norm_mode']:
+                model = normalized_model(model, model_args['norm_mode'])
+            input_shape = tuple(model.input_shape)
+        result_queue.put(('ready', rank, input_shape))
+    except Exception:
+        result_queue.put(('error', rank, traceback.format_exc()))
+        return
+    _serve(model, task_queue, result_queue, rank)
+
+
+
+def _serve(model, task_queue, result_queue, rank):
+    ' Predicts the batches of the shared queue until it gets None. The replies carry the call the batch belongs to. '
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        call, idx, X = task
+        try:
+            pred = model.predict(X, batch_size=len(X), verbose=0)
+            result_queue.put(('result', (call, idx), [np.asarray(p) for p in pred]))
+        except Exception:
+            result_queue.put(('error', (call, rank), traceback.format_exc()))
+
+
+
+def _shared_model(model_args):
+    ' Loads a single-threaded TensorFlow Lite interpreter, whose weights are a read-only memory map of the model file, and warms it up. '
+
+    from .EqT_utils import load_inference_model, long_input_model, normalized_model, TFLiteModel
+    if str(model_args['input_model']).endswith('.tflite'):
+        model = TFLiteModel(model_args['input_model'], number_of_threads=1)
+        input_shape = None
+        warm_up = np.zeros((1, 6000, 3), dtype=np.float32)
+    else:
+        from .quantizer import _convert
+        keras_model = load_inference_model(model_args['input_model'],
+                                           model_args['loss_types'],
+                                           model_args['loss_weights'])
+        if model_args['long_input']:
+            keras_model = long_input_model(keras_model, model_args['long_input'])
+        if model_args['norm_mode']:
+            keras_model = normalized_model(keras_model, model_args['norm_mode'])
+        input_shape = tuple(keras_model.input_shape)
+        fd, path = tempfile.mkstemp(suffix='.tflite')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_convert({'precision': 'float32'}, keras_model))
+        model = TFLiteModel(path, number_of_threads=1)
+        # the interpreter keeps its map of the file, so it can be unlinked right away
+        os.remove(path)
+        warm_up = np.zeros((1,)+input_shape[1:], dtype=np.float32)
+    model.predict(warm_up)
+    return model, input_shape
+
+
+
+def _memory_mb(pid):
+    ' Reads the resident, proportional and private memory of a process in MB from /proc. '
+
+    usage = {}
+    try:
+        with open('/proc/'+str(pid)+'/smaps_rollup') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) == 3 and fields[2] == 'kB':
+                    usage[fields[0][:-1]] = int(fields[1]) / 1024
+    except (IOError, OSError):
+        return None
+    return {'rss': round(usage['Rss'], 1),
+            'pss': round(usage['Pss'], 1),
+            'private': round(usage['Private_Clean'] + usage['Private_Dirty'], 1)}
+
+
+
+class ReplicaPool():
+
+    """
+
+    Runs copies of a model in separate processes, each pinned to its own core set with its own thread settings.
+    Batches are put on a shared queue that the replicas pull from and the outputs are merged back in order.
+    It has the predict and predict_generator methods of a Keras model so it can replace one in the predictors.
+
+    Parameters
+    ----------
+    input_model: str
+        Path to a trained model (.h5 or .tflite).
+
+    loss_types: list
+        Loss types for detection P picking and S picking respectively.
+
+    loss_weights: list
+        Loss weights for detection P picking and S picking respectively.
+
+    precision: str, default=None
+        Precision passed to load_inference_model in each replica.
+
+    number_of_replicas: {int, 'auto'}, default='auto'
+        Number of replicas, see replica_layout.
+
+    threads_per_replica: int, default=None
+        Number of cores and intra-op threads of each replica, see replica_layout.
+
+    long_input: int, default=None
+        If set, each replica builds its model for long_input x 6000-sample inputs.
+
+    norm_mode: str, default=None
+        If set, each replica prepends a NormalizationLayer with this mode to its model (see normalized_model), so 
+        the batches can be raw waveforms. Not available for .tflite models.
+
+    share_weights: bool, default=False
+        If True, the model is loaded and warmed up once in this process as a single-threaded float32 TensorFlow Lite
+        interpreter (a .tflite input_model is used as it is) and the replicas are forked from it. They share its
+        read-only weights and the TensorFlow runtime pages instead of each loading their own copy, and each
+        replica runs on one core. precision and threads_per_replica are ignored. Only on platforms with fork.
+
+    Note
+    --------
+    Without share_weights the replicas are started with the spawn method, so scripts using it on Windows or macOS should be guarded by if __name__ == '__main__'.
+    memory_usage reports what each replica adds: with share_weights the private memory of a replica is mostly its activations.
+
+    """
+
+    def __init__(self,
+                 input_model,
+                 loss_types,
+                 loss_weights,
+                 precision=None,
+                 number_of_replicas='auto',
+                 threads_per_replica=None,
+                 long_input=None,
+                 share_weights=False,
+                 norm_mode=None):
+
+        model_args = {'input_model': input_model,
+                      'loss_types': loss_types,
+                      'loss_weights': loss_weights,
+                      'precision': precision,
+                      'long_input': long_input,
+                      'norm_mode': norm_mode}
+        if norm_mode and str(input_model).endswith('.tflite'):
+            raise ValueError('in-graph normalization needs a Keras model, not a .tflite model.')
+        if share_weights:
+            if 'fork' not in mp.get_all_start_methods():
+                raise ValueError('share_weights needs the fork start method, which is not available on this platform.')
+            # TensorFlow thread pools do not survive a fork, so each shared replica runs single-threaded
+            self.layout = replica_layout(number_of_replicas, 1)
+            model_args['model'], model_args['input_shape'] = _shared_model(model_args)
+            ctx = mp.get_context('fork')
+        else:
+            self.layout = replica_layout(number_of_replicas, threads_per_replica)
+            ctx = mp.get_context('spawn')
+        self.task_queue = ctx.Queue()
+        self.result_queue = ctx.Queue()
+        self.workers = []
+        for rank, cpus in enumerate(self.layout):
+            p = ctx.Process(target=_replica_worker, args=(rank, cpus, model_args, self.task_queue, self.result_queue))
+            p.daemon = True
+            p.start()
+            self.workers.append(p)
+
+        # numbers the predict calls, so the results of a call that failed midway are not taken by the next one
+        self.call = 0
+        self.input_shape = None
+        for _ in self.workers:
+            try:
+                status, rank, value = self._get()
+            except RuntimeError:
+                self.close()
+                raise
+            if status == 'error':
+                self.close()
+                raise RuntimeError('replica '+str(rank)+' failed to start:\n'+value)
+            self.input_shape = value
+
+    def predict(self, X, batch_size=None, **kwargs):
+        if not batch_size:
+            batch_size = max(1, int(np.ceil(len(X) / len(self.workers))))
+        return self._run(X[i:i+batch_size] for i in range(0, len(X), batch_size))
+
+    def predict_generator(self, generator, **kwargs):
+        def _chunks():
+            for bn in range(len(generator)):
+                X = generator[bn]['input']
+                if len(X) == 0:
+                    continue
+                for chunk in np.array_split(X, min(len(self.workers), len(X))):
+                    yield chunk
+        return self._run(_chunks())
+
+    def _run(self, chunks):
+        self.call += 1
+        results = {}
+        sent = 0
+        for chunk in chunks:
+            self.task_queue.put((self.call, sent, chunk))
+            sent += 1
+            while sent - len(results) >= 2*len(self.workers):
+                self._receive(results)
+        while len(results) < sent:
+            self._receive(results)
+        if not sent:
+            raise ValueError('there are no windows to predict.')
+        outputs = [results[i] for i in range(sent)]
+        return [np.concatenate([o[k] for o in outputs]) for k in range(len(outputs[0]))]
+
+    def _get(self):
+        while True:
+            try:
+                return self.result_queue.get(timeout=5)
+            except queue.Empty:
+                dead = [rank for rank, p in enumerate(self.workers) if not p.is_alive()]
+                if dead:
+                    raise RuntimeError('replica '+str(dead[0])+' exited with code '+str(self.workers[dead[0]].exitcode)+'.')
+
+    def _receive(self, results):
+        status, (call, idx), value = self._get()
+        if call != self.call:
+            return
+        if status == 'error':
+            raise RuntimeError('replica '+str(idx)+' failed:\n'+value)
+        results[idx] = value
+
+    def memory_usage(self):
+
+        """
+
+        Measures the memory of each replica.
+
+        Returns
+        -------
+        usage: list of dicts
+            The resident (rss), proportional (pss), and private memory of each replica in MB, or None where /proc
+            is not available. pss splits the shared pages between the processes using them, and private is what
+            the replica alone holds.
+
+        """
+
+        return [_memory_mb(p.pid) for p in self.workers]
+
+    def close(self):
+        for p in self.workers:
+            if p.is_alive():
+                self.task_queue.put(None)
+        for p in self.workers:
+            p.join(timeout=10)
+            if p.is_alive():
+                p.terminate()
+        self.workers = []
@@ -19,13 +19,18 @@ import matplotlib
 matplotlib.use('agg')
 import matplotlib.pyplot as plt
 import numpy as np
+import pandas as pd
 import csv
 import h5py
 import time
 import shutil
 from .EqT_utils import f1, SeqSelfAttention, FeedForward, LayerNormalization
 from .EqT_utils import generate_arrays_from_file, picker
-from .EqT_utils import DataGeneratorTest, PreLoadGeneratorTest
+from .EqT_utils import DataGeneratorTest, PreLoadGeneratorTest, load_inference_model, set_inference_threads, XLAModel
+from .EqT_utils import cached_hdf5, close_hdf5_files
+from .autotune import apply_tuning_profile
+from ..utils.preprocessing import window_qc, dead_windows
+from ..utils.packed_hdf5 import PACKED_DATA
 np.warnings.filterwarnings('ignore')
 import datetime
 from tqdm import tqdm
@@ -48,9 +53,14 @@ def tester(input_hdf5=None,
            input_dimention=(6000, 3),
            normalization_mode='std',
            mode='generator',
-           batch_size=500,
+           batch_size=None,
            gpuid=None,
-           gpu_limit=None):
+           gpu_limit=None,
+           precision=None,
+           tuning_profile='default',
+           jit_compile=False,
+           qc_policy=None,
+           qc_max_gap=0.9):
 
     """
     
@@ -61,12 +71,13 @@ def tester(input_hdf5=None,
     ----------
     input_hdf5: str, default=None
         Path to an hdf5 file containing only one class of "data" with NumPy arrays containing 3 component waveforms each 1 min long.
+        The packed files of pack_hdf5 are not supported, since they do not keep the attributes reported in the results.
 
     input_testset: npy, default=None
         Path to a NumPy file (automaticaly generated by the trainer) containing a list of trace names.        
 
     input_model: str, default=None
-        Path to a trained model.
+        Path to a trained model, or the address of a running inference server ('http://127.0.0.1:8765' or 'unix:///path/to/socket').
         
     output_dir: str, default=None
         Output directory that will be generated. 
@@ -107,14 +118,29 @@ def tester(input_hdf5=None,
     mode: str, default='generator'
         Mode of running. 'pre_load_generator' or 'generator'.
                       
-    batch_size: int, default=500 
-        Batch size. This wont affect the speed much but can affect the performance. A value beteen 200 to 1000 is recommanded.
+    batch_size: int, default=None
+        Batch size. If None it is taken from the tuning profile, else 500. Depending on the hardware it can change the speed several times, see eqt-autotune. It can also affect the performance. A value beteen 200 to 1000 is recommanded.
 
     gpuid: int, default=None
         Id of GPU used for the prediction. If using CPU set to None.
          
     gpu_limit: int, default=None
         Set the maximum percentage of memory usage for the GPU.
+
+    precision: str, default=None
+        None or 'float32' for full precision, 'bfloat16' for running the model in bfloat16 on CPUs that support it. int8 and float16 models made by the quantizer (.tflite) can be passed directly as input_model.
+
+    tuning_profile: str, default='default'
+        JSON profile written by eqt-autotune. Its batch size fills batch_size if it is None, and its TensorFlow threads are used. It is skipped with a warning if it was tuned for another model or precision. 'default' reads ~/.eqtransformer/autotune.json (or $EQT_TUNING_PROFILE) if it exists, None disables it. 
+
+    jit_compile: bool, default=False
+        If True, the Keras model is run through one XLA-compiled function with a fixed batch shape (see XLAModel). The compilation is done once, before the first batch, and can take a few minutes; it is reused for the rest of the run. 
+
+    qc_policy: str, default=None
+        What to do with the traces that are mostly gaps or dead channels, i.e. in which every channel has at least qc_max_gap samples that are zero or at most 1e-7 of the peak of the trace (see window_qc and dead_windows). The QC is computed on each batch as it is read. 'skip' does not test them, 'last' tests them after all of the other traces, None tests all of the traces in their order. Their number is written into the report. 
+
+    qc_max_gap: float, default=0.9
+        Fraction of gap or dead samples above which a channel counts as dead for qc_policy. 
         
       
     Returns
@@ -152,8 +178,19 @@ def tester(input_hdf5=None,
     "mode": mode,
     "batch_size": batch_size,
     "gpuid": gpuid,
-    "gpu_limit": gpu_limit
+    "gpu_limit": gpu_limit,
+    "precision": precision,
+    "jit_compile": jit_compile,
+    "tuning_profile": tuning_profile,
+    "qc_policy": qc_policy,
+    "qc_max_gap": qc_max_gap
     }  
+    
+    tuned = apply_tuning_profile(args, args['tuning_profile'], {'batch_size': 500})
+    assert args['qc_policy'] in [None, 'skip', 'last'], "qc_policy should be None, 'skip', or 'last'"
+    with h5py.File(args['input_hdf5'], 'r') as fl:
+        if PACKED_DATA in fl:
+            raise ValueError(str(args['input_hdf5'])+' is a packed file of pack_hdf5, which does not keep the attributes tester reports. Use the hdf5 file with one dataset per trace.')
 
     
     if args['gpuid']:           
@@ -174,16 +211,12 @@ def tester(input_hdf5=None,
     test = np.load(args['input_testset'])
     
     print('Loading the model ...', flush=True)        
-    model = load_model(args['input_model'], custom_objects={'SeqSelfAttention': SeqSelfAttention, 
-                                                         'FeedForward': FeedForward,
-                                                         'LayerNormalization': LayerNormalization, 
-                                                         'f1': f1                                                                            
-                                                         })
-                
-    model.compile(loss = args['loss_types'],
-                  loss_weights =  args['loss_weights'],           
-                  optimizer = Adam(lr = 0.001),
-                  metrics = [f1])
+    if tuned:
+        set_inference_threads(tuned['intra_op_threads'], tuned['inter_op_threads'])
+    model = load_inference_model(args['input_model'], args['loss_types'], args['loss_weights'], args['precision'])
+    if args['jit_compile']:
+        print('Compiling the model with XLA ...', flush=True)
+        model = XLAModel(model, args['batch_size'])
     
     print('Loading is complete!', flush=True)  
     print('Testing ...', flush=True)    
@@ -226,12 +259,11 @@ def tester(input_hdf5=None,
     csvTst.flush()        
         
     plt_n = 0
-    list_generator = generate_arrays_from_file(test, args['batch_size']) 
+    dead_list = []
     
     pbar_test = tqdm(total= int(np.ceil(len(test)/args['batch_size'])))            
-    for _ in range(int(np.ceil(len(test) / args['batch_size']))):
+    for new_list in _qc_batches(args, test, dead_list):
         pbar_test.update()
-        new_list = next(list_generator)
 
         if args['mode'].lower() == 'pre_load_generator':                
             params_test = {'dim': args['input_dimention'][0],
@@ -239,7 +271,7 @@ def tester(input_hdf5=None,
                            'n_channels': args['input_dimention'][-1],
                            'norm_mode': args['normalization_mode']}  
             test_set={}
-            fl = h5py.File(args['input_hdf5'], 'r')
+            fl = cached_hdf5(args['input_hdf5'])
             for ID in new_list:
                 if ID.split('_')[-1] == 'EV':
                     dataset = fl.get('data/'+str(ID))
@@ -277,9 +309,10 @@ def tester(input_hdf5=None,
                 pred_PP_mean = pred_PP_mean.reshape(pred_PP_mean.shape[0], pred_PP_mean.shape[1]) 
                 pred_SS_mean = pred_SS_mean.reshape(pred_SS_mean.shape[0], pred_SS_mean.shape[1]) 
                 
-                pred_DD_std = np.zeros((pred_DD_mean.shape))
-                pred_PP_std = np.zeros((pred_PP_mean.shape))
-                pred_SS_std = np.zeros((pred_SS_mean.shape))  
+                # read-only zeros that take no memory, the uncertainties are only used with estimate_uncertainty
+                pred_DD_std = np.broadcast_to(np.float32(0), pred_DD_mean.shape)
+                pred_PP_std = np.broadcast_to(np.float32(0), pred_PP_mean.shape)
+                pred_SS_std = np.broadcast_to(np.float32(0), pred_SS_mean.shape)
                 
             for ts in range(pred_DD_mean.shape[0]): 
                 evi =  new_list[ts] 
@@ -355,12 +388,13 @@ def tester(input_hdf5=None,
                 pred_PP_mean = pred_PP_mean.reshape(pred_PP_mean.shape[0], pred_PP_mean.shape[1]) 
                 pred_SS_mean = pred_SS_mean.reshape(pred_SS_mean.shape[0], pred_SS_mean.shape[1]) 
                 
-                pred_DD_std = np.zeros((pred_DD_mean.shape))
-                pred_PP_std = np.zeros((pred_PP_mean.shape))
-                pred_SS_std = np.zeros((pred_SS_mean.shape))           
+                # read-only zeros that take no memory, the uncertainties are only used with estimate_uncertainty
+                pred_DD_std = np.broadcast_to(np.float32(0), pred_DD_mean.shape)
+                pred_PP_std = np.broadcast_to(np.float32(0), pred_PP_mean.shape)
+                pred_SS_std = np.broadcast_to(np.float32(0), pred_SS_mean.shape)
                 
             test_set={}
-            fl = h5py.File(args['input_hdf5'], 'r')
+            fl = cached_hdf5(args['input_hdf5'])
             for ID in new_list:
                 if ID.split('_')[-1] == 'EV':
                     dataset = fl.get('data/'+str(ID))
@@ -402,6 +436,7 @@ def tester(input_hdf5=None,
                                 matches)
     
                 plt_n += 1
+    close_hdf5_files()
     end_training = time.time()  
     delta = end_training - start_training
     hour = int(delta / 3600)
@@ -424,8 +459,14 @@ def tester(input_hdf5=None,
         the_file.write('loss_weights: '+str(args['loss_weights'])+'\n')
         the_file.write('batch_size: '+str(args['batch_size'])+'\n')
         the_file.write('total number of tests '+str(len(test))+'\n')
+        the_file.write('qc_policy: '+str(args['qc_policy'])+'\n')
+        if args['qc_policy']:
+            the_file.write('traces with mostly gaps or dead channels '+('skipped' if args['qc_policy'] == 'skip' else 'tested last')+': '+str(len(dead_list))+'\n')
         the_file.write('gpuid: '+str(args['gpuid'])+'\n')
         the_file.write('gpu_limit: '+str(args['gpu_limit'])+'\n')             
+        the_file.write('precision: '+str(args['precision'])+'\n')
+        the_file.write('jit_compile: '+str(args['jit_compile'])+'\n')
+        the_file.write('tuning_profile: '+str(tuned)+'\n')
         the_file.write('================== Other Parameters ========================='+'\n')            
         the_file.write('normalization_mode: '+str(args['normalization_mode'])+'\n')
         the_file.write('estimate uncertainty: '+str(args['estimate_uncertainty'])+'\n')
@@ -439,6 +480,211 @@ def tester(input_hdf5=None,
 
     
     
+def _qc_batches(args, test, dead_list):
+    
+    """ 
+    
+    Yields the batches of trace names of the test set. With qc_policy, the traces that are mostly gaps or dead 
+    channels are taken out of each batch and added to dead_list, and with 'last' they are yielded after the others.
+    
+    """
+    
+    list_generator = generate_arrays_from_file(test, args['batch_size']) 
+    fl = h5py.File(args['input_hdf5'], 'r') if args['qc_policy'] else None
+    for _ in range(int(np.ceil(len(test) / args['batch_size']))):
+        new_list = next(list_generator)
+        if args['qc_policy']:
+            dead = dead_windows(window_qc(np.stack([np.array(fl.get('data/'+str(ID))) for ID in new_list])), args['qc_max_gap'])
+            dead_list.extend([ID for ID, d in zip(new_list, dead) if d])
+            new_list = [ID for ID, d in zip(new_list, dead) if not d]
+        if len(new_list):
+            yield new_list
+    if args['qc_policy'] == 'last':
+        for k in range(0, len(dead_list), args['batch_size']):
+            yield dead_list[k:k+args['batch_size']]
+    if fl is not None:
+        fl.close()
+
+
+
+def compare_models(input_hdf5=None,
+                   input_testset=None,
+                   input_models=None,
+                   output_name=None,
+                   detection_threshold=0.20,                
+                   P_threshold=0.1,
+                   S_threshold=0.1, 
+                   loss_weights=[0.05, 0.40, 0.55],
+                   loss_types=['binary_crossentropy', 'binary_crossentropy', 'binary_crossentropy'],
+                   input_dimention=(6000, 3),
+                   normalization_mode='std',
+                   batch_size=None,
+                   number_of_batches=4,
+                   precision=None,
+                   tuning_profile='default'):
+
+    """
+    
+    Tests several models on the same test set and writes their accuracy and speed side by side, e.g. a teacher and the students distilled from it.  
+
+
+    Parameters
+    ----------
+    input_hdf5: str, default=None
+        Path to an hdf5 file containing only one class of "data" with NumPy arrays containing 3 component waveforms each 1 min long.
+        The packed files of pack_hdf5 are not supported, since they do not keep the attributes reported in the results.
+
+    input_testset: npy, default=None
+        Path to a NumPy file (automaticaly generated by the trainer) containing a list of trace names.        
+
+    input_models: list, default=None
+        Paths to the trained models. The first one is the reference for the probability differences.
+        
+    output_name: str, default=None
+        Output directory that will be generated. 
+        
+    detection_threshold : float, default=0.2
+        A value in which the detection probabilities above it will be considered as an event.
+          
+    P_threshold: float, default=0.1
+        A value which the P probabilities above it will be considered as P arrival.
+
+    S_threshold: float, default=0.1
+        A value which the S probabilities above it will be considered as S arrival.
+               
+    loss_weights: list, default=[0.05, 0.40, 0.55]
+        Loss weights for detection, P picking, and S picking respectively.
+             
+    loss_types: list, default=['binary_crossentropy', 'binary_crossentropy', 'binary_crossentropy'] 
+        Loss types for detection, P picking, and S picking respectively.
+        
+    input_dimention: tuple, default=(6000, 3)
+        Dimension of the input waveforms.          
+
+    normalization_mode: str, default='std' 
+        Mode of normalization for data preprocessing, 'max', maximum amplitude among three components, 'std', standard deviation.
+                      
+    batch_size: int, default=None
+        Batch size. If None it is taken from the tuning profile of each model, else 500. The report gives the batch size of each model.
+
+    number_of_batches: int, default=4 
+        Number of test batches used for measuring the speed after one warm-up batch.
+
+    precision: str, default=None
+        Precision of the Keras models, see tester.
+
+    tuning_profile: str, default='default'
+        JSON profile written by eqt-autotune, see tester. 
+      
+    Returns
+    -------- 
+    ./output_name/X_report.txt: Batch size, detection rate, false detection rate, P and S picks within 0.5 s and their mean absolute errors, windows per second, number of parameters, and mean absolute differences of the probabilities to the first model, for each model.
+        
+    ./output_name/model_i_outputs: The outputs of the tester for the i-th model.
+
+    results: list
+        The numbers of the report for each model.
+        
+    """ 
+
+    save_dir = os.path.join(os.getcwd(), str(output_name)+'_outputs')
+    if os.path.isdir(save_dir):
+        shutil.rmtree(save_dir)  
+    os.makedirs(save_dir) 
+    test = np.load(input_testset)
+
+    results = []
+    for i, input_model in enumerate(input_models):
+        name = os.path.join(str(output_name)+'_outputs', 'model_'+str(i))
+        resolved = {'input_model': input_model, 'precision': precision, 'batch_size': batch_size}
+        apply_tuning_profile(resolved, tuning_profile, {'batch_size': 500})
+        tester(input_hdf5=input_hdf5,
+               input_testset=input_testset,
+               input_model=input_model,
+               output_name=name,
+               detection_threshold=detection_threshold,
+               P_threshold=P_threshold,
+               S_threshold=S_threshold,
+               number_of_plots=0,
+               estimate_uncertainty=False,
+               loss_weights=loss_weights,
+               loss_types=loss_types,
+               input_dimention=input_dimention,
+               normalization_mode=normalization_mode,
+               batch_size=resolved['batch_size'],
+               precision=precision,
+               tuning_profile=tuning_profile)
+        
+        scores = {'input_model': input_model, 'batch_size': resolved['batch_size']}
+        scores.update(_test_scores(os.path.join(os.getcwd(), name+'_outputs', 'X_test_results.csv')))
+        
+        model = load_inference_model(input_model, loss_types, loss_weights, precision)
+        scores['total params'] = model.count_params() if hasattr(model, 'count_params') else None
+        speed, outputs = _throughput(model, test[:(number_of_batches+1)*resolved['batch_size']], input_hdf5, input_dimention, normalization_mode, resolved['batch_size'])
+        scores['windows per second'] = speed
+        if i == 0:
+            reference = outputs
+        scores['mean absolute difference to model_0 (D, P, S)'] = [round(float(np.mean(np.abs(o - r))), 4) for o, r in zip(outputs, reference)]
+        results.append(scores)
+
+    with open(os.path.join(save_dir,'X_report.txt'), 'a') as the_file: 
+        the_file.write('================== Overal Info =============================='+'\n')               
+        the_file.write('date of report: '+str(datetime.datetime.now())+'\n')         
+        the_file.write('input_hdf5: '+str(input_hdf5)+'\n')            
+        the_file.write('input_testset: '+str(input_testset)+'\n')
+        the_file.write('total number of tests '+str(len(test))+'\n')
+        the_file.write('detection_threshold: '+str(detection_threshold)+'\n')            
+        the_file.write('P_threshold: '+str(P_threshold)+'\n')
+        the_file.write('S_threshold: '+str(S_threshold)+'\n')
+        the_file.write('precision: '+str(precision)+'\n')
+        for i, scores in enumerate(results):
+            the_file.write('================== model_'+str(i)+' ===================================='+'\n')  
+            for key, value in scores.items():
+                the_file.write(key+': '+str(value)+'\n')
+    return results
+
+
+
+def _test_scores(csv_file):
+    ' Returns the detection and picking scores of the results of the tester. '
+    
+    df = pd.read_csv(csv_file)
+    names = df['trace_name'].astype(str)
+    ev = df[names.str.endswith('_EV')]
+    no = df[names.str.endswith('_NO')]
+    
+    def _rate(x):
+        return round(float(np.mean(x)), 4) if len(x) else None
+    
+    return {'number of earthquakes': len(ev),
+            'number of noise': len(no),
+            'detection rate': _rate(ev['number_of_detections'] > 0),
+            'false detection rate': _rate(no['number_of_detections'] > 0),
+            'P picks within 0.5 s': _rate(np.abs(ev['P_error']) <= 50),
+            'P mean absolute error (s)': _rate(np.abs(ev['P_error'].dropna()) / 100),
+            'S picks within 0.5 s': _rate(np.abs(ev['S_error']) <= 50),
+            'S mean absolute error (s)': _rate(np.abs(ev['S_error'].dropna()) / 100)}
+
+
+
+def _throughput(model, test, input_hdf5, input_dimention, normalization_mode, batch_size):
+    ' Measures the prediction speed on the test traces after one warm-up batch and returns it with the probabilities. '
+    
+    batch_size = min(batch_size, len(test))
+    generator = DataGeneratorTest(list(test), file_name=str(input_hdf5), dim=input_dimention[0], batch_size=batch_size, 
+                                  n_channels=input_dimention[-1], norm_mode=normalization_mode)
+    batches = [generator[bn]['input'] for bn in range(len(generator))]
+    model.predict(batches[0], batch_size=batch_size, verbose=0)
+    if len(batches) > 1:
+        batches = batches[1:]
+    start = time.time()
+    outputs = [model.predict(X, batch_size=batch_size, verbose=0) for X in batches]
+    elapsed = time.time() - start
+    outputs = [np.concatenate([o[k] for o in outputs]) for k in range(3)]
+    return round(len(outputs[0]) / elapsed, 2), outputs
+
+
+
 def _output_writter_test(args, 
                         dataset, 
                         evi, 
@@ -15,6 +15,7 @@ from tensorflow import keras
 from tensorflow.keras import backend as K
 from tensorflow.keras.callbacks import ModelCheckpoint, LearningRateScheduler, ReduceLROnPlateau, EarlyStopping
 from tensorflow.keras.layers import Input
+from tensorflow.keras.optimizers import Adam
 import tensorflow as tf
 import matplotlib
 matplotlib.use('agg')
@@ -25,8 +26,10 @@ import h5py
 import time
 
 import shutil
+import threading
 import multiprocessing
 from .EqT_utils import DataGenerator, _lr_schedule, cred2, PreLoadGenerator, data_reader
+from .EqT_utils import f1, load_inference_model, prune_filters, normalized_model
 import datetime
 from tqdm import tqdm
 from tensorflow.python.util import deprecation
@@ -64,7 +67,14 @@ def trainer(input_hdf5=None,
             patience=12,
             gpuid=None,
             gpu_limit=None,
-            use_multiprocessing=True):
+            use_multiprocessing=True,
+            nb_filters=[8, 16, 16, 32, 32, 64, 64],
+            teacher_model=None,
+            distillation_alpha=0.8,
+            prune_ratio=None,
+            prune_epochs=10,
+            graph_normalization=False,
+            label_dtype='float32'):
         
     """
     
@@ -168,6 +178,27 @@ def trainer(input_hdf5=None,
     use_multiprocessing: bool, default=True
         If True, multiple CPUs will be used for the preprocessing of data even when GPU is used for the prediction. 
 
+    nb_filters: list, default=[8, 16, 16, 32, 32, 64, 64]
+        The number of filters of the 7 encoder (and decoder) layers. The second one is also the number of units of the LSTM layers and the 7th the number of filters of the residual blocks.
+
+    teacher_model: str, default=None
+        Path to a trained model. If given, the model defined by nb_filters, cnn_blocks, and lstm_blocks is trained as a student to match the detection, P, and S probabilities that the teacher predicts for each augmented batch (knowledge distillation).
+
+    distillation_alpha: float, default=0.8
+        Weight of the teacher outputs in the training targets, the rest is the labels. 1 trains only on the teacher outputs.
+
+    prune_ratio: float, default=None
+        If given, this fraction of the filters with the smallest L1 norms is removed from the convolutional layers of the encoder and decoders after the training and the pruned model is fine-tuned.
+
+    prune_epochs: int, default=10
+        The number of fine-tuning epochs after pruning.
+
+    graph_normalization: bool, default=False
+        If True, the normalization (normalization_mode) is done on each batch by a NormalizationLayer at the input of the model instead of on each trace by the data generators. The saved models then take raw waveforms.
+
+    label_dtype: str, default='float32'
+        Type of the training labels, e.g. 'float16' to halve their memory, or 'uint8' with box labels. 
+
     Returns
     -------- 
     output_name/models/output_name_.h5: This is where all good models will be saved.  
@@ -190,6 +221,9 @@ def trainer(input_hdf5=None,
     -------- 
     'generator' mode is memory efficient and more suitable for machines with fast disks. 
     'pre_load' mode is faster but requires more memory and it comes with only box labeling.
+
+    With a teacher_model the validation loss is still computed against the labels, and the data generation runs in threads 
+    because the teacher predicts the targets in the main process. The student and the teacher can be compared with compare_models. 
         
     """     
 
@@ -226,7 +260,14 @@ def trainer(input_hdf5=None,
     "patience": patience,                    
     "gpuid": gpuid,
     "gpu_limit": gpu_limit,
-    "use_multiprocessing": use_multiprocessing
+    "use_multiprocessing": use_multiprocessing,
+    "nb_filters": nb_filters,
+    "teacher_model": teacher_model,
+    "distillation_alpha": distillation_alpha,
+    "prune_ratio": prune_ratio,
+    "prune_epochs": prune_epochs,
+    "graph_normalization": graph_normalization,
+    "label_dtype": label_dtype
     }
                        
     def train(args):
@@ -272,6 +313,12 @@ def trainer(input_hdf5=None,
         training, validation=_split(args, save_dir)
         callbacks=_make_callback(args, save_models)
         model=_build_model(args)
+        teacher=None
+        if args['teacher_model']:
+            print('Loading the teacher model ...', flush=True)
+            teacher=load_inference_model(args['teacher_model'], args['loss_types'], args['loss_weights'])
+            if args['graph_normalization']:
+                teacher=normalized_model(teacher, args['normalization_mode'])
         
         if args['gpuid']:           
             os.environ['CUDA_VISIBLE_DEVICES'] = '{}'.format(gpuid)
@@ -290,7 +337,7 @@ def trainer(input_hdf5=None,
                               'batch_size': args['batch_size'],
                               'n_channels': args['input_dimention'][-1],
                               'shuffle': args['shuffle'],  
-                              'norm_mode': args['normalization_mode'],
+                              'norm_mode': _input_norm_mode(args),
                               'label_type': args['label_type'],
                               'augmentation': args['augmentation'],
                               'add_event_r': args['add_event_r'],
@@ -300,34 +347,50 @@ def trainer(input_hdf5=None,
                               'add_noise_r': args['add_noise_r'],
                               'drop_channe_r': args['drop_channel_r'],
                               'scale_amplitude_r': args['scale_amplitude_r'],
-                              'pre_emphasis': args['pre_emphasis']}
+                              'pre_emphasis': args['pre_emphasis'],
+                              'label_dtype': args['label_dtype']}
                         
             params_validation = {'file_name': str(args['input_hdf5']),  
                                  'dim': args['input_dimention'][0],
                                  'batch_size': args['batch_size'],
                                  'n_channels': args['input_dimention'][-1],
                                  'shuffle': False,  
-                                 'norm_mode': args['normalization_mode'],
+                                 'norm_mode': _input_norm_mode(args),
                                  'augmentation': False}         
 
             training_generator = DataGenerator(training, **params_training)
             validation_generator = DataGenerator(validation, **params_validation) 
+            if teacher:
+                training_generator = _DistillationGenerator(training_generator, teacher, args['distillation_alpha'])
 
             print('Started training in generator mode ...') 
             history = model.fit_generator(generator=training_generator,
                                           validation_data=validation_generator,
-                                          use_multiprocessing=args['use_multiprocessing'],
+                                          use_multiprocessing=args['use_multiprocessing'] and teacher is None,
                                           workers=multiprocessing.cpu_count(),    
                                           callbacks=callbacks, 
                                           epochs=args['epochs'],
                                           class_weight={0: 0.11, 1: 0.89})
             
+            if args['prune_ratio']:
+                model = _prune_model(model, args)
+                print('Fine-tuning the pruned model ...', flush=True) 
+                fine_tuning = model.fit_generator(generator=training_generator,
+                                                  validation_data=validation_generator,
+                                                  use_multiprocessing=args['use_multiprocessing'] and teacher is None,
+                                                  workers=multiprocessing.cpu_count(),    
+                                                  callbacks=_make_callback(args, save_models), 
+                                                  initial_epoch=len(history.epoch),
+                                                  epochs=len(history.epoch)+args['prune_epochs'],
+                                                  class_weight={0: 0.11, 1: 0.89})
+                _extend_history(history, fine_tuning)
+            
         elif args['mode'] == 'preload': 
             X, y1, y2, y3 = data_reader(list_IDs=training+validation, 
                                        file_name=str(args['input_hdf5']), 
                                        dim=args['input_dimention'][0], 
                                        n_channels=args['input_dimention'][-1], 
-                                       norm_mode=args['normalization_mode'],
+                                       norm_mode=_input_norm_mode(args),
                                        augmentation=args['augmentation'],
                                        add_event_r=args['add_event_r'],
                                        add_gap_r=args['add_gap_r'],
@@ -336,7 +399,12 @@ def trainer(input_hdf5=None,
                                        add_noise_r=args['add_noise_r'],  
                                        drop_channe_r=args['drop_channel_r'],
                                        scale_amplitude_r=args['scale_amplitude_r'],
-                                       pre_emphasis=args['pre_emphasis'])
+                                       pre_emphasis=args['pre_emphasis'],
+                                       label_dtype=args['label_dtype'])
+            if teacher:
+                n_train = int(len(X)*(1 - args['train_valid_test_split'][1]))
+                y1[:n_train], y2[:n_train], y3[:n_train] = _distillation_targets(teacher, X[:n_train], [y1[:n_train], y2[:n_train], y3[:n_train]], 
+                                                                                 args['distillation_alpha'], args['batch_size'])
              
             print('Started training in preload mode ...', flush=True) 
             history = model.fit({'input': X}, 
@@ -346,6 +414,19 @@ def trainer(input_hdf5=None,
                                 batch_size=args['batch_size'], 
                                 callbacks=callbacks,
                                 class_weight={0: 0.11, 1: 0.89})            
+
+            if args['prune_ratio']:
+                model = _prune_model(model, args)
+                print('Fine-tuning the pruned model ...', flush=True) 
+                fine_tuning = model.fit({'input': X}, 
+                                        {'detector': y1, 'picker_P': y2, 'picker_S': y3}, 
+                                        initial_epoch=len(history.epoch),
+                                        epochs=len(history.epoch)+args['prune_epochs'],
+                                        validation_split=args['train_valid_test_split'][1],
+                                        batch_size=args['batch_size'], 
+                                        callbacks=_make_callback(args, save_models),
+                                        class_weight={0: 0.11, 1: 0.89})
+                _extend_history(history, fine_tuning)
         else:
             print('Please specify training_mode !', flush=True)
         end_training = time.time()  
@@ -412,7 +493,7 @@ def _build_model(args):
     """       
     
     inp = Input(shape=args['input_dimention'], name='input') 
-    model = cred2(nb_filters=[8, 16, 16, 32, 32, 64, 64],
+    model = cred2(nb_filters=args['nb_filters'],
               kernel_size=[11, 9, 7, 7, 5, 5, 3],
               padding=args['padding'],
               activationf =args['activation'],
@@ -422,13 +503,139 @@ def _build_model(args):
               loss_weights=args['loss_weights'],
               loss_types=args['loss_types'],
               kernel_regularizer=keras.regularizers.l2(1e-6),
-              bias_regularizer=keras.regularizers.l1(1e-4)
+              bias_regularizer=keras.regularizers.l1(1e-4),
+              norm_mode=args['normalization_mode'] if args['graph_normalization'] else None
                )(inp)  
     model.summary()  
     return model  
     
 
 
+def _input_norm_mode(args): 
+    ' norm_mode of the data generators, which leave the normalization to the model with graph_normalization '
+    
+    return None if args['graph_normalization'] else args['normalization_mode']
+
+
+
+def _prune_model(model, args): 
+    
+    """ 
+    
+    Prune the low-magnitude filters of a trained model and compile it for fine-tuning.
+
+    Parameters
+    ----------
+    model: 
+        Trained model.
+
+    args: dic
+        A dictionary containing all of the input parameters. 
+               
+    Returns
+    -------   
+    model: 
+        Compiled pruned model.
+        
+    """       
+    
+    print('Pruning '+str(args['prune_ratio'])+' of the filters ...', flush=True) 
+    model = prune_filters(model, args['prune_ratio'])
+    model.compile(loss=args['loss_types'], loss_weights=args['loss_weights'],    
+                  optimizer=Adam(lr=_lr_schedule(0)), metrics=[f1])
+    model.summary()  
+    return model  
+
+
+
+def _extend_history(history, fine_tuning): 
+    ' Appends the history of the fine-tuning epochs to the training history. '
+    
+    history.epoch += fine_tuning.epoch
+    for key, values in fine_tuning.history.items():
+        history.history.setdefault(key, []).extend(values)
+
+
+
+def _distillation_targets(teacher, X, labels, alpha, batch_size): 
+    
+    """ 
+    
+    Mix the labels with the outputs of the teacher model.
+
+    Parameters
+    ----------
+    teacher: 
+        Trained teacher model.
+
+    X: array
+        Input waveforms. 
+
+    labels: list
+        Detection, P, and S labels. 
+
+    alpha: float
+        Weight of the teacher outputs. 
+
+    batch_size: int
+        Batch size of the teacher prediction.
+               
+    Returns
+    -------   
+    targets: list
+        Detection, P, and S targets. 
+        
+    """       
+    
+    outputs = teacher.predict(X, batch_size=batch_size, verbose=0)
+    # the targets of integer labels are not 0 or 1 anymore
+    dtypes = [y.dtype if y.dtype.kind == 'f' else np.dtype(np.float32) for y in labels]
+    return [alpha*np.asarray(o, dtype=dtype) + (1-alpha)*y.astype(dtype, copy=False) for o, y, dtype in zip(outputs, labels, dtypes)]
+
+
+
+class _DistillationGenerator(keras.utils.Sequence):
+    
+    """ 
+    
+    Replaces the labels of the batches of a data generator with the outputs of a teacher model mixed with the labels. 
+    The teacher sees the same augmented waveforms as the student.
+    
+    Parameters
+    ----------
+    generator: obj
+        DataGenerator or PreLoadGenerator of the training set.
+
+    teacher: 
+        Trained teacher model.
+
+    alpha: float
+        Weight of the teacher outputs.
+        
+    """
+    
+    def __init__(self, generator, teacher, alpha):
+        self.generator = generator
+        self.teacher = teacher
+        self.alpha = alpha
+        self.lock = threading.Lock()
+        
+    def __len__(self):
+        return len(self.generator)
+
+    def __getitem__(self, index):
+        inputs, labels = self.generator[index]
+        X = inputs['input']
+        with self.lock:
+            y1, y2, y3 = _distillation_targets(self.teacher, X, [labels['detector'], labels['picker_P'], labels['picker_S']], 
+                                               self.alpha, len(X))
+        return ({'input': X}, {'detector': y1, 'picker_P': y2, 'picker_S': y3})
+
+    def on_epoch_end(self):
+        self.generator.on_epoch_end()
+
+
+
 def _split(args, save_dir):
     
     """ 
@@ -564,7 +771,7 @@ def _pre_loading(args, training, validation):
                        'batch_size': args['batch_size'],
                        'n_channels': args['input_dimention'][-1],
                        'shuffle': args['shuffle'],  
-                       'norm_mode': args['normalization_mode'],
+                       'norm_mode': _input_norm_mode(args),
                        'label_type': args['label_type'],
                        'augmentation': args['augmentation'],
                        'add_event_r': args['add_event_r'], 
@@ -574,13 +781,14 @@ def _pre_loading(args, training, validation):
                        'add_noise_r': args['add_noise_r'], 
                        'drop_channe_r': args['drop_channel_r'],
                        'scale_amplitude_r': args['scale_amplitude_r'],
-                       'pre_emphasis': args['pre_emphasis']}  
+                       'pre_emphasis': args['pre_emphasis'],
+                       'label_dtype': args['label_dtype']}  
 
     params_validation = {'dim': args['input_dimention'][0],
                          'batch_size': args['batch_size'],
                          'n_channels': args['input_dimention'][-1],
                          'shuffle': False,  
-                         'norm_mode': args['normalization_mode'],
+                         'norm_mode': _input_norm_mode(args),
                          'augmentation': False}  
     
     training_generator = PreLoadGenerator(training, training_set, **params_training)  
@@ -702,6 +910,7 @@ def _document_training(history, model, start_training, end_training, save_dir, s
         the_file.write('input_dimention: '+str(args['input_dimention'])+'\n')
         the_file.write('cnn_blocks: '+str(args['cnn_blocks'])+'\n')
         the_file.write('lstm_blocks: '+str(args['lstm_blocks'])+'\n')
+        the_file.write('nb_filters: '+str(args['nb_filters'])+'\n')
         the_file.write('padding_type: '+str(args['padding'])+'\n')
         the_file.write('activation_type: '+str(args['activation'])+'\n')        
         the_file.write('drop_rate: '+str(args['drop_rate'])+'\n')            
@@ -722,6 +931,12 @@ def _document_training(history, model, start_training, end_training, save_dir, s
         the_file.write('gpuid: '+str(args['gpuid'])+'\n')
         the_file.write('gpu_limit: '+str(args['gpu_limit'])+'\n')             
         the_file.write('use_multiprocessing: '+str(args['use_multiprocessing'])+'\n')  
+        the_file.write('teacher_model: '+str(args['teacher_model'])+'\n')
+        the_file.write('distillation_alpha: '+str(args['distillation_alpha'])+'\n')
+        the_file.write('prune_ratio: '+str(args['prune_ratio'])+'\n')
+        the_file.write('prune_epochs: '+str(args['prune_epochs'])+'\n')
+        the_file.write('graph_normalization: '+str(args['graph_normalization'])+'\n')
+        the_file.write('label_dtype: '+str(args['label_dtype'])+'\n')
         the_file.write('================== Training Performance ====================='+'\n')  
         the_file.write('finished the training in:  {} hours and {} minutes and {} seconds \n'.format(hour, minute, round(seconds,2)))                         
         the_file.write('stoped after epoche: '+str(len(history.history['loss']))+'\n')
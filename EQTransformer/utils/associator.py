@@ -25,6 +25,7 @@ from obspy.signal.trigger import ar_pick
 from obspy.signal.trigger import recursive_sta_lta, trigger_onset
 from itertools import combinations
 from obspy.core.event import Catalog, Event, Origin, Arrival, Pick, WaveformStreamID
+from .hdf5_maker import window_index, get_window, station_attrs
 
 
 def run_associator(input_dir,
@@ -323,8 +324,10 @@ def _doubleChecking(station_list, detections, preprocessed_dir, moving_window, t
             mask = (df['start_time'] > detections.iloc[0]['event_start_time']-timedelta(seconds = moving_window)) & (df['start_time'] < detections.iloc[0]['event_start_time']+timedelta(seconds = moving_window))
             df = df.loc[mask]
             dtfl = h5py.File(file_name, 'r')
-            dataset = dtfl.get('data/'+df['trace_name'].to_list()[0]) 
+            dataset = get_window(dtfl, df['trace_name'].to_list()[0], window_index(df))
             data = np.array(dataset)
+            station = station_attrs(dtfl)
+            trace_start = UTCDateTime(df['start_time'].to_list()[0].to_pydatetime())
                 
             cft = recursive_sta_lta(data[:,2], int(2.5 * 100), int(10. * 100))
             on_of = trigger_onset(cft, thr_on, thr_of)
@@ -333,17 +336,17 @@ def _doubleChecking(station_list, detections, preprocessed_dir, moving_window, t
                 if (on_of[0][1]+100)/100 > p_pick > (on_of[0][0]-100)/100: 
                    # print('got one')
                     new_picks['traceID'] = df['trace_name'].to_list()[0]
-                    new_picks['network'] = dataset.attrs["network_code"]
+                    new_picks['network'] = station["network_code"]
                     new_picks['station'] = sttt
                     new_picks['instrument_type'] = df['trace_name'].to_list()[0].split('_')[2]
-                    new_picks['stlat'] = round(dataset.attrs["receiver_latitude"], 4)
-                    new_picks['stlon'] = round(dataset.attrs["receiver_longitude"], 4)
-                    new_picks['stelv'] = round(dataset.attrs["receiver_elevation_m"], 2)
-                    new_picks['event_start_time'] = datetime.strptime(str(UTCDateTime(dataset.attrs['trace_start_time'].replace(' ', 'T')+'Z')+(on_of[0][0]/100)).replace('T', ' ').replace('Z', ''), '%Y-%m-%d %H:%M:%S.%f')
-                    new_picks['event_end_time'] = datetime.strptime(str(UTCDateTime(dataset.attrs['trace_start_time'].replace(' ', 'T')+'Z')+(on_of[0][1]/100)).replace('T', ' ').replace('Z', ''), '%Y-%m-%d %H:%M:%S.%f')
+                    new_picks['stlat'] = round(station["receiver_latitude"], 4)
+                    new_picks['stlon'] = round(station["receiver_longitude"], 4)
+                    new_picks['stelv'] = round(station["receiver_elevation_m"], 2)
+                    new_picks['event_start_time'] = datetime.strptime(str(trace_start+(on_of[0][0]/100)).replace('T', ' ').replace('Z', ''), '%Y-%m-%d %H:%M:%S.%f')
+                    new_picks['event_end_time'] = datetime.strptime(str(trace_start+(on_of[0][1]/100)).replace('T', ' ').replace('Z', ''), '%Y-%m-%d %H:%M:%S.%f')
                     new_picks['detection_prob'] = 0.3
                     new_picks['detection_unc'] = 0.6
-                    new_picks['p_arrival_time'] = datetime.strptime(str(UTCDateTime(dataset.attrs['trace_start_time'].replace(' ', 'T')+'Z')+p_pick).replace('T', ' ').replace('Z', ''), '%Y-%m-%d %H:%M:%S.%f')
+                    new_picks['p_arrival_time'] = datetime.strptime(str(trace_start+p_pick).replace('T', ' ').replace('Z', ''), '%Y-%m-%d %H:%M:%S.%f')
                     new_picks['p_prob'] = 0.3
                     new_picks['p_unc'] = 0.6
                     new_picks['p_snr'] = None
@@ -7,16 +7,12 @@ Created on Sat Aug 31 21:21:31 2019
 
 last update: 01/29/2021
 
-- downsampling using the interpolation function can cause false segmentaiton error. 
-    This depend on your data and its sampling rate. If you kept getting this error when 
-    using multiprocessors, try using only a single cpu. 
+- traces that are not at 100 Hz are resampled with the polyphase resampler in utils/preprocessing.py. 
     
 """
 
-from obspy import read
+from obspy import read, UTCDateTime
 import os
-import platform
-from os import listdir
 from os.path import join
 import h5py
 import numpy as np
@@ -25,15 +21,23 @@ import csv
 import shutil
 import json
 import pandas as pd
-from multiprocessing.pool import ThreadPool
 import multiprocessing
 import pickle
+import tempfile
+from functools import lru_cache
+from .preprocessing import preprocess_stream, resample_stream, BlockStream, _COLUMNS, _sliding_windows
+from .preprocessing import window_qc, dead_windows, QC_COLUMNS
+from .trace_cache import TraceCache
+from .mseed_catalog import MseedCatalog
 import faulthandler; faulthandler.enable()
 
+# written once per station into the root attributes of station.hdf5
+STATION_ATTRS = ['receiver_code', 'network_code', 'receiver_latitude', 'receiver_longitude', 'receiver_elevation_m']
 
 
 
-def preprocessor(preproc_dir, mseed_dir, stations_json, overlap=0.3, n_processor=None):
+
+def preprocessor(preproc_dir, mseed_dir, stations_json, overlap=0.3, n_processor=None, block_length=None, cache_dir=None, cache_size=None, storage='slices', append=False, catalog_path=None):
     
     
     """
@@ -55,13 +59,51 @@ def preprocessor(preproc_dir, mseed_dir, stations_json, overlap=0.3, n_processor
         If set, detection, and picking are performed in overlapping windows.
            
     n_processor: int, default=None 
-        The number of CPU processors for parallel preprocessing.         
+        The number of CPU processors for parallel preprocessing. The chunks of data of all stations are preprocessed 
+        by a pool of processes, and the hdf5 and csv files of each station are written by the main process.         
+
+    block_length: float, default=None
+        If set, each chunk of data is read and preprocessed in blocks of this many seconds (e.g. 3600) instead of as 
+        a whole, so the memory used per station depends on the block length and not on the length of the files. 
+        The slices are the same as without blocks up to float32 rounding (see BlockStream).
+
+    cache_dir: str, default=None
+        If set, the preprocessed traces of each chunk of data are stored in this directory, keyed by the contents of 
+        the mseed files and the preprocessing parameters, and read from it when the same files are preprocessed again.
+        It can be shared with mseed_predictor. See TraceCache. 
+
+    cache_size: float, default=None
+        Disk budget of cache_dir in GB. The least recently used chunks are deleted when it is exceeded. None for no limit. 
+
+    storage: str, default='slices'
+        'slices' writes each 1-minute slice as its own dataset in the data group. 'continuous' writes each chunk of 
+        data once as a (npts, 3) float32 dataset in the continuous group, with the start time and the time slots 
+        of the chunk, and the slices are read from it on the fly by predictor. The station.csv 
+        file then also lists the chunk and the offset of each slice. It needs about 30 % less space with the default 
+        overlap. 
+
+    append: bool, default=False
+        If True, the existing hdf5 and csv files of the stations are kept and only the chunks of data that are not in 
+        preproc_dir/time_tracks.pkl yet are preprocessed and appended to them, and time_tracks.pkl is updated. A chunk 
+        whose files now end later than when it was preprocessed (e.g. a file of the current month that has grown) is 
+        preprocessed again and its old slices are replaced, so the slices are the same as those of a new run. HDF5 does 
+        not give back the space of deleted datasets, so the slices and continuous traces of such a chunk are rewritten in 
+        place (the continuous traces are resized) and the file does not grow with each append. Only the old slices or 
+        traces that are not written again, e.g. when the chunk now starts at another time, are deleted and leave space 
+        that only h5repack frees; so do the continuous traces of files written before they were resizable. 
+
+    catalog_path: str, default=None
+        Path of the SQLite catalog of the mseed files (see MseedCatalog), which is refreshed with the new and changed 
+        files and used instead of scanning mseed_dir. None keeps it in mseed_dir/.mseed_catalog.sqlite. 
 
     Returns
     ----------
     mseed_dir_processed_hdfs/station.csv: Phase information for the associated events in hypoInverse format. 
+    The file also lists QC features of each slice (QC_COLUMNS, see window_qc) computed on the preprocessed chunk: the 
+    fraction and the longest run of gap or dead samples, the fraction of clipped samples, and the RMS of each channel. 
+    predictor uses them to leave out the slices that are mostly gaps (qc_policy). 
     
-    mseed_dir_processed_hdfs/station.hdf5: Containes all slices and preprocessed traces. 
+    mseed_dir_processed_hdfs/station.hdf5: Containes all slices and preprocessed traces (or the continuous traces). 
     
     preproc_dir/X_preprocessor_report.txt: A summary of processing performance. 
     
@@ -73,395 +115,542 @@ def preprocessor(preproc_dir, mseed_dir, stations_json, overlap=0.3, n_processor
     if not n_processor:
         n_processor = multiprocessing.cpu_count()
     
-    json_file = open(stations_json)
-    stations_ = json.load(json_file)
+    stations_ = load_stations(stations_json)
     
     save_dir = os.path.join(os.getcwd(), str(mseed_dir)+'_processed_hdfs')
-    if os.path.isdir(save_dir):
+    if os.path.isdir(save_dir) and not append:
         print(f' *** " {save_dir} " directory already exists!')
         inp = input(" * --> Do you want to creat a new empty folder? Type (Yes or y) ")
         if inp.lower() == "yes" or inp.lower() == "y":        
             shutil.rmtree(save_dir)  
-    os.makedirs(save_dir)
+    os.makedirs(save_dir, exist_ok=append)
               
     if not os.path.exists(preproc_dir):
             os.makedirs(preproc_dir)
+    assert storage in ['slices', 'continuous'], "storage should be 'slices' or 'continuous'"
     repfile = open(os.path.join(preproc_dir,"X_preprocessor_report.txt"), 'w');
     
-    if platform.system() == 'Windows':
-        station_list = [join(mseed_dir, ev) for ev in listdir(mseed_dir) if ev.split("\\")[-1] != ".DS_Store"];
-    else:   
-        station_list = [join(mseed_dir, ev) for ev in listdir(mseed_dir) if ev.split("/")[-1] != ".DS_Store"];
+    catalog = MseedCatalog(mseed_dir, catalog_path)
+    
+    tim_shift = int(60-(overlap*60))
+    tmp_dir = tempfile.mkdtemp(dir=save_dir)
     
     data_track = dict()
+    if append and os.path.isfile(os.path.join(preproc_dir,'time_tracks.pkl')):
+        with open(os.path.join(preproc_dir,'time_tracks.pkl'), 'rb') as f:
+            data_track = pickle.load(f)
     
-    def process(station):
-    # for station in station_list:
-        if platform.system() == 'Windows':
-            output_name = station.split("\\")[-1];
+    tasks, n_chunks, dropped = [], dict(), dict()
+    for output_name in catalog.stations():
+        chunks = catalog.chunks(output_name)
+        if append and output_name in data_track:
+            print('============ Station {} has {} chunks of data.'.format(output_name, len(chunks)), end='', flush=True)  
+            chunks, dropped[output_name] = _new_chunks(save_dir, output_name, chunks, catalog, data_track[output_name])
+            print(' {} of them are new.'.format(len(chunks)), flush=True)
         else:
-            output_name = station.split("/")[-1]
+            print('============ Station {} has {} chunks of data.'.format(output_name, len(chunks)), flush=True)  
+            data_track.pop(output_name, None)
+        n_chunks[output_name] = len(chunks)
+        for ct, (month, matching) in enumerate(chunks):
+            matching = [join(mseed_dir, m) for m in matching]
+            tasks.append((output_name, ct, month, matching, overlap, block_length, cache_dir, cache_size,
+                          os.path.join(tmp_dir, output_name+'_'+str(ct)+'.npy')))
+    catalog.close()
+
+    # the chunks of all stations are preprocessed in parallel and each station is written by one writer in this process
+    writers, received, hits, misses = dict(), dict(), 0, 0
+    for output_name in n_chunks:
+        if not n_chunks[output_name] and output_name not in data_track:
+            data_track[output_name] = _StationWriter(save_dir, output_name, stations_[output_name], tim_shift, storage).close(0, repfile)
+    try:
+        with multiprocessing.Pool(n_processor) as p:
+            for task, chunk in zip(tasks, p.imap(_preprocess_chunk, tasks)):
+                output_name = task[0]
+                if output_name not in writers:
+                    writers[output_name] = _StationWriter(save_dir, output_name, stations_[output_name], tim_shift, storage, 
+                                                          append=output_name in data_track, reuse=dropped.get(output_name))
+                if chunk:
+                    writers[output_name].write(chunk)
+                    hits += chunk['hit'] is True
+                    misses += chunk['hit'] is False
+                received[output_name] = received.get(output_name, 0) + 1
+                if received[output_name] == n_chunks[output_name]:
+                    time_slots, comp_types = writers.pop(output_name).close(n_chunks[output_name], repfile)
+                    if output_name in data_track:
+                        # in the order of the time slots, as if all of the chunks were preprocessed in one run
+                        track = sorted(zip(data_track[output_name][0] + time_slots, data_track[output_name][1] + comp_types), key=lambda x: x[0][0])
+                        time_slots, comp_types = [slot for slot, _ in track], [comp for _, comp in track]
+                    data_track[output_name] = [time_slots, comp_types]
+    finally:
+        for writer in writers.values():
+            writer.HDF.close()
+            writer.csvfile.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    if cache_dir:
+        repfile.write(f' Cache {cache_dir}: {hits} chunks were read from the cache, {misses} were preprocessed\n')
+    with open(os.path.join(preproc_dir,'time_tracks.pkl'), 'wb') as f:
+        pickle.dump(data_track, f, pickle.HIGHEST_PROTOCOL)
+
+
+
+def _preprocess_chunk(task):
+    
+    ' preprocesses one chunk of mseed files of a station into a .npy file of its 100 Hz components, (npts, 3), and the QC features of its slices, for the writer of preprocessor '
+    
+    output_name, ct, month, matching, overlap, block_length, cache_dir, cache_size, path = task
+    if len(matching) not in [1, 2, 3]:
+        return None
+    hit = None
+    
+    if block_length or cache_dir:
+        if cache_dir:
+            cache = TraceCache(cache_dir, cache_size)
+            stream = cache.stream(matching, overlap=overlap, block_length=block_length or 3600, span='longest')
+            hit = cache.hits == 1
+        else:
+            stream = BlockStream(matching, overlap=overlap, block_length=block_length, span='longest')
+        tr_stats = stream.traces[0]
+        start_time = stream.starttime
+        org_samplingRate = stream.sampling_rates[0]
+        time_slots = stream.time_slots
+        npts = int(round((stream.endtime - stream.starttime) * 100)) + 1
+        out = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(npts, 3))
+        stream.fill(out, start_time)
+        out.flush()
+        del out
+        
+    else:
+        st1 = None
+        for fl in matching:
+            st = read(fl, debug_headers=True)
+            if st1 is None:
+                org_samplingRate = st[0].stats.sampling_rate
+                time_slots = [(tr.stats.starttime, tr.stats.endtime) for tr in st]
+            try:
+                st.merge(fill_value=0) 
+            except Exception:
+                st=resample_stream(st)
+                st.merge(fill_value=0)  
+            if st1 is None:
+                st1 = st
+            else:
+                st1.append(st[0])
+        preprocess_stream(st1)
+        st1=resample_stream(st1)
         
-        try:
-            os.remove(output_name+'.hdf5')
-            os.remove(output_name+".csv")
-        except Exception:
-            pass
+        longest = st1[0].stats.npts
+        start_time = st1[0].stats.starttime
+        end_time = st1[0].stats.endtime
+        for tt in st1:
+            if tt.stats.npts > longest:
+                longest = tt.stats.npts
+                start_time = tt.stats.starttime
+                end_time = tt.stats.endtime
+        st1.trim(start_time, end_time, pad=True, fill_value=0)
         
-        HDF = h5py.File(os.path.join(save_dir, output_name+'.hdf5'), 'a')
-        HDF.create_group("data")
+        tr_stats = st1[0].stats
+        start_time = st1[0].stats.starttime
+        npts = st1[0].stats.npts
+        data = np.zeros([npts, 3], dtype=np.float32)
+        for tr in st1:
+            if tr.stats.channel[-1] in _COLUMNS:
+                data[:, _COLUMNS[tr.stats.channel[-1]]] = tr.data[:npts]
+        np.save(path, data)
+        
+    print('  * '+output_name+' ('+str(ct+1)+') .. '+month.split('T')[0]+' --> '+month.split('__')[1].split('T')[0]+' .. '+str(len(matching))+' components .. sampling rate: '+str(org_samplingRate), flush=True)
+    return {'n_components': len(matching),
+            'sampling_rate': org_samplingRate,
+            'time_slots': time_slots,
+            'prefix': tr_stats.station+'_'+tr_stats.network+'_'+tr_stats.channel[:2],
+            'start_time': start_time,
+            'npts': npts,
+            'path': path,
+            'hit': hit,
+            'qc': _chunk_qc(path, npts, int(60-(overlap*60))*100)}
+
+
+
+def _chunk_qc(path, npts, step, batch_size=1000):
+    ' QC features of the slices of a chunk written by _preprocess_chunk, relative to the peak of each channel in the chunk, see window_qc '
     
-        csvfile = open(os.path.join(save_dir, output_name+".csv"), 'w')
-        output_writer = csv.writer(csvfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-        output_writer.writerow(['trace_name', 'start_time'])
-        csvfile.flush()   
+    data = np.load(path, mmap_mode='r')
+    scale = np.zeros(3, dtype=np.float32)
+    for first in range(0, npts, 360000):
+        scale = np.maximum(scale, np.max(np.abs(data[first:first+360000]), axis=0))
+    n_windows = max(0, (npts - 1 - 6000) // step + 1)
+    qc = [np.zeros((0, len(QC_COLUMNS)), dtype=np.float32)]
+    for k0 in range(0, n_windows, batch_size):
+        k1 = min(n_windows, k0 + batch_size)
+        batch = np.array(data[k0 * step:(k1 - 1) * step + 6000])
+        qc.append(window_qc(_sliding_windows(batch, step, k1 - k0), scale))
+    del data
+    return np.concatenate(qc)
+
+
+
+class _StationWriter():
     
-        if platform.system() == 'Windows':
-            file_list = [join(station, ev) for ev in listdir(station) if ev.split("\\")[-1] != ".DS_Store"];
-        else:
-            file_list = [join(station, ev) for ev in listdir(station) if ev.split("/")[-1] != ".DS_Store"];
-            
-        mon = [ev.split('__')[1]+'__'+ev.split('__')[2] for ev in file_list ];
-        uni_list = list(set(mon))
-        uni_list.sort()        
-        tim_shift = int(60-(overlap*60))
+    """ 
+    
+    Writes the chunks of one station into its hdf5 and csv files, keeping both open. The slices of a chunk are read 
+    from its .npy file in batches and the files are flushed once per chunk. With append, they are added to the 
+    existing files, with the QC columns only if these have them, and the datasets in reuse (those of the chunks 
+    preprocessed again, see _drop_slices) are rewritten in place; the ones that are not written again are deleted at 
+    close. The station attributes are written once into the root attributes of the hdf5 file, the names and start 
+    times of the slices are in the csv file.
+    
+    """
+    
+    def __init__(self, save_dir, output_name, station_info, tim_shift, storage, batch_size=100, append=False, reuse=None):
+        self.save_dir = save_dir
+        self.output_name = output_name
+        self.station_info = station_info
+        self.tim_shift = tim_shift
+        self.storage = storage
+        self.batch_size = batch_size
         
-        time_slots, comp_types = [], []
+        hdf_name, csv_name = os.path.join(save_dir, output_name+'.hdf5'), os.path.join(save_dir, output_name+".csv")
+        append = append and os.path.isfile(hdf_name) and os.path.isfile(csv_name)
+        self.n_old = 0
+        self.qc = True
+        if append:
+            df = pd.read_csv(csv_name)
+            assert ('chunk' in df.columns) == (storage == 'continuous'), f"{csv_name} was not written with storage='{storage}'"
+            self.n_old = len(df)
+            self.qc = set(QC_COLUMNS) <= set(df.columns)
+        self.HDF = h5py.File(hdf_name, 'a' if append else 'w')
+        self.reuse = set(reuse or []) if append else set()
+        for group in ["data"] + (["continuous"] if storage == 'continuous' else []):
+            if group not in self.HDF:
+                self.HDF.create_group(group)
+        self._set_attrs(self.HDF)
+        self.csvfile = open(csv_name, 'a' if append else 'w')
+        self.output_writer = csv.writer(self.csvfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        if not append:
+            self.output_writer.writerow(['trace_name', 'start_time'] + (['chunk', 'offset'] if storage == 'continuous' else []) + QC_COLUMNS)
+        self.csvfile.flush()   
         
-        if platform.system() == 'Windows':
-            print('============ Station {} has {} chunks of data.'.format(station.split("\\")[-1], len(uni_list)), flush=True)   
+        self.time_slots, self.comp_types, self.slide_estimates = [], [], []
+        self.count_chuncks = 0; self.fln = 0; self.c1 = 0; self.c2 = 0; self.c3 = 0
+        self.org_samplingRate = None
+    
+    def _set_attrs(self, dsF):
+        dsF.attrs["receiver_code"] = self.output_name
+        dsF.attrs["network_code"] = self.station_info['network']
+        dsF.attrs["receiver_latitude"] = self.station_info['coords'][0]
+        dsF.attrs["receiver_longitude"] = self.station_info['coords'][1]
+        dsF.attrs["receiver_elevation_m"] = self.station_info['coords'][2] 
+        
+    def write(self, chunk):
+        ' writes one chunk returned by _preprocess_chunk and deletes its .npy file '
+        
+        for tr in chunk['time_slots']:
+            self.time_slots.append(tr)
+            self.comp_types.append(chunk['n_components'])
+        self.count_chuncks += 1
+        if chunk['n_components'] == 3:
+            self.c3 += 1
+        elif chunk['n_components'] == 2:
+            self.c2 += 1
         else:
-            print('============ Station {} has {} chunks of data.'.format(station.split("/")[-1], len(uni_list)), flush=True)  
-            
-        count_chuncks=0; fln=0; c1=0; c2=0; c3=0; fl_counts=1; slide_estimates=[];
+            self.c1 += 1
+        self.org_samplingRate = chunk['sampling_rate']
+        
+        npts, step = chunk['npts'], self.tim_shift*100
+        self.slide_estimates.append(((npts - 1) / 100)//self.tim_shift)
+        n_windows = max(0, (npts - 1 - 6000) // step + 1)
+        data = np.load(chunk['path'], mmap_mode='r')
+        qc = [['%.4g' % v for v in row] if self.qc else [] for row in chunk['qc']]
         
-        for ct, month in enumerate(uni_list):
-            matching = [s for s in file_list if month in s]
+        if self.storage == 'continuous':
+            chunk_name = chunk['prefix']+'_'+str(chunk['start_time'])
+            name = 'continuous/'+chunk_name
+            if name in self.reuse and self.HDF[name].maxshape[0] is None:
+                dsF = self.HDF[name]
+                dsF.resize((npts, 3))
+            else:
+                if name in self.reuse:
+                    del self.HDF[name]
+                # resizable, so a chunk preprocessed again in append mode is rewritten in place
+                dsF = self.HDF.create_dataset(name, (npts, 3), dtype=np.float32, maxshape=(None, 3),
+                                              chunks=(min(npts, step), 3), fillvalue=0)
+            self.reuse.discard(name)
+            for first in range(0, npts, 360000):
+                dsF[first:first+360000] = data[first:first+360000]
+            dsF.attrs["trace_start_time"] = str(chunk['start_time']).replace('T', ' ').replace('Z', '')
+            dsF.attrs["sampling_rate"] = 100.0
+            # the segments of data, the rest is gaps filled with zeros
+            dsF.attrs["time_slots"] = np.array([[t0.timestamp, t1.timestamp] for t0, t1 in chunk['time_slots']])
+            rows = []
+            for k in range(n_windows):
+                start_time = chunk['start_time'] + k * self.tim_shift
+                tr_name = chunk['prefix']+'_'+str(start_time)
+                start_time_str = str(start_time).replace('T', ' ').replace('Z', '')
+                rows.append([str(tr_name), start_time_str, chunk_name, k * step] + qc[k])
+            self.output_writer.writerows(rows)
+            self.fln += n_windows
             
-            if len(matching) == 3:  
-                
-                st1 = read(matching[0], debug_headers=True)
-                org_samplingRate = st1[0].stats.sampling_rate
-                
-                for tr in st1:                   
-                    time_slots.append((tr.stats.starttime, tr.stats.endtime))
-                    comp_types.append(3)
-
-                try:
-                    st1.merge(fill_value=0) 
-                except Exception:
-                    st1=_resampling(st1)
-                    st1.merge(fill_value=0)                     
-                st1.detrend('demean') 
-                count_chuncks += 1; c3 += 1
-                if platform.system() == 'Windows':
-                    print('  * '+station.split("\\")[-1]+' ('+str(count_chuncks)+') .. '+month.split('T')[0]+' --> '+month.split('__')[1].split('T')[0]+' .. 3 components .. sampling rate: '+str(org_samplingRate))  
-                else:
-                    print('  * '+station.split("/")[-1]+' ('+str(count_chuncks)+') .. '+month.split('T')[0]+' --> '+month.split('__')[1].split('T')[0]+' .. 3 components .. sampling rate: '+str(org_samplingRate))  
-                 
-                st2 = read(matching[1], debug_headers=True) 
-                try:
-                    st2.merge(fill_value=0)                    
-                except Exception:
-                    st2=_resampling(st2)
-                    st2.merge(fill_value=0)                    
-                st2.detrend('demean')
-    
-                st3 = read(matching[2], debug_headers=True) 
-                try:
-                    st3.merge(fill_value=0)                     
-                except Exception:
-                    st3=_resampling(st3)
-                    st3.merge(fill_value=0) 
-                st3.detrend('demean')
-                
-                st1.append(st2[0])
-                st1.append(st3[0])
-                st1.filter('bandpass',freqmin = 1.0, freqmax = 45, corners=2, zerophase=True)
-                st1.taper(max_percentage=0.001, type='cosine', max_length=2)
-                if len([tr for tr in st1 if tr.stats.sampling_rate != 100.0]) != 0:
-                    try:
-                        st1.interpolate(100, method="linear")
-                    except Exception:
-                        st1=_resampling(st1)
-                        
-                                     
-                longest = st1[0].stats.npts
-                start_time = st1[0].stats.starttime
-                end_time = st1[0].stats.endtime
-                
-                for tt in st1:
-                    if tt.stats.npts > longest:
-                        longest = tt.stats.npts
-                        start_time = tt.stats.starttime
-                        end_time = tt.stats.endtime
-                    
-                st1.trim(start_time, end_time, pad=True, fill_value=0)
-
-                start_time = st1[0].stats.starttime
-                end_time = st1[0].stats.endtime  
-                slide_estimates.append((end_time - start_time)//tim_shift)                
-                fl_counts += 1 
-                
-                chanL = [st1[0].stats.channel[-1], st1[1].stats.channel[-1], st1[2].stats.channel[-1]]
-                next_slice = start_time+60               
-                while next_slice <= end_time:
-                    w = st1.slice(start_time, next_slice) 
-                    npz_data = np.zeros([6000,3])
-                                        
-                    npz_data[:,2] = w[chanL.index('Z')].data[:6000]
-                    try: 
-                        npz_data[:,0] = w[chanL.index('E')].data[:6000]
-                    except Exception:
-                        npz_data[:,0] = w[chanL.index('1')].data[:6000]
-                    try: 
-                        npz_data[:,1] = w[chanL.index('N')].data[:6000]
-                    except Exception:
-                        npz_data[:,1] = w[chanL.index('2')].data[:6000]                        
-                                     
-                    tr_name = st1[0].stats.station+'_'+st1[0].stats.network+'_'+st1[0].stats.channel[:2]+'_'+str(start_time)
-                    HDF = h5py.File(os.path.join(save_dir,output_name+'.hdf5'), 'r')
-                    dsF = HDF.create_dataset('data/'+tr_name, npz_data.shape, data = npz_data, dtype= np.float32)        
-                       
-                    dsF.attrs["trace_name"] = tr_name 
-                    if platform.system() == 'Windows':
-                        dsF.attrs["receiver_code"] = station.split("\\")[-1]
-                        dsF.attrs["network_code"] = stations_[station.split("\\")[-1]]['network']
-                        dsF.attrs["receiver_latitude"] = stations_[station.split("\\")[-1]]['coords'][0]
-                        dsF.attrs["receiver_longitude"] = stations_[station.split("\\")[-1]]['coords'][1]
-                        dsF.attrs["receiver_elevation_m"] = stations_[station.split("\\")[-1]]['coords'][2] 
+        else:
+            for k0 in range(0, n_windows, self.batch_size):
+                k1 = min(n_windows, k0 + self.batch_size)
+                batch = np.array(data[k0 * step:(k1 - 1) * step + 6000])
+                rows = []
+                for k in range(k0, k1):
+                    start_time = chunk['start_time'] + k * self.tim_shift
+                    tr_name = chunk['prefix']+'_'+str(start_time)
+                    if 'data/'+tr_name in self.reuse:
+                        self.HDF['data/'+tr_name][...] = batch[(k - k0) * step:(k - k0) * step + 6000]
+                        self.reuse.discard('data/'+tr_name)
                     else:
-                        dsF.attrs["receiver_code"] = station.split("/")[-1]
-                        dsF.attrs["network_code"] = stations_[station.split("/")[-1]]['network']
-                        dsF.attrs["receiver_latitude"] = stations_[station.split("/")[-1]]['coords'][0]
-                        dsF.attrs["receiver_longitude"] = stations_[station.split("/")[-1]]['coords'][1]
-                        dsF.attrs["receiver_elevation_m"] = stations_[station.split("/")[-1]]['coords'][2] 
-                    
+                        self.HDF.create_dataset('data/'+tr_name, (6000, 3), data=batch[(k - k0) * step:(k - k0) * step + 6000], dtype=np.float32)
                     start_time_str = str(start_time)   
                     start_time_str = start_time_str.replace('T', ' ')                 
                     start_time_str = start_time_str.replace('Z', '')          
-                    dsF.attrs['trace_start_time'] = start_time_str
-                    HDF.flush()
-                    output_writer.writerow([str(tr_name), start_time_str])  
-                    csvfile.flush()
-                    fln += 1            
-            
-                    start_time = start_time+tim_shift
-                    next_slice = next_slice+tim_shift 
-  
-            if len(matching) == 1:  
-                 count_chuncks += 1; c1 += 1
-                
-                 st1 = read(matching[0], debug_headers=True)
-                 org_samplingRate = st1[0].stats.sampling_rate
-
-                 for tr in st1:                   
-                     time_slots.append((tr.stats.starttime, tr.stats.endtime))
-                     comp_types.append(1)
-                 try:
-                     st1.merge(fill_value=0) 
-                 except Exception:
-                     st1=_resampling(st1)
-                     st1.merge(fill_value=0)                 
-                 st1.detrend('demean')
-                 
-                 if platform.system() == 'Windows':
-                     print('  * '+station.split("\\")[-1]+' ('+str(count_chuncks)+') .. '+month.split('T')[0]+' --> '+month.split('__')[1].split('T')[0]+' .. 1 components .. sampling rate: '+str(org_samplingRate)) 
-                 else:
-                     print('  * '+station.split("/")[-1]+' ('+str(count_chuncks)+') .. '+month.split('T')[0]+' --> '+month.split('__')[1].split('T')[0]+' .. 1 components .. sampling rate: '+str(org_samplingRate)) 
-                 
-                 st1.filter('bandpass',freqmin = 1.0, freqmax = 45, corners=2, zerophase=True)
-                 st1.taper(max_percentage=0.001, type='cosine', max_length=2)
-                 if len([tr for tr in st1 if tr.stats.sampling_rate != 100.0]) != 0:
-                     try:
-                         st1.interpolate(100, method="linear")
-                     except Exception:
-                         st1=_resampling(st1) 
-                         
-                 chan = st1[0].stats.channel
-                 start_time = st1[0].stats.starttime
-                 end_time = st1[0].stats.endtime
-                 slide_estimates.append((end_time - start_time)//tim_shift)
-                 fl_counts += 1    
-
-                 next_slice = start_time+60
-
-                 while next_slice <= end_time:
-                     w = st1.slice(start_time, next_slice)                    
-                     npz_data = np.zeros([6000,3])
-                     if chan[-1] == 'Z':
-                         npz_data[:,2] = w[0].data[:6000]
-                     if chan[-1] == 'E' or  chan[-1] == '1':
-                         npz_data[:,0] = w[0].data[:6000]
-                     if chan[-1] == 'N' or  chan[-1] == '2':
-                         npz_data[:,1] = w[0].data[:6000]
-                    
-                     tr_name = st1[0].stats.station+'_'+st1[0].stats.network+'_'+st1[0].stats.channel[:2]+'_'+str(start_time)
-                     HDF = h5py.File(os.path.join(save_dir,output_name+'.hdf5'), 'r')
-                     dsF = HDF.create_dataset('data/'+tr_name, npz_data.shape, data = npz_data, dtype= np.float32)        
-                     dsF.attrs["trace_name"] = tr_name 
-                     
-                     if platform.system() == 'Windows':
-                         dsF.attrs["receiver_code"] = station.split("\\")[-1]
-                         dsF.attrs["network_code"] = stations_[station.split("\\")[-1]]['network']
-                         dsF.attrs["receiver_latitude"] = stations_[station.split("\\")[-1]]['coords'][0]
-                         dsF.attrs["receiver_longitude"] = stations_[station.split("\\")[-1]]['coords'][1]
-                         dsF.attrs["receiver_elevation_m"] = stations_[station.split("\\")[-1]]['coords'][2]  
-                     else:                         
-                         dsF.attrs["receiver_code"] = station.split("/")[-1]
-                         dsF.attrs["network_code"] = stations_[station.split("/")[-1]]['network']
-                         dsF.attrs["receiver_latitude"] = stations_[station.split("/")[-1]]['coords'][0]
-                         dsF.attrs["receiver_longitude"] = stations_[station.split("/")[-1]]['coords'][1]
-                         dsF.attrs["receiver_elevation_m"] = stations_[station.split("/")[-1]]['coords'][2] 
-                         
-                     start_time_str = str(start_time)   
-                     start_time_str = start_time_str.replace('T', ' ')                 
-                     start_time_str = start_time_str.replace('Z', '')          
-                     dsF.attrs['trace_start_time'] = start_time_str
-                     HDF.flush()
-                     output_writer.writerow([str(tr_name), start_time_str])  
-                     csvfile.flush()
-                     fln += 1            
-
-                     start_time = start_time+tim_shift
-                     next_slice = next_slice+tim_shift                
-                
-            if len(matching) == 2:  
-                count_chuncks += 1; c2 += 1                
-                st1 = read(matching[0], debug_headers=True)
-                org_samplingRate = st1[0].stats.sampling_rate
-
-                for tr in st1:                   
-                    time_slots.append((tr.stats.starttime, tr.stats.endtime))
-                    comp_types.append(2)
-
-                try:
-                    st1.merge(fill_value=0) 
-                except Exception:
-                    st1=_resampling(st1)
-                    st1.merge(fill_value=0)  
-                st1.detrend('demean')  
-                
-                org_samplingRate = st1[0].stats.sampling_rate
-                
-                if platform.system() == 'Windows':
-                    print('  * '+station.split("\\")[-1]+' ('+str(count_chuncks)+') .. '+month.split('T')[0]+' --> '+month.split('__')[1].split('T')[0]+' .. 2 components .. sampling rate: '+str(org_samplingRate)) 
-                else:    
-                    print('  * '+station.split("/")[-1]+' ('+str(count_chuncks)+') .. '+month.split('T')[0]+' --> '+month.split('__')[1].split('T')[0]+' .. 2 components .. sampling rate: '+str(org_samplingRate)) 
-                 
-                st2 = read(matching[1], debug_headers=True)  
-                try:
-                    st2.merge(fill_value=0) 
-                except Exception:
-                    st2=_resampling(st1)
-                    st2.merge(fill_value=0)                 
-                st2.detrend('demean')
-    
-                st1.append(st2[0])
-                st1.filter('bandpass',freqmin = 1.0, freqmax = 45, corners=2, zerophase=True)
-                st1.taper(max_percentage=0.001, type='cosine', max_length=2)
-                if len([tr for tr in st1 if tr.stats.sampling_rate != 100.0]) != 0:
-                    try:
-                        st1.interpolate(100, method="linear")
-                    except Exception:
-                        st1=_resampling(st1)   
-                        
-                longest = st1[0].stats.npts
-                start_time = st1[0].stats.starttime
-                end_time = st1[0].stats.endtime
-                
-                for tt in st1:
-                    if tt.stats.npts > longest:
-                        longest = tt.stats.npts
-                        start_time = tt.stats.starttime
-                        end_time = tt.stats.endtime               
-                
-                st1.trim(start_time, end_time, pad=True, fill_value=0)
-
-                start_time = st1[0].stats.starttime
-                end_time = st1[0].stats.endtime
-                slide_estimates.append((end_time - start_time)//tim_shift)
-                
-                chan1 = st1[0].stats.channel
-                chan2 = st1[1].stats.channel
-                fl_counts += 1  
-                
-                next_slice = start_time+60
-
-                while next_slice <= end_time:
-                    w = st1.slice(start_time, next_slice)                     
-                    npz_data = np.zeros([6000,3])
-                    if chan1[-1] == 'Z':
-                        npz_data[:,2] = w[0].data[:6000]
-                    elif chan1[-1] == 'E' or  chan1[-1] == '1':
-                        npz_data[:,0] = w[0].data[:6000]
-                    elif chan1[-1] == 'N' or  chan1[-1] == '2':
-                        npz_data[:,1] = w[0].data[:6000]
-
-                    if chan2[-1] == 'Z':
-                        npz_data[:,2] = w[1].data[:6000]
-                    elif chan2[-1] == 'E' or  chan2[-1] == '1':
-                        npz_data[:,0] = w[1].data[:6000]
-                    elif chan2[-1] == 'N' or  chan2[-1] == '2':
-                        npz_data[:,1] = w[1].data[:6000]
-                    
-                    tr_name = st1[0].stats.station+'_'+st1[0].stats.network+'_'+st1[0].stats.channel[:2]+'_'+str(start_time)
-                    HDF = h5py.File(os.path.join(save_dir,output_name+'.hdf5'), 'r')
-                    dsF = HDF.create_dataset('data/'+tr_name, npz_data.shape, data = npz_data, dtype= np.float32)        
-                       
-                    dsF.attrs["trace_name"] = tr_name 
-                    
-                    if platform.system() == 'Windows':
-                        dsF.attrs["receiver_code"] = station.split("\\")[-1]
-                        dsF.attrs["network_code"] = stations_[station.split("\\")[-1]]['network']
-                        dsF.attrs["receiver_latitude"] = stations_[station.split("\\")[-1]]['coords'][0]
-                        dsF.attrs["receiver_longitude"] = stations_[station.split("\\")[-1]]['coords'][1]
-                        dsF.attrs["receiver_elevation_m"] = stations_[station.split("\\")[-1]]['coords'][2] 
-                    else:    
-                        dsF.attrs["receiver_code"] = station.split("/")[-1]
-                        dsF.attrs["network_code"] = stations_[station.split("/")[-1]]['network']
-                        dsF.attrs["receiver_latitude"] = stations_[station.split("/")[-1]]['coords'][0]
-                        dsF.attrs["receiver_longitude"] = stations_[station.split("/")[-1]]['coords'][1]
-                        dsF.attrs["receiver_elevation_m"] = stations_[station.split("/")[-1]]['coords'][2] 
-                    
-                    start_time_str = str(start_time)   
-                    start_time_str = start_time_str.replace('T', ' ')                 
-                    start_time_str = start_time_str.replace('Z', '')          
-                    dsF.attrs['trace_start_time'] = start_time_str
-                    HDF.flush()
-                    output_writer.writerow([str(tr_name), start_time_str])  
-                    csvfile.flush()
-                    fln += 1            
-            
-                    start_time = start_time+tim_shift
-                    next_slice = next_slice+tim_shift 
-                    
-            st1, st2, st3 = None, None, None
-                
-        HDF.close() 
+                    rows.append([str(tr_name), start_time_str] + qc[k])
+                self.output_writer.writerows(rows)
+                self.fln += k1 - k0
         
-        dd = pd.read_csv(os.path.join(save_dir, output_name+".csv"))
-                
+        self.HDF.flush()
+        self.csvfile.flush()
+        del data
+        os.remove(chunk['path'])
         
-        assert count_chuncks == len(uni_list)  
-        assert sum(slide_estimates)-(fln/100) <= len(dd) <= sum(slide_estimates)+10
-        data_track[output_name]=[time_slots, comp_types]
-        print(f" Station {output_name} had {len(uni_list)} chuncks of data") 
-        print(f"{len(dd)} slices were written, {sum(slide_estimates)} were expected.")
-        print(f"Number of 1-components: {c1}. Number of 2-components: {c2}. Number of 3-components: {c3}.")
-        try:
-            print(f"Original samplieng rate: {org_samplingRate}.") 
-            repfile.write(f' Station {output_name} had {len(uni_list)} chuncks of data, {len(dd)} slices were written, {int(sum(slide_estimates))} were expected. Number of 1-components: {c1}, Number of 2-components: {c2}, number of 3-components: {c3}, original samplieng rate: {org_samplingRate}\n')
-        except Exception:
-            pass
-    with ThreadPool(n_processor) as p:
-        p.map(process, station_list) 
-    with open(os.path.join(preproc_dir,'time_tracks.pkl'), 'wb') as f:
-        pickle.dump(data_track, f, pickle.HIGHEST_PROTOCOL)
+    def close(self, n_chunks, repfile):
+        ' closes the files, checks and reports the number of slices, and returns the time track of the station '
+        
+        for name in self.reuse:
+            del self.HDF[name]
+        self.HDF.close() 
+        self.csvfile.close()
+        output_name = self.output_name
+        dd = pd.read_csv(os.path.join(self.save_dir, output_name+".csv"))
+        dd = dd[self.n_old:]
+        
+        assert self.count_chuncks == n_chunks  
+        assert sum(self.slide_estimates)-(self.fln/100) <= len(dd) <= sum(self.slide_estimates)+10
+        print(f" Station {output_name} had {n_chunks} chuncks of data") 
+        print(f"{len(dd)} slices were written, {sum(self.slide_estimates)} were expected.")
+        print(f"Number of 1-components: {self.c1}. Number of 2-components: {self.c2}. Number of 3-components: {self.c3}.")
+        n_dead = int(np.sum(dead_windows(dd))) if set(QC_COLUMNS) <= set(dd.columns) else 0
+        print(f"{n_dead} slices are mostly gaps or dead channels.")
+        if self.org_samplingRate is not None:
+            print(f"Original samplieng rate: {self.org_samplingRate}.") 
+            repfile.write(f' Station {output_name} had {n_chunks} chuncks of data, {len(dd)} slices were written, {int(sum(self.slide_estimates))} were expected. Number of 1-components: {self.c1}, Number of 2-components: {self.c2}, number of 3-components: {self.c3}, original samplieng rate: {self.org_samplingRate}, {n_dead} slices are mostly gaps or dead channels\n')
+        return [self.time_slots, self.comp_types]
+
+
+
+def _new_chunks(save_dir, output_name, chunks, catalog, track):
+    
+    """ 
+    
+    Returns the chunks of a station that are not in its time track yet, for appending, and the hdf5 datasets of the 
+    removed slices. A chunk whose first file now ends later than its time slots according to the catalog, is returned too 
+    and its slices and time slots are removed, to be preprocessed again with the new data.
+    
+    """
+    
+    time_slots, comp_types = track
+    new_list, dropped = [], []
+    for month, matching in chunks:
+        t0, t1 = UTCDateTime(month.split('__')[0]), UTCDateTime(month.split('__')[1].split('.')[0])
+        index = [k for k, slot in enumerate(time_slots) if t0 <= slot[0] < t1]
+        if not index:
+            new_list.append((month, matching))
+            continue
+        if UTCDateTime(catalog.span(matching[0])[1]) > max([time_slots[k][1] for k in index]):
+            dropped += _drop_slices(save_dir, output_name, min([t0] + [time_slots[k][0] for k in index]), 
+                                    max([t1] + [time_slots[k][1] for k in index]))
+            track[0] = time_slots = [slot for k, slot in enumerate(time_slots) if k not in index]
+            track[1] = comp_types = [comp for k, comp in enumerate(comp_types) if k not in index]
+            new_list.append((month, matching))
+    return new_list, dropped
+
+
+
+def _drop_slices(save_dir, output_name, starttime, endtime):
+    ' removes the slices of a station starting from starttime to endtime from its csv file and returns the names of their hdf5 datasets, which _StationWriter rewrites or deletes '
+    
+    csv_name = os.path.join(save_dir, output_name+".csv")
+    df = pd.read_csv(csv_name)
+    start_times = pd.to_datetime(df.start_time)
+    mask = (start_times >= pd.Timestamp(starttime.datetime)) & (start_times < pd.Timestamp(endtime.datetime))
+    with h5py.File(os.path.join(save_dir, output_name+'.hdf5'), 'r') as HDF:
+        names = ['data/'+tr_name for tr_name in df.trace_name[mask] if 'data/'+tr_name in HDF]
+        if 'chunk' in df.columns:
+            names += ['continuous/'+chunk_name for chunk_name in sorted(set(df.chunk[mask]))]
+    df[~mask].to_csv(csv_name, index=False)
+    return names
+
+
+
+class ContinuousWindow():
+
+    """
+
+    A slice of a continuous trace written by preprocessor with storage='continuous'. It is read on the fly, when it is 
+    converted to an array, so it can be used in place of the datasets of the slices. Its attrs are those of the chunk, 
+    with the name and start time of the slice.
+
+    Parameters
+    ----------
+    dataset: obj
+        The (npts, 3) hdf5 dataset of the chunk.
+
+    trace_name: str
+        Name of the slice.
+
+    offset: int
+        Index of the first sample of the slice in the chunk.
+
+    start_time: str
+        Start time of the slice.
+
+    npts: int, default=6000
+        Length of the slice.
+
+    """
+
+    def __init__(self, dataset, trace_name, offset, start_time, npts=6000):
+        self.dataset = dataset
+        self.offset = int(offset)
+        self.npts = npts
+        self.trace_name = trace_name
+        self.start_time = start_time
+
+    @property
+    def attrs(self):
+        ' the attributes of the chunk are only read when they are asked for '
+        attrs = dict(self.dataset.attrs)
+        attrs['trace_name'] = self.trace_name
+        attrs['trace_start_time'] = self.start_time
+        return attrs
+
+    def __array__(self, dtype=None, copy=None):
+        data = np.zeros((self.npts, self.dataset.shape[1]), dtype=self.dataset.dtype)
+        window = self.dataset[self.offset:self.offset+self.npts]
+        data[:len(window)] = window
+        return data if dtype is None else data.astype(dtype)
+
+
+
+def window_index(df):
+
+    """
+
+    Returns the chunk, offset, and start time of each slice listed in a station.csv file written by preprocessor with
+    storage='continuous', or None for a file of the slices format.
+
+    Parameters
+    ----------
+    df: obj
+        The station.csv file as a dataframe.
+
+    Returns
+    ----------
+    windows: dic
+        {trace_name: (chunk, offset, start_time)}
+
+    """
+
+    if 'chunk' not in df.columns:
+        return None
+    return dict(zip(df.trace_name, zip(df.chunk, df.offset, df.start_time)))
+
+
+
+def get_window(fl, trace_name, windows=None):
+
+    """
+
+    Returns a slice of a file written by preprocessor in either format.
+
+    Parameters
+    ----------
+    fl: obj
+        The station.hdf5 file.
+
+    trace_name: str
+        Name of the slice.
+
+    windows: dic, default=None
+        The window_index of the station.csv file.
+
+    Returns
+    ----------
+    dataset: obj
+        The hdf5 dataset of the slice, or a ContinuousWindow.
+
+    """
+
+    if windows is None:
+        return fl.get('data/'+str(trace_name))
+    chunk, offset, start_time = windows[trace_name]
+    return ContinuousWindow(fl['continuous/'+str(chunk)], trace_name, offset, start_time)
+
+
+
+@lru_cache(maxsize=None)
+def _read_stations(stations_json, mtime):
+    with open(stations_json) as json_file:
+        return json.load(json_file)
+
+
+
+def load_stations(stations_json):
+
+    """
+
+    Returns the station list of a station_list.json file. It is read once per process, and again only if the file 
+    changes, so it is shared and should not be modified.
+
+    Parameters
+    ----------
+    stations_json: str
+        Path to the station_list.json file.
+
+    Returns
+    ----------
+    stations: dic
+        {station: {'network': str, 'channels': list, 'coords': [latitude, longitude, elevation]}}
+
+    """
+
+    return _read_stations(os.path.abspath(stations_json), os.path.getmtime(stations_json))
+
+
+
+def station_attrs(fl):
+
+    """
+
+    Returns the station attributes (STATION_ATTRS) of a station.hdf5 file written by preprocessor, from its root 
+    attributes, or from its first slice or chunk for the files written before these were stored once per station.
+
+    Parameters
+    ----------
+    fl: obj
+        The station.hdf5 file.
+
+    Returns
+    ----------
+    attrs: dic
+        {receiver_code, network_code, receiver_latitude, receiver_longitude, receiver_elevation_m}, empty for a file 
+        without them.
+
+    """
+
+    if STATION_ATTRS[0] in fl.attrs:
+        return {key: fl.attrs[key] for key in STATION_ATTRS}
+    for group in ['data', 'continuous']:
+        if group in fl and len(fl[group]):
+            attrs = fl[group][next(iter(fl[group]))].attrs
+            return {key: attrs[key] for key in STATION_ATTRS}
+    return {}
 
 
 
-def stationListFromMseed(mseed_directory, station_locations, dir_json='./'):
+def stationListFromMseed(mseed_directory, station_locations, dir_json='./', catalog_path=None):
     """
     Contributed by: Tyler Newton
         
@@ -482,6 +671,10 @@ def stationListFromMseed(mseed_directory, station_locations, dir_json='./'):
         -117.49268, 796.4], "CA10": [35.56736, -117.667427, 835.9]}
     dir_json: str
         String specifying the path to the output json file.
+    catalog_path: str
+        Path of the SQLite catalog of the miniseed files, see MseedCatalog. The channels are taken from the record 
+        headers it keeps, so the files are only read when they are new or changed. None keeps it in 
+        mseed_directory/.mseed_catalog.sqlite.
    
     Returns
     -------
@@ -496,19 +689,14 @@ def stationListFromMseed(mseed_directory, station_locations, dir_json='./'):
 
     station_list = {}
 
-    # loop through subdirectories of specified directory
-    for subdirectory in os.scandir(mseed_directory):
-        if subdirectory.is_dir():
-            channels = []
-            # build channel list from miniseed files
-            for mseed_file in os.scandir(subdirectory.path):
-                temp_stream = read(mseed_file.path, debug_headers=True)
-                channels.append(temp_stream[0].stats.channel)
-            # add entry to station list for the current station
-            station_list[str(temp_stream[0].stats.station)] = {"network":
-                        temp_stream[0].stats.network, "channels": list(set(
-                        channels)), "coords": station_locations[str(
-                        temp_stream[0].stats.station)]}
+    # loop through the station subdirectories in the catalog of the specified directory
+    catalog = MseedCatalog(mseed_directory, catalog_path)
+    for subdirectory in catalog.stations():
+        network, station, channels = catalog.channels(subdirectory)
+        # add entry to station list for the current station
+        station_list[str(station)] = {"network": network, "channels": channels, 
+                                      "coords": station_locations[str(station)]}
+    catalog.close()
     
     if not os.path.exists(dir_json):
         os.makedirs(dir_json)
@@ -516,18 +704,3 @@ def stationListFromMseed(mseed_directory, station_locations, dir_json='./'):
     with open(jfilename, 'w') as fp:
         json.dump(station_list, fp)             
         
-def _resampling(st):
-    need_resampling = [tr for tr in st if tr.stats.sampling_rate != 100.0]
-    if len(need_resampling) > 0:
-       # print('resampling ...', flush=True)    
-        for indx, tr in enumerate(need_resampling):
-            if tr.stats.delta < 0.01:
-                tr.filter('lowpass',freq=45,zerophase=True)
-            tr.resample(100)
-            tr.stats.sampling_rate = 100
-            tr.stats.delta = 0.01
-            tr.data.dtype = 'int32'
-            st.remove(tr)                    
-            st.append(tr)    
-             
-    return st
\ No newline at end of file
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 19:06:44 2026
+
+last update: 10/19/2026
+
+"""
+
+import os
+import sqlite3
+from obspy import read
+from obspy.io.mseed import util as mseed_util
+from .preprocessing import _record_span
+
+# bump when the schema of the catalog changes
+CATALOG_VERSION = 1
+
+CATALOG_NAME = '.mseed_catalog.sqlite'
+
+
+
+def _header(path):
+    ' network, station, location, channel, starttime, endtime, and sampling rate of a MiniSEED file from its record headers '
+
+    record = _record_span(path)
+    if record:
+        info = mseed_util.get_record_information(path)
+        return (info['network'], info['station'], info['location'], info['channel'],
+                record[0].timestamp, record[1].timestamp, record[2])
+    st = read(path, headonly=True)
+    return (st[0].stats.network, st[0].stats.station, st[0].stats.location, st[0].stats.channel,
+            min([tr.stats.starttime for tr in st]).timestamp, max([tr.stats.endtime for tr in st]).timestamp,
+            st[0].stats.sampling_rate)
+
+
+
+class MseedCatalog():
+
+    """
+
+    On-disk SQLite index of an archive of MiniSEED files, with one subdirectory per station and one file per
+    component and chunk of data, named NETWORK.STATION.LOCATION.CHANNEL__STARTTIMESTAMP__ENDTIMESTAMP.mseed as
+    written by downloadMseeds.
+
+    Each file is listed with its station directory, its chunk (STARTTIMESTAMP__ENDTIMESTAMP.mseed), the codes, time
+    span, and sampling rate from its record headers, and its size and modification time. refresh only reads the
+    headers of the files that are new or whose size or modification time changed, and removes deleted files, so
+    after the first run the archive is only listed. preprocessor, mseed_predictor, and stationListFromMseed query
+    it instead of scanning and grouping the files themselves.
+
+    Parameters
+    ----------
+    mseed_dir: str
+        Directory of the archive.
+
+    catalog_path: str, default=None
+        Path of the SQLite file. None uses mseed_dir/.mseed_catalog.sqlite, or an in-memory catalog if mseed_dir is
+        not writable.
+
+    refresh: bool, default=True
+        If True, the catalog is refreshed when it is opened.
+
+    Attributes
+    ----------
+    added, updated, removed: int
+        Number of files added, read again, and removed by the last refresh.
+
+    """
+
+    def __init__(self, mseed_dir, catalog_path=None, refresh=True):
+        self.mseed_dir = mseed_dir
+        if catalog_path is None:
+            catalog_path = os.path.join(mseed_dir, CATALOG_NAME) if os.access(mseed_dir, os.W_OK) else ':memory:'
+        self.catalog_path = catalog_path
+        self.added = self.updated = self.removed = 0
+        self.db = sqlite3.connect(catalog_path, timeout=60)
+        if self.db.execute('PRAGMA user_version').fetchone()[0] != CATALOG_VERSION:
+            self.db.execute('DROP TABLE IF EXISTS files')
+        self.db.execute('CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, directory TEXT, chunk TEXT, '
+                        'network TEXT, station TEXT, location TEXT, channel TEXT, starttime REAL, endtime REAL, '
+                        'sampling_rate REAL, size INTEGER, mtime REAL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS files_directory ON files (directory, chunk)')
+        self.db.execute('PRAGMA user_version = '+str(CATALOG_VERSION))
+        self.db.commit()
+        if refresh:
+            self.refresh()
+
+
+    def refresh(self):
+
+        """
+
+        Brings the catalog up to date with the files in the archive.
+
+        """
+
+        known = {path: (size, mtime) for path, size, mtime in self.db.execute('SELECT path, size, mtime FROM files')}
+        rows, seen = [], set()
+        for directory in os.scandir(self.mseed_dir):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                parts = entry.name.split('__')
+                if len(parts) < 3 or not entry.name.lower().endswith('.mseed') or not entry.is_file():
+                    continue
+                path = directory.name+'/'+entry.name
+                seen.add(path)
+                stat = entry.stat()
+                if known.get(path) == (stat.st_size, stat.st_mtime):
+                    continue
+                try:
+                    header = _header(entry.path)
+                except Exception:
+                    print(' *** '+entry.path+' could not be read and is left out.', flush=True)
+                    continue
+                rows.append((path, directory.name, parts[1]+'__'+parts[2]) + header + (stat.st_size, stat.st_mtime))
+                if path in known:
+                    self.updated += 1
+                else:
+                    self.added += 1
+
+        removed = [(path,) for path in known if path not in seen]
+        self.removed = len(removed)
+        self.db.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        self.db.executemany('DELETE FROM files WHERE path = ?', removed)
+        self.db.commit()
+
+
+    def stations(self):
+
+        """
+
+        Returns the sorted names of the station directories that have files.
+
+        """
+
+        return [row[0] for row in self.db.execute('SELECT DISTINCT directory FROM files ORDER BY directory')]
+
+
+    def chunks(self, station):
+
+        """
+
+        Returns the chunks of data of a station directory.
+
+        Parameters
+        ----------
+        station: str
+            Name of the station directory.
+
+        Returns
+        ----------
+        chunks: list
+            (chunk, files) sorted by chunk, where files are the paths of its files relative to mseed_dir, sorted.
+
+        """
+
+        chunks = []
+        for chunk, path in self.db.execute('SELECT chunk, path FROM files WHERE directory = ? ORDER BY chunk, path', (station,)):
+            if not chunks or chunks[-1][0] != chunk:
+                chunks.append((chunk, []))
+            chunks[-1][1].append(os.path.join(*path.split('/')))
+        return chunks
+
+
+    def channels(self, station):
+
+        """
+
+        Returns the network code, station code, and sorted channel codes of a station directory.
+
+        """
+
+        rows = self.db.execute('SELECT DISTINCT network, station, channel FROM files WHERE directory = ? ORDER BY channel',
+                               (station,)).fetchall()
+        return rows[0][0], rows[0][1], [row[2] for row in rows]
+
+
+    def span(self, path):
+
+        """
+
+        Returns the starttime, endtime (as timestamps), and sampling rate of a file, by its path relative to mseed_dir.
+
+        """
+
+        return self.db.execute('SELECT starttime, endtime, sampling_rate FROM files WHERE path = ?',
+                               ('/'.join(os.path.normpath(path).split(os.sep)),)).fetchone()
+
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 21:12:05 2026
+
+last update: 10/19/2026
+
+"""
+
+import os
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import h5py
+from tqdm import tqdm
+
+# waveforms of all the traces, (number of traces, samples, channels)
+PACKED_DATA = 'packed/data'
+
+# one dataset per attribute, in the order of the traces
+PACKED_METADATA = 'packed/metadata'
+
+# suffix of the metadata index saved next to a dataset
+INDEX_SUFFIX = '_index.npy'
+
+# attributes the training and test generators read, with their type in the packed file
+PACKED_COLUMNS = {'trace_name': 'S',
+                  'trace_category': 'S',
+                  'p_arrival_sample': 'f8',
+                  's_arrival_sample': 'f8',
+                  'coda_end_sample': 'f8',
+                  'snr_db': 'f8'}
+
+
+
+def _float(value):
+    ' an attribute as a float, NaN if it is missing or empty '
+
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+
+def pack_hdf5(input_hdf5, output_hdf5, input_csv=None, chunk_traces=1, block_size=1000):
+
+    """
+
+    Converts a training dataset with one hdf5 dataset per trace (data/trace_name, as STEAD) into the packed layout:
+    a single float32 dataset holding the waveforms of all the traces and a columnar table of the attributes the
+    generators use (PACKED_COLUMNS), so a batch is read with one sorted selection instead of one small dataset and
+    its attributes per trace. DataGenerator, DataGeneratorTest, and data_reader read both layouts with the same
+    trace names, so the csv file and the training, validation, and test lists stay the same. tester needs the
+    original file, since the other attributes it reports are not packed.
+
+    Parameters
+    ----------
+    input_hdf5: str
+        Path to the hdf5 file with one dataset per trace.
+
+    output_hdf5: str
+        Path of the packed hdf5 file.
+
+    input_csv: str, default=None
+        Path to the csv file of the dataset. Only its trace_name column is used, to pick and order the traces.
+        If None, all the traces of input_hdf5 are packed in the order of their names.
+
+    chunk_traces: int, default=1
+        Number of traces in one chunk of the waveforms dataset. One trace per chunk is the fastest for random batches.
+        None stores the waveforms contiguously, which is a bit faster to read but cannot be compressed or resized.
+
+    block_size: int, default=1000
+        Number of traces copied at a time.
+
+    Returns
+    --------
+    output_hdf5: packed hdf5 file. Attributes missing from a trace are stored as NaN or an empty string.
+
+    """
+
+    with h5py.File(input_hdf5, 'r') as fin, h5py.File(output_hdf5, 'w') as fout:
+        if input_csv:
+            trace_names = pd.read_csv(input_csv, usecols=['trace_name'])['trace_name'].astype(str).tolist()
+        else:
+            trace_names = sorted(fin['data'].keys())
+        shape = fin['data/'+trace_names[0]].shape
+        data = fout.create_dataset(PACKED_DATA, shape=(len(trace_names),)+shape, dtype=np.float32,
+                                   chunks=(min(chunk_traces, len(trace_names)),)+shape if chunk_traces else None)
+        columns = {name: [] for name in PACKED_COLUMNS}
+
+        pbar = tqdm(total=len(trace_names))
+        for start in range(0, len(trace_names), block_size):
+            names = trace_names[start:start+block_size]
+            block = np.zeros((len(names),)+shape, dtype=np.float32)
+            for k, name in enumerate(names):
+                pbar.update()
+                dataset = fin['data/'+name]
+                block[k] = dataset[()]
+                columns['trace_name'].append(name)
+                columns['trace_category'].append(str(dataset.attrs.get('trace_category', '')))
+                for column in ['p_arrival_sample', 's_arrival_sample', 'coda_end_sample']:
+                    columns[column].append(_float(dataset.attrs.get(column)))
+                snr = np.full(shape[-1], np.nan)
+                if 'snr_db' in dataset.attrs:
+                    snr[:] = dataset.attrs['snr_db']
+                columns['snr_db'].append(snr)
+            data[start:start+len(names)] = block
+        pbar.close()
+
+        for name, dtype in PACKED_COLUMNS.items():
+            fout.create_dataset(PACKED_METADATA+'/'+name, data=np.array(columns[name], dtype=dtype))
+
+
+
+def build_metadata_index(file_name):
+
+    """
+
+    Builds the metadata index of a training dataset with one hdf5 dataset per trace or a packed one: a structured
+    array with one record per trace, in the order of the traces of the packed file or of their names. The integer
+    id of a trace is its position in the index, and for a packed file also its row in PACKED_DATA.
+
+    Parameters
+    ----------
+    file_name: str
+        Path to the hdf5 file.
+
+    Returns
+    --------
+    index: structured numpy array
+        Fields trace_name (bytes), event (the name ends with _EV), earthquake (trace_category is earthquake_local),
+        noise (trace_category is noise), p_arrival_sample, s_arrival_sample, coda_end_sample (NaN if missing), and
+        snr_db (one value per channel).
+
+    """
+
+    with h5py.File(file_name, 'r') as fl:
+        if PACKED_DATA in fl:
+            columns = {name: fl[PACKED_METADATA+'/'+name][()] for name in PACKED_COLUMNS}
+            n_channels = fl[PACKED_DATA].shape[-1]
+        else:
+            names = sorted(fl['data'].keys())
+            columns = {name: [] for name in PACKED_COLUMNS}
+            n_channels = fl['data/'+names[0]].shape[-1] if names else 3
+            for name in tqdm(names):
+                attrs = fl['data/'+name].attrs
+                columns['trace_name'].append(name)
+                columns['trace_category'].append(str(attrs.get('trace_category', '')))
+                for column in ['p_arrival_sample', 's_arrival_sample', 'coda_end_sample']:
+                    columns[column].append(_float(attrs.get(column)))
+                snr = np.full(n_channels, np.nan)
+                if 'snr_db' in attrs:
+                    snr[:] = attrs['snr_db']
+                columns['snr_db'].append(snr)
+            columns = {name: np.array(values, dtype=PACKED_COLUMNS[name]) for name, values in columns.items()}
+
+    # plain bytes, without the string metadata of h5py
+    trace_name = np.array(columns['trace_name'].tolist(), dtype='S')
+    category = columns['trace_category'].astype(str)
+    index = np.zeros(len(trace_name), dtype=[('trace_name', trace_name.dtype),
+                                             ('event', '?'),
+                                             ('earthquake', '?'),
+                                             ('noise', '?'),
+                                             ('p_arrival_sample', 'f8'),
+                                             ('s_arrival_sample', 'f8'),
+                                             ('coda_end_sample', 'f8'),
+                                             ('snr_db', 'f8', (n_channels,))])
+    index['trace_name'] = trace_name
+    index['event'] = np.char.endswith(trace_name, b'_EV')
+    index['earthquake'] = category == 'earthquake_local'
+    index['noise'] = category == 'noise'
+    for column in ['p_arrival_sample', 's_arrival_sample', 'coda_end_sample', 'snr_db']:
+        index[column] = columns[column]
+    return index
+
+
+
+@lru_cache(maxsize=8)
+def _metadata_index(file_name, mtime):
+    ' the index of a file, from its cache next to it if that is newer than the file '
+
+    index_path = os.path.splitext(file_name)[0]+INDEX_SUFFIX
+    if os.path.isfile(index_path) and os.path.getmtime(index_path) >= mtime:
+        return np.load(index_path)
+    index = build_metadata_index(file_name)
+    try:
+        # written aside and renamed, so another process never loads a partial index
+        with open(index_path+'.'+str(os.getpid()), 'wb') as f:
+            np.save(f, index)
+        os.replace(index_path+'.'+str(os.getpid()), index_path)
+    except OSError:
+        print(' *** the metadata index could not be saved next to '+file_name+'.', flush=True)
+    return index
+
+
+
+@lru_cache(maxsize=8)
+def _index_ids(file_name, mtime):
+    ' id of each trace name of a file '
+
+    return {name: i for i, name in enumerate(_metadata_index(file_name, mtime)['trace_name'].astype(str))}
+
+
+
+def metadata_index(file_name):
+
+    """
+
+    Returns the metadata index of a training dataset (see build_metadata_index). It is built once and saved next
+    to the hdf5 file as NAME_index.npy, which is rebuilt when the hdf5 file is newer, and it is loaded once per
+    process.
+
+    Parameters
+    ----------
+    file_name: str
+        Path to the hdf5 file.
+
+    Returns
+    --------
+    index: structured numpy array
+        One record per trace, by integer id.
+
+    """
+
+    file_name = os.path.abspath(file_name)
+    return _metadata_index(file_name, os.path.getmtime(file_name))
+
+
+
+def trace_ids(file_name, list_IDs):
+
+    """
+
+    Returns the integer ids of a list of trace names in the metadata index of a dataset. A list of integer ids is
+    returned as it is.
+
+    Parameters
+    ----------
+    file_name: str
+        Path to the hdf5 file.
+
+    list_IDs: list
+        Trace names or ids.
+
+    Returns
+    --------
+    ids: 1D numpy array
+        Integer ids.
+
+    """
+
+    if all([isinstance(ID, (int, np.integer)) for ID in list_IDs]):
+        return np.array(list_IDs, dtype=np.int64)
+    file_name = os.path.abspath(file_name)
+    ids = _index_ids(file_name, os.path.getmtime(file_name))
+    return np.array([ids[str(ID)] for ID in list_IDs], dtype=np.int64)
+
+
+
+def iter_traces(fl, ids, block_size=1000):
+
+    """
+
+    Yields the waveform and metadata of each trace of ids in order, from an hdf5 file with one dataset per trace or
+    a packed one. From a packed file the waveforms of block_size traces at a time are read in the order of their
+    rows, one hyperslab per run of consecutive rows.
+
+    Parameters
+    ----------
+    fl: obj
+        Open h5py file.
+
+    ids: list
+        Integer ids of the traces in the metadata index of the file.
+
+    block_size: int, default=1000
+        Number of traces read at a time from a packed file.
+
+    Yields
+    --------
+    data: 2D numpy array
+        A writable copy of the waveform.
+
+    meta: numpy record
+        The record of the trace in the metadata index.
+
+    """
+
+    index = metadata_index(fl.filename)
+    if PACKED_DATA not in fl:
+        for i in ids:
+            yield np.array(fl['data/'+index['trace_name'][i].decode()]), index[i]
+        return
+
+    waveforms = fl[PACKED_DATA]
+    for start in range(0, len(ids), block_size):
+        rows = np.asarray(ids[start:start+block_size])
+        unique, inverse = np.unique(rows, return_inverse=True)
+        # each run of consecutive rows is one hyperslab; h5py point selections are much slower on chunked datasets
+        block = np.empty((len(unique),)+waveforms.shape[1:], dtype=waveforms.dtype)
+        for run in np.split(np.arange(len(unique)), np.flatnonzero(np.diff(unique) != 1) + 1):
+            block[run[0]:run[-1]+1] = waveforms[unique[run[0]]:unique[run[-1]]+1]
+        for k, row in zip(inverse, rows):
+            yield np.array(block[k]), index[row]
@@ -0,0 +1,697 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 16:40:21 2026
+
+last update: 10/19/2026
+
+"""
+
+from functools import lru_cache
+from fractions import Fraction
+import warnings
+import numpy as np
+from scipy.signal import iirfilter, sosfilt, firwin, resample_poly
+from obspy import read
+from obspy.io.mseed import util as mseed_util
+from obspy.signal.invsim import cosine_taper
+
+
+
+@lru_cache(maxsize=None)
+def _bandpass_sos(sampling_rate, freqmin, freqmax, corners):
+    ' Butterworth second-order sections of the bandpass designed the same way as in ObsPy, in float32. '
+
+    fe = 0.5 * sampling_rate
+    if freqmax / fe - 1.0 > -1e-6:
+        # like ObsPy, a high corner at or above Nyquist turns the bandpass into a highpass
+        sos = iirfilter(corners, freqmin / fe, btype='highpass', ftype='butter', output='sos')
+    else:
+        if freqmin / fe > 1:
+            raise ValueError('Selected low corner frequency is above Nyquist.')
+        sos = iirfilter(corners, [freqmin / fe, freqmax / fe], btype='band', ftype='butter', output='sos')
+    return sos.astype(np.float32)
+
+
+
+@lru_cache(maxsize=None)
+def _filter_padding(sampling_rate, freqmin, freqmax, corners):
+    ' Samples after which the impulse response of the bandpass has decayed far below float32 resolution. '
+
+    sos = _bandpass_sos(sampling_rate, freqmin, freqmax, corners).astype(np.float64)
+    radius = max([np.max(np.abs(np.roots(section[3:]))) for section in sos])
+    # twice the decay length to 1e-16, for the repeated poles of the cascaded sections
+    return 2 * int(np.ceil(np.log(1e-16) / np.log(radius)))
+
+
+
+@lru_cache(maxsize=None)
+def _taper_sides(npts, wlen):
+    ' The two cosine ramps ObsPy multiplies the first and last wlen samples of an npts-long trace with. '
+
+    sides = cosine_taper(2 * wlen if 2 * wlen == npts else 2 * wlen + 1, p=1.0).astype(np.float32)
+    left, right = sides[:wlen], sides[len(sides) - wlen:]
+    left.flags.writeable = False
+    right.flags.writeable = False
+    return left, right
+
+
+
+def preprocess_array(data, sampling_rate, freqmin=1.0, freqmax=45, corners=2, max_percentage=0.001, max_length=2):
+
+    """
+
+    Demeans, zero-phase bandpass filters, and cosine tapers equally long channels sampled at the same rate, in float32.
+
+    Parameters
+    ----------
+    data: array
+        The channels, with the shape of (n_channels, npts). Integer or float.
+
+    sampling_rate: float
+        Sampling rate of the channels in Hz.
+
+    freqmin: float, default=1.0
+        Low corner of the bandpass in Hz.
+
+    freqmax: float, default=45
+        High corner of the bandpass in Hz. At or above Nyquist a highpass at freqmin is applied instead.
+
+    corners: int, default=2
+        Order of the Butterworth filter. It is applied forward and backward.
+
+    max_percentage: float, default=0.001
+        Maximum length of each side of the taper as a fraction of npts.
+
+    max_length: float, default=2
+        Maximum length of each side of the taper in seconds.
+
+    Returns
+    -------
+    data: array
+        The preprocessed float32 channels, (n_channels, npts).
+
+    Notes
+    -----
+    The result is that of ObsPy's detrend('demean'), filter('bandpass', zerophase=True), and taper(type='cosine')
+    applied to each channel, up to float32 rounding. The filter coefficients and the taper are cached, so all
+    of the channels are filtered in one sosfilt call per direction.
+
+    """
+
+    data = np.atleast_2d(data)
+    return _preprocess(data, sampling_rate, data.mean(axis=-1, keepdims=True, dtype=np.float64), 0, data.shape[-1],
+                       freqmin, freqmax, corners, max_percentage, max_length)
+
+
+
+def _preprocess(data, sampling_rate, mean, offset, npts, freqmin, freqmax, corners, max_percentage, max_length):
+    ' preprocess_array of the samples [offset, offset+data.shape[-1]) of npts-long channels with the given means. '
+
+    data = data.astype(np.float32)
+    data -= mean.astype(np.float32)
+
+    sos = _bandpass_sos(float(sampling_rate), float(freqmin), float(freqmax), int(corners))
+    data = sosfilt(sos, data, axis=-1)
+    data = np.flip(sosfilt(sos, np.flip(data, axis=-1), axis=-1), axis=-1)
+    data = np.ascontiguousarray(data)
+
+    wlen = [int(npts / 2)]
+    if max_percentage is not None:
+        wlen.append(int(max_percentage * npts))
+    if max_length is not None:
+        wlen.append(int(max_length * sampling_rate))
+    wlen = min(wlen)
+    if wlen > 0:
+        left, right = _taper_sides(npts, wlen)
+        end = offset + data.shape[-1]
+        if offset < wlen:
+            data[:, :min(wlen, end) - offset] *= left[offset:min(wlen, end)]
+        if end > npts - wlen:
+            first = max(offset, npts - wlen)
+            data[:, first - offset:] *= right[first - (npts - wlen):end - (npts - wlen)]
+    return data
+
+
+
+def preprocess_stream(st, freqmin=1.0, freqmax=45, corners=2, max_percentage=0.001, max_length=2):
+
+    """
+
+    Applies preprocess_array to the traces of a merged ObsPy stream in place. Traces with the same sampling rate
+    and length are stacked and processed together.
+
+    Parameters
+    ----------
+    st: obj
+        ObsPy stream whose traces have no gaps (e.g. merged with fill_value=0).
+
+    freqmin, freqmax, corners, max_percentage, max_length:
+        See preprocess_array.
+
+    Returns
+    -------
+    st: obj
+        The same stream with float32 data.
+
+    """
+
+    groups = {}
+    for tr in st:
+        groups.setdefault((tr.stats.sampling_rate, tr.stats.npts), []).append(tr)
+
+    for (sampling_rate, npts), traces in groups.items():
+        if npts == 0:
+            continue
+        if freqmax / (0.5 * sampling_rate) - 1.0 > -1e-6:
+            warnings.warn('Selected high corner frequency ('+str(freqmax)+') of bandpass is at or above Nyquist ('
+                          +str(0.5 * sampling_rate)+'). Applying a high-pass instead.')
+        data = preprocess_array(np.stack([tr.data for tr in traces]), sampling_rate,
+                                freqmin, freqmax, corners, max_percentage, max_length)
+        for tr, channel in zip(traces, data):
+            tr.data = channel
+    return st
+
+
+
+def _resampling_ratio(sampling_rate, target_rate):
+    ' Returns (up, down) if target_rate/sampling_rate is a ratio of small integers, otherwise None. '
+
+    ratio = Fraction(target_rate / sampling_rate).limit_denominator(1000)
+    if ratio.numerator > 1000 or abs(float(ratio) - target_rate / sampling_rate) > 1e-12:
+        return None
+    return ratio.numerator, ratio.denominator
+
+
+
+@lru_cache(maxsize=None)
+def _polyphase_filter(up, down):
+    ' The Kaiser-windowed anti-aliasing FIR filter scipy.signal.resample_poly designs for an up/down pair. '
+
+    max_rate = max(up, down)
+    h = firwin(2 * 10 * max_rate + 1, 1. / max_rate, window=('kaiser', 5.0))
+    h.flags.writeable = False
+    return h
+
+
+
+def resample_array(data, sampling_rate, target_rate=100.0, block_length=3600):
+
+    """
+
+    Resamples channels with a rational polyphase filter, block by block.
+
+    Parameters
+    ----------
+    data: array
+        The channels along the last axis, (npts,) or (n_channels, npts).
+
+    sampling_rate: float
+        Sampling rate of the data in Hz.
+
+    target_rate: float, default=100.0
+        The new sampling rate in Hz. target_rate/sampling_rate should be a ratio of small integers, e.g. 40, 50,
+        200, 250, or 500 Hz to 100 Hz.
+
+    block_length: float, default=3600
+        Length of the blocks in seconds. Each block is filtered with enough of its neighbours to give the same
+        samples as resampling the whole trace at once, so only the output and one block are in memory.
+
+    Returns
+    -------
+    data: array
+        The resampled channels. Float data keep their dtype, integer data are returned as float64.
+        The first sample keeps its time and there are ceil(npts*target_rate/sampling_rate) samples.
+
+    """
+
+    ratio = _resampling_ratio(sampling_rate, target_rate)
+    if ratio is None:
+        raise ValueError('No polyphase filter for '+str(sampling_rate)+' Hz to '+str(target_rate)+' Hz.')
+    up, down = ratio
+
+    data = np.asarray(data)
+    dtype = data.dtype if np.issubdtype(data.dtype, np.floating) else np.float64
+    if up == down:
+        return data.astype(dtype)
+    npts = data.shape[-1]
+    n_out = -(-npts * up // down)
+    h = _polyphase_filter(up, down).astype(dtype)
+
+    # the block borders and the overlaps are multiples of down, so each block starts on an output sample
+    block = max(down, int(block_length * sampling_rate) // down * down)
+    pad = -(-((len(h) - 1) // 2 // up + 2) // down) * down
+    out = np.empty(data.shape[:-1] + (n_out,), dtype=dtype)
+    for start in range(0, npts, block):
+        end = min(npts, start + block)
+        first = max(0, start - pad)
+        y = resample_poly(data[..., first:min(npts, end + pad)].astype(dtype), up, down, axis=-1, window=h)
+        o_start, o_end = start * up // down, (n_out if end == npts else end * up // down)
+        out[..., o_start:o_end] = y[..., o_start - first * up // down:o_end - first * up // down]
+    return out
+
+
+
+def resample_stream(st, target_rate=100.0, block_length=3600):
+
+    """
+
+    Resamples the traces of an ObsPy stream that are not at target_rate in place.
+
+    Parameters
+    ----------
+    st: obj
+        ObsPy stream.
+
+    target_rate: float, default=100.0
+        The new sampling rate in Hz.
+
+    block_length: float, default=3600
+        See resample_array.
+
+    Returns
+    -------
+    st: obj
+        The same stream. Integer traces are rounded back to their dtype, so they can still be merged with the
+        traces already at target_rate.
+
+    Notes
+    -----
+    Rates with a rational ratio to target_rate (40, 50, 200, 250, 500 Hz ...) use resample_array; other rates fall
+    back to ObsPy's FFT resampling after a 0.45*target_rate zero-phase lowpass when downsampling.
+
+    """
+
+    for tr in st:
+        if tr.stats.sampling_rate == target_rate or tr.stats.npts == 0:
+            continue
+        dtype = tr.data.dtype
+        if _resampling_ratio(tr.stats.sampling_rate, target_rate):
+            data = resample_array(tr.data, tr.stats.sampling_rate, target_rate, block_length)
+        else:
+            if tr.stats.sampling_rate > target_rate:
+                tr.filter('lowpass', freq=0.45*target_rate, zerophase=True)
+            tr.resample(target_rate)
+            data = tr.data
+        if not np.issubdtype(dtype, np.floating):
+            data = np.round(data).astype(dtype)
+        tr.data = data
+        tr.stats.sampling_rate = target_rate
+    return st
+
+
+
+def _record_span(path):
+    ' starttime, endtime, sampling rate, and record length of a MiniSEED file from its first and last records, None if it has records of several lengths or channels '
+
+    try:
+        first = mseed_util.get_record_information(path)
+        last = mseed_util.get_record_information(path, offset=first['filesize'] - first['record_length'])
+    except Exception:
+        return None
+    if first['filesize'] % first['record_length']:
+        return None
+    if [first[key] for key in ['network', 'station', 'location', 'channel', 'samp_rate']] != \
+       [last[key] for key in ['network', 'station', 'location', 'channel', 'samp_rate']]:
+        return None
+    return first['starttime'], last['endtime'], float(first['samp_rate']), first['record_length']
+
+
+
+def _join_slots(slots, delta):
+    ' joins the (starttime, endtime) of traces read in overlapping blocks into those of the continuous traces '
+
+    joined = []
+    for start, end in sorted(slots):
+        if joined and start - joined[-1][1] <= 1.5 * delta:
+            joined[-1] = (joined[-1][0], max(end, joined[-1][1]))
+        else:
+            joined.append((start, end))
+    return joined
+
+
+
+def _window_span(traces, span, shift):
+    ' starttime, endtime, and number of the windows over the 100 Hz components for a span of BlockStream '
+
+    if span == 'longest':
+        longest = traces[0]
+        for stats in traces:
+            if stats.npts > longest.npts:
+                longest = stats
+        starttime, endtime = longest.starttime, longest.endtime
+    else:
+        starttime = min([stats.starttime for stats in traces])
+        endtime = max([stats.endtime for stats in traces])
+    return starttime, endtime, max(0, (endtime.ns - starttime.ns - 60*10**9) // (shift*10**9) + 1)
+
+
+
+# columns of the E/1, N/2, and Z components in the windows
+_COLUMNS = {'E': 0, '1': 0, 'N': 1, '2': 1, 'Z': 2}
+
+# names of the QC features of window_qc, for the E/1, N/2, and Z columns
+QC_COLUMNS = [feature+'_'+c for feature in ['gap', 'zero_run', 'clip', 'rms'] for c in 'ENZ']
+
+
+
+def window_qc(windows, scale=None, dead=1e-7, clip=0.999):
+
+    """
+
+    Computes QC features of each channel of windows in one vectorized pass, to find the windows that are mostly
+    gaps or dead channels.
+
+    Parameters
+    ----------
+    windows: array
+        The windows, (n, npts, 3). All of them are processed at once, so pass large sets in batches.
+
+    scale: array, default=None
+        Reference amplitude of each channel, (3,), e.g. its peak over the whole chunk of data. None takes the peak
+        of each window over its channels.
+
+    dead: float, default=1e-7
+        Samples whose absolute value is at most dead * scale count as dead. Gaps are filled with zeros before the
+        preprocessing and are about 1e-10 of the signal after the bandpass, except for the few seconds at their
+        edges into which the filter rings, and missing components are zeros.
+
+    clip: float, default=0.999
+        Samples whose absolute value is at least clip times the peak of their window and channel count as clipped.
+
+    Returns
+    -------
+    qc: array
+        (n, 12) float32, in the order of QC_COLUMNS: the fraction of dead samples (gap), the longest run of dead
+        samples in samples (zero_run), the fraction of clipped samples (clip), and the RMS (rms) of each channel.
+
+    """
+
+    windows = np.asarray(windows, dtype=np.float32)
+    amplitude = np.abs(windows)
+    peak = np.max(amplitude, axis=1)
+    if scale is None:
+        scale = np.max(peak, axis=1, keepdims=True)
+    else:
+        scale = np.asarray(scale, dtype=np.float32)[None]
+    is_dead = amplitude <= (dead * scale)[:, None]
+
+    # the length of a run of dead samples is the distance of its last sample to the live sample before it
+    index = np.arange(1, windows.shape[1] + 1, dtype=np.int32)[None, :, None]
+    last_live = np.maximum.accumulate(np.where(is_dead, 0, index), axis=1)
+    zero_run = np.max(index - last_live, axis=1)
+
+    clipped = np.mean(amplitude >= clip * peak[:, None], axis=1)
+    clipped[peak == 0] = 0
+    rms = np.sqrt(np.mean(np.square(windows), axis=1))
+    return np.concatenate([np.mean(is_dead, axis=1), zero_run, clipped, rms], axis=1).astype(np.float32)
+
+
+
+def dead_windows(qc, max_gap=0.9):
+
+    """
+
+    Returns which windows are mostly gaps or dead channels, i.e. in which every channel has at least max_gap
+    dead samples.
+
+    Parameters
+    ----------
+    qc: array
+        The output of window_qc, or a station.csv file written by preprocessor as a dataframe.
+
+    max_gap: float, default=0.9
+        Fraction of dead samples above which a channel counts as dead.
+
+    Returns
+    -------
+    dead: array
+        Boolean, (n,).
+
+    """
+
+    if hasattr(qc, 'columns'):
+        qc = qc[QC_COLUMNS].values
+    return np.min(np.asarray(qc, dtype=np.float32).reshape(-1, len(QC_COLUMNS))[:, :3], axis=1) >= max_gap
+
+
+
+def _sliding_windows(data, step, n_windows, npts=6000):
+    ' the (n_windows, npts, 3) view of the windows of a (samples, 3) array starting every step samples '
+
+    return np.lib.stride_tricks.as_strided(data, shape=(n_windows, npts, data.shape[1]),
+                                           strides=(step * data.strides[0],) + data.strides, writeable=False)
+
+
+
+class BlockStream():
+
+    """
+
+    Preprocesses the continuous traces of one chunk of MiniSEED files block by block, and slices them into the
+    same 1-minute 100 Hz windows as the whole-trace path of preprocessor and mseed_predictor.
+
+    Parameters
+    ----------
+    files: list of str
+        Paths of the MiniSEED files of the chunk, one file per component.
+
+    overlap: float, default=0.3
+        Overlap of the windows.
+
+    block_length: float, default=3600
+        Length of the blocks in seconds. Each block is read from the files with its padding, so the peak memory
+        depends on block_length and not on the length of the files.
+
+    span: str, default='longest'
+        'longest' places the windows on the longest component, like preprocessor; 'union' from the earliest start
+        to the latest end of the components, like mseed_predictor.
+
+    freqmin, freqmax, corners, max_percentage, max_length:
+        See preprocess_array.
+
+    Attributes
+    ----------
+    traces: list
+        ObsPy stats of the merged components at 100 Hz, in the order of files.
+
+    time_slots: list
+        (starttime, endtime) of the traces in the first file.
+
+    sampling_rates: list
+        Original sampling rate of each component.
+
+    starttime, endtime: obj
+        UTCDateTime of the span of the windows.
+
+    n_windows: int
+        Number of windows.
+
+    Notes
+    -----
+    The span of each file is taken from its first and last records and the blocks are read with ObsPy's time
+    selection, so the records should be sorted and of one length, as in the files written by downloadMseeds.
+    Before the blocks, one pass over the files computes the mean of each component. The zero-phase filter of a block
+    starts on both sides from the padding after which its impulse response has decayed below 1e-16, the taper is
+    applied at the positions of the samples in the whole trace, and the resampling overlaps the blocks by the
+    length of its filter. The windows are therefore those of the whole-trace path up to float32 rounding (about
+    1e-6 of the peak amplitude), as the rounding of the recursive filter depends on where it starts. A file with
+    several sampling rates or channels, or with a rate that has no polyphase filter to 100 Hz, is preprocessed as
+    a whole trace.
+
+    """
+
+    def __init__(self, files, overlap=0.3, block_length=3600, span='longest',
+                 freqmin=1.0, freqmax=45, corners=2, max_percentage=0.001, max_length=2):
+
+        self.files = files
+        self.shift = int(60-(overlap*60))
+        self.block_length = block_length
+        self.filter_args = (freqmin, freqmax, corners, max_percentage, max_length)
+        self.time_slots = []
+        self.sampling_rates = []
+        self.traces = []
+        self._channels = []
+        for path in files:
+            record = _record_span(path)
+            if record is None or (record[2] != 100.0 and _resampling_ratio(record[2], 100.0) is None):
+                self._channels.append(self._whole_trace(path))
+                continue
+
+            starttime, endtime, sampling_rate, record_length = record
+            npts = int(round((endtime - starttime) * sampling_rate)) + 1
+            # ObsPy's bisection of the records only finds the last record of a file if it is at least 4096 bytes long
+            channel = {'path': path, 'starttime': starttime, 'sampling_rate': sampling_rate, 'npts': npts,
+                       'bisection': record_length >= 4096}
+            step = max(1, int(block_length * sampling_rate))
+            total, slots, stats = 0, [], None
+            for first in range(0, npts, step):
+                st = self._read_traces(channel, first, min(npts, first + step))
+                if len(set([tr.stats.sampling_rate for tr in st] + [sampling_rate])) > 1:
+                    break
+                slots += [(tr.stats.starttime, tr.stats.endtime) for tr in st]
+                stats = stats or (st[0].stats.copy() if len(st) else None)
+                data = self._merge(st, channel, first, min(npts, first + step))
+                total += np.sum(data, dtype=np.float64 if np.issubdtype(data.dtype, np.floating) else np.int64)
+            else:
+                if stats is None:
+                    self._channels.append(self._whole_trace(path))
+                    continue
+                channel['mean'] = np.array([[np.float64(total) / npts]])
+                if not len(self.time_slots):
+                    self.time_slots = _join_slots(slots, 1. / sampling_rate)
+                self.sampling_rates.append(sampling_rate)
+                stats.starttime = starttime
+                stats.sampling_rate = 100.0
+                if sampling_rate == 100.0:
+                    stats.npts = npts
+                else:
+                    up, down = _resampling_ratio(sampling_rate, 100.0)
+                    stats.npts = -(-npts * up // down)
+                self.traces.append(stats)
+                self._channels.append(channel)
+                continue
+            # several sampling rates in one file
+            self._channels.append(self._whole_trace(path))
+
+        self.starttime, self.endtime, self.n_windows = _window_span(self.traces, span, self.shift)
+
+
+    def _whole_trace(self, path):
+        ' the whole-trace path for one file '
+
+        st = read(path, debug_headers=True)
+        if not len(self.time_slots):
+            self.time_slots = [(tr.stats.starttime, tr.stats.endtime) for tr in st]
+        try:
+            st.merge(fill_value=0)
+        except Exception:
+            st = resample_stream(st)
+            st.merge(fill_value=0)
+        freqmin, freqmax, corners, max_percentage, max_length = self.filter_args
+        st = resample_stream(preprocess_stream(st, freqmin, freqmax, corners, max_percentage, max_length))
+        self.traces.append(st[0].stats)
+        return {'data': st[0].data}
+
+
+    def _read_traces(self, channel, first, last):
+        ' the traces of a channel with samples in [first, last), using the time index of the records '
+
+        sampling_rate = channel['sampling_rate']
+        return read(channel['path'], format='MSEED', use_bisection=channel['bisection'],
+                    starttime=channel['starttime'] + first / sampling_rate,
+                    endtime=channel['starttime'] + (last - 1) / sampling_rate)
+
+
+    def _merge(self, st, channel, first, last):
+        ' the samples [first, last) of the traces read by _read_traces, with zeros in the gaps '
+
+        if not len(st):
+            return np.zeros(last - first, dtype=np.int32)
+        sampling_rate = channel['sampling_rate']
+        st.merge(fill_value=0)
+        st.trim(channel['starttime'] + first / sampling_rate, channel['starttime'] + (last - 1) / sampling_rate,
+                pad=True, fill_value=0)
+        return st[0].data[:last - first]
+
+
+    def _read(self, channel, first, last):
+        ' the raw samples [first, last) of a channel '
+
+        return self._merge(self._read_traces(channel, first, last), channel, first, last)
+
+
+    def _preprocessed(self, channel, first, last):
+        ' the preprocessed samples [first, last) of a channel at its own sampling rate '
+
+        sampling_rate, npts = channel['sampling_rate'], channel['npts']
+        freqmin, freqmax, corners, max_percentage, max_length = self.filter_args
+        pad = _filter_padding(float(sampling_rate), float(freqmin), float(freqmax), int(corners))
+        lo, hi = max(0, first - pad), min(npts, last + pad)
+        data = _preprocess(self._read(channel, lo, hi)[None], sampling_rate, channel['mean'], lo, npts,
+                           freqmin, freqmax, corners, max_percentage, max_length)
+        return data[0, first - lo:last - lo]
+
+
+    def _segment(self, c, first, last):
+        ' the preprocessed samples [first, last) of component c at 100 Hz '
+
+        channel = self._channels[c]
+        if 'data' in channel:
+            return channel['data'][first:last]
+        if channel['sampling_rate'] == 100.0:
+            return self._preprocessed(channel, first, last)
+
+        # the same alignment and overlap of the polyphase filter as in resample_array
+        up, down = _resampling_ratio(channel['sampling_rate'], 100.0)
+        h = _polyphase_filter(up, down).astype(np.float32)
+        pad = -(-((len(h) - 1) // 2 // up + 2) // down) * down
+        lo = max(0, first // up * down - pad)
+        hi = min(channel['npts'], -(-last // up) * down + pad)
+        y = resample_poly(self._preprocessed(channel, lo, hi), up, down, window=h)
+        return y[first - lo * up // down:last - lo * up // down]
+
+
+    def fill(self, out, starttime):
+
+        """
+
+        Writes the preprocessed 100 Hz components block by block into the columns of out.
+
+        Parameters
+        ----------
+        out: array
+            Array of zeros, (npts, 3), whose first row is at starttime, e.g. a memory-mapped .npy file.
+
+        starttime: obj
+            UTCDateTime of the first row of out.
+
+        """
+
+        step = max(1, int(self.block_length * 100))
+        for c, stats in enumerate(self.traces):
+            column = _COLUMNS.get(stats.channel[-1:])
+            if column is None:
+                continue
+            offset = int(round((stats.starttime - starttime) * 100))
+            for first in range(max(0, -offset), min(stats.npts, len(out) - offset), step):
+                last = min(stats.npts, len(out) - offset, first + step)
+                out[offset + first:offset + last, column] = self._segment(c, first, last)
+
+
+    def blocks(self):
+
+        """
+
+        Yields the windows block by block.
+
+        Yields
+        ------
+        start_times: list
+            UTCDateTime of the first sample of each window.
+
+        data: array
+            The float32 windows, (n, 6000, 3), with the E/1, N/2, and Z components in this order and zeros for missing ones.
+
+        """
+
+        step = self.shift * 100
+        per_block = max(1, int(self.block_length // self.shift))
+        offsets = [int(round((stats.starttime - self.starttime) * 100)) for stats in self.traces]
+        columns = [_COLUMNS.get(stats.channel[-1:]) for stats in self.traces]
+
+        for k0 in range(0, self.n_windows, per_block):
+            k1 = min(self.n_windows, k0 + per_block)
+            first, last = k0 * step, (k1 - 1) * step + 6000
+            data = np.zeros([k1 - k0, 6000, 3], dtype=np.float32)
+            for c, stats in enumerate(self.traces):
+                if columns[c] is None:
+                    continue
+                lo, hi = max(0, first - offsets[c]), min(stats.npts, last - offsets[c])
+                if lo >= hi:
+                    continue
+                segment = np.zeros(last - first, dtype=np.float32)
+                segment[lo + offsets[c] - first:hi + offsets[c] - first] = self._segment(c, lo, hi)
+                for k in range(k0, k1):
+                    data[k - k0, :, columns[c]] = segment[(k - k0) * step:(k - k0) * step + 6000]
+            yield [self.starttime + k * self.shift for k in range(k0, k1)], data
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 17:52:08 2026
+
+last update: 10/19/2026
+
+"""
+
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+from obspy import UTCDateTime
+from obspy.core import Stats
+from .preprocessing import BlockStream, _window_span
+
+# bump when the preprocessing changes the cached arrays
+CACHE_VERSION = 1
+
+
+
+def _file_hash(path):
+    ' sha1 of the content of a file '
+
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+
+class TraceCache():
+
+    """
+
+    Content-addressed cache of preprocessed continuous traces.
+
+    Each chunk of MiniSEED files (one file per component) is stored once as a float32 .npy array of its preprocessed
+    100 Hz components, (npts, 3) with the E/1, N/2, and Z components in this order, from the earliest start to the
+    latest end of the components, next to a .json file with its stats. The key is the sha1 of the contents of
+    the files and of the preprocessing parameters, so a renamed or moved archive is still found, and a changed
+    file or parameter gets a new entry.
+
+    Parameters
+    ----------
+    cache_dir: str
+        Directory of the cache. It is created if needed and can be shared by runs of preprocessor and mseed_predictor.
+
+    max_size: float, default=None
+        Disk budget in GB. After an entry is added, the least recently used entries are deleted until the cache fits
+        in it. None for no limit.
+
+    Attributes
+    ----------
+    hits, misses: int
+        Number of chunks read from the cache and preprocessed by this instance.
+
+    """
+
+    def __init__(self, cache_dir, max_size=None):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+
+    def key(self, files, freqmin=1.0, freqmax=45, corners=2, max_percentage=0.001, max_length=2):
+
+        """
+
+        Returns the key of a chunk of files preprocessed with the given parameters (see preprocess_array).
+
+        """
+
+        params = {'version': CACHE_VERSION, 'sampling_rate': 100.0, 'freqmin': freqmin, 'freqmax': freqmax,
+                  'corners': corners, 'max_percentage': max_percentage, 'max_length': max_length}
+        h = hashlib.sha1(json.dumps(params, sort_keys=True).encode())
+        for path in files:
+            h.update(_file_hash(path).encode())
+        return h.hexdigest()
+
+
+    def stream(self, files, overlap=0.3, block_length=3600, span='longest',
+               freqmin=1.0, freqmax=45, corners=2, max_percentage=0.001, max_length=2):
+
+        """
+
+        Returns the windows of a chunk of files from the cache, preprocessing and adding the chunk first if needed.
+
+        Parameters
+        ----------
+        files, overlap, span, freqmin, freqmax, corners, max_percentage, max_length:
+            See BlockStream.
+
+        block_length: float, default=3600
+            Length of the blocks in seconds, for preprocessing the chunk on a miss and for the blocks of windows.
+            None reads all of the windows in one block.
+
+        Returns
+        -------
+        stream: obj
+            A CachedStream, with the attributes and the fill and blocks methods of BlockStream.
+
+        """
+
+        key = self.key(files, freqmin, freqmax, corners, max_percentage, max_length)
+        path = os.path.join(self.cache_dir, key)
+        if os.path.isfile(path+'.json'):
+            try:
+                # the modification time of the .json file orders the entries for the eviction
+                os.utime(path+'.json')
+                stream = CachedStream(path, overlap, block_length, span)
+                with self._lock:
+                    self.hits += 1
+                return stream
+            except (OSError, ValueError):
+                pass
+
+        block_stream = BlockStream(files, overlap=overlap, block_length=block_length or 3600, span='union',
+                                   freqmin=freqmin, freqmax=freqmax, corners=corners,
+                                   max_percentage=max_percentage, max_length=max_length)
+        npts = int(round((block_stream.endtime - block_stream.starttime) * 100)) + 1
+        tmp = path+'.'+str(os.getpid())+'.'+str(threading.get_ident())
+        out = np.lib.format.open_memmap(tmp+'.npy', mode='w+', dtype=np.float32, shape=(npts, 3))
+        block_stream.fill(out, block_stream.starttime)
+        out.flush()
+        del out
+        meta = {'starttime': str(block_stream.starttime),
+                'traces': [{'network': stats.network, 'station': stats.station, 'location': stats.location,
+                            'channel': stats.channel, 'starttime': str(stats.starttime), 'npts': stats.npts}
+                           for stats in block_stream.traces],
+                'time_slots': [[str(t0), str(t1)] for t0, t1 in block_stream.time_slots],
+                'sampling_rates': block_stream.sampling_rates}
+        with open(tmp+'.json', 'w') as f:
+            json.dump(meta, f)
+        # the .npy first, as the .json marks a complete entry
+        os.replace(tmp+'.npy', path+'.npy')
+        os.replace(tmp+'.json', path+'.json')
+        with self._lock:
+            self.misses += 1
+            self.evict(keep=key)
+        return CachedStream(path, overlap, block_length, span)
+
+
+    def size(self):
+        ' Total size of the cache in bytes. '
+
+        return sum([os.path.getsize(os.path.join(self.cache_dir, f)) for f in os.listdir(self.cache_dir)
+                    if f.endswith('.npy') or f.endswith('.json')])
+
+
+    def evict(self, keep=None):
+
+        """
+
+        Deletes the least recently used entries until the cache fits in max_size.
+
+        Parameters
+        ----------
+        keep: str, default=None
+            Key of an entry that is not deleted, e.g. the one just added.
+
+        """
+
+        if self.max_size is None:
+            return
+        entries = []
+        for f in os.listdir(self.cache_dir):
+            if f.endswith('.json') and f.count('.') == 1:
+                key = f[:-5]
+                try:
+                    entries.append((os.path.getmtime(os.path.join(self.cache_dir, f)), key,
+                                    os.path.getsize(os.path.join(self.cache_dir, f))
+                                    + os.path.getsize(os.path.join(self.cache_dir, key+'.npy'))))
+                except OSError:
+                    continue
+        total = sum([entry[2] for entry in entries])
+        for _, key, size in sorted(entries):
+            if total <= self.max_size * 1e9:
+                break
+            if key == keep:
+                continue
+            for ext in ['.json', '.npy']:
+                try:
+                    os.remove(os.path.join(self.cache_dir, key+ext))
+                except OSError:
+                    pass
+            total -= size
+
+
+
+class CachedStream():
+
+    """
+
+    The windows of a chunk of preprocessed components stored by TraceCache. It has the attributes and the fill and
+    blocks methods of BlockStream, and reads the windows from the memory-mapped array.
+
+    Parameters
+    ----------
+    path: str
+        Path of the entry without the extension.
+
+    overlap: float, default=0.3
+        Overlap of the windows.
+
+    block_length: float, default=3600
+        Length of the blocks of windows in seconds. None for all of the windows in one block.
+
+    span: str, default='longest'
+        See BlockStream.
+
+    """
+
+    def __init__(self, path, overlap=0.3, block_length=3600, span='longest'):
+        with open(path+'.json') as f:
+            meta = json.load(f)
+        self.data = np.load(path+'.npy', mmap_mode='r')
+        self.shift = int(60-(overlap*60))
+        self.block_length = block_length
+        self.time_slots = [(UTCDateTime(t0), UTCDateTime(t1)) for t0, t1 in meta['time_slots']]
+        self.sampling_rates = meta['sampling_rates']
+        self.traces = [Stats(dict(trace, starttime=UTCDateTime(trace['starttime']), sampling_rate=100.0))
+                       for trace in meta['traces']]
+        self._starttime = UTCDateTime(meta['starttime'])
+        self.starttime, self.endtime, self.n_windows = _window_span(self.traces, span, self.shift)
+
+
+    def fill(self, out, starttime):
+
+        """
+
+        Writes the components into out, see BlockStream.fill.
+
+        """
+
+        step = int((self.block_length or 3600) * 100)
+        offset = int(round((self._starttime - starttime) * 100))
+        lo, hi = max(0, -offset), min(len(self.data), len(out) - offset)
+        for first in range(lo, hi, step):
+            last = min(hi, first + step)
+            out[offset + first:offset + last] = self.data[first:last]
+
+
+    def blocks(self):
+
+        """
+
+        Yields the windows block by block, see BlockStream.blocks.
+
+        """
+
+        step = self.shift * 100
+        per_block = max(1, int(self.block_length // self.shift)) if self.block_length else max(1, self.n_windows)
+        offset = int(round((self.starttime - self._starttime) * 100))
+
+        for k0 in range(0, self.n_windows, per_block):
+            k1 = min(self.n_windows, k0 + per_block)
+            data = np.zeros([k1 - k0, 6000, 3], dtype=np.float32)
+            for k in range(k0, k1):
+                start = offset + k * step
+                lo, hi = max(0, start), min(len(self.data), start + 6000)
+                if lo < hi:
+                    data[k - k0, lo - start:hi - start] = self.data[lo:hi]
+            yield [self.starttime + k * self.shift for k in range(k0, k1)], data
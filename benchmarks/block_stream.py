@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+Compares the peak memory (VmHWM of a fresh process) and the time of preprocessing a chunk of 3-component
+MiniSEED files as whole traces and block by block with BlockStream, on synthetic files of a given length
+(or on real MiniSEED files).
+
+    python benchmarks/block_stream.py --days 3 --sampling_rate 100 --block_length 3600
+    python benchmarks/block_stream.py --mseeds downloads_mseeds/CA06/*20190901T000000Z*
+
+"""
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+import numpy as np
+import obspy
+from EQTransformer.utils.preprocessing import BlockStream, preprocess_stream, resample_stream
+
+
+def _whole(files, overlap):
+    st = obspy.Stream()
+    for f in files:
+        st += obspy.read(f)
+    st.merge(fill_value=0)
+    st = resample_stream(preprocess_stream(st))
+    st.trim(min([tr.stats.starttime for tr in st]), max([tr.stats.endtime for tr in st]), pad=True, fill_value=0)
+    step = int(60-(overlap*60))*100
+    n = 0
+    for start in range(0, st[0].stats.npts - 6000, step):
+        npz_data = np.zeros([6000, 3])
+        for c, tr in enumerate(st):
+            npz_data[:, c] = tr.data[start:start+6000]
+        n += 1
+    return n
+
+
+def _blocks(files, overlap, block_length):
+    n = 0
+    for start_times, windows in BlockStream(files, overlap=overlap, block_length=block_length, span='union').blocks():
+        n += len(windows)
+    return n
+
+
+def _peak_rss():
+    ' peak resident memory of this process in kB, ru_maxrss would start from that of the parent '
+
+    with open('/proc/self/status') as f:
+        return int([line for line in f if line.startswith('VmHWM')][0].split()[1])
+
+
+def _run(queue, mode, files, overlap, block_length):
+    base = _peak_rss()
+    start = time.time()
+    n = _whole(files, overlap) if mode == 'whole' else _blocks(files, overlap, block_length)
+    queue.put((n, time.time() - start, base, _peak_rss()))
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Whole-trace vs block-streaming preprocessing memory benchmark.')
+    parser.add_argument('--days', type=float, default=3)
+    parser.add_argument('--sampling_rate', type=float, default=100)
+    parser.add_argument('--mseeds', nargs='*', default=None)
+    parser.add_argument('--block_length', type=float, default=3600)
+    parser.add_argument('--overlap', type=float, default=0.3)
+    opt = parser.parse_args()
+
+    tmp_dir = None
+    files = opt.mseeds
+    if not files:
+        tmp_dir = tempfile.mkdtemp()
+        npts = int(opt.days * 86400 * opt.sampling_rate)
+        rng = np.random.default_rng(0)
+        files = []
+        for c in 'ENZ':
+            tr = obspy.Trace((rng.standard_normal(npts)*1000).astype(np.int32),
+                             header={'network': 'XX', 'station': 'ST01', 'channel': 'HH'+c, 'sampling_rate': opt.sampling_rate})
+            files.append(os.path.join(tmp_dir, 'XX.ST01..HH'+c+'.mseed'))
+            tr.write(files[-1], format='MSEED', encoding='STEIM2')
+        print('files: '+str(round(sum([os.path.getsize(f) for f in files]) / 1e6, 1))+' MB, '+str(npts)+' samples per component')
+
+    ctx = multiprocessing.get_context('spawn')
+    try:
+        for mode in ['whole', 'blocks']:
+            queue = ctx.Queue()
+            p = ctx.Process(target=_run, args=(queue, mode, files, opt.overlap, opt.block_length))
+            p.start()
+            n, t, base, peak = queue.get()
+            p.join()
+            print(mode+': '+str(n)+' windows in '+str(round(t, 1))+' s, peak RSS '+str(round(peak / 1024))+' MB ('
+                  +str(round((peak - base) / 1024))+' MB above the imports)')
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir)
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+Compares the two storage formats of preprocessor, one dataset per 1-minute slice ('slices') and one continuous
+dataset per chunk of data ('continuous'), on synthetic 3-component MiniSEED files of a given length: size of the
+hdf5 file, time of writing it, and time of reading all of the slices back as predictor does.
+
+    python benchmarks/continuous_storage.py --days 1 --overlap 0.3
+
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import h5py
+import numpy as np
+import pandas as pd
+import obspy
+from EQTransformer.utils.hdf5_maker import preprocessor, window_index, get_window
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Slices vs continuous storage of preprocessor.')
+    parser.add_argument('--days', type=float, default=1)
+    parser.add_argument('--overlap', type=float, default=0.3)
+    parser.add_argument('--block_length', type=float, default=3600)
+    opt = parser.parse_args()
+
+    cwd = os.getcwd()
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        os.chdir(tmp_dir)
+        os.makedirs(os.path.join('mseeds', 'ST01'))
+        npts = int(opt.days * 86400 * 100)
+        rng = np.random.default_rng(0)
+        for c in 'ENZ':
+            tr = obspy.Trace((rng.standard_normal(npts)*1000).astype(np.int32),
+                             header={'network': 'XX', 'station': 'ST01', 'channel': 'HH'+c, 'sampling_rate': 100.0,
+                                     'starttime': obspy.UTCDateTime(2019, 9, 1)})
+            tr.write(os.path.join('mseeds', 'ST01', 'XX.ST01..HH'+c+'__20190901T000000Z__20190902T000000Z.mseed'),
+                     format='MSEED', encoding='STEIM2')
+        with open('station_list.json', 'w') as f:
+            json.dump({'ST01': {'network': 'XX', 'channels': ['HHE', 'HHN', 'HHZ'], 'coords': [35.8, -117.6, 800]}}, f)
+
+        for storage in ['slices', 'continuous']:
+            start = time.time()
+            preprocessor('preproc_'+storage, 'mseeds', 'station_list.json', overlap=opt.overlap, n_processor=1,
+                         block_length=opt.block_length, storage=storage)
+            t_write = time.time() - start
+            os.rename('mseeds_processed_hdfs', storage)
+            size = os.path.getsize(os.path.join(storage, 'ST01.hdf5'))
+
+            start = time.time()
+            df = pd.read_csv(os.path.join(storage, 'ST01.csv'))
+            windows = window_index(df)
+            with h5py.File(os.path.join(storage, 'ST01.hdf5'), 'r') as fl:
+                for trace_name in df.trace_name:
+                    data = np.array(get_window(fl, trace_name, windows))
+            t_read = time.time() - start
+            print(storage+': '+str(len(df))+' slices, '+str(round(size / 1e6, 1))+' MB, written in '+str(round(t_write, 1))
+                  +' s, read in '+str(round(t_read, 2))+' s', flush=True)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp_dir)
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+Measures the memory the training and prediction generators allocate for each batch, with tracemalloc, on a
+synthetic hdf5 file of earthquake and noise traces in the format of the training data. The batches are consumed
+one by one, as by a model. The time per batch is measured in a first pass, the peak of the traced memory during a
+batch above what was allocated before it and the memory still allocated after the batches in a second one.
+
+    python benchmarks/generator_memory.py --n_traces 2000 --batch_size 200
+
+"""
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import h5py
+import numpy as np
+from EQTransformer.core.EqT_utils import DataGenerator, DataGeneratorPrediction
+
+
+
+def _write_hdf5(file_name, n_traces):
+    rng = np.random.default_rng(0)
+    list_IDs = []
+    with h5py.File(file_name, 'w') as fl:
+        for k in range(n_traces):
+            ID = 'TR%05d_' % k + ('EV' if k % 2 else 'NO')
+            dataset = fl.create_dataset('data/'+ID, data=rng.standard_normal((6000, 3)).astype(np.float32))
+            if k % 2:
+                dataset.attrs['trace_category'] = 'earthquake_local'
+                dataset.attrs['p_arrival_sample'] = 1000 + k % 500
+                dataset.attrs['s_arrival_sample'] = 2000 + k % 500
+                dataset.attrs['coda_end_sample'] = 3000 + k % 500
+                dataset.attrs['snr_db'] = np.array([20.0, 20.0, 20.0])
+            else:
+                dataset.attrs['trace_category'] = 'noise'
+            list_IDs.append(ID)
+    return list_IDs
+
+
+
+def _measure(generator):
+    ' time per batch, peak of the traced memory per batch, and memory left allocated, in MB '
+
+    start = time.time()
+    for bn in range(len(generator)):
+        batch = generator[bn]
+        del batch
+    elapsed = (time.time() - start) / len(generator)
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    peaks = []
+    for bn in range(len(generator)):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        batch = generator[bn]
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        del batch
+    left = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return elapsed, np.mean(peaks) / 1e6, left / 1e6
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory allocated per batch by the generators.')
+    parser.add_argument('--n_traces', type=int, default=2000)
+    parser.add_argument('--batch_size', type=int, default=200)
+    opt = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        file_name = os.path.join(tmp_dir, 'traces.hdf5')
+        list_IDs = _write_hdf5(file_name, opt.n_traces)
+        print('one batch of input: '+str(round(opt.batch_size * 6000 * 3 * 4 / 1e6, 1))+' MB in float32')
+        generators = [('DataGenerator', DataGenerator(list_IDs, file_name, 6000, batch_size=opt.batch_size, shuffle=False,
+                                                      norm_mode='std', label_type='gaussian')),
+                      ('DataGeneratorPrediction', DataGeneratorPrediction(list_IDs, file_name, 6000, batch_size=opt.batch_size,
+                                                                          norm_mode='std'))]
+        for name, generator in generators:
+            elapsed, peak, left = _measure(generator)
+            print(name+': '+str(round(elapsed * 1000, 1))+' ms per batch, peak '+str(round(peak, 1))+' MB per batch, '
+                  +str(round(left, 1))+' MB left allocated', flush=True)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+Compares the batches per second of DataGenerator when its hdf5 file is opened and closed for each batch, as before,
+and when it stays open for the process (cached_hdf5), on a synthetic dataset with small batches, where opening the
+file is a large part of a batch. Both layouts, one hdf5 dataset per trace and packed, are measured.
+
+    python benchmarks/hdf5_handles.py --n_traces 2000 --batch_size 8
+
+"""
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import h5py
+import numpy as np
+from EQTransformer.core.EqT_utils import DataGenerator, close_hdf5_files
+from EQTransformer.utils.packed_hdf5 import pack_hdf5
+
+
+
+def _write_hdf5(file_name, n_traces):
+    rng = np.random.default_rng(0)
+    list_IDs = []
+    with h5py.File(file_name, 'w') as fl:
+        for k in range(n_traces):
+            ID = 'TR%05d_' % k + ('EV' if k % 2 else 'NO')
+            dataset = fl.create_dataset('data/'+ID, data=rng.standard_normal((6000, 3)).astype(np.float32))
+            if k % 2:
+                dataset.attrs['trace_category'] = 'earthquake_local'
+                dataset.attrs['p_arrival_sample'] = 1000 + k % 500
+                dataset.attrs['s_arrival_sample'] = 2000 + k % 500
+                dataset.attrs['coda_end_sample'] = 3000 + k % 500
+                dataset.attrs['snr_db'] = np.array([20.0, 20.0, 20.0])
+            else:
+                dataset.attrs['trace_category'] = 'noise'
+            list_IDs.append(ID)
+    return list_IDs
+
+
+
+def _steps(file_name, list_IDs, batch_size, reopen):
+    ' batches per second of DataGenerator, closing the file after each batch if reopen '
+
+    np.random.seed(1)
+    generator = DataGenerator(list_IDs, file_name, 6000, batch_size=batch_size, shuffle=True, norm_mode='std',
+                              label_type='gaussian')
+    start = time.time()
+    for bn in range(len(generator)):
+        batch = generator[bn]
+        del batch
+        if reopen:
+            close_hdf5_files()
+    close_hdf5_files()
+    return len(generator) / (time.time() - start)
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batches per second with the hdf5 file reopened per batch or kept open.')
+    parser.add_argument('--n_traces', type=int, default=2000)
+    parser.add_argument('--batch_size', type=int, default=8)
+    opt = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        file_name = os.path.join(tmp_dir, 'traces.hdf5')
+        packed_name = os.path.join(tmp_dir, 'packed.hdf5')
+        list_IDs = _write_hdf5(file_name, opt.n_traces)
+        pack_hdf5(file_name, packed_name)
+
+        for name, path in [('per-trace', file_name), ('packed', packed_name)]:
+            _steps(path, list_IDs, opt.batch_size, False)
+            print(name+': reopened per batch '+str(round(_steps(path, list_IDs, opt.batch_size, True), 1))
+                  +' steps/s, kept open '+str(round(_steps(path, list_IDs, opt.batch_size, False), 1))+' steps/s', flush=True)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+Measures the time to write the detection, P, and S labels of a batch of events with an added event in every other
+trace, for each label type, from the precomputed kernels of the training generators and, for comparison, computed
+for each event as the generators did before (np.exp of the gaussian and _triangle() per pick). Both give the same
+labels.
+
+    python benchmarks/label_synthesis.py --batch_size 200
+
+"""
+
+import time
+import argparse
+import numpy as np
+from EQTransformer.core.EqT_utils import _event_labels, _write_labels, _triangle
+
+
+
+def _events(batch_size, dim):
+    rng = np.random.default_rng(0)
+    events = []
+    for k in range(batch_size):
+        spt = int(rng.integers(100, dim//2))
+        sst = spt + int(rng.integers(50, 2000))
+        additions = [int(rng.integers(dim//2, dim//2+1000)), int(rng.integers(dim//2+1100, dim-500))] if k % 2 else None
+        events.append((spt, sst, additions))
+    return events
+
+
+
+def _kernels(label_type, events, dim):
+    ' labels of a batch from the precomputed kernels '
+
+    y1, y2, y3 = [np.zeros((len(events), dim, 1), dtype=np.float32) for _ in range(3)]
+    labels, added = [[], [], []], [[], [], []]
+    for i, (spt, sst, additions) in enumerate(events):
+        for slices, label in zip(labels, _event_labels(label_type, spt, sst, dim, 0.4)):
+            if label:
+                slices.append((i,)+label)
+        if additions:
+            for slices, label in zip(added, _event_labels(label_type, additions[0], additions[1], dim, 0.4, added=True)):
+                if label:
+                    slices.append((i,)+label)
+    for y, event_slices, added_slices in zip([y1, y2, y3], labels, added):
+        _write_labels(y, event_slices + added_slices)
+    return y1, y2, y3
+
+
+
+def _per_pick(label_type, events, dim):
+    ' labels of a batch computed for each event, for the events away from the edges of the window '
+
+    y1, y2, y3 = [np.zeros((len(events), dim, 1), dtype=np.float32) for _ in range(3)]
+    for i, (spt, sst, additions) in enumerate(events):
+        for p, s in [(spt, sst)] + ([additions] if additions else []):
+            y1[i, p:int(s+(0.4*(s-p))), 0] = 1
+            for y, pick in [(y2, p), (y3, s)]:
+                if label_type == 'gaussian':
+                    y[i, pick-20:pick+20, 0] = np.exp(-(np.arange(pick-20, pick+20)-pick)**2/(2*(10)**2))
+                elif label_type == 'triangle':
+                    y[i, pick-20:pick+21, 0] = _triangle()
+                else:
+                    y[i, pick-20:pick+20, 0] = 1
+    return y1, y2, y3
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time to write the labels of a batch.')
+    parser.add_argument('--batch_size', type=int, default=200)
+    parser.add_argument('--repeats', type=int, default=20)
+    opt = parser.parse_args()
+
+    dim = 6000
+    events = _events(opt.batch_size, dim)
+    for label_type in ['gaussian', 'triangle', 'box']:
+        assert all([np.array_equal(a, b) for a, b in zip(_kernels(label_type, events, dim), _per_pick(label_type, events, dim))])
+        timings = []
+        for function in [_per_pick, _kernels]:
+            start = time.time()
+            for _ in range(opt.repeats):
+                function(label_type, events, dim)
+            timings.append((time.time() - start) / opt.repeats * 1000)
+        print(label_type+': per event '+str(round(timings[0], 2))+' ms, from the kernels '
+              +str(round(timings[1], 2))+' ms per batch', flush=True)
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+Compares windowed and long-input prediction on the continuous data of one station:
+throughput, probability differences, and agreement of the picked P and S arrivals.
+
+    python benchmarks/long_input.py --input_dir downloads_mseeds --stations_json station_list.json \
+        --station CA06 --input_model ModelsAndSampleData/EqT_model.h5 --long_input 10
+
+"""
+
+import os
+import time
+import argparse
+import numpy as np
+from EQTransformer.core.EqT_utils import load_inference_model, long_input_model
+from EQTransformer.core.mseed_predictor import _mseed2nparry, _long_input_windows, _picker, PreLoadGeneratorTest
+
+
+def _picks(args, predD, predP, predS, shift):
+    ' returns the P and S picks of all windows as sample indices of the continuous data'
+
+    p_picks, s_picks = set(), set()
+    for ix in range(len(predD)):
+        matches, _, _ = _picker(args, predD[ix][:, 0], predP[ix][:, 0], predS[ix][:, 0])
+        for match_value in matches.values():
+            if match_value[3]:
+                p_picks.add(ix*shift + int(match_value[3]))
+            if match_value[6]:
+                s_picks.add(ix*shift + int(match_value[6]))
+    return sorted(p_picks), sorted(s_picks)
+
+
+
+def _agreement(ref, new, tolerance=20):
+    ' fraction of the reference picks that have a new pick within tolerance samples'
+
+    if len(ref) == 0:
+        return None
+    new = np.array(new)
+    if len(new) == 0:
+        return 0.0
+    return float(np.mean([np.min(np.abs(new - r)) <= tolerance for r in ref]))
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Windowed vs long-input prediction benchmark.')
+    parser.add_argument('--input_dir', default='downloads_mseeds')
+    parser.add_argument('--stations_json', default='station_list.json')
+    parser.add_argument('--station', required=True)
+    parser.add_argument('--input_model', default='ModelsAndSampleData/EqT_model.h5')
+    parser.add_argument('--long_input', type=int, default=10)
+    parser.add_argument('--overlap', type=float, default=0.3)
+    parser.add_argument('--batch_size', type=int, default=500)
+    parser.add_argument('--normalization_mode', default='std')
+    opt = parser.parse_args()
+
+    args = {"input_dir": opt.input_dir,
+            "stations_json": opt.stations_json,
+            "overlap": opt.overlap,
+            "batch_size": opt.batch_size,
+            "normalization_mode": opt.normalization_mode,
+            "long_input": opt.long_input,
+            "detection_threshold": 0.3,
+            "P_threshold": 0.1,
+            "S_threshold": 0.1}
+
+    model = load_inference_model(opt.input_model, ['binary_crossentropy']*3, [0.03, 0.40, 0.58])
+    long_model = long_input_model(model, opt.long_input)
+
+    file_list = [os.path.join(opt.station, ev) for ev in os.listdir(os.path.join(opt.input_dir, opt.station)) if ev.split(".")[-1].lower() == "mseed"]
+    uni_list = sorted(set([ev.split('__')[1]+'__'+ev.split('__')[2] for ev in file_list]))
+
+    t_win, t_long, n_win, n_samples = 0, 0, 0, 0
+    diff, p_agree, s_agree = [], [], []
+    warm = True
+    for month in uni_list:
+        matching = [s for s in file_list if month in s]
+        meta, _, _, data_set = _mseed2nparry(args, matching, [], [], opt.station)
+        pred_generator = PreLoadGeneratorTest(meta["trace_start_time"], data_set, batch_size=opt.batch_size, norm_mode=opt.normalization_mode)
+        if len(pred_generator) == 0:
+            continue
+        if warm:
+            model.predict(pred_generator[0]['input'], batch_size=opt.batch_size, verbose=0)
+            _long_input_windows(args, long_model, {"continuous_data": meta["continuous_data"][:opt.long_input*6000],
+                                                   "trace_start_time": meta["trace_start_time"][:1],
+                                                   "window_shift": meta["window_shift"]})
+            warm = False
+
+        start = time.time()
+        X = np.concatenate([pred_generator[bn]['input'] for bn in range(len(pred_generator))])
+        predD, predP, predS = model.predict(X, batch_size=opt.batch_size, verbose=0)
+        t_win += time.time() - start
+
+        start = time.time()
+        longD, longP, longS = _long_input_windows(args, long_model, meta)
+        t_long += time.time() - start
+
+        longD, longP, longS = longD[:len(predD)], longP[:len(predD)], longS[:len(predD)]
+        n_win += len(predD)
+        n_samples += len(meta["continuous_data"])
+        diff.append([np.mean(np.abs(predD - longD)), np.mean(np.abs(predP - longP)), np.mean(np.abs(predS - longS))])
+
+        p_ref, s_ref = _picks(args, predD, predP, predS, meta["window_shift"])
+        p_new, s_new = _picks(args, longD, longP, longS, meta["window_shift"])
+        p_agree.append(_agreement(p_ref, p_new))
+        s_agree.append(_agreement(s_ref, s_new))
+
+    hours = n_samples / 100 / 3600
+    diff = np.mean(diff, axis=0)
+    print('windows: '+str(n_win)+', continuous data: '+str(round(hours, 2))+' hours')
+    print('windowed (overlap '+str(opt.overlap)+'): '+str(round(t_win, 2))+' s, '+str(round(hours/t_win*3600, 1))+' hours of data/hour')
+    print('long_input '+str(opt.long_input)+': '+str(round(t_long, 2))+' s, '+str(round(hours/t_long*3600, 1))+' hours of data/hour')
+    print('speedup: '+str(round(t_win/t_long, 2)))
+    print('mean absolute probability difference (D, P, S): '+str(np.round(diff, 4)))
+    print('windowed P picks recovered within 0.2 s: '+str([round(a, 3) for a in p_agree if a is not None]))
+    print('windowed S picks recovered within 0.2 s: '+str([round(a, 3) for a in s_agree if a is not None]))
+
+
+
+if __name__ == '__main__':
+    main()
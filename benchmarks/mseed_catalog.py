@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+Compares listing and grouping the files of a MiniSEED archive by scanning the directories, as preprocessor and
+mseed_predictor did, with building the catalog of the archive (MseedCatalog) and opening it again once it is
+up to date, on an archive of small synthetic files with a given number of stations and daily chunks.
+
+    python benchmarks/mseed_catalog.py --stations 20 --days 365
+
+"""
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import obspy
+from EQTransformer.utils.mseed_catalog import MseedCatalog
+
+
+
+def _scan(mseed_dir):
+    ' the directory scan and grouping of the files into chunks of the old preprocessor '
+
+    n = 0
+    for station in sorted(os.listdir(mseed_dir)):
+        if not os.path.isdir(os.path.join(mseed_dir, station)):
+            continue
+        file_list = [os.path.join(station, ev) for ev in os.listdir(os.path.join(mseed_dir, station))]
+        uni_list = sorted(set([ev.split('__')[1]+'__'+ev.split('__')[2] for ev in file_list]))
+        for month in uni_list:
+            matching = [s for s in file_list if month in s]
+            n += len(matching)
+    return n
+
+
+
+def _catalog(mseed_dir):
+    catalog = MseedCatalog(mseed_dir)
+    n = sum([len(matching) for station in catalog.stations() for _, matching in catalog.chunks(station)])
+    catalog.close()
+    return n
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scanning the directories vs the catalog of a MiniSEED archive.')
+    parser.add_argument('--stations', type=int, default=20)
+    parser.add_argument('--days', type=int, default=365)
+    opt = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        mseed_dir = os.path.join(tmp_dir, 'mseeds')
+        tr = obspy.Trace(np.zeros(1000, dtype=np.int32), header={'network': 'XX', 'sampling_rate': 100.0})
+        for s in range(opt.stations):
+            station = 'ST%02d' % s
+            os.makedirs(os.path.join(mseed_dir, station))
+            for d in range(opt.days):
+                t0 = obspy.UTCDateTime(2019, 1, 1) + d * 86400
+                name = '__'+t0.strftime('%Y%m%dT%H%M%SZ')+'__'+(t0 + 86400).strftime('%Y%m%dT%H%M%SZ')+'.mseed'
+                for c in 'ENZ':
+                    tr.stats.station, tr.stats.channel, tr.stats.starttime = station, 'HH'+c, t0
+                    tr.write(os.path.join(mseed_dir, station, 'XX.'+station+'..HH'+c+name), format='MSEED')
+        print(str(opt.stations * opt.days * 3)+' files')
+
+        for name, run in [('directory scan', _scan), ('catalog build', _catalog), ('catalog, up to date', _catalog)]:
+            start = time.time()
+            n = run(mseed_dir)
+            print(name+': '+str(n)+' files in '+str(round(time.time() - start, 2))+' s', flush=True)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+
+if __name__ == '__main__':
+    main()
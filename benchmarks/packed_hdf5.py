@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+Compares the training samples per second read from a synthetic dataset with one hdf5 dataset per trace, as STEAD,
+and from the same dataset converted by pack_hdf5, for the raw reads (iter_traces) and for DataGenerator, with the
+batches in a shuffled order as during the training. The files are read once before the timings so both layouts
+come from the page cache; on a cold disk the per-trace layout also pays one seek per trace.
+
+    python benchmarks/packed_hdf5.py --n_traces 5000 --batch_size 200
+
+"""
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import h5py
+import numpy as np
+from EQTransformer.core.EqT_utils import DataGenerator
+from EQTransformer.utils.packed_hdf5 import pack_hdf5, trace_ids, iter_traces
+
+
+
+def _write_hdf5(file_name, n_traces):
+    rng = np.random.default_rng(0)
+    list_IDs = []
+    with h5py.File(file_name, 'w') as fl:
+        for k in range(n_traces):
+            ID = 'TR%05d_' % k + ('EV' if k % 2 else 'NO')
+            dataset = fl.create_dataset('data/'+ID, data=rng.standard_normal((6000, 3)).astype(np.float32))
+            if k % 2:
+                dataset.attrs['trace_category'] = 'earthquake_local'
+                dataset.attrs['p_arrival_sample'] = 1000 + k % 500
+                dataset.attrs['s_arrival_sample'] = 2000 + k % 500
+                dataset.attrs['coda_end_sample'] = 3000 + k % 500
+                dataset.attrs['snr_db'] = np.array([20.0, 20.0, 20.0])
+            else:
+                dataset.attrs['trace_category'] = 'noise'
+            list_IDs.append(ID)
+    return list_IDs
+
+
+
+def _reads(file_name, list_IDs, batch_size):
+    ' samples per second of the raw reads of shuffled batches '
+
+    ids = trace_ids(file_name, list_IDs)[np.random.default_rng(1).permutation(len(list_IDs))]
+    start = time.time()
+    with h5py.File(file_name, 'r') as fl:
+        for bn in range(len(list_IDs) // batch_size):
+            for data, meta in iter_traces(fl, ids[bn*batch_size:(bn+1)*batch_size]):
+                meta['earthquake']
+    return (len(list_IDs) // batch_size) * batch_size / (time.time() - start)
+
+
+
+def _generator(file_name, list_IDs, batch_size):
+    ' samples per second of DataGenerator '
+
+    np.random.seed(1)
+    generator = DataGenerator(list_IDs, file_name, 6000, batch_size=batch_size, shuffle=True, norm_mode='std',
+                              label_type='gaussian')
+    start = time.time()
+    for bn in range(len(generator)):
+        batch = generator[bn]
+        del batch
+    return len(generator) * batch_size / (time.time() - start)
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Samples per second from the per-trace and the packed hdf5 layouts.')
+    parser.add_argument('--n_traces', type=int, default=5000)
+    parser.add_argument('--batch_size', type=int, default=200)
+    opt = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        file_name = os.path.join(tmp_dir, 'traces.hdf5')
+        packed_name = os.path.join(tmp_dir, 'packed.hdf5')
+        list_IDs = _write_hdf5(file_name, opt.n_traces)
+        start = time.time()
+        pack_hdf5(file_name, packed_name)
+        print('packing '+str(opt.n_traces)+' traces: '+str(round(time.time() - start, 1))+' s', flush=True)
+
+        for name, path in [('per-trace', file_name), ('packed', packed_name)]:
+            _reads(path, list_IDs, opt.batch_size)
+            print(name+': reads '+str(int(_reads(path, list_IDs, opt.batch_size)))+' samples/s, DataGenerator '
+                  +str(int(_generator(path, list_IDs, opt.batch_size)))+' samples/s', flush=True)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+Compares the ObsPy detrend/bandpass/taper chain with the float32 preprocessing engine on
+day-long 3-component synthetic data (or on real MiniSEED files): time, throughput, and differences.
+
+    python benchmarks/preprocessing.py --days 1 --sampling_rate 100
+    python benchmarks/preprocessing.py --mseeds downloads_mseeds/CA06/*20190901T000000Z*
+
+"""
+
+import time
+import argparse
+import numpy as np
+import obspy
+from obspy import read
+from EQTransformer.utils.preprocessing import preprocess_stream
+
+
+def _obspy_chain(st):
+    st.detrend('demean')
+    st.filter('bandpass', freqmin=1.0, freqmax=45, corners=2, zerophase=True)
+    st.taper(max_percentage=0.001, type='cosine', max_length=2)
+    return st
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ObsPy chain vs float32 preprocessing engine.')
+    parser.add_argument('--days', type=float, default=1)
+    parser.add_argument('--sampling_rate', type=float, default=100)
+    parser.add_argument('--mseeds', nargs='*', default=None)
+    parser.add_argument('--repeats', type=int, default=3)
+    opt = parser.parse_args()
+
+    if opt.mseeds:
+        st = obspy.Stream()
+        for f in opt.mseeds:
+            st += read(f)
+        st.merge(fill_value=0)
+    else:
+        npts = int(opt.days * 86400 * opt.sampling_rate)
+        rng = np.random.default_rng(0)
+        st = obspy.Stream([obspy.Trace((rng.standard_normal(npts)*1000 + np.cumsum(rng.standard_normal(npts))).astype(np.int32),
+                                       header={'sampling_rate': opt.sampling_rate, 'channel': 'HH'+c}) for c in 'ENZ'])
+    hours = sum([tr.stats.npts / tr.stats.sampling_rate for tr in st]) / 3600
+
+    results = {}
+    for name, chain in [('obspy', _obspy_chain), ('engine', preprocess_stream)]:
+        times = []
+        for _ in range(opt.repeats):
+            data = st.copy()
+            start = time.time()
+            out = chain(data)
+            times.append(time.time() - start)
+        results[name] = out
+        t = min(times)
+        print(name+': '+str(round(t, 3))+' s, '+str(round(hours / t, 1))+' channel-hours/s')
+
+    err = max([np.max(np.abs(a.data - b.data)) / np.max(np.abs(a.data)) for a, b in zip(results['obspy'], results['engine'])])
+    print('maximum absolute difference relative to the peak amplitude: '+str(err))
+
+
+
+if __name__ == '__main__':
+    main()
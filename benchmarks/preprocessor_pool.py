@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+Times preprocessor on synthetic 3-component MiniSEED files of several stations and chunks of data with different
+numbers of processes, to check how the throughput scales with the number of cores.
+
+    python benchmarks/preprocessor_pool.py --stations 8 --chunks 2 --hours 6 --processors 1 2 4 8
+
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import obspy
+from EQTransformer.utils.hdf5_maker import preprocessor
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='preprocessor throughput vs number of processes.')
+    parser.add_argument('--stations', type=int, default=8)
+    parser.add_argument('--chunks', type=int, default=2)
+    parser.add_argument('--hours', type=float, default=6)
+    parser.add_argument('--processors', type=int, nargs='*', default=[1, 2, 4])
+    parser.add_argument('--block_length', type=float, default=None)
+    opt = parser.parse_args()
+
+    cwd = os.getcwd()
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        os.chdir(tmp_dir)
+        rng = np.random.default_rng(0)
+        stations = {}
+        for s in range(opt.stations):
+            station = 'ST%02d' % s
+            stations[station] = {'network': 'XX', 'channels': ['HHE', 'HHN', 'HHZ'], 'coords': [35.8, -117.6, 800]}
+            os.makedirs(os.path.join('mseeds', station))
+            for d in range(opt.chunks):
+                t0 = obspy.UTCDateTime(2019, 9, 1) + d * 86400
+                name = '__'+t0.strftime('%Y%m%dT%H%M%SZ')+'__'+(t0 + 86400).strftime('%Y%m%dT%H%M%SZ')+'.mseed'
+                for c in 'ENZ':
+                    tr = obspy.Trace((rng.standard_normal(int(opt.hours * 360000))*1000).astype(np.int32),
+                                     header={'network': 'XX', 'station': station, 'channel': 'HH'+c,
+                                             'sampling_rate': 100.0, 'starttime': t0})
+                    tr.write(os.path.join('mseeds', station, 'XX.'+station+'..HH'+c+name), format='MSEED', encoding='STEIM2')
+        with open('station_list.json', 'w') as f:
+            json.dump(stations, f)
+        channel_hours = opt.stations * opt.chunks * opt.hours * 3
+
+        for n in opt.processors:
+            shutil.rmtree('mseeds_processed_hdfs', ignore_errors=True)
+            start = time.time()
+            preprocessor('preproc', 'mseeds', 'station_list.json', overlap=0.3, n_processor=n, block_length=opt.block_length)
+            t = time.time() - start
+            print(str(n)+' processes: '+str(round(t, 1))+' s, '+str(round(channel_hours / t, 1))+' channel-hours/s', flush=True)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp_dir)
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+Measures the memory that each model replica adds, with replicas that load their own copy of the
+model (spawn) and with replicas forked from one warmed-up model that share its weights (share_weights):
+
+    python benchmarks/replica_memory.py --input_model ModelsAndSampleData/EqT_model.h5 --number_of_replicas 4
+
+"""
+
+import time
+import argparse
+import numpy as np
+from EQTransformer.core.replica_pool import ReplicaPool
+
+
+def _run(opt, share_weights):
+    ' starts a pool, predicts a few batches, and returns its throughput and the memory of its replicas'
+
+    pool = ReplicaPool(opt.input_model,
+                       ['binary_crossentropy', 'binary_crossentropy', 'binary_crossentropy'],
+                       [0.03, 0.40, 0.58],
+                       number_of_replicas=opt.number_of_replicas,
+                       threads_per_replica=1,
+                       share_weights=share_weights)
+    X = np.random.randn(opt.number_of_windows, 6000, 3).astype(np.float32)
+    pool.predict(X[:opt.batch_size*len(pool.workers)], batch_size=opt.batch_size)
+    start = time.time()
+    pool.predict(X, batch_size=opt.batch_size)
+    throughput = len(X) / (time.time() - start)
+    usage = pool.memory_usage()
+    pool.close()
+    return throughput, usage
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-replica memory with and without shared weights.')
+    parser.add_argument('--input_model', default='ModelsAndSampleData/EqT_model.h5')
+    parser.add_argument('--number_of_replicas', type=int, default=4)
+    parser.add_argument('--number_of_windows', type=int, default=200)
+    parser.add_argument('--batch_size', type=int, default=10)
+    opt = parser.parse_args()
+
+    for name, share_weights in [('separate models (spawn)', False), ('shared weights (fork)', True)]:
+        throughput, usage = _run(opt, share_weights)
+        print(name+': '+str(round(throughput, 1))+' windows/s')
+        for rank, u in enumerate(usage):
+            print('    replica '+str(rank)+': '+str(u))
+        if all(usage):
+            print('    mean private memory per replica: '+str(round(np.mean([u['private'] for u in usage]), 1))+' MB, '
+                  'total pss: '+str(round(sum([u['pss'] for u in usage]), 1))+' MB')
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+Compares the time of getting the windows of a chunk of 3-component MiniSEED files by preprocessing them
+(BlockStream), on a cache miss (preprocessing plus writing the entry), and on a cache hit (TraceCache), on
+synthetic files of a given length (or on real MiniSEED files).
+
+    python benchmarks/trace_cache.py --days 1 --sampling_rate 100
+    python benchmarks/trace_cache.py --mseeds downloads_mseeds/CA06/*20190901T000000Z*
+
+"""
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import obspy
+from EQTransformer.utils.preprocessing import BlockStream
+from EQTransformer.utils.trace_cache import TraceCache
+
+
+def _windows(stream):
+    n = 0
+    for start_times, windows in stream.blocks():
+        n += len(windows)
+    return n
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Preprocessing vs cached preprocessed traces.')
+    parser.add_argument('--days', type=float, default=1)
+    parser.add_argument('--sampling_rate', type=float, default=100)
+    parser.add_argument('--mseeds', nargs='*', default=None)
+    parser.add_argument('--block_length', type=float, default=3600)
+    parser.add_argument('--overlap', type=float, default=0.3)
+    opt = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    files = opt.mseeds
+    if not files:
+        npts = int(opt.days * 86400 * opt.sampling_rate)
+        rng = np.random.default_rng(0)
+        files = []
+        for c in 'ENZ':
+            tr = obspy.Trace((rng.standard_normal(npts)*1000).astype(np.int32),
+                             header={'network': 'XX', 'station': 'ST01', 'channel': 'HH'+c, 'sampling_rate': opt.sampling_rate})
+            files.append(os.path.join(tmp_dir, 'XX.ST01..HH'+c+'.mseed'))
+            tr.write(files[-1], format='MSEED', encoding='STEIM2')
+        print('files: '+str(round(sum([os.path.getsize(f) for f in files]) / 1e6, 1))+' MB, '+str(npts)+' samples per component')
+
+    try:
+        cache = TraceCache(os.path.join(tmp_dir, 'cache'))
+        runs = [('preprocessing', lambda: BlockStream(files, overlap=opt.overlap, block_length=opt.block_length, span='union')),
+                ('cache miss', lambda: cache.stream(files, overlap=opt.overlap, block_length=opt.block_length, span='union')),
+                ('cache hit', lambda: cache.stream(files, overlap=opt.overlap, block_length=opt.block_length, span='union'))]
+        for name, stream in runs:
+            start = time.time()
+            n = _windows(stream())
+            print(name+': '+str(n)+' windows in '+str(round(time.time() - start, 2))+' s')
+        print('cache entry: '+str(round(cache.size() / 1e6, 1))+' MB')
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+
+if __name__ == '__main__':
+    main()
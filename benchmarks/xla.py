@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+Compares the default graph with the XLA-compiled (jit_compile) prediction path on CPU:
+compilation time, per-window latency at batch size 1, throughput at a larger batch size,
+and the difference between the probabilities.
+
+    python benchmarks/xla.py --input_model ModelsAndSampleData/EqT_model.h5 --batch_size 100
+
+"""
+
+import time
+import argparse
+import numpy as np
+from EQTransformer.core.EqT_utils import load_inference_model, XLAModel
+
+
+def _time(predict, X, batch_size, repeats):
+    ' seconds per call of predict over repeats calls, after one untimed call'
+
+    predict(X, batch_size)
+    start = time.time()
+    for _ in range(repeats):
+        predict(X, batch_size)
+    return (time.time() - start) / repeats
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Default vs XLA-compiled prediction benchmark.')
+    parser.add_argument('--input_model', default='ModelsAndSampleData/EqT_model.h5')
+    parser.add_argument('--batch_size', type=int, default=100)
+    parser.add_argument('--number_of_batches', type=int, default=5)
+    parser.add_argument('--repeats', type=int, default=20)
+    opt = parser.parse_args()
+
+    model = load_inference_model(opt.input_model, ['binary_crossentropy']*3, [0.03, 0.40, 0.58])
+    X = np.random.randn(opt.batch_size*opt.number_of_batches, 6000, 3).astype(np.float32)
+    single = X[:1]
+
+    xla_single = XLAModel(model, 1)
+    xla_batch = XLAModel(model, opt.batch_size)
+    print('compilation: '+str(round(xla_single.compile_time, 1))+' s (batch size 1), '
+          +str(round(xla_batch.compile_time, 1))+' s (batch size '+str(opt.batch_size)+')')
+
+    default = lambda x, bs: model.predict(x, batch_size=bs, verbose=0)
+    for name, predict_single, predict_batch in [('default', default, default),
+                                                ('jit_compile', lambda x, bs: xla_single.predict(x), lambda x, bs: xla_batch.predict(x))]:
+        latency = _time(predict_single, single, 1, opt.repeats)
+        throughput = len(X) / _time(predict_batch, X, opt.batch_size, 1)
+        print(name+': latency '+str(round(latency*1000, 1))+' ms/window, throughput '+str(round(throughput, 1))+' windows/s')
+
+    # the model uses Monte Carlo dropout, so the differences include the dropout noise of both runs
+    ref = model.predict(X[:opt.batch_size], batch_size=opt.batch_size, verbose=0)
+    new = xla_batch.predict(X[:opt.batch_size])
+    print('mean absolute probability difference (D, P, S): '+str([round(float(np.mean(np.abs(r - n))), 5) for r, n in zip(ref, new)]))
+
+
+
+if __name__ == '__main__':
+    main()
@@ -30,6 +30,9 @@ setup(
 	'obspy',
 	'jupyter'], 
 
+    entry_points={
+        'console_scripts': ['eqt-autotune=EQTransformer.core.autotune:main'],
+        },
     python_requires='>=3.6',
 )
 
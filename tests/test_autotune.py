@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 2026
+
+"""
+
+from EQTransformer.core.autotune import autotune, apply_tuning_profile
+import json
+import os
+import pytest
+
+
+def test_autotune():
+    profile = autotune(input_model='../sampleData&Model/EqT1D8pre_048.h5', 
+                       output_profile='test_autotune.json',
+                       batch_sizes=[10, 50],
+                       intra_op_threads=[1],
+                       inter_op_threads=[1],
+                       number_of_cpus=[1, 2],
+                       number_of_windows=100)
+    assert len(profile['trials']) == 4
+    assert os.path.isfile('test_autotune.json')
+    
+def test_profile():
+    profile = json.load(open('test_autotune.json'))
+    best = profile['best']
+    assert profile['input_model'] == os.path.abspath('../sampleData&Model/EqT1D8pre_048.h5')
+    assert profile['use_multiprocessing'] and best['use_multiprocessing']
+    args = {'input_model': '../sampleData&Model/EqT1D8pre_048.h5', 'precision': None, 
+            'batch_size': None, 'number_of_cpus': 3, 'use_multiprocessing': True}
+    apply_tuning_profile(args, 'test_autotune.json', {'batch_size': 500, 'number_of_cpus': 5})
+    assert args['batch_size'] == best['batch_size']
+    assert args['number_of_cpus'] == 3
+    
+    args = {'input_model': '../sampleData&Model/EqT1D8pre_048.h5', 'precision': 'float32', 
+            'batch_size': 500, 'number_of_cpus': None, 'use_multiprocessing': True}
+    apply_tuning_profile(args, 'test_autotune.json', {'batch_size': 500, 'number_of_cpus': 5})
+    assert args['batch_size'] == 500
+    assert args['number_of_cpus'] == best['number_of_cpus']
+
+    args = {'input_model': '../sampleData&Model/EqT1D8pre_048.h5', 'precision': None, 
+            'batch_size': None, 'number_of_cpus': None, 'use_multiprocessing': False}
+    apply_tuning_profile(args, 'test_autotune.json', {'batch_size': 500, 'number_of_cpus': 5})
+    assert args['number_of_cpus'] == 5
+    
+    for input_model, precision in [('other_model.h5', None), 
+                                   ('../sampleData&Model/EqT1D8pre_048.h5', 'bfloat16')]:
+        args = {'input_model': input_model, 'precision': precision, 
+                'batch_size': None, 'number_of_cpus': None, 'use_multiprocessing': True}
+        assert apply_tuning_profile(args, 'test_autotune.json', {'batch_size': 500, 'number_of_cpus': 5}) is None
+        assert args['batch_size'] == 500 and args['number_of_cpus'] == 5
+    os.remove('test_autotune.json')
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+"""
+
+from EQTransformer.core.EqT_utils import load_inference_model, prune_filters
+from EQTransformer.core.trainer import trainer
+from EQTransformer.core.tester import compare_models
+import numpy as np
+import h5py
+import pytest
+import glob
+import os
+
+
+def test_prune_filters():
+    model = load_inference_model('../sampleData&Model/EqT1D8pre_048.h5', 
+                                 ['binary_crossentropy', 'binary_crossentropy', 'binary_crossentropy'], 
+                                 [0.02, 0.40, 0.58])
+    pruned = prune_filters(model, 0.5)
+    assert pruned.count_params() < model.count_params()
+    assert pruned.get_layer('conv1d').filters == model.get_layer('conv1d').filters // 2
+    yh1, yh2, yh3 = pruned.predict(np.random.randn(2, 6000, 3), verbose=0)
+    assert yh1.shape == yh2.shape == yh3.shape == (2, 6000, 1)
+
+
+def test_distillation():
+    trainer(input_hdf5='../sampleData&Model/100samples.hdf5',
+        input_csv='../sampleData&Model/100samples.csv',
+        output_name='test_distillation',                
+        nb_filters=[4, 8, 8, 16, 16, 32, 32],
+        cnn_blocks=1,
+        lstm_blocks=1,
+        teacher_model='../sampleData&Model/EqT1D8pre_048.h5',
+        distillation_alpha=0.8,
+        prune_ratio=0.25,
+        prune_epochs=1,
+        mode='generator',
+        train_valid_test_split=[0.60, 0.20, 0.20],
+        batch_size=20,
+        epochs=2, 
+        patience=2)
+    
+    assert len(glob.glob("test_distillation_outputs/final_model.h5")) == 1
+    with open('test_distillation_outputs/X_report.txt') as f:
+        report = f.read()
+    assert 'teacher_model: ../sampleData&Model/EqT1D8pre_048.h5' in report
+    
+
+def test_compare_models():
+    results = compare_models(input_hdf5='../sampleData&Model/100samples.hdf5',
+                             input_testset='test_distillation_outputs/test.npy',
+                             input_models=['../sampleData&Model/EqT1D8pre_048.h5', 'test_distillation_outputs/final_model.h5'],
+                             output_name='test_compare',
+                             batch_size=5,
+                             number_of_batches=2)
+    
+    assert len(results) == 2
+    assert results[1]['total params'] < results[0]['total params']
+    assert results[0]['mean absolute difference to model_0 (D, P, S)'] == [0.0, 0.0, 0.0]
+    assert results[1]['windows per second'] > 0
+    assert len(glob.glob("test_compare_outputs/X_report.txt")) == 1
+    assert len(glob.glob("test_compare_outputs/model_*_outputs/X_test_results.csv")) == 2
+
+
+def _write_test_hdf5(file_name, n_traces=6):
+    rng = np.random.default_rng(0)
+    list_IDs = []
+    with h5py.File(file_name, 'w') as fl:
+        for k in range(n_traces):
+            ID = 'ST%02d_' % k + ('EV' if k % 2 else 'NO')
+            dataset = fl.create_dataset('data/'+ID, data=rng.standard_normal((6000, 3)).astype(np.float32))
+            attrs = {'trace_name': ID, 'network_code': 'XX', 'receiver_type': 'HH', 'trace_start_time': '2019-07-04 17:00:00',
+                     'snr_db': np.array([20.0, 20.0, 20.0])}
+            if k % 2:
+                attrs.update({'trace_category': 'earthquake_local', 'source_id': str(k), 'source_distance_km': 10.0, 
+                              'source_magnitude': 2.0, 'p_arrival_sample': 1000, 'p_status': 'manual', 'p_weight': 0.5,
+                              's_arrival_sample': 2000, 's_status': 'manual', 's_weight': 0.5, 'coda_end_sample': 3000})
+            else:
+                attrs['trace_category'] = 'noise'
+            dataset.attrs.update(attrs)
+            list_IDs.append(ID)
+    return list_IDs
+
+
+def test_compare_models_default_batch_size(tmp_path, monkeypatch):
+    model = os.path.abspath('../sampleData&Model/EqT1D8pre_048.h5')
+    monkeypatch.chdir(tmp_path)
+    np.save('test.npy', _write_test_hdf5('traces.hdf5'))
+    results = compare_models(input_hdf5='traces.hdf5',
+                             input_testset='test.npy',
+                             input_models=[model, model],
+                             output_name='test_compare',
+                             tuning_profile=None)
+    
+    assert [scores['batch_size'] for scores in results] == [500, 500]
+    assert results[1]['windows per second'] > 0
+    with open(os.path.join('test_compare_outputs', 'X_report.txt')) as f:
+        report = f.read()
+    assert 'batch_size: 500' in report and 'batch_size: None' not in report
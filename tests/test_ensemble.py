@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+"""
+
+from EQTransformer.core.EqT_utils import load_inference_model, ModelEnsemble
+import numpy as np
+import pytest
+
+
+def test_ensemble():
+    models = [load_inference_model('../sampleData&Model/EqT1D8pre_048.h5',
+                                   ['binary_crossentropy', 'binary_crossentropy', 'binary_crossentropy'],
+                                   [0.02, 0.40, 0.58]) for _ in range(2)]
+    X = np.random.randn(4, 6000, 3)
+
+    yh1, yh2, yh3 = ModelEnsemble(models, ensemble=None).predict(X, batch_size=2)
+    assert yh1.shape == yh2.shape == yh3.shape == (4, 6000, 2)
+
+    yh1, yh2, yh3 = ModelEnsemble(models, ensemble='mean').predict(X, batch_size=2)
+    assert yh1.shape == (4, 6000, 1)
+    assert np.all(yh1 >= 0) and np.all(yh1 <= 1)
+
+    with pytest.raises(ValueError):
+        ModelEnsemble(models, ensemble='median')
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+"""
+
+from EQTransformer.core.EqT_utils import DataGenerator, DataGeneratorPrediction, data_reader, cached_hdf5, close_hdf5_files
+from EQTransformer.utils.packed_hdf5 import pack_hdf5, metadata_index, trace_ids, iter_traces
+from EQTransformer.core.tester import tester as run_tester
+import numpy as np
+import pytest
+import pickle
+import h5py
+import os
+
+
+def _write_hdf5(file_name, n_traces=8):
+    rng = np.random.default_rng(0)
+    list_IDs = []
+    with h5py.File(file_name, 'w') as fl:
+        for k in range(n_traces):
+            ID = 'TR%02d_' % k + ('EV' if k % 2 else 'NO')
+            dataset = fl.create_dataset('data/'+ID, data=rng.standard_normal((6000, 3)).astype(np.float32))
+            if k % 2:
+                dataset.attrs['trace_category'] = 'earthquake_local'
+                dataset.attrs['p_arrival_sample'] = 1000 + 100*k
+                dataset.attrs['s_arrival_sample'] = 2000 + 100*k
+                dataset.attrs['coda_end_sample'] = 3000 + 100*k
+                dataset.attrs['snr_db'] = np.array([20.0, 20.0, 20.0])
+            else:
+                dataset.attrs['trace_category'] = 'noise'
+            list_IDs.append(ID)
+    return list_IDs
+
+
+def test_generator_buffers(tmp_path):
+    file_name = str(tmp_path / 'traces.hdf5')
+    list_IDs = _write_hdf5(file_name)
+    generator = DataGeneratorPrediction(list_IDs, file_name, 6000, batch_size=2, norm_mode='std')
+
+    first = generator[0]['input']
+    assert first.dtype == np.float32
+    with h5py.File(file_name, 'r') as fl:
+        data = np.array(fl['data/'+list_IDs[0]])
+    data -= np.mean(data, axis=0, keepdims=True)
+    assert np.array_equal(first[0], data / np.std(data, axis=0, keepdims=True))
+
+    # a batch that is still referred to is not overwritten by the next ones
+    kept = first.copy()
+    second = generator[1]['input']
+    assert second is not first and np.array_equal(first, kept)
+    # and its arrays are reused once it is released
+    address = second.__array_interface__['data'][0]
+    del second
+    assert generator[2]['input'].__array_interface__['data'][0] == address
+    assert len(pickle.loads(pickle.dumps(generator))._buffers.pool) == 0
+
+
+def test_label_dtype(tmp_path):
+    file_name = str(tmp_path / 'traces.hdf5')
+    list_IDs = _write_hdf5(file_name)
+    generator = DataGenerator(list_IDs, file_name, 6000, batch_size=4, shuffle=False, norm_mode='std', label_type='gaussian')
+    batches = [generator[bn] for bn in range(len(generator))]
+    X, y1, y2, y3 = data_reader(list_IDs, file_name, norm_mode='std')
+    for array in [X, y1, y2, y3] + [b for batch in batches for b in [batch[0]['input']] + list(batch[1].values())]:
+        assert array.dtype == np.float32
+    y2 = [batch[1]['picker_P'].copy() for batch in batches]
+    assert y2[0][1, 1100, 0] == 1 and np.count_nonzero(y2[0][0]) == 0
+
+    # the reused label arrays are cleared between the batches
+    del batches
+    assert np.array_equal(generator[0][1]['picker_P'], y2[0])
+    assert np.array_equal(generator[1][1]['picker_P'], y2[1])
+
+
+def test_packed_hdf5(tmp_path):
+    file_name = str(tmp_path / 'traces.hdf5')
+    packed_name = str(tmp_path / 'packed.hdf5')
+    list_IDs = _write_hdf5(file_name)
+    pack_hdf5(file_name, packed_name)
+
+    batches = []
+    for name in [file_name, packed_name]:
+        generator = DataGenerator(list_IDs, name, 6000, batch_size=4, shuffle=False, norm_mode='std', label_type='gaussian')
+        batches.append([generator[bn] for bn in range(len(generator))])
+    for batch, packed_batch in zip(*batches):
+        assert np.array_equal(batch[0]['input'], packed_batch[0]['input'])
+        for output in ['detector', 'picker_P', 'picker_S']:
+            assert np.array_equal(batch[1][output], packed_batch[1][output])
+
+    # a batch can have a trace twice, and its copies are separate
+    with h5py.File(packed_name, 'r') as fl:
+        traces = list(iter_traces(fl, trace_ids(packed_name, [list_IDs[3], list_IDs[0], list_IDs[3]]), block_size=2))
+    assert traces[0][0] is not traces[2][0] and np.array_equal(traces[0][0], traces[2][0])
+    assert traces[2][1]['p_arrival_sample'] == 1300
+
+    X, y1, y2, y3 = data_reader(list_IDs, packed_name, norm_mode='std')
+    assert np.array_equal(X, data_reader(list_IDs, file_name, norm_mode='std')[0])
+
+    # tester reports attributes that are not packed
+    np.save(str(tmp_path / 'test.npy'), list_IDs)
+    with pytest.raises(ValueError, match='pack_hdf5'):
+        run_tester(input_hdf5=packed_name, input_testset=str(tmp_path / 'test.npy'), input_model=str(tmp_path / 'model.h5'), 
+               output_name=str(tmp_path / 'test_tester'), tuning_profile=None)
+    assert not os.path.isdir(str(tmp_path / 'test_tester_outputs'))
+
+
+def test_metadata_index(tmp_path):
+    file_name = str(tmp_path / 'traces.hdf5')
+    list_IDs = _write_hdf5(file_name)
+    index = metadata_index(file_name)
+    assert os.path.isfile(str(tmp_path / 'traces_index.npy'))
+    assert list(index['trace_name'].astype(str)) == sorted(list_IDs)
+    assert list(trace_ids(file_name, list_IDs[::-1])) == list(range(len(list_IDs)))[::-1]
+    assert list(trace_ids(file_name, [2, 0])) == [2, 0]
+    assert index['event'][1] and index['earthquake'][1] and not index['noise'][1]
+    assert index['p_arrival_sample'][1] == 1100 and np.isnan(index['p_arrival_sample'][0])
+    assert np.array_equal(index['snr_db'][1], [20.0, 20.0, 20.0])
+
+    pack_hdf5(file_name, str(tmp_path / 'packed.hdf5'))
+    packed_index = metadata_index(str(tmp_path / 'packed.hdf5'))
+    for field in index.dtype.names:
+        assert np.array_equal(packed_index[field].astype(str), index[field].astype(str))
+
+
+def test_cached_hdf5(tmp_path):
+    file_name = str(tmp_path / 'traces.hdf5')
+    list_IDs = _write_hdf5(file_name)
+    generator = DataGenerator(list_IDs, file_name, 6000, batch_size=4, shuffle=False, norm_mode='std', label_type='gaussian')
+    first = generator[0][0]['input'].copy()
+    fl = cached_hdf5(file_name)
+    assert fl.id.valid
+    generator[1]
+    DataGeneratorPrediction(list_IDs, file_name, 6000, batch_size=2, norm_mode='std')[0]
+    assert cached_hdf5(file_name) is fl
+
+    close_hdf5_files()
+    assert not fl.id.valid
+    assert np.array_equal(pickle.loads(pickle.dumps(generator))[0][0]['input'], first)
+    assert cached_hdf5(file_name) is not fl
+
+    # a modified file is opened again
+    fl = cached_hdf5(file_name)
+    close_hdf5_files()
+    _write_hdf5(file_name)
+    os.utime(file_name, (0, os.path.getmtime(file_name) + 10))
+    assert cached_hdf5(file_name) is not fl
+    close_hdf5_files()
+
+
+def test_labels(tmp_path):
+    file_name = str(tmp_path / 'traces.hdf5')
+    list_IDs = _write_hdf5(file_name)
+    labels = {}
+    for label_type in ['gaussian', 'triangle', 'box']:
+        generator = DataGenerator(list_IDs, file_name, 6000, batch_size=8, shuffle=False, norm_mode='std', label_type=label_type)
+        labels[label_type] = [y[:, :, 0].copy() for y in generator[0][1].values()]
+
+    # the trace 1 has its P at 1100 and its S at 2100
+    y1, y2, y3 = labels['gaussian']
+    assert np.array_equal(np.flatnonzero(y1[1]), np.arange(1100, 2500))
+    assert np.array_equal(y2[1, 1080:1120], np.exp(-(np.arange(1080, 1120)-1100)**2/(2*(10)**2)).astype(np.float32))
+    assert np.count_nonzero(y2[1]) == 40 and np.count_nonzero(y3[0]) == 0
+    y1, y2, y3 = labels['triangle']
+    assert y2[1, 1100] == 1 and y2[1, 1110] == 0.5 and np.count_nonzero(y2[1]) == 39
+    y1, y2, y3 = labels['box']
+    assert np.array_equal(np.flatnonzero(y3[1]), np.arange(2080, 2120))
+
+    generator = DataGenerator(list_IDs, file_name, 6000, batch_size=8, shuffle=False, norm_mode='std', label_type='box', label_dtype='uint8')
+    assert all([np.array_equal(y[:, :, 0], label) and y.dtype == np.uint8 for y, label in zip(generator[0][1].values(), labels['box'])])
+    generator = DataGenerator(list_IDs, file_name, 6000, batch_size=8, shuffle=False, norm_mode='std', label_dtype='float16')
+    assert np.array_equal(generator[0][1]['picker_P'][:, :, 0], labels['gaussian'][1].astype(np.float16))
+    with pytest.raises(ValueError):
+        DataGenerator(list_IDs, file_name, 6000, label_type='gaussian', label_dtype='uint8')
@@ -6,10 +6,18 @@ Created on Sat Jan 25 22:34:05 2020
 @author: mostafamousavi
 """
 
-from EQTransformer.utils.hdf5_maker import preprocessor
+from EQTransformer.utils.hdf5_maker import preprocessor, window_index, get_window, station_attrs, load_stations
+from EQTransformer.utils.preprocessing import dead_windows, QC_COLUMNS
 import pytest
 import glob
 import os
+import json
+import pickle
+import shutil
+import h5py
+import numpy as np
+import obspy
+import pandas as pd
 
 
 def test_hdf5maker():
@@ -30,4 +38,104 @@ def test_outputs():
     output_files = glob.glob("downloads_mseeds_processed_hdfs/*")
     
     assert len(output_files) == 2
-    
+
+
+
+def _write_mseeds(days=(1,), seconds=3600, gap=(1200, 1300)):
+    rng = np.random.default_rng(0)
+    os.makedirs(os.path.join('mseeds', 'ST01'), exist_ok=True)
+    for day in days:
+        t0 = obspy.UTCDateTime(2019, 9, day)
+        name = '__'+t0.strftime('%Y%m%dT%H%M%SZ')+'__'+(t0 + 86400).strftime('%Y%m%dT%H%M%SZ')+'.mseed'
+        for c in 'ENZ':
+            tr = obspy.Trace((rng.standard_normal(100*3600)*1000).astype(np.int32),
+                             header={'network': 'XX', 'station': 'ST01', 'channel': 'HH'+c, 'sampling_rate': 100.0, 'starttime': t0})
+            st = obspy.Stream([tr.slice(endtime=t0+gap[0]), tr.slice(starttime=t0+gap[1], endtime=t0+seconds)])
+            st.write(os.path.join('mseeds', 'ST01', 'XX.ST01..HH'+c+name), format='MSEED')
+    with open('station_list.json', 'w') as f:
+        json.dump({'ST01': {'network': 'XX', 'channels': ['HHE', 'HHN', 'HHZ'], 'coords': [35.8, -117.6, 800]}}, f)
+
+
+def test_continuous_storage(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write_mseeds()
+    # block_length=None is the default call of the continuous storage
+    for storage, block_length in [('slices', 1800), ('continuous', 1800), ('continuous', None)]:
+        preprocessor('preproc_'+storage, 'mseeds', 'station_list.json', overlap=0.3, n_processor=1, block_length=block_length, storage=storage)
+        os.rename('mseeds_processed_hdfs', storage+'_'+str(block_length))
+
+    df_slices = pd.read_csv(os.path.join('slices_1800', 'ST01.csv'))
+    assert window_index(df_slices) is None
+    slices = h5py.File(os.path.join('slices_1800', 'ST01.hdf5'), 'r')
+    for output in ['continuous_1800', 'continuous_None']:
+        df = pd.read_csv(os.path.join(output, 'ST01.csv'))
+        assert list(df.trace_name) == list(df_slices.trace_name)
+        windows = window_index(df)
+        continuous = h5py.File(os.path.join(output, 'ST01.hdf5'), 'r')
+        assert len(continuous['data']) == 0 and len(continuous['continuous']) == 1
+        for trace_name in df.trace_name:
+            window, dataset = get_window(continuous, trace_name, windows), get_window(slices, trace_name)
+            # the blocks of the two formats end at other samples, see BlockStream
+            assert np.allclose(np.array(window), np.array(dataset), rtol=0, atol=1e-5 * np.max(np.abs(dataset)))
+            for key in dataset.attrs:
+                assert window.attrs[key] == dataset.attrs[key]
+        assert os.path.getsize(os.path.join(output, 'ST01.hdf5')) < 0.8 * os.path.getsize(os.path.join('slices_1800', 'ST01.hdf5'))
+
+
+@pytest.mark.parametrize('storage', ['slices', 'continuous'])
+def test_station_attrs(tmp_path, monkeypatch, storage):
+    monkeypatch.chdir(tmp_path)
+    _write_mseeds()
+    stations = load_stations('station_list.json')
+    assert load_stations(os.path.join('.', 'station_list.json')) is stations
+    preprocessor('preproc', 'mseeds', 'station_list.json', overlap=0.3, n_processor=1, storage=storage)
+    fl = h5py.File(os.path.join('mseeds_processed_hdfs', 'ST01.hdf5'), 'r')
+    assert station_attrs(fl) == {'receiver_code': 'ST01', 'network_code': 'XX', 'receiver_latitude': 35.8, 
+                                 'receiver_longitude': -117.6, 'receiver_elevation_m': 800}
+    # once per station, not per slice
+    assert all(len(fl['data'][tr_name].attrs) == 0 for tr_name in fl['data'])
+    if storage == 'continuous':
+        assert all('receiver_code' not in fl['continuous'][chunk].attrs for chunk in fl['continuous'])
+
+
+@pytest.mark.parametrize('storage', ['slices', 'continuous'])
+def test_window_qc_columns(tmp_path, monkeypatch, storage):
+    monkeypatch.chdir(tmp_path)
+    _write_mseeds(gap=(1200, 1300))
+    preprocessor('preproc', 'mseeds', 'station_list.json', overlap=0.3, n_processor=1, storage=storage)
+    df = pd.read_csv(os.path.join('mseeds_processed_hdfs', 'ST01.csv'))
+    assert set(QC_COLUMNS) <= set(df.columns)
+    # the only slice inside the gap, from 1218 s to 1278 s
+    assert list(df.start_time[dead_windows(df)]) == ['2019-09-01 00:20:18.000000']
+    # the filter rings for a few seconds into the gap
+    partial = df[(df.gap_Z > 0.1) & ~dead_windows(df)]
+    assert len(partial) == 2 and np.all(np.abs(partial.gap_Z.values - [36 / 60, 40 / 60]) < 0.1)
+    assert np.all(df.rms_E[~dead_windows(df)] > 100)
+
+
+@pytest.mark.parametrize('storage', ['slices', 'continuous'])
+def test_append(tmp_path, monkeypatch, storage):
+    monkeypatch.chdir(tmp_path)
+    _write_mseeds(days=(1, 2, 3))
+    preprocessor('preproc', 'mseeds', 'station_list.json', overlap=0.3, n_processor=1, storage=storage)
+    shutil.rmtree('mseeds')
+    os.rename('mseeds_processed_hdfs', 'full')
+
+    # the files of the first two days grow, and a third day is added
+    _write_mseeds(days=(1, 2), seconds=3000)
+    preprocessor('preproc', 'mseeds', 'station_list.json', overlap=0.3, n_processor=1, storage=storage)
+    _write_mseeds(days=(1, 2, 3))
+    preprocessor('preproc', 'mseeds', 'station_list.json', overlap=0.3, n_processor=1, storage=storage, append=True)
+    with open(os.path.join('preproc', 'time_tracks.pkl'), 'rb') as f:
+        time_slots, comp_types = pickle.load(f)['ST01']
+    assert len(time_slots) == len(comp_types) == 6 and time_slots == sorted(time_slots)
+
+    full, appended = pd.read_csv(os.path.join('full', 'ST01.csv')), pd.read_csv(os.path.join('mseeds_processed_hdfs', 'ST01.csv'))
+    assert list(full.trace_name) == list(appended.trace_name)
+    fl, fl_appended = h5py.File(os.path.join('full', 'ST01.hdf5'), 'r'), h5py.File(os.path.join('mseeds_processed_hdfs', 'ST01.hdf5'), 'r')
+    windows, windows_appended = window_index(full), window_index(appended)
+    for trace_name in full.trace_name:
+        assert np.array_equal(np.array(get_window(fl, trace_name, windows)), np.array(get_window(fl_appended, trace_name, windows_appended)))
+    assert len(fl['data']) == len(fl_appended['data'])
+    # the grown chunks are rewritten in place, not left behind as dead space
+    assert os.path.getsize(os.path.join('mseeds_processed_hdfs', 'ST01.hdf5')) < 1.05 * os.path.getsize(os.path.join('full', 'ST01.hdf5'))
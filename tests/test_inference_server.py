@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+"""
+
+from EQTransformer.core.inference_server import inference_server, InferenceClient
+import numpy as np
+import multiprocessing
+import time
+import os
+import pytest
+
+
+def test_inference_server():
+    proc = multiprocessing.Process(target=inference_server, 
+                                   kwargs={'input_model': '../sampleData&Model/EqT1D8pre_048.h5',
+                                           'socket_path': 'test_eqt.sock',
+                                           'max_batch_size': 50})
+    proc.start()
+    try:
+        for _ in range(300):
+            if os.path.exists('test_eqt.sock'):
+                break
+            time.sleep(1)
+        client = InferenceClient('unix://test_eqt.sock')
+        predD, predP, predS = client.predict(np.random.randn(120, 6000, 3))
+        assert predD.shape == predP.shape == predS.shape == (120, 6000, 1)
+        
+        predD, predP, predS = client.predict_continuous(np.random.randn(20000, 3))
+        assert predD.shape == (20000,)
+    finally:
+        proc.terminate()
+        proc.join()
+        if os.path.exists('test_eqt.sock'):
+            os.remove('test_eqt.sock')
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+"""
+
+from EQTransformer.core.EqT_utils import _decoder_cropping, load_inference_model, long_input_model, long_input_predict
+import numpy as np
+import pytest
+
+
+def test_cropping():
+    assert [_decoder_cropping(n*6000) for n in range(1, 11)] == [(1, 1), (2, 2), (3, 3), (4, 4), (5, 5), (6, 6), (7, 7), (0, 0), (1, 1), (2, 2)]
+    for n in range(1, 11):
+        # 7 halvings in the encoder, then 4 upsamplings, the cropping, and 3 more upsamplings in the decoders
+        length = n*6000
+        for _ in range(7):
+            length = int(np.ceil(length / 2))
+        assert (length * 2**4 - sum(_decoder_cropping(n*6000))) * 2**3 == n*6000
+
+    
+def test_long_input():
+    model = load_inference_model('../sampleData&Model/EqT1D8pre_048.h5', 
+                                 ['binary_crossentropy', 'binary_crossentropy', 'binary_crossentropy'], 
+                                 [0.02, 0.40, 0.58])
+    long_model = long_input_model(model, 5)
+    assert long_model.outputs[0].shape[1] == 30000
+    for w1, w2 in zip(model.get_weights(), long_model.get_weights()):
+        assert np.array_equal(w1, w2)
+        
+    yh1, yh2, yh3 = long_input_predict(long_model, np.random.randn(100000, 3), batch_size=2)
+    assert yh1.shape == yh2.shape == yh3.shape == (100000,)
+    assert np.all(yh1 >= 0) and np.all(yh1 <= 1)
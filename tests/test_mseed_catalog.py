@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+"""
+
+from EQTransformer.utils.mseed_catalog import MseedCatalog
+from EQTransformer.utils.hdf5_maker import stationListFromMseed
+import numpy as np
+import obspy
+import json
+import os
+
+
+def _write(directory, station, day, channels='ENZ', seconds=600, sampling_rate=100.0):
+    t0 = obspy.UTCDateTime(2019, 9, day)
+    name = '__'+t0.strftime('%Y%m%dT%H%M%SZ')+'__'+(t0 + 86400).strftime('%Y%m%dT%H%M%SZ')+'.mseed'
+    os.makedirs(os.path.join(directory, station), exist_ok=True)
+    for c in channels:
+        tr = obspy.Trace(np.arange(int(seconds * sampling_rate), dtype=np.int32),
+                         header={'network': 'XX', 'station': station, 'channel': 'HH'+c, 'sampling_rate': sampling_rate, 'starttime': t0})
+        tr.write(os.path.join(directory, station, 'XX.'+station+'..HH'+c+name), format='MSEED')
+
+
+def test_mseed_catalog(tmp_path):
+    archive = str(tmp_path / 'mseeds')
+    _write(archive, 'ST01', 1)
+    _write(archive, 'ST01', 2)
+    _write(archive, 'ST02', 1, channels='Z', sampling_rate=50.0)
+
+    catalog = MseedCatalog(archive)
+    assert os.path.isfile(os.path.join(archive, '.mseed_catalog.sqlite'))
+    assert (catalog.added, catalog.updated, catalog.removed) == (7, 0, 0)
+    assert catalog.stations() == ['ST01', 'ST02']
+    chunks = catalog.chunks('ST01')
+    assert [chunk for chunk, _ in chunks] == ['20190901T000000Z__20190902T000000Z.mseed', '20190902T000000Z__20190903T000000Z.mseed']
+    assert chunks[0][1] == [os.path.join('ST01', 'XX.ST01..HH'+c+'__'+chunks[0][0]) for c in 'ENZ']
+    assert catalog.channels('ST02') == ('XX', 'ST02', ['HHZ'])
+    start, end, sampling_rate = catalog.span(chunks[1][1][0])
+    assert (start, sampling_rate) == (obspy.UTCDateTime(2019, 9, 2).timestamp, 100.0)
+    assert abs(end - start - (600 - 0.01)) < 1e-6
+    catalog.close()
+
+    # only the new, changed, and deleted files are handled again
+    catalog = MseedCatalog(archive)
+    assert (catalog.added, catalog.updated, catalog.removed) == (0, 0, 0)
+    catalog.close()
+    _write(archive, 'ST01', 2, seconds=1200)
+    _write(archive, 'ST03', 1, channels='Z')
+    os.remove(os.path.join(archive, 'ST02', os.listdir(os.path.join(archive, 'ST02'))[0]))
+    catalog = MseedCatalog(archive)
+    assert (catalog.added, catalog.updated, catalog.removed) == (1, 3, 1)
+    assert catalog.stations() == ['ST01', 'ST03']
+    start, end, _ = catalog.span(catalog.chunks('ST01')[1][1][0])
+    assert abs(end - start - (1200 - 0.01)) < 1e-6
+    catalog.close()
+
+    stationListFromMseed(archive, {'ST01': [35.8, -117.6, 800], 'ST03': [35.5, -117.4, 700]}, dir_json=str(tmp_path))
+    with open(str(tmp_path / 'station_list.json')) as f:
+        stations = json.load(f)
+    assert stations['ST01'] == {'network': 'XX', 'channels': ['HHE', 'HHN', 'HHZ'], 'coords': [35.8, -117.6, 800]}
+    assert stations['ST03']['channels'] == ['HHZ']
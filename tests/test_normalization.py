@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+"""
+
+from EQTransformer.core.EqT_utils import load_inference_model, normalized_model, normalize, NormalizationLayer
+import numpy as np
+import pytest
+
+
+def test_normalization_layer():
+    rng = np.random.default_rng(0)
+    X = (rng.standard_normal((4, 6000, 3)) * 1000 + 50).astype(np.float32)
+    X[1, :, 2] = 0
+    for mode in ['max', 'std', None]:
+        expected = np.stack([normalize(x.copy(), mode) for x in X])
+        assert np.allclose(NormalizationLayer(mode)(X).numpy(), expected, rtol=1e-5, atol=1e-6)
+    assert np.all(NormalizationLayer('std')(X).numpy()[1, :, 2] == 0)
+
+    emphasized = X.copy()
+    emphasized[:, 1:] -= 0.97 * X[:, :-1]
+    expected = np.stack([normalize(x, 'std') for x in emphasized])
+    assert np.allclose(NormalizationLayer('std', pre_emphasis=0.97)(X).numpy(), expected, rtol=1e-4, atol=1e-5)
+
+    with pytest.raises(ValueError):
+        NormalizationLayer('abs')
+
+
+def test_normalized_model():
+    model = load_inference_model('../sampleData&Model/EqT1D8pre_048.h5',
+                                 ['binary_crossentropy', 'binary_crossentropy', 'binary_crossentropy'],
+                                 [0.02, 0.40, 0.58])
+    norm_model = normalized_model(model, 'std')
+    assert norm_model.get_layer('normalization').norm_mode == 'std'
+    assert norm_model.output_names == model.output_names
+    assert all([np.array_equal(a, b) for a, b in zip(norm_model.get_weights(), model.get_weights())])
+    assert normalized_model(norm_model, 'max') is norm_model
+
+    yh1, yh2, yh3 = norm_model.predict(np.random.randn(2, 6000, 3) * 1e4, verbose=0)
+    assert yh1.shape == yh2.shape == yh3.shape == (2, 6000, 1)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+"""
+
+from EQTransformer.utils.preprocessing import preprocess_array, preprocess_stream, resample_array, resample_stream, _resampling_ratio, BlockStream
+from EQTransformer.utils.preprocessing import window_qc, dead_windows, QC_COLUMNS
+from scipy.signal import resample_poly
+import numpy as np
+import obspy
+import pytest
+
+
+def _stream(sampling_rate, npts, seed=0):
+    rng = np.random.default_rng(seed)
+    return obspy.Stream([obspy.Trace((rng.standard_normal(npts)*1000 + np.cumsum(rng.standard_normal(npts))).astype(np.int32),
+                                     header={'sampling_rate': sampling_rate, 'channel': 'HH'+c}) for c in 'ENZ'])
+
+
+def _obspy_chain(st):
+    st.detrend('demean')
+    st.filter('bandpass', freqmin=1.0, freqmax=45, corners=2, zerophase=True)
+    st.taper(max_percentage=0.001, type='cosine', max_length=2)
+    return st
+
+
+@pytest.mark.parametrize('sampling_rate, npts', [(100.0, 360000), (200.0, 50000), (40.0, 20000), (100.0, 300)])
+def test_preprocess_stream(sampling_rate, npts):
+    st = _stream(sampling_rate, npts)
+    ref = _obspy_chain(st.copy())
+    new = preprocess_stream(st)
+    for tr_ref, tr_new in zip(ref, new):
+        assert tr_new.data.dtype == np.float32
+        assert np.max(np.abs(tr_new.data - tr_ref.data)) <= 1e-4 * np.max(np.abs(tr_ref.data))
+
+
+def test_preprocess_array():
+    st = _stream(100.0, 100000)
+    ref = _obspy_chain(st.copy())
+    data = preprocess_array(np.stack([tr.data for tr in st]), 100.0)
+    assert data.shape == (3, 100000)
+    assert np.allclose(data, np.stack([tr.data for tr in ref]), atol=1e-4 * np.max(np.abs(ref[0].data)))
+
+
+@pytest.mark.parametrize('sampling_rate', [40.0, 50.0, 200.0, 250.0, 500.0])
+def test_resample_array(sampling_rate):
+    rng = np.random.default_rng(0)
+    data = rng.standard_normal((3, int(sampling_rate*1000)+7)).astype(np.float32)
+    up, down = _resampling_ratio(sampling_rate, 100.0)
+    ref = resample_poly(data, up, down, axis=-1)
+    new = resample_array(data, sampling_rate, 100.0, block_length=120)
+    assert new.dtype == np.float32
+    assert np.array_equal(ref, new)
+
+
+def test_resample_stream():
+    t = np.arange(200*600) / 200.0
+    st = obspy.Stream([obspy.Trace((1000*np.sin(2*np.pi*5*t)).astype(np.int32), header={'sampling_rate': 200.0}),
+                       obspy.Trace(np.zeros(6000, dtype=np.int32), header={'sampling_rate': 100.0})])
+    st = resample_stream(st)
+    assert [tr.stats.sampling_rate for tr in st] == [100.0, 100.0]
+    assert st[0].data.dtype == np.int32 and st[0].stats.npts == 60000
+    expected = 1000*np.sin(2*np.pi*5*np.arange(60000) / 100.0)
+    assert np.max(np.abs(st[0].data[1000:-1000] - expected[1000:-1000])) <= 2
+    st.merge(fill_value=0)
+
+    st = resample_stream(obspy.Stream([obspy.Trace(np.ones(1000, dtype=np.float32), header={'sampling_rate': 99.99})]))
+    assert st[0].stats.sampling_rate == 100.0
+
+
+@pytest.mark.parametrize('sampling_rate, span', [(100.0, 'union'), (200.0, 'union'), (100.0, 'longest'), (200.0, 'longest')])
+def test_block_stream(tmp_path, sampling_rate, span):
+    files = []
+    for k, tr in enumerate(_stream(sampling_rate, int(sampling_rate*1800))):
+        tr.stats.station = 'ST01'
+        tr.stats.starttime += k * 0.5
+        if k != 1:
+            tr = tr.slice(endtime=tr.stats.starttime+1700)
+        st = obspy.Stream([tr.slice(endtime=tr.stats.starttime+600), tr.slice(starttime=tr.stats.starttime+700)])
+        files.append(str(tmp_path / (tr.stats.channel+'.mseed')))
+        st.write(files[-1], format='MSEED', reclen=512)
+
+    whole = obspy.Stream()
+    for f in files:
+        whole += obspy.read(f)
+    time_slots = [(tr.stats.starttime, tr.stats.endtime) for tr in obspy.read(files[0])]
+    whole.merge(fill_value=0)
+    whole.sort(keys=['channel'])
+    whole = resample_stream(preprocess_stream(whole))
+    if span == 'union':
+        whole.trim(min([tr.stats.starttime for tr in whole]), max([tr.stats.endtime for tr in whole]), pad=True, fill_value=0)
+    else:
+        longest = max(whole, key=lambda tr: tr.stats.npts)
+        whole.trim(longest.stats.starttime, longest.stats.endtime, pad=True, fill_value=0)
+    assert whole[0].stats.starttime == obspy.read(files[0])[0].stats.starttime + (0.5 if span == 'longest' else 0)
+
+    stream = BlockStream(files, overlap=0.3, block_length=300, span=span)
+    assert stream.time_slots == time_slots
+    assert stream.starttime == whole[0].stats.starttime
+    peak = max([np.max(np.abs(tr.data)) for tr in whole])
+    n = 0
+    for start_times, windows in stream.blocks():
+        for start_time, data in zip(start_times, windows):
+            w = whole.slice(start_time, start_time+60)
+            expected = np.stack([w[0].data[:6000], w[1].data[:6000], w[2].data[:6000]], axis=-1)
+            assert np.max(np.abs(data - expected)) <= 1e-5 * peak
+            n += 1
+    assert n == stream.n_windows == int((whole[0].stats.endtime - whole[0].stats.starttime - 60) // 42) + 1
+
+
+
+def test_window_qc():
+    rng = np.random.default_rng(0)
+    windows = rng.standard_normal((4, 6000, 3)).astype(np.float32) * 100
+    windows[0, 1000:3000] = 1e-8
+    windows[1, :, :2] = 0
+    windows[2] = 0
+    windows[3, :5900] = 1e-9
+    windows[3, 100, 2] = 1
+    windows[3, 5950:, 0] = 400
+
+    qc = window_qc(windows, scale=np.max(np.abs(windows), axis=(0, 1)))
+    assert qc.shape == (4, len(QC_COLUMNS)) and qc.dtype == np.float32
+    gap, zero_run, clip, rms = qc[:, 0:3], qc[:, 3:6], qc[:, 6:9], qc[:, 9:12]
+    assert np.allclose(gap[0], 2000 / 6000) and np.all(zero_run[0] == 2000)
+    assert np.all(gap[1] == [1, 1, 0]) and np.all(zero_run[1] == [6000, 6000, 0])
+    assert np.all(gap[2] == 1) and np.all(clip[2] == 0) and np.all(rms[2] == 0)
+    assert zero_run[3, 2] == 5799 and np.isclose(clip[3, 0], 50 / 6000)
+    assert np.allclose(rms[1, 2], np.sqrt(np.mean(np.square(windows[1, :, 2]))))
+    assert list(dead_windows(qc)) == [False, False, True, True]
+    assert list(dead_windows(qc, max_gap=0.99)) == [False, False, True, False]
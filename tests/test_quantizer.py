@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 10:12:31 2026
+
+"""
+
+from EQTransformer.core.quantizer import quantizer, _MemoryMonitor
+import sys
+import time
+import pytest
+import glob
+import os
+
+def test_quantizer():
+    
+    quantizer(input_hdf5='../sampleData&Model/100samples.hdf5',
+              input_csv='../sampleData&Model/100samples.csv',
+              input_testset='test_trainer_outputs/test.npy',
+              input_model='test_trainer_outputs/models/test_trainer_001.h5',
+              output_name='test_quantizer',
+              precision='int8_dynamic',
+              batch_size=10)
+    
+    dir_list = [ev for ev in os.listdir('.') if ev.split('_')[-1] == 'outputs']  
+    assert 'test_quantizer_outputs' in dir_list 
+    
+def test_model():
+    model = glob.glob("test_quantizer_outputs/test_quantizer.tflite")
+    assert len(model) == 1
+    
+def test_report():
+    report = glob.glob("test_quantizer_outputs/X_report.txt")
+    assert len(report) == 1
+
+
+def test_memory_monitor(monkeypatch):
+    # a failed read of /proc during the run is skipped
+    samples = iter([1e9, None, 3e9] + [None]*10000)
+    monkeypatch.setattr(sys.modules['EQTransformer.core.quantizer'], '_current_rss', lambda: next(samples))
+    monitor = _MemoryMonitor(interval=0.001)
+    monitor.start()
+    time.sleep(0.1)
+    assert monitor.thread.is_alive()
+    assert monitor.stop() == 2000.0
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+"""
+
+from EQTransformer.core.replica_pool import replica_layout, ReplicaPool
+import numpy as np
+import pytest
+
+
+def test_layout():
+    layout = replica_layout('auto')
+    assert len(layout) >= 1
+    assert all(len(cpus) >= 1 for cpus in layout)
+    assert len(replica_layout(3, 1)) == 3
+
+    
+def test_pool():
+    pool = ReplicaPool('../sampleData&Model/EqT1D8pre_048.h5', 
+                       ['binary_crossentropy', 'binary_crossentropy', 'binary_crossentropy'], 
+                       [0.02, 0.40, 0.58],
+                       number_of_replicas=2, 
+                       threads_per_replica=1)
+    X = np.random.randn(10, 6000, 3)
+    predD, predP, predS = pool.predict(X, batch_size=3)
+    with pytest.raises(ValueError):
+        pool.predict(np.zeros((0, 6000, 3)))
+
+    # the chunks of a call that failed midway do not end up in the next call
+    def _chunks():
+        for i in range(4):
+            yield np.random.randn(5, 6000, 3)
+        raise IOError('unreadable batch')
+    with pytest.raises(IOError):
+        pool._run(_chunks())
+    again = pool.predict(X, batch_size=3)
+    pool.close()
+    assert predD.shape == predP.shape == predS.shape == (10, 6000, 1)
+    assert [o.shape for o in again] == [(10, 6000, 1)] * 3
+
+
+def test_shared_pool():
+    pool = ReplicaPool('../sampleData&Model/EqT1D8pre_048.h5', 
+                       ['binary_crossentropy', 'binary_crossentropy', 'binary_crossentropy'], 
+                       [0.02, 0.40, 0.58],
+                       number_of_replicas=2, 
+                       share_weights=True)
+    predD, predP, predS = pool.predict(np.random.randn(10, 6000, 3), batch_size=3)
+    usage = pool.memory_usage()
+    pool.close()
+    assert predD.shape == predP.shape == predS.shape == (10, 6000, 1)
+    assert len(usage) == 2
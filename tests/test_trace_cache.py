@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+"""
+
+from EQTransformer.utils.preprocessing import BlockStream
+from EQTransformer.utils.trace_cache import TraceCache
+import numpy as np
+import obspy
+import os
+import pytest
+
+
+def _files(directory, sampling_rate, seconds, seed=0):
+    rng = np.random.default_rng(seed)
+    files = []
+    for k, c in enumerate('ENZ'):
+        tr = obspy.Trace((rng.standard_normal(int(sampling_rate*seconds))*1000).astype(np.int32),
+                         header={'station': 'ST01', 'channel': 'HH'+c, 'sampling_rate': sampling_rate})
+        tr.stats.starttime += k * 0.5
+        st = obspy.Stream([tr.slice(endtime=tr.stats.starttime+300), tr.slice(starttime=tr.stats.starttime+350)])
+        files.append(os.path.join(str(directory), 'ST01.HH'+c+'.'+str(seed)+'.mseed'))
+        st.write(files[-1], format='MSEED', reclen=512)
+    return files
+
+
+@pytest.mark.parametrize('sampling_rate, span', [(100.0, 'union'), (200.0, 'longest')])
+def test_trace_cache(tmp_path, sampling_rate, span):
+    files = _files(tmp_path, sampling_rate, 900)
+    cache = TraceCache(str(tmp_path / 'cache'))
+    reference = BlockStream(files, overlap=0.3, block_length=300, span=span)
+    for n in range(2):
+        stream = cache.stream(files, overlap=0.3, block_length=300, span=span)
+        assert (cache.misses, cache.hits) == (1, n)
+        assert stream.time_slots == reference.time_slots
+        assert stream.sampling_rates == reference.sampling_rates
+        assert (stream.starttime, stream.n_windows) == (reference.starttime, reference.n_windows)
+        assert [tr.channel for tr in stream.traces] == [tr.channel for tr in reference.traces]
+        blocks = list(stream.blocks())
+        expected = list(reference.blocks())
+        assert [b[0] for b in blocks] == [b[0] for b in expected]
+        for (_, windows), (_, ref) in zip(blocks, expected):
+            assert np.max(np.abs(windows - ref)) <= 1e-5 * np.max(np.abs(ref))
+
+    whole = list(cache.stream(files, overlap=0.3, block_length=None, span=span).blocks())
+    assert len(whole) == 1 and len(whole[0][0]) == reference.n_windows
+
+    # another file content or filter band is another entry
+    assert cache.key(files) != cache.key(files, freqmin=2.0)
+    (tmp_path / 'other').mkdir()
+    assert cache.key(files) != cache.key(_files(tmp_path / 'other', sampling_rate, 900, seed=1))
+
+
+def test_trace_cache_eviction(tmp_path):
+    chunks = [_files(tmp_path, 100.0, 600, seed=seed) for seed in range(3)]
+    cache = TraceCache(str(tmp_path / 'cache'))
+    cache.stream(chunks[0])
+    entry = cache.size()
+    cache.max_size = 2.5 * entry / 1e9
+    cache.stream(chunks[1])
+    os.utime(os.path.join(cache.cache_dir, cache.key(chunks[0])+'.json'), (0, 0))
+    cache.stream(chunks[2])
+    assert cache.size() <= 2.5 * entry
+    assert not os.path.isfile(os.path.join(cache.cache_dir, cache.key(chunks[0])+'.npy'))
+    assert os.path.isfile(os.path.join(cache.cache_dir, cache.key(chunks[2])+'.npy'))
+    cache.stream(chunks[1])
+    assert (cache.misses, cache.hits) == (3, 1)
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+"""
+
+from EQTransformer.core.EqT_utils import load_inference_model, XLAModel
+import numpy as np
+import pytest
+
+
+def test_xla():
+    model = load_inference_model('../sampleData&Model/EqT1D8pre_048.h5',
+                                 ['binary_crossentropy', 'binary_crossentropy', 'binary_crossentropy'],
+                                 [0.02, 0.40, 0.58])
+    xla_model = XLAModel(model, 4)
+    assert xla_model.compile_time > 0
+
+    yh1, yh2, yh3 = xla_model.predict(np.random.randn(10, 6000, 3))
+    assert yh1.shape == yh2.shape == yh3.shape == (10, 6000, 1)
+    assert np.all(yh1 >= 0) and np.all(yh1 <= 1)
+
+    with pytest.raises(ValueError):
+        XLAModel(None, 4)